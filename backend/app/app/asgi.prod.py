@@ -19,6 +19,7 @@ os.environ.setdefault("DJANGO_SETTINGS_MODULE", "app.settings.prod")
 # is populated before importing code that may import ORM models.
 django_asgi_app = get_asgi_application()
 
+from webchat.buffers import BuffersLifespan  # noqa E402
 from webchat.middleware import JWTAuthMiddleWare  # noqa E402
 
 # we need to make sure that this import is after the application has been generated
@@ -32,5 +33,7 @@ application = ProtocolTypeRouter(
         "http": django_asgi_app,
         # WebSocket handler
         "websocket": JWTAuthMiddleWare(URLRouter(urls.websocket_urlpatterns)),
+        # the buffered writes are stored on a graceful shutdown
+        "lifespan": BuffersLifespan(),
     }
 )
@@ -124,7 +124,8 @@ DATABASES = {
 # Using Argon2 with Django
 # https://docs.djangoproject.com/en/5.0/topics/auth/passwords/#using-argon2-with-django
 PASSWORD_HASHERS = [
-    "django.contrib.auth.hashers.Argon2PasswordHasher",
+    # Argon2PasswordHasher hashing on a bounded pool during the logins
+    "utils.jwt_tokens.hashers.PooledArgon2PasswordHasher",
     "django.contrib.auth.hashers.PBKDF2PasswordHasher",
     "django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher",
     "django.contrib.auth.hashers.BCryptSHA256PasswordHasher",
@@ -212,6 +213,30 @@ SIMPLE_JWT = {
     "JWT_AUTH_COOKIE_NAME": "access_token",  # setting the cookie name for the JWT authentication
     "JWT_AUTH_REFRESH_COOKIE_NAME": "refresh_token",
     "JWT_AUTH_SAMESITE": "Lax",
+    # the request user is built from the claims of the access token,
+    # without reading the database - used by the JWTCookieAuthentication
+    "JWT_AUTH_STATELESS_USER": bool(
+        int(os.environ.get("SIMPLE_JWT_STATELESS_USER", 0))
+    ),
+    # the revoked tokens are stored in redis, every process checks them with
+    # a Bloom filter reloaded at most every refresh interval (in seconds),
+    # sized for the capacity of revoked tokens
+    "JWT_REVOCATION_REFRESH_INTERVAL": float(
+        os.environ.get("SIMPLE_JWT_REVOCATION_REFRESH_INTERVAL", 5)
+    ),
+    "JWT_REVOCATION_CAPACITY": int(
+        os.environ.get("SIMPLE_JWT_REVOCATION_CAPACITY", 100_000)
+    ),
+    # the passwords of the logins are hashed by a fixed number of workers,
+    # with at most the queue size of logins waiting for them, the other
+    # logins are refused with 503 and Retry-After (in seconds)
+    "JWT_AUTH_PASSWORD_WORKERS": int(os.environ.get("SIMPLE_JWT_PASSWORD_WORKERS", 2)),
+    "JWT_AUTH_PASSWORD_QUEUE_SIZE": int(
+        os.environ.get("SIMPLE_JWT_PASSWORD_QUEUE_SIZE", 8)
+    ),
+    "JWT_AUTH_PASSWORD_RETRY_AFTER": int(
+        os.environ.get("SIMPLE_JWT_PASSWORD_RETRY_AFTER", 1)
+    ),
     # custom settings SIMPLE_JWT - END
 }
 
@@ -256,3 +281,115 @@ CHANNEL_LAYERS = {
         },
     },
 }
+
+
+# redis used by the app for caching, it is the same server as the one of the
+# channel layers but a different database
+REDIS = {
+    "HOST": os.environ.get("REDIS_HOST", os.environ.get("CHANNEL_LAYERS_REDIS_HOST")),
+    "PORT": int(
+        os.environ.get("REDIS_PORT", os.environ.get("CHANNEL_LAYERS_REDIS_PORT", 6379))
+    ),
+    "DB": int(os.environ.get("REDIS_DB_INDEX", 2)),
+    # in seconds, a slow redis is treated like a cache miss
+    "SOCKET_TIMEOUT": float(os.environ.get("REDIS_SOCKET_TIMEOUT", 1.0)),
+}
+
+
+# custom settings for the members of the servers
+SERVER_MEMBERSHIP = {
+    # in seconds, the members of a server are cached in redis and
+    # updated when they change, the timeout only limits the memory used
+    "CACHE_TIMEOUT": int(os.environ.get("SERVER_MEMBERSHIP_CACHE_TIMEOUT", 60 * 60)),
+}
+
+
+# custom settings for the webchat app
+WEBCHAT = {
+    # how the chat messages are stored:
+    # "sync" - every message is stored before it is broadcasted
+    # "write_behind" - the message is broadcasted immediately and the messages
+    # are stored in batches, when the batch size is reached or after the flush
+    # interval (in seconds), the remaining messages are stored on shutdown.
+    # The failed flushes are retried with a growing delay, the messages are
+    # dropped after the max retries failed flushes in a row
+    "MESSAGE_PERSISTENCE": os.environ.get("WEBCHAT_MESSAGE_PERSISTENCE", "sync"),
+    "WRITE_BEHIND_BATCH_SIZE": int(
+        os.environ.get("WEBCHAT_WRITE_BEHIND_BATCH_SIZE", 100)
+    ),
+    "WRITE_BEHIND_FLUSH_INTERVAL": float(
+        os.environ.get("WEBCHAT_WRITE_BEHIND_FLUSH_INTERVAL", 0.5)
+    ),
+    "WRITE_BEHIND_MAX_RETRIES": int(
+        os.environ.get("WEBCHAT_WRITE_BEHIND_MAX_RETRIES", 5)
+    ),
+    # the sequence numbers of the buffered messages are handed out in redis
+    # from blocks of this size, reserved in the conversation with one UPDATE
+    "WRITE_BEHIND_SEQ_BLOCK_SIZE": int(
+        os.environ.get("WEBCHAT_WRITE_BEHIND_SEQ_BLOCK_SIZE", 100)
+    ),
+    # number of the latest messages of every channel kept in redis, the first
+    # page of the messages is served from them, 0 disables the cache
+    "RECENT_MESSAGES_CACHE_SIZE": int(
+        os.environ.get("WEBCHAT_RECENT_MESSAGES_CACHE_SIZE", 100)
+    ),
+    # in seconds, the messages of an inactive channel are evicted after
+    "RECENT_MESSAGES_CACHE_TIMEOUT": int(
+        os.environ.get("WEBCHAT_RECENT_MESSAGES_CACHE_TIMEOUT", 60 * 60 * 24)
+    ),
+    # number of the users of the access tokens cached in every process,
+    # used by the websocket handshakes, 0 disables the cache
+    "TOKEN_USER_CACHE_SIZE": int(os.environ.get("WEBCHAT_TOKEN_USER_CACHE_SIZE", 1024)),
+    # in seconds, at most until the token expires
+    "TOKEN_USER_CACHE_TIMEOUT": int(
+        os.environ.get("WEBCHAT_TOKEN_USER_CACHE_TIMEOUT", 60)
+    ),
+    # number of the monthly partitions of the messages created ahead
+    # of the current month by the partition_messages command
+    "MESSAGE_PARTITIONS_AHEAD": int(
+        os.environ.get("WEBCHAT_MESSAGE_PARTITIONS_AHEAD", 3)
+    ),
+    # number of the full months before the current one kept in the messages
+    # table, the older partitions are detached, 0 keeps all of them
+    "MESSAGE_PARTITIONS_RETAIN_MONTHS": int(
+        os.environ.get("WEBCHAT_MESSAGE_PARTITIONS_RETAIN_MONTHS", 0)
+    ),
+    # number of the messages read from the server-side cursor and compressed
+    # at once by the streaming exports, the memory used depends only on it
+    "MESSAGE_EXPORT_CHUNK_SIZE": int(
+        os.environ.get("WEBCHAT_MESSAGE_EXPORT_CHUNK_SIZE", 2000)
+    ),
+    # gzip compression level of the exports, from 1 (fastest) to 9 (smallest)
+    "MESSAGE_EXPORT_COMPRESS_LEVEL": int(
+        os.environ.get("WEBCHAT_MESSAGE_EXPORT_COMPRESS_LEVEL", 6)
+    ),
+    # number of the expired messages deleted in one transaction by the
+    # purge_messages command, and the pause between the batches in seconds
+    "MESSAGE_PURGE_BATCH_SIZE": int(
+        os.environ.get("WEBCHAT_MESSAGE_PURGE_BATCH_SIZE", 1000)
+    ),
+    "MESSAGE_PURGE_SLEEP": float(os.environ.get("WEBCHAT_MESSAGE_PURGE_SLEEP", 0.1)),
+    # in days, the messages of the deleted channels are purged after,
+    # the retention of the servers does not apply to them, 0 keeps them
+    "ORPHANED_MESSAGE_RETENTION_DAYS": int(
+        os.environ.get("WEBCHAT_ORPHANED_MESSAGE_RETENTION_DAYS", 0)
+    ),
+    # the "mark read" frames of the sockets are coalesced and stored after
+    # the flush interval (in seconds), or when the number of the buffered
+    # (user, channel) markers reaches the buffer size, the remaining markers
+    # are stored on shutdown. The failed flushes are retried like the ones
+    # of the messages
+    "READ_MARKER_BUFFER_SIZE": int(
+        os.environ.get("WEBCHAT_READ_MARKER_BUFFER_SIZE", 1000)
+    ),
+    "READ_MARKER_FLUSH_INTERVAL": float(
+        os.environ.get("WEBCHAT_READ_MARKER_FLUSH_INTERVAL", 1.0)
+    ),
+    "READ_MARKER_MAX_RETRIES": int(
+        os.environ.get("WEBCHAT_READ_MARKER_MAX_RETRIES", 5)
+    ),
+}
+
+# the links to the pages of the messages are sent in the Link header
+# https://pypi.org/project/django-cors-headers/
+CORS_EXPOSE_HEADERS = ["Link"]
@@ -0,0 +1,207 @@
+"""
+Django command to bulk import the message history of the old chat system.
+Loading the messages with COPY, in batches with resumable checkpoints.
+"""
+
+import gzip
+import json
+import os
+import time
+import uuid
+from collections import Counter
+from typing import Any, BinaryIO
+
+from django.core.management.base import BaseCommand, CommandError, CommandParser
+
+from webchat.imports import MessageImport, read_csv, read_jsonl
+
+READERS = {"jsonl": read_jsonl, "csv": read_csv}
+
+
+class Command(BaseCommand):
+    """Django command to bulk import the message history."""
+
+    help = (
+        "Imports the messages of a JSON Lines or CSV file (optionally gzipped) "
+        "with COPY. Every message has the fields channel_id, sender_email or "
+        "sender_id, content, created (ISO 8601, UTC if without a time zone) and "
+        "optionally id, the messages of a channel are numbered in the order of "
+        "their creation. The senders and the channels have to exist, the other "
+        "rows are skipped, as are the channels that already have messages, "
+        "unless --force is given. The offset of the last written batch is stored "
+        "in the checkpoint file, an interrupted import continues from it."
+    )
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument("input", help="Path of the .jsonl or .csv file.")
+        parser.add_argument(
+            "--format",
+            choices=sorted(READERS),
+            default=None,
+            help="Format of the file, by default from its extension.",
+        )
+        parser.add_argument(
+            "--channel-id",
+            default=None,
+            help="Channel of the messages without their own channel_id.",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=10000,
+            help="Number of the messages written with one COPY.",
+        )
+        parser.add_argument(
+            "--checkpoint",
+            default=None,
+            help="Path of the checkpoint file, by default <input>.checkpoint.",
+        )
+        parser.add_argument(
+            "--restart",
+            action="store_true",
+            help="Ignores the checkpoint and imports the file from the start.",
+        )
+        parser.add_argument(
+            "--force",
+            action="store_true",
+            help=(
+                "Imports into the channels that already have messages, the "
+                "imported messages are numbered after the existing ones."
+            ),
+        )
+
+    def handle(self, *args: Any, **options: Any) -> str | None:
+        """Entry point for command."""
+        path = options["input"]
+        if not os.path.isfile(path):
+            raise CommandError(f"File {path} does not exist.")
+        if options["batch_size"] <= 0:
+            raise CommandError("The batch size has to be positive.")
+        name = path.removesuffix(".gz")
+        file_format = options["format"] or os.path.splitext(name)[1].lstrip(".")
+        if file_format == "ndjson":
+            file_format = "jsonl"
+        if file_format not in READERS:
+            raise CommandError(f"Unknown format of {path}, use --format.")
+        checkpoint_path = options["checkpoint"] or f"{path}.checkpoint"
+
+        checkpoint = {
+            "offset": 0,
+            "rows": 0,
+            "skipped": {},
+            "conversations": {},
+            "done": False,
+        }
+        resumed = not options["restart"] and os.path.exists(checkpoint_path)
+        if resumed:
+            with open(checkpoint_path) as file:
+                checkpoint.update(json.load(file))
+        if checkpoint["done"]:
+            self.stdout.write(f"{path} is already imported, use --restart.")
+            return
+
+        importer = MessageImport(
+            channel_id=options["channel_id"],
+            source=os.path.basename(name),
+            force=options["force"],
+        )
+        importer.rows = checkpoint["rows"]
+        importer.skipped = Counter(checkpoint["skipped"])
+        # the conversations of the interrupted import are not refused
+        importer.base_seqs = {
+            uuid.UUID(conversation_id): base_seq
+            for conversation_id, base_seq in checkpoint["conversations"].items()
+        }
+        if checkpoint["offset"]:
+            self.stdout.write(
+                f"Continuing from {checkpoint['offset']} bytes, "
+                f"{checkpoint['rows']} messages imported."
+            )
+
+        start, start_rows = time.perf_counter(), importer.rows
+        with self.open(path) as file:
+            # the batch written last may not be in the checkpoint yet
+            skip_existing = resumed
+            offset = written = checkpoint["offset"]
+            self.saved_conversations = set(importer.base_seqs)
+            batch = []
+            for offset, row in READERS[file_format](file, checkpoint["offset"]):
+                message = importer.parse(row, offset)
+                if message is not None:
+                    batch.append(message)
+                if len(batch) >= options["batch_size"]:
+                    self.write_batch(
+                        checkpoint_path, importer, batch, written, skip_existing
+                    )
+                    self.save_checkpoint(checkpoint_path, importer, offset)
+                    self.write_progress(importer, start, start_rows)
+                    batch, skip_existing, written = [], False, offset
+            self.write_batch(checkpoint_path, importer, batch, written, skip_existing)
+            self.save_checkpoint(checkpoint_path, importer, offset)
+            importer.renumber()
+            self.save_checkpoint(checkpoint_path, importer, offset, done=True)
+
+        seconds = max(time.perf_counter() - start, 1e-9)
+        skipped = ", ".join(
+            f"{reason}: {count}" for reason, count in sorted(importer.skipped.items())
+        )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Imported {importer.rows} messages of {path} "
+                f"({(importer.rows - start_rows) / seconds:.0f} rows/s)"
+                + (f", skipped {skipped}" if skipped else "")
+            )
+        )
+
+    @staticmethod
+    def open(path: str) -> BinaryIO:
+        if path.endswith(".gz"):
+            return gzip.open(path, "rb")
+        return open(path, "rb")
+
+    def write_batch(
+        self,
+        path: str,
+        importer: MessageImport,
+        batch: list,
+        offset: int,
+        skip_existing: bool,
+    ) -> None:
+        """
+        Writes the batch read after the offset. The new conversations of the
+        batch are stored in the checkpoint first, with the offset of the
+        previous batch, so a resumed import does not take their messages
+        for existing ones.
+        """
+        if batch and set(importer.base_seqs) != self.saved_conversations:
+            self.save_checkpoint(path, importer, offset)
+            self.saved_conversations = set(importer.base_seqs)
+        importer.write(batch, skip_existing=skip_existing)
+
+    @staticmethod
+    def save_checkpoint(
+        path: str, importer: MessageImport, offset: int, done: bool = False
+    ) -> None:
+        """Stores the checkpoint, it is replaced at once, so it is never partial."""
+        checkpoint = {
+            "offset": offset,
+            "rows": importer.rows,
+            "skipped": dict(importer.skipped),
+            "conversations": {
+                str(conversation_id): base_seq
+                for conversation_id, base_seq in importer.base_seqs.items()
+            },
+            "done": done,
+        }
+        with open(f"{path}.tmp", "w") as file:
+            json.dump(checkpoint, file)
+        os.replace(f"{path}.tmp", path)
+
+    def write_progress(
+        self, importer: MessageImport, start: float, start_rows: int
+    ) -> None:
+        seconds = max(time.perf_counter() - start, 1e-9)
+        self.stdout.write(
+            f"{importer.rows} messages, {sum(importer.skipped.values())} skipped, "
+            f"{(importer.rows - start_rows) / seconds:.0f} rows/s"
+        )
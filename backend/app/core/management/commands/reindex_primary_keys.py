@@ -0,0 +1,76 @@
+"""
+Django command to rebuild the primary key indexes of the UUID models.
+Compacting the indexes bloated by the random uuid4 ids, after the models
+switched to the time ordered uuid7 ids.
+"""
+
+from typing import Any
+
+from django.apps import apps
+from django.core.management.base import BaseCommand, CommandParser
+from django.db import connection
+
+from utils.abstracts import UUIDModel
+
+
+class Command(BaseCommand):
+    """Django command to rebuild the primary key indexes of the UUID models."""
+
+    help = (
+        "Rebuilds the primary key indexes of the UUID models concurrently, "
+        "without locking the writes, to compact the pages split by the "
+        "random uuid4 ids. The existing ids are kept, the new rows get "
+        "the time ordered uuid7 ids appended at the end of the index."
+    )
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Only prints the indexes with their size.",
+        )
+
+    def handle(self, *args: Any, **options: Any) -> str | None:
+        """Entry point for command."""
+        for model in apps.get_models():
+            if not issubclass(model, UUIDModel):
+                continue
+            index = self.get_primary_key_index(model)
+            size = self.get_size(index)
+            if options["dry_run"]:
+                self.stdout.write(f"{model._meta.label}: {index} ({size})")
+                continue
+
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f"REINDEX INDEX CONCURRENTLY {connection.ops.quote_name(index)}"
+                )
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f"{model._meta.label}: {index} ({size} -> {self.get_size(index)})"
+                )
+            )
+
+    @staticmethod
+    def get_primary_key_index(model: type[UUIDModel]) -> str:
+        with connection.cursor() as cursor:
+            constraints = connection.introspection.get_constraints(
+                cursor, model._meta.db_table
+            )
+        return next(
+            name
+            for name, constraint in constraints.items()
+            if constraint["primary_key"]
+        )
+
+    @staticmethod
+    def get_size(index: str) -> str:
+        # a partitioned index has no storage of its own, its size is
+        # the sum of the indexes of the partitions
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT pg_size_pretty(coalesce(sum(pg_relation_size(relid)), 0)) "
+                "FROM pg_partition_tree(%s::regclass)",
+                [connection.ops.quote_name(index)],
+            )
+            return cursor.fetchone()[0]
@@ -0,0 +1,145 @@
+import json
+import os
+import random
+import string
+import tempfile
+from datetime import datetime, timedelta, timezone
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import SimpleTestCase
+
+from server.models import Category, Channel, Server
+from utils.tests.benchmark import BaseBenchmark
+from webchat.models import Conversation, Message
+
+User = get_user_model()
+
+
+class ImportMessagesBenchmark(SimpleTestCase, BaseBenchmark):
+    """
+    Throughput of the import_messages command with a few batch sizes,
+    compared with storing the same messages with bulk_create.
+
+    Run with BENCH_IMPORT_MESSAGES=5000000 for a bigger history.
+    """
+
+    databases = "__all__"
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        benchmark = cls()
+        generator = random.Random(13)
+        cls.senders = User.objects.bulk_create(
+            User(email=f"bench_import_{index}@test.com")
+            for index in range(benchmark.bench_size("import_senders", 100))
+        )
+        category = Category.objects.create(name="bench_import_category")
+        cls.server = Server.objects.create(
+            name="bench_import_server", owner=cls.senders[0], category=category
+        )
+        cls.channels = [
+            Channel.objects.create(
+                name=f"bench_import_{index}", owner=cls.senders[0], server=cls.server
+            )
+            for index in range(benchmark.bench_size("import_channels", 50))
+        ]
+        cls.directory = tempfile.TemporaryDirectory()
+        cls.path = os.path.join(cls.directory.name, "messages.jsonl")
+        cls.rows = benchmark.bench_size("import_messages", 200_000)
+        start = datetime(2001, 1, 1, tzinfo=timezone.utc)
+        words = [
+            "".join(generator.choices(string.ascii_lowercase, k=6)) for _ in range(2000)
+        ]
+        with open(cls.path, "w") as file:
+            for index in range(cls.rows):
+                row = {
+                    "channel_id": str(generator.choice(cls.channels).id),
+                    "sender_email": generator.choice(cls.senders).email,
+                    "content": " ".join(
+                        generator.choices(words, k=generator.randint(3, 30))
+                    ),
+                    # a few months of history
+                    "created": (start + timedelta(seconds=index * 30)).isoformat(),
+                }
+                file.write(json.dumps(row) + "\n")
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.clear()
+        cls.server.delete()
+        User.objects.filter(email__startswith="bench_import_").delete()
+        cls.directory.cleanup()
+        super().tearDownClass()
+
+    @classmethod
+    def clear(cls) -> None:
+        Message.objects.filter(conversation__channel__server=cls.server).delete()
+        Conversation.objects.filter(channel__server=cls.server).delete()
+
+    def run_import(self, batch_size: int) -> dict:
+        self.clear()
+        with self.timer() as import_time:
+            call_command(
+                "import_messages",
+                self.path,
+                "--batch-size",
+                str(batch_size),
+                "--restart",
+                stdout=StringIO(),
+            )
+        imported = Message.objects.filter(
+            conversation__channel__server=self.server
+        ).count()
+        assert imported == self.rows, imported
+        return {
+            "import": f"COPY, batches of {batch_size}",
+            "messages": imported,
+            "rows/s": imported / import_time["seconds"],
+        }
+
+    def run_bulk_create(self, batch_size: int) -> dict:
+        """the messages of the file stored with bulk_create, as a baseline"""
+        self.clear()
+        rows = self.bench_size("import_bulk_create_messages", 50_000)
+        senders = {sender.email: sender.pk for sender in self.senders}
+        conversations, seqs = {}, {}
+        with self.timer() as import_time:
+            messages = []
+            with open(self.path) as file:
+                for _, line in zip(range(rows), file):
+                    row = json.loads(line)
+                    if row["channel_id"] not in conversations:
+                        conversations[row["channel_id"]] = (
+                            Conversation.objects.get_or_create_id_for_channel(
+                                row["channel_id"]
+                            )
+                        )
+                    conversation_id = conversations[row["channel_id"]]
+                    seqs[conversation_id] = seqs.get(conversation_id, 0) + 1
+                    messages.append(
+                        Message(
+                            conversation_id=conversation_id,
+                            sender_id=senders[row["sender_email"]],
+                            content=row["content"],
+                            created=datetime.fromisoformat(row["created"]),
+                            seq=seqs[conversation_id],
+                        )
+                    )
+                    if len(messages) == batch_size:
+                        Message.objects.bulk_create(messages)
+                        messages = []
+            Message.objects.bulk_create(messages)
+        return {
+            "import": f"bulk_create, batches of {batch_size}",
+            "messages": rows,
+            "rows/s": rows / import_time["seconds"],
+        }
+
+    def test_import_throughput(self):
+        rows = [self.run_bulk_create(1000)]
+        for batch_size in (1000, 10000, 50000):
+            rows.append(self.run_import(batch_size))
+        self.report("Message history import", rows)
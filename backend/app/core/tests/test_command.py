@@ -2,13 +2,31 @@
 Test custom Django management commands.
 """
 
+import gzip
+import json
+import os
+import tempfile
+import uuid
+from datetime import datetime, timezone
+from io import StringIO
 from unittest.mock import MagicMock, patch
 
 from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
 from django.db.utils import OperationalError
 from django.test import SimpleTestCase  # without database
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 from psycopg import OperationalError as PsycopgError
 
+from core.management.commands.import_messages import Command as ImportCommand
+from core.management.commands.reindex_primary_keys import Command as ReindexCommand
+from utils.tests.base import BaseTestChannel, BaseTestUser
+from webchat.imports import MessageImport
+from webchat.models import Conversation, Message, ReadMarker
+from webchat.partitions import MessagePartitions
+
 
 @patch("core.management.commands.wait_for_db.Command.check")
 class CommandTests(SimpleTestCase):
@@ -42,3 +60,287 @@ class CommandTests(SimpleTestCase):
 
         self.assertEqual(patched_check.call_count, 6)
         patched_check.assert_called_with(databases=["default"])
+
+
+class ReindexPrimaryKeysCommandTests(SimpleTestCase):
+    """Test rebuilding the primary key indexes of the UUID models."""
+
+    # REINDEX CONCURRENTLY can not run in the transaction of a TestCase
+    databases = ["default"]
+
+    def test_dry_run(self) -> None:
+        """Test the indexes are listed without rebuilding them."""
+        stdout = StringIO()
+        with CaptureQueriesContext(connection) as context:
+            call_command("reindex_primary_keys", "--dry-run", stdout=stdout)
+
+        self.assertIn("webchat.Message: webchat_message_pkey", stdout.getvalue())
+        self.assertIn("users.User: users_user_pkey", stdout.getvalue())
+        self.assertFalse(
+            any("REINDEX" in query["sql"] for query in context.captured_queries)
+        )
+
+    def test_reindex(self) -> None:
+        """Test the indexes of the UUID models are rebuilt."""
+        stdout = StringIO()
+        call_command("reindex_primary_keys", stdout=stdout)
+
+        self.assertIn("webchat.Message: webchat_message_pkey", stdout.getvalue())
+        self.assertNotIn("contenttypes", stdout.getvalue())
+
+    def test_size_of_partitioned_index(self) -> None:
+        """Test the size of a partitioned index is the one of its partitions."""
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT pg_size_pretty(sum(pg_relation_size(inhrelid))) "
+                "FROM pg_inherits "
+                "WHERE inhparent = 'webchat_message_pkey'::regclass"
+            )
+            partitions_size = cursor.fetchone()[0]
+
+        size = ReindexCommand.get_size("webchat_message_pkey")
+
+        self.assertEqual(size, partitions_size)
+        self.assertNotEqual(size, "0 bytes")
+
+
+class ImportMessagesCommandTests(TestCase, BaseTestUser, BaseTestChannel):
+    """Test the bulk import of the messages."""
+
+    @classmethod
+    def setUpTestData(cls) -> None:
+        cls.user = cls().get_test_active_regularuser()
+        cls.other_user = cls().get_test_staffuser()
+        cls.channel = cls().get_test_channel()
+
+    def setUp(self) -> None:
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+    def write_file(self, name: str, lines: list[str]) -> str:
+        path = os.path.join(self.directory, name)
+        data = "".join(f"{line}\n" for line in lines).encode()
+        if name.endswith(".gz"):
+            data = gzip.compress(data)
+        with open(path, "wb") as file:
+            file.write(data)
+        return path
+
+    def get_rows(self, count: int, start: int = 0) -> list[str]:
+        return [
+            json.dumps(
+                {
+                    "channel_id": str(self.channel.id),
+                    "sender_email": self.user.email,
+                    "content": f"Message {index}",
+                    "created": f"2001-01-01T00:00:{index:02d}+00:00",
+                }
+            )
+            for index in range(start, start + count)
+        ]
+
+    def call_command(self, *args) -> str:
+        stdout = StringIO()
+        call_command("import_messages", *args, stdout=stdout)
+        return stdout.getvalue()
+
+    def get_messages(self) -> list[Message]:
+        conversation = Conversation.objects.get_for_channel(self.channel.id)
+        return list(Message.objects.of_conversation(*conversation).order_by("seq"))
+
+    def test_import_jsonl(self):
+        rows = self.get_rows(3)
+        rows += [
+            "not json",
+            json.dumps(
+                {
+                    "channel_id": str(self.channel.id),
+                    "sender_id": str(self.other_user.id),
+                    "content": "tab\tnew line\nback\\slash",
+                    "created": "2001-02-01T00:00:00",
+                }
+            ),
+            json.dumps({**json.loads(rows[0]), "sender_email": "nobody@test.com"}),
+            json.dumps({**json.loads(rows[0]), "channel_id": str(uuid.uuid4())}),
+            json.dumps({**json.loads(rows[0]), "created": "yesterday"}),
+            json.dumps({**json.loads(rows[0]), "content": ""}),
+        ]
+        out = self.call_command(self.write_file("messages.jsonl", rows))
+
+        self.assertIn("Imported 4 messages", out)
+        self.assertIn(
+            "skipped channel: 1, content: 1, created: 1, invalid: 1, sender: 1", out
+        )
+        messages = self.get_messages()
+        self.assertEqual([message.seq for message in messages], [1, 2, 3, 4])
+        self.assertEqual(messages[0].content, "Message 0")
+        self.assertEqual(messages[0].sender, self.user)
+        self.assertEqual(messages[3].content, "tab\tnew line\nback\\slash")
+        self.assertEqual(messages[3].sender, self.other_user)
+        self.assertEqual(messages[3].created, datetime(2001, 2, 1, tzinfo=timezone.utc))
+        # the conversation starts with its oldest message
+        conversation = Conversation.objects.get(channel=self.channel)
+        self.assertEqual(conversation.created, messages[0].created)
+        self.assertEqual(conversation.last_seq, 4)
+        self.assertEqual(conversation.message_count, 4)
+        latest = max(messages, key=lambda message: message.created)
+        self.assertEqual(conversation.last_message_at, latest.created)
+        self.assertEqual(conversation.last_message_id, latest.id)
+
+    def test_messages_are_stored_in_their_partitions(self):
+        self.call_command(self.write_file("messages.jsonl", self.get_rows(3)))
+        names = [name for name, _, _ in MessagePartitions().get_partitions()]
+        self.assertIn("webchat_message_p2001_01", names)
+        self.assertEqual(MessagePartitions().get_default_months(), [])
+
+    def test_import_csv(self):
+        path = self.write_file(
+            "messages.csv.gz",
+            [
+                "sender_email,content,created",
+                f'{self.user.email.upper()},"first, with ""quotes""",2001-01-01T00:00:00Z',
+                f'{self.user.email},"multi\nline",2001-01-01T00:00:01Z',
+            ],
+        )
+        out = self.call_command(path, "--channel-id", str(self.channel.id))
+        self.assertIn("Imported 2 messages", out)
+        self.assertEqual(
+            [message.content for message in self.get_messages()],
+            ['first, with "quotes"', "multi\nline"],
+        )
+
+    def test_resume_from_the_checkpoint(self):
+        path = self.write_file("messages.jsonl", self.get_rows(7))
+        write = MessageImport.write
+        calls = []
+
+        def interrupted_write(importer, *args, **kwargs):
+            calls.append(args)
+            if len(calls) == 3:
+                raise KeyboardInterrupt
+            return write(importer, *args, **kwargs)
+
+        with patch.object(MessageImport, "write", interrupted_write):
+            with self.assertRaises(KeyboardInterrupt):
+                self.call_command(path, "--batch-size", "2")
+        self.assertEqual(len(self.get_messages()), 4)
+
+        out = self.call_command(path, "--batch-size", "2")
+        self.assertIn("Continuing from", out)
+        self.assertIn("Imported 7 messages", out)
+        messages = self.get_messages()
+        self.assertEqual([message.seq for message in messages], list(range(1, 8)))
+        self.assertEqual(
+            [message.content for message in messages],
+            [f"Message {index}" for index in range(7)],
+        )
+        self.assertIn("already imported", self.call_command(path))
+
+    def test_batch_stored_without_its_checkpoint(self):
+        path = self.write_file("messages.jsonl", self.get_rows(4))
+        save_checkpoint = ImportCommand.save_checkpoint
+        calls = []
+
+        def interrupted_save_checkpoint(*args, **kwargs):
+            calls.append(args)
+            # after the checkpoint of the new conversation and the first batch
+            if len(calls) == 3:
+                raise KeyboardInterrupt
+            return save_checkpoint(*args, **kwargs)
+
+        with patch.object(
+            ImportCommand, "save_checkpoint", staticmethod(interrupted_save_checkpoint)
+        ):
+            with self.assertRaises(KeyboardInterrupt):
+                self.call_command(path, "--batch-size", "2")
+        self.assertEqual(len(self.get_messages()), 4)
+
+        # the messages written after the checkpoint are not imported twice
+        out = self.call_command(path, "--batch-size", "2")
+        self.assertIn("Imported 4 messages", out)
+        self.assertNotIn(", skipped", out)
+        self.assertEqual([message.seq for message in self.get_messages()], [1, 2, 3, 4])
+
+    def test_import_the_export(self):
+        conversation_id = Conversation.objects.get_or_create_id_for_channel(
+            self.channel.id
+        )
+        for index in range(3):
+            Message.objects.create(
+                conversation_id=conversation_id,
+                sender=self.user,
+                content=f"Message {index}",
+            )
+        exported = {message.id: message.content for message in self.get_messages()}
+        path = os.path.join(self.directory, "export.jsonl.gz")
+        call_command(
+            "export_messages", str(self.channel.id), "-o", path, stderr=StringIO()
+        )
+        Message.objects.all().delete()
+
+        # the sequence numbers of the deleted messages are not reused
+        out = self.call_command(path, "--channel-id", str(self.channel.id), "--force")
+        self.assertIn("Imported 3 messages", out)
+        # the messages get their exported ids back
+        self.assertEqual(
+            {message.id: message.content for message in self.get_messages()},
+            exported,
+        )
+
+    def test_messages_are_numbered_in_the_order_of_creation(self):
+        rows = self.get_rows(6)
+        path = self.write_file("messages.jsonl", rows[3:] + rows[:3])
+        self.call_command(path, "--batch-size", "2")
+        messages = self.get_messages()
+        self.assertEqual([message.seq for message in messages], list(range(1, 7)))
+        self.assertEqual(
+            [message.content for message in messages],
+            [f"Message {index}" for index in range(6)],
+        )
+
+    def test_channel_with_messages_is_skipped(self):
+        conversation_id = Conversation.objects.get_or_create_id_for_channel(
+            self.channel.id
+        )
+        Message.objects.create(
+            conversation_id=conversation_id, sender=self.user, content="Live"
+        )
+        out = self.call_command(self.write_file("messages.jsonl", self.get_rows(3)))
+        self.assertIn("Imported 0 messages", out)
+        self.assertIn("skipped existing: 3", out)
+        self.assertEqual(len(self.get_messages()), 1)
+
+    def test_force_numbers_after_the_existing_messages(self):
+        conversation_id = Conversation.objects.get_or_create_id_for_channel(
+            self.channel.id
+        )
+        Message.objects.create(
+            conversation_id=conversation_id, sender=self.user, content="Live"
+        )
+        read = ReadMarker.objects.create(
+            user=self.user, conversation_id=conversation_id, last_read_seq=1
+        )
+        unread = ReadMarker.objects.create(
+            user=self.other_user, conversation_id=conversation_id, last_read_seq=0
+        )
+        path = self.write_file("messages.jsonl", self.get_rows(3))
+        out = self.call_command(path, "--force")
+        self.assertIn("Imported 3 messages", out)
+        messages = self.get_messages()
+        self.assertEqual([message.seq for message in messages], [1, 2, 3, 4])
+        self.assertEqual(
+            [message.content for message in messages],
+            ["Live", "Message 0", "Message 1", "Message 2"],
+        )
+        # the imported history is not unread for the users who read the rest
+        read.refresh_from_db()
+        self.assertEqual(read.last_read_seq, 4)
+        unread.refresh_from_db()
+        self.assertEqual(unread.last_read_seq, 0)
+
+    def test_invalid_arguments(self):
+        with self.assertRaises(CommandError):
+            self.call_command(os.path.join(self.directory, "missing.jsonl"))
+        with self.assertRaises(CommandError):
+            self.call_command(self.write_file("messages.txt", []))
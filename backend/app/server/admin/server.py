@@ -9,7 +9,14 @@ class ServerAdmin(admin.ModelAdmin):
     """Define the admin pages for Server model."""
 
     ordering = ["name"]
-    list_display = ["name", "owner", "category", "created", "modified"]
+    list_display = [
+        "name",
+        "owner",
+        "category",
+        "message_retention_days",
+        "created",
+        "modified",
+    ]
     list_filter = ["name", "owner", "category", "created", "modified"]
     search_fields = ["name", "owner__email", "category__name"]
     readonly_fields = ["id", "created", "modified"]
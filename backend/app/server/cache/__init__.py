@@ -0,0 +1,6 @@
+from server.cache.membership_cache import MembershipCache, get_membership_cache
+
+__all__ = [
+    MembershipCache,
+    get_membership_cache,
+]
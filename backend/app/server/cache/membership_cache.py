@@ -0,0 +1,183 @@
+"""
+Redis cache of the members of every server.
+"""
+
+import logging
+from uuid import UUID
+
+import redis
+from channels.db import database_sync_to_async
+from django.conf import settings
+
+from server.models import Server
+from utils.redis import get_async_redis, get_redis
+
+logger = logging.getLogger(__name__)
+
+# marks the set as loaded, so a server without members is cached too
+LOADED = "*"
+
+# replaces the cached members with the ones read from the database, unless
+# the members were changed since the version was read before the query
+# KEYS: members, version - ARGV: timeout, version, member ids ...
+FILL_SCRIPT = """
+if (redis.call('GET', KEYS[2]) or '0') ~= ARGV[2] then
+    return 0
+end
+redis.call('DEL', KEYS[1])
+redis.call('SADD', KEYS[1], '*')
+for i = 3, #ARGV do
+    redis.call('SADD', KEYS[1], ARGV[i])
+end
+redis.call('EXPIRE', KEYS[1], ARGV[1])
+return 1
+"""
+
+# adds or removes the members of a cached server and changes the version,
+# so a fill that read the members before the change is refused
+# KEYS: members, version - ARGV: timeout, SADD or SREM, member ids ...
+UPDATE_SCRIPT = """
+redis.call('INCR', KEYS[2])
+redis.call('EXPIRE', KEYS[2], ARGV[1])
+if redis.call('EXISTS', KEYS[1]) == 1 then
+    for i = 3, #ARGV do
+        redis.call(ARGV[2], KEYS[1], ARGV[i])
+    end
+end
+"""
+
+
+class MembershipCache:
+    """
+    Members of every server, kept in a redis set per server.
+
+    The set is loaded from the database with the first check of the server
+    and updated when the members are added or removed, with the signals of
+    the Server.member relation. The redis errors are logged and the
+    membership is then checked in the database.
+    """
+
+    key_prefix = "server:members"
+
+    def __init__(self, timeout: int = 60 * 60):
+        self.timeout = timeout
+
+    def get_keys(self, server_id: UUID | str) -> list[str]:
+        """Returns the keys of the members and of their version."""
+        return [
+            f"{self.key_prefix}:{server_id}",
+            f"{self.key_prefix}:{server_id}:version",
+        ]
+
+    def is_member(self, server_id: UUID | str, user_id: UUID | str) -> bool:
+        """Returns True if the user is a member of the server."""
+        members_key, version_key = self.get_keys(server_id)
+        try:
+            pipeline = get_redis().pipeline(transaction=False)
+            pipeline.sismember(members_key, LOADED)
+            pipeline.sismember(members_key, str(user_id))
+            pipeline.get(version_key)
+            loaded, is_member, version = pipeline.execute()
+        except redis.RedisError:
+            logger.warning("Reading the members of the server %s failed.", server_id)
+            return self.has_member(server_id, user_id)
+        if loaded:
+            return bool(is_member)
+        return str(user_id) in self.load(server_id, version)
+
+    async def ais_member(self, server_id: UUID | str, user_id: UUID | str) -> bool:
+        """Returns True if the user is a member of the server, used on the event loop."""
+        members_key, version_key = self.get_keys(server_id)
+        try:
+            pipeline = get_async_redis().pipeline(transaction=False)
+            pipeline.sismember(members_key, LOADED)
+            pipeline.sismember(members_key, str(user_id))
+            pipeline.get(version_key)
+            loaded, is_member, version = await pipeline.execute()
+        except redis.RedisError:
+            logger.warning("Reading the members of the server %s failed.", server_id)
+            return await database_sync_to_async(self.has_member)(server_id, user_id)
+        if loaded:
+            return bool(is_member)
+        members = await database_sync_to_async(self.load)(server_id, version)
+        return str(user_id) in members
+
+    def has_member(self, server_id: UUID | str, user_id: UUID | str) -> bool:
+        """
+        Returns True if the user is a member of the server, read from the
+        database without loading the other members, when redis is not available.
+        """
+        return Server.member.through.objects.filter(
+            server_id=server_id, user_id=user_id
+        ).exists()
+
+    def get_members(self, server_id: UUID | str) -> set[str]:
+        """Returns the ids of the members of the server read from the database."""
+        return {
+            str(user_id)
+            for user_id in Server.member.through.objects.filter(
+                server_id=server_id
+            ).values_list("user_id", flat=True)
+        }
+
+    def load(self, server_id: UUID | str, version: str | None) -> set[str]:
+        """
+        Reads the members from the database and caches them, the version
+        has to be read before the members.
+        """
+        members = self.get_members(server_id)
+        self.fill(server_id, members, version)
+        return members
+
+    def fill(
+        self, server_id: UUID | str, members: set[str], version: str | None
+    ) -> None:
+        """Caches the members read from the database after the version was read."""
+        try:
+            get_redis().register_script(FILL_SCRIPT)(
+                keys=self.get_keys(server_id),
+                args=[self.timeout, version or "0", *members],
+            )
+        except redis.RedisError:
+            logger.warning("Caching the members of the server %s failed.", server_id)
+
+    def add(self, server_id: UUID | str, user_ids: list) -> None:
+        """Adds the members to the cached server."""
+        self._update(server_id, "SADD", user_ids)
+
+    def remove(self, server_id: UUID | str, user_ids: list) -> None:
+        """Removes the members from the cached server."""
+        self._update(server_id, "SREM", user_ids)
+
+    def clear(self, server_id: UUID | str) -> None:
+        """Removes the cached members, they are loaded again with the next check."""
+        members_key, version_key = self.get_keys(server_id)
+        try:
+            pipeline = get_redis().pipeline()
+            pipeline.incr(version_key)
+            pipeline.expire(version_key, self.timeout)
+            pipeline.delete(members_key)
+            pipeline.execute()
+        except redis.RedisError:
+            logger.warning("Clearing the members of the server %s failed.", server_id)
+
+    def _update(self, server_id: UUID | str, command: str, user_ids: list) -> None:
+        if not user_ids:
+            return
+        try:
+            get_redis().register_script(UPDATE_SCRIPT)(
+                keys=self.get_keys(server_id),
+                args=[self.timeout, command, *(str(user_id) for user_id in user_ids)],
+            )
+        except redis.RedisError:
+            # the outdated members can not be left in the cache
+            logger.warning("Updating the members of the server %s failed.", server_id)
+            self.clear(server_id)
+
+
+def get_membership_cache() -> MembershipCache:
+    """Returns the cache of the members configured with the SERVER_MEMBERSHIP settings."""
+    membership_settings = getattr(settings, "SERVER_MEMBERSHIP", {})
+    return MembershipCache(
+        timeout=membership_settings.get("CACHE_TIMEOUT", 60 * 60),
+    )
@@ -0,0 +1,47 @@
+# Generated by Django 5.0.3 on 2026-10-18 09:18
+
+import utils.identifiers.time_ordered_uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("server", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="category",
+            name="id",
+            field=models.UUIDField(
+                default=utils.identifiers.time_ordered_uuid.uuid7,
+                editable=False,
+                primary_key=True,
+                serialize=False,
+                verbose_name="id",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="channel",
+            name="id",
+            field=models.UUIDField(
+                default=utils.identifiers.time_ordered_uuid.uuid7,
+                editable=False,
+                primary_key=True,
+                serialize=False,
+                verbose_name="id",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="server",
+            name="id",
+            field=models.UUIDField(
+                default=utils.identifiers.time_ordered_uuid.uuid7,
+                editable=False,
+                primary_key=True,
+                serialize=False,
+                verbose_name="id",
+            ),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.0.3 on 2026-10-18 09:54
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("server", "0002_uuid7_primary_keys"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="server",
+            name="message_retention_days",
+            field=models.PositiveIntegerField(
+                blank=True,
+                null=True,
+                validators=[django.core.validators.MinValueValidator(1)],
+                verbose_name="message retention days",
+            ),
+        ),
+    ]
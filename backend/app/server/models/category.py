@@ -26,6 +26,9 @@ def category_icon_file_path(instance: "Category", file_name: str) -> str:
 class Category(Model):
     """Category class defined"""
 
+    # the replaced files are deleted using the loaded values
+    track_changes = True
+
     name = models.CharField(
         _("name"),
         null=False,
@@ -50,14 +53,11 @@ class Category(Model):
         self.name = self.name.strip()
         if not self.name:  # Check if name is empty after stripping whitespace
             raise ValueError(_("Name cannot be empty"))
-        # deleting previous image if it exists before saving the new one
-        try:
-            exisitng = Category.objects.get(id=self.id)
-        except Category.DoesNotExist:
-            exisitng = None
-
-        if exisitng and exisitng.icon and exisitng.icon != self.icon:
-            exisitng.icon.delete(save=False)
+        # deleting previous image if it exists before saving the new one,
+        # the previous file is the one loaded with the category, without a query
+        previous = self.get_loaded_value("icon")
+        if previous and self.has_changed("icon"):
+            self._meta.get_field("icon").storage.delete(previous)
 
         super().save(*args, **kwargs)
 
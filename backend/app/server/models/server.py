@@ -4,6 +4,7 @@ import os
 import uuid
 
 from django.conf import settings
+from django.core.validators import MinValueValidator
 from django.db import models
 from django.utils.translation import gettext_lazy as _
 
@@ -38,6 +39,9 @@ def server_banner_file_path(instance: "Server", file_name: str) -> str:
 class Server(Model):
     """Server class defined"""
 
+    # the replaced files are deleted using the loaded values
+    track_changes = True
+
     name = models.CharField(_("name"), max_length=100)
     owner = models.ForeignKey(
         settings.AUTH_USER_MODEL,
@@ -76,19 +80,23 @@ class Server(Model):
         upload_to=server_icon_file_path,
         validators=[ImageSizeValidator(70, 70), validate_image_file_extension],
     )
+    # the messages of the channels older than this number of days are deleted
+    # by the purge_messages command, they are kept when it is not set
+    message_retention_days = models.PositiveIntegerField(
+        _("message retention days"),
+        null=True,
+        blank=True,
+        validators=[MinValueValidator(1)],
+    )
 
     def save(self, *args, **kwargs) -> None:
-        # deleting previous image (icon, banner) if it exists before saving the new one
-        try:
-            exisitng = Server.objects.get(id=self.id)
-        except Server.DoesNotExist:
-            exisitng = None
-
-        if exisitng:
-            if exisitng.icon and exisitng.icon != self.icon:
-                exisitng.icon.delete(save=False)
-            if exisitng.banner and exisitng.banner != self.banner:
-                exisitng.banner.delete(save=False)
+        # deleting previous image (icon, banner) if it exists before saving the new one,
+        # the previous file is the one loaded with the server, without a query
+        changed_fields = self.get_changed_fields()
+        for field_name in ("icon", "banner"):
+            previous = self.get_loaded_value(field_name)
+            if previous and field_name in changed_fields:
+                self._meta.get_field(field_name).storage.delete(previous)
         super().save(*args, **kwargs)
 
     def __str__(self) -> str:
@@ -6,6 +6,10 @@ from server.models import Channel
 class ChannelSerializer(serializers.ModelSerializer):
     """Serializes data for channel"""
 
+    # the counters of the conversation, annotated to the listed channels
+    message_count = serializers.IntegerField(read_only=True, allow_null=True)
+    last_message_at = serializers.DateTimeField(read_only=True, allow_null=True)
+
     class Meta:
         model = Channel
         fields = "__all__"
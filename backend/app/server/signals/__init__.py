@@ -1,4 +1,15 @@
 from server.signals.category_signals import delete_category_icon_file
+from server.signals.membership_signals import (
+    clear_server_members,
+    get_membership_group_name,
+    update_server_members,
+)
 from server.signals.server_signals import delete_server_icon_banner_file
 
-__all__ = [delete_category_icon_file, delete_server_icon_banner_file]
+__all__ = [
+    delete_category_icon_file,
+    delete_server_icon_banner_file,
+    update_server_members,
+    clear_server_members,
+    get_membership_group_name,
+]
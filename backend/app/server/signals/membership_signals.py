@@ -0,0 +1,92 @@
+import logging
+from functools import partial
+from uuid import UUID
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete
+from django.dispatch import receiver
+
+from server.cache import get_membership_cache
+from server.models import Server
+
+logger = logging.getLogger(__name__)
+
+
+def get_membership_group_name(server_id: UUID | str, user_id: UUID | str) -> str:
+    """
+    Returns the channel layer group of the sockets the user has open
+    in the server, they are notified when the membership changes.
+    """
+    return f"membership_{server_id}_{user_id}"
+
+
+def membership_changed(server_id: UUID, user_ids: list, is_member: bool) -> None:
+    """
+    Updates the cached members of the server and sends the
+    membership.changed event to the open sockets of the users.
+    """
+    membership = get_membership_cache()
+    if is_member:
+        membership.add(server_id, user_ids)
+    else:
+        membership.remove(server_id, user_ids)
+
+    channel_layer = get_channel_layer()
+    if channel_layer is None:
+        return
+    for user_id in user_ids:
+        try:
+            async_to_sync(channel_layer.group_send)(
+                get_membership_group_name(server_id, user_id),
+                {
+                    "type": "membership.changed",
+                    "server_id": str(server_id),
+                    "is_member": is_member,
+                },
+            )
+        except Exception:
+            logger.exception("Notifying the membership change of %s failed.", user_id)
+
+
+@receiver(m2m_changed, sender=Server.member.through)
+def update_server_members(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    When members are added to or removed from a server, the changes are
+    sent to the membership cache and to the open sockets, after the
+    transaction is committed.
+    """
+    if action == "pre_clear":
+        # the removed members are not known after they are cleared
+        if reverse:
+            instance._cleared_members = set(
+                instance.servers_joined.values_list("id", flat=True)
+            )
+        else:
+            instance._cleared_members = set(
+                instance.member.values_list("id", flat=True)
+            )
+        return
+    if action == "post_clear":
+        pk_set = instance.__dict__.pop("_cleared_members", set())
+    elif action not in ("post_add", "post_remove"):
+        return
+
+    is_member = action == "post_add"
+    if reverse:
+        # user.servers_joined was changed, pk_set are the servers
+        for server_id in pk_set:
+            transaction.on_commit(
+                partial(membership_changed, server_id, [instance.pk], is_member)
+            )
+    elif pk_set:
+        transaction.on_commit(
+            partial(membership_changed, instance.pk, list(pk_set), is_member)
+        )
+
+
+@receiver(post_delete, sender=Server)
+def clear_server_members(sender, **kwargs):
+    """When a server gets deleted, its cached members are removed too."""
+    transaction.on_commit(partial(get_membership_cache().clear, kwargs["instance"].pk))
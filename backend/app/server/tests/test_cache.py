@@ -0,0 +1,123 @@
+from unittest.mock import patch
+
+import redis
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.test import TestCase
+
+from server.cache import MembershipCache, get_membership_cache
+from server.models import Category, Server
+from server.signals import get_membership_group_name
+from utils.redis import get_redis
+from utils.tests.base import BaseTestUser
+
+
+class MembershipCacheTest(TestCase, BaseTestUser):
+    """Test suit for the MembershipCache"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = cls().get_test_active_regularuser()
+        cls.user = cls().get_test_staffuser()
+        cls.category = Category.objects.create(name="Test Category")
+        cls.server = Server.objects.create(
+            name="Test Server", owner=cls.owner, category=cls.category
+        )
+        cls.server.member.add(cls.owner)
+
+    def setUp(self):
+        self.membership = get_membership_cache()
+        self.addCleanup(get_redis().delete, *self.membership.get_keys(self.server.pk))
+
+    def test_members_are_loaded_once(self):
+        with self.assertNumQueries(1):
+            self.assertTrue(self.membership.is_member(self.server.pk, self.owner.pk))
+        with self.assertNumQueries(0):
+            self.assertTrue(self.membership.is_member(self.server.pk, self.owner.pk))
+            self.assertFalse(self.membership.is_member(self.server.pk, self.user.pk))
+
+    def test_server_without_members_is_cached(self):
+        self.server.member.clear()
+        self.assertFalse(self.membership.is_member(self.server.pk, self.owner.pk))
+        with self.assertNumQueries(0):
+            self.assertFalse(self.membership.is_member(self.server.pk, self.owner.pk))
+
+    def test_members_added_and_removed(self):
+        self.assertFalse(self.membership.is_member(self.server.pk, self.user.pk))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.server.member.add(self.user)
+        with self.assertNumQueries(0):
+            self.assertTrue(self.membership.is_member(self.server.pk, self.user.pk))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.server.member.remove(self.user)
+        with self.assertNumQueries(0):
+            self.assertFalse(self.membership.is_member(self.server.pk, self.user.pk))
+
+    def test_members_changed_from_the_user(self):
+        self.assertFalse(self.membership.is_member(self.server.pk, self.user.pk))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.servers_joined.add(self.server)
+        self.assertTrue(self.membership.is_member(self.server.pk, self.user.pk))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.servers_joined.clear()
+        self.assertFalse(self.membership.is_member(self.server.pk, self.user.pk))
+
+    def test_members_cleared(self):
+        self.assertTrue(self.membership.is_member(self.server.pk, self.owner.pk))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.server.member.clear()
+        self.assertFalse(self.membership.is_member(self.server.pk, self.owner.pk))
+
+    def test_fill_with_outdated_members_is_refused(self):
+        members_key, version_key = self.membership.get_keys(self.server.pk)
+        version = get_redis().get(version_key)
+        members = self.membership.get_members(self.server.pk)
+        # the user joins after the members were read from the database
+        with self.captureOnCommitCallbacks(execute=True):
+            self.server.member.add(self.user)
+        self.membership.fill(self.server.pk, members, version)
+
+        self.assertFalse(get_redis().exists(members_key))
+        self.assertTrue(self.membership.is_member(self.server.pk, self.user.pk))
+
+    def test_deleted_server_is_cleared(self):
+        self.membership.is_member(self.server.pk, self.owner.pk)
+        members_key, _ = self.membership.get_keys(self.server.pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.server.delete()
+        self.assertFalse(get_redis().exists(members_key))
+
+    def test_open_sockets_are_notified(self):
+        channel_layer = get_channel_layer()
+        channel_name = async_to_sync(channel_layer.new_channel)()
+        group = get_membership_group_name(self.server.pk, self.user.pk)
+        async_to_sync(channel_layer.group_add)(group, channel_name)
+        self.addCleanup(async_to_sync(channel_layer.group_discard), group, channel_name)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.server.member.add(self.user)
+
+        event = async_to_sync(channel_layer.receive)(channel_name)
+        self.assertEqual(
+            event,
+            {
+                "type": "membership.changed",
+                "server_id": str(self.server.pk),
+                "is_member": True,
+            },
+        )
+
+    def test_redis_not_available(self):
+        unavailable = redis.Redis(port=1, socket_connect_timeout=0.1)
+        membership = MembershipCache()
+        with patch("server.cache.membership_cache.get_redis", return_value=unavailable):
+            with self.assertLogs("server.cache.membership_cache", "WARNING"):
+                # only the membership of the user is read
+                with patch.object(membership, "get_members") as patched_get_members:
+                    self.assertTrue(membership.is_member(self.server.pk, self.owner.pk))
+                    self.assertFalse(membership.is_member(self.server.pk, self.user.pk))
+                patched_get_members.assert_not_called()
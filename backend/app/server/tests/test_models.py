@@ -318,6 +318,15 @@ class ServerModelTestCase(TestCase, BaseTestUser):
         # testing the string representation
         self.assertEqual(str(self.server), self.server.name)
 
+    def test_message_retention_days(self):
+        # the messages are kept by default
+        self.assertIsNone(self.server.message_retention_days)
+        self.server.message_retention_days = 0
+        with self.assertRaises(ValidationError):
+            self.server.full_clean()
+        self.server.message_retention_days = 90
+        self.server.full_clean()
+
     def test_name_max_length_fail(self):
         # Test max length for name field
         max_length = Server._meta.get_field("name").max_length
@@ -1,12 +1,20 @@
+import itertools
 import uuid
+from datetime import timedelta
 
-from django.test import TestCase
+from django.conf import settings
+from django.test import TestCase, override_settings
 from django.urls import reverse
+from django.utils import timezone
 from rest_framework.test import APIClient
 
-from server.models import Category, Server
+from server.cache import get_membership_cache
+from server.models import Category, Channel, Server
 from server.serializers import CategorySerializer, ServerSerializer
+from utils.jwt_tokens.serializers import CustomTokenObtainPairSerializer
+from utils.redis import get_redis
 from utils.tests.base import BaseTestUser
+from webchat.models import Conversation
 
 
 class CategoryViewSetTest(TestCase):
@@ -216,3 +224,178 @@ class ServerViewSetTest(TestCase, BaseTestUser):
         )
         response = self.client.get(url, data)
         self.assertEqual(response.status_code, 400)
+
+
+class ServerViewSetQueriesTest(TestCase, BaseTestUser):
+    """Test suit for the number of queries of the ServerViewSet"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = cls().get_test_active_regularuser()
+        cls.user2 = cls().get_test_staffuser()
+        cls.category = Category.objects.create(
+            name="Test Category", description="Test Description"
+        )
+        cls.servers = []
+        for index in range(10):
+            server = Server.objects.create(
+                name=f"Test Server {index}", owner=cls.user, category=cls.category
+            )
+            server.member.add(cls.user, cls.user2)
+            for channel in range(3):
+                Channel.objects.create(
+                    name=f"channel {channel}",
+                    owner=cls.user,
+                    topic="Test Topic",
+                    server=server,
+                )
+            cls.servers.append(server)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.url = reverse("server:server-list")
+
+    def test_list_servers_query_count(self):
+        # one query for the servers with their category and the number of
+        # members, and one for the channels of all the servers
+        options = {
+            "category": [None, self.category.name],
+            "by_user": [None, "true"],
+            "with_num_members": [None, "true"],
+            "by_serverId": [None, str(self.servers[0].id)],
+            "qty": [None, "5"],
+        }
+        for values in itertools.product(*options.values()):
+            data = {
+                name: value
+                for name, value in zip(options.keys(), values)
+                if value is not None
+            }
+            with self.subTest(**data):
+                with self.assertNumQueries(2):
+                    response = self.client.get(self.url, data)
+                self.assertEqual(response.status_code, 200)
+                for server in response.data:
+                    self.assertEqual(len(server["channel_server"]), 3)
+                    self.assertEqual(server["category"], self.category.name)
+                    if "with_num_members" in data:
+                        self.assertEqual(server["num_members"], 2)
+
+    def test_list_servers_channels_by_activity(self):
+        server = self.servers[0]
+        channels = list(server.channel_server.order_by("name"))
+        now = timezone.now()
+        for channel, minutes, count in ((channels[1], 5, 2), (channels[2], 1, 7)):
+            Conversation.objects.create(
+                channel=channel,
+                message_count=count,
+                last_message_at=now - timedelta(minutes=minutes),
+            )
+
+        response = self.client.get(self.url, {"by_serverId": str(server.id)})
+
+        self.assertEqual(response.status_code, 200)
+        listed = response.data[0]["channel_server"]
+        # the most active first, the channels without messages last
+        self.assertEqual(
+            [channel["name"] for channel in listed],
+            [channels[2].name, channels[1].name, channels[0].name],
+        )
+        self.assertEqual([channel["message_count"] for channel in listed], [7, 2, 0])
+        self.assertIsNotNone(listed[0]["last_message_at"])
+        self.assertIsNone(listed[2]["last_message_at"])
+
+    def test_list_servers_not_existing_serverId_query_count(self):
+        with self.assertNumQueries(1):
+            response = self.client.get(
+                self.url, {"by_serverId": "550e8400-e29b-41d4-a716-446655440000"}
+            )
+        self.assertEqual(response.status_code, 400)
+
+
+class ServerMembershipViewSetTest(TestCase, BaseTestUser):
+    """Test suit for the ServerMembershipViewSet"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = cls().get_test_active_regularuser()
+        cls.user = cls().get_test_staffuser()
+        cls.category = Category.objects.create(name="Test Category")
+        cls.server = Server.objects.create(
+            name="Test Server", owner=cls.owner, category=cls.category
+        )
+        cls.server.member.add(cls.owner)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        kwargs = {"server_id": self.server.pk}
+        self.create_url = reverse("server:membership-list", kwargs=kwargs)
+        self.remove_url = reverse("server:membership-remove-member", kwargs=kwargs)
+        self.is_member_url = reverse("server:membership-is-member", kwargs=kwargs)
+        membership = get_membership_cache()
+        self.addCleanup(get_redis().delete, *membership.get_keys(self.server.pk))
+
+    def is_member(self) -> bool:
+        return self.client.get(self.is_member_url).data["is_member"]
+
+    def test_join_and_leave_the_server(self):
+        self.assertFalse(self.is_member())
+
+        # the cached members are updated when the transaction is committed
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(self.create_url)
+        self.assertEqual(response.status_code, 201)
+        self.assertTrue(self.is_member())
+        self.assertTrue(self.server.member.filter(pk=self.user.pk).exists())
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.delete(self.remove_url)
+        self.assertEqual(response.status_code, 204)
+        self.assertFalse(self.is_member())
+        self.assertFalse(self.server.member.filter(pk=self.user.pk).exists())
+
+    def test_join_twice(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(self.create_url)
+        response = self.client.post(self.create_url)
+        self.assertEqual(response.status_code, 400)
+
+    def test_leave_without_being_a_member(self):
+        response = self.client.delete(self.remove_url)
+        self.assertEqual(response.status_code, 404)
+
+    def test_owner_can_not_leave(self):
+        self.client.force_authenticate(user=self.owner)
+        response = self.client.delete(self.remove_url)
+        self.assertEqual(response.status_code, 400)
+        self.assertTrue(self.is_member())
+
+    def test_is_member_is_cached(self):
+        self.assertFalse(self.is_member())
+        # only the server is read, the membership comes from the cache
+        with self.assertNumQueries(1):
+            self.assertFalse(self.is_member())
+
+    @override_settings(
+        SIMPLE_JWT={**settings.SIMPLE_JWT, "JWT_AUTH_STATELESS_USER": True}
+    )
+    def test_stateless_user(self):
+        # the user of the access token cookie is built from its claims
+        self.client.force_authenticate(user=None)
+        token = CustomTokenObtainPairSerializer.get_token(self.user).access_token
+        self.client.cookies["access_token"] = str(token)
+        self.assertFalse(self.is_member())
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(self.create_url)
+        self.assertEqual(response.status_code, 201)
+        # polling reads only the server, neither the user nor the members
+        with self.assertNumQueries(1):
+            self.assertTrue(self.is_member())
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.delete(self.remove_url)
+        self.assertEqual(response.status_code, 204)
+        self.assertFalse(self.server.member.filter(pk=self.user.pk).exists())
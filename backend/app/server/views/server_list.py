@@ -1,13 +1,14 @@
 import uuid
 
-from django.db.models import Count
+from django.db.models import Count, F, Prefetch, Value
+from django.db.models.functions import Coalesce
 from drf_spectacular.utils import extend_schema_view
 from rest_framework import viewsets
 from rest_framework.exceptions import AuthenticationFailed, ValidationError
 from rest_framework.request import Request
 from rest_framework.response import Response
 
-from server.models import Server
+from server.models import Channel, Server
 from server.schema import server_list_docs
 from server.serializers import ServerSerializer
 
@@ -42,7 +43,17 @@ class ServerViewSet(viewsets.ViewSet):
     # permission_classes = [IsAuthenticated]
 
     def get_queryset(self):
-        return Server.objects.all()
+        # the category and the channels are serialized with every server,
+        # so a page of servers is read with a fixed number of queries, the
+        # channels are listed by their activity with the counters of their
+        # conversations, joined by the unique index of the channel
+        channels = Channel.objects.annotate(
+            message_count=Coalesce(F("conversations__message_count"), Value(0)),
+            last_message_at=F("conversations__last_message_at"),
+        ).order_by(F("last_message_at").desc(nulls_last=True), "name")
+        return Server.objects.select_related("category").prefetch_related(
+            Prefetch("channel_server", queryset=channels)
+        )
 
     def get_view_name(self):
         """
@@ -102,24 +113,21 @@ class ServerViewSet(viewsets.ViewSet):
                 category__name__iexact=category
             )
 
+        # annotating before filtering by the user, so the members are counted
+        # with their own join and not with the one filtered to the user
+        if with_num_members:
+            queryset_filtered = queryset_filtered.annotate(num_members=Count("member"))
+
         if by_user:
             user_id = request.user.id
             # self.queryset = self.queryset.filter(member__id=user_id)
             queryset_filtered = queryset_filtered.filter(member=user_id)
 
-        if with_num_members:
-            queryset_filtered = queryset_filtered.annotate(num_members=Count("member"))
-
         if by_serverId:
             try:
                 # Check if by_serverId is a valid UUID
                 uuid.UUID(str(by_serverId))
                 queryset_filtered = queryset_filtered.filter(id=by_serverId)
-                # if the id does not exists
-                if not queryset_filtered.exists():
-                    raise ValidationError(
-                        detail=f"Server with id: {by_serverId} does not exists."
-                    )
             except ValueError:  # if the by_serverId is in wrong format
                 raise ValidationError(
                     detail=f"The id: {by_serverId} is not in the right UUID format."
@@ -132,7 +140,15 @@ class ServerViewSet(viewsets.ViewSet):
                 )
             queryset_filtered = queryset_filtered[: int(qty)]
 
+        # evaluating the servers once, the same result tells
+        # if the server with the given id exists
+        servers = list(queryset_filtered)
+        if by_serverId and not servers:
+            raise ValidationError(
+                detail=f"Server with id: {by_serverId} does not exists."
+            )
+
         serializer = ServerSerializer(
-            queryset_filtered, many=True, context={"num_members": with_num_members}
+            servers, many=True, context={"num_members": with_num_members}
         )
         return Response(serializer.data)
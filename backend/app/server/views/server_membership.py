@@ -8,6 +8,7 @@ from rest_framework.permissions import IsAuthenticated
 from rest_framework.request import Request
 from rest_framework.response import Response
 
+from server.cache import get_membership_cache
 from server.models import Server
 
 
@@ -32,13 +33,15 @@ class ServerMembershipViewSet(viewsets.ViewSet):
         user = request.user
         # checking if the user is a memeber of the server if not we add the user
         # as one
-        if server.member.filter(pk=user.pk).exists():
+        if get_membership_cache().is_member(server.pk, user.pk):
             # if the users is alredy a member return an error response
             raise ValidationError(detail="User is already a member of the server.")
 
         # else
-        # adding the user as a memebr to the server
-        server.member.add(user)
+        # adding the user as a memebr to the server, the cached members
+        # and the open sockets of the user are updated with the m2m_changed signal,
+        # the pk is used, so the stateless user of the token is not loaded
+        server.member.add(user.pk)
         return Response(status=status.HTTP_201_CREATED)
 
     @action(detail=False, methods=["DELETE"])
@@ -54,7 +57,7 @@ class ServerMembershipViewSet(viewsets.ViewSet):
 
         # making sure the owner of a server cant remove himself from
         # the members
-        if server.owner == user:
+        if server.owner_id == user.pk:
             return Response(
                 {"error": "Owners cannot be removed as a member"},
                 status=status.HTTP_400_BAD_REQUEST,
@@ -62,9 +65,9 @@ class ServerMembershipViewSet(viewsets.ViewSet):
 
         # checking if the user is a memeber of the server if not we
         # return a validation error
-        if server.member.filter(pk=user.pk).exists():
+        if get_membership_cache().is_member(server.pk, user.pk):
             # if the users is alredy a member we delete the user from the memebrship
-            server.member.remove(user)
+            server.member.remove(user.pk)
             return Response(status=status.HTTP_204_NO_CONTENT)
 
         # else
@@ -81,6 +84,6 @@ class ServerMembershipViewSet(viewsets.ViewSet):
         # getting th user tha makes the request
         user = request.user
 
-        is_member = server.member.filter(pk=user.pk).exists()
+        is_member = get_membership_cache().is_member(server.pk, user.pk)
 
         return Response({"is_member": is_member})
@@ -0,0 +1,25 @@
+# Generated by Django 5.0.3 on 2026-10-18 09:18
+
+import utils.identifiers.time_ordered_uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("users", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="user",
+            name="id",
+            field=models.UUIDField(
+                default=utils.identifiers.time_ordered_uuid.uuid7,
+                editable=False,
+                primary_key=True,
+                serialize=False,
+                verbose_name="id",
+            ),
+        ),
+    ]
@@ -2,7 +2,12 @@ from drf_spectacular.utils import extend_schema
 from rest_framework import status
 
 logout_post_docs = extend_schema(
-    responses={status.HTTP_200_OK: {"description": "Logged out successfully"}},
+    responses={
+        status.HTTP_200_OK: {"description": "Logged out successfully"},
+        status.HTTP_503_SERVICE_UNAVAILABLE: {
+            "description": "The tokens could not be revoked, try again later."
+        },
+    },
     # specify that there is no request body (serializer)
     request=None,
 )
@@ -3,8 +3,11 @@ from drf_spectacular.utils import extend_schema_view
 from rest_framework.request import Request
 from rest_framework.response import Response
 from rest_framework.views import APIView
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
 
 from users.schema import logout_post_docs
+from utils.jwt_tokens.revocation import get_revoked_tokens
 
 
 @extend_schema_view(post=logout_post_docs)  # adding openAPI doc
@@ -13,12 +16,15 @@ class LogOutAPIView(APIView):
     Clear HTTP-only cookies to log the user out.
 
     This endpoint clears the HTTP-only cookies, typically access and refresh tokens, to log the user out.
+    The tokens are revoked, so they can not be used again even if they were copied.
 
     Request Method: POST
     URL: `/logout/`
 
     Responses:
       - 200 OK: Logged out successfully.
+      - 503 Service Unavailable: The tokens could not be revoked, the cookies
+        are kept and the logout can be retried.
     """
 
     def post(self, request: Request, format=None):
@@ -30,6 +36,9 @@ class LogOutAPIView(APIView):
 
         Returns:
             Response: A response indicating successful logout.
+
+        Raises:
+            RevocationUnavailable: The tokens could not be revoked.
         """
         response = Response("Logged out successfully")
         refresh_token_name = refresh_token_name = getattr(
@@ -38,6 +47,20 @@ class LogOutAPIView(APIView):
         access_token_name = self.access_token_name = getattr(
             settings, "SIMPLE_JWT", {}
         ).get("JWT_AUTH_COOKIE_NAME", "access_token")
+        # revoking the tokens, so a stolen token is not valid until it expires
+        for token_class, token_name in (
+            (AccessToken, access_token_name),
+            (RefreshToken, refresh_token_name),
+        ):
+            raw_token = request.COOKIES.get(token_name, None)
+            if not raw_token:
+                continue
+            try:
+                get_revoked_tokens().revoke_token(token_class(raw_token))
+            except TokenError:
+                # invalid or expired tokens can not be used anyway
+                pass
+
         # deleting the http only cookies
         response.set_cookie(refresh_token_name, "", expires=0)
         response.set_cookie(access_token_name, "", expires=0)
@@ -2,6 +2,11 @@
 Base model, for every model used
 """
 
+import copy
+from typing import Any
+
+from django.db.models.fields.files import FieldFile
+
 from .timestamped_model import TimestampedModel
 from .uuid_model import UUIDModel
 
@@ -9,7 +14,123 @@ from .uuid_model import UUIDModel
 class Model(UUIDModel, TimestampedModel):
     """
     Base Model for every model
+
+    A model with track_changes records the values of its fields when it is
+    loaded from the database and after it is saved, so the changed fields are
+    known without a query. It can be saved with save(update_changed=True) to
+    only update the changed fields, and the modified timestamp, the fields
+    changed by the pre_save handlers have to be listed with update_fields then.
     """
 
+    # every loaded row pays for a copy of its values, so only the models
+    # that use them record them
+    track_changes = False
+
     class Meta:
         abstract = True
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        if cls.track_changes:
+            instance._record_loaded_values()
+        return instance
+
+    def _record_loaded_values(self, attnames: list[str] | None = None) -> None:
+        """records the current values of the loaded fields (all by default)"""
+        if attnames is None or not hasattr(self, "_loaded_values"):
+            self._loaded_values = {}
+            attnames = [
+                field.attname
+                for field in self._meta.concrete_fields
+                if field.attname in self.__dict__
+            ]
+        for attname in attnames:
+            value = self._get_field_value(attname)
+            # mutable values can be changed in place
+            if isinstance(value, (dict, list)):
+                value = copy.deepcopy(value)
+            self._loaded_values[attname] = value
+
+    def _get_field_value(self, attname: str) -> Any:
+        value = self.__dict__[attname]
+        # the files are compared by their name, the file can be changed in place
+        if isinstance(value, FieldFile):
+            return value.name
+        return value
+
+    def get_loaded_value(self, field_name: str) -> Any:
+        """
+        returns the value of the field as it was loaded from the database,
+        None if the model was not loaded or the field was deferred
+        """
+        field = self._meta.get_field(field_name)
+        return getattr(self, "_loaded_values", {}).get(field.attname)
+
+    def get_changed_fields(self) -> set[str]:
+        """
+        returns the names of the fields changed since the model was loaded,
+        all the fields set on a model that was not loaded from the database
+        or does not track its changes
+        """
+        loaded_values = getattr(self, "_loaded_values", None)
+        changed_fields = set()
+        for field in self._meta.concrete_fields:
+            if field.attname not in self.__dict__ or field.generated:
+                # deferred and not set, or computed by the database
+                continue
+            if (
+                loaded_values is None
+                or field.attname not in loaded_values
+                or self._get_field_value(field.attname) != loaded_values[field.attname]
+            ):
+                changed_fields.add(field.name)
+        return changed_fields
+
+    def has_changed(self, field_name: str) -> bool:
+        return field_name in self.get_changed_fields()
+
+    def save(self, *args, update_changed: bool = False, **kwargs) -> None:
+        if (
+            update_changed
+            and not args
+            and kwargs.get("update_fields") is None
+            and not kwargs.get("force_insert")
+            and not self._state.adding
+            and hasattr(self, "_loaded_values")
+        ):
+            # the fields with auto_now, like modified, are always updated
+            kwargs["update_fields"] = self.get_changed_fields() | {
+                field.name
+                for field in self._meta.concrete_fields
+                if getattr(field, "auto_now", False)
+            }
+        super().save(*args, **kwargs)
+        if not self.track_changes:
+            return
+        update_fields = kwargs.get("update_fields")
+        if update_fields is None:
+            self._record_loaded_values()
+        else:
+            self._record_loaded_values(
+                [
+                    field.attname
+                    for field in self._meta.concrete_fields
+                    if field.name in update_fields or field.attname in update_fields
+                ]
+            )
+
+    def refresh_from_db(self, using=None, fields=None, **kwargs) -> None:
+        super().refresh_from_db(using, fields, **kwargs)
+        if not self.track_changes:
+            return
+        if fields is None or not hasattr(self, "_loaded_values"):
+            self._record_loaded_values()
+        else:
+            self._record_loaded_values(
+                [
+                    field.attname
+                    for field in self._meta.concrete_fields
+                    if field.name in fields or field.attname in fields
+                ]
+            )
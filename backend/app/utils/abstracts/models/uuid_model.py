@@ -2,16 +2,19 @@
 Base model to replace the id with a UUID
 """
 
-import uuid
-
 from django.db import models
 from django.utils.translation import gettext_lazy as _
 
+from utils.identifiers import uuid7
+
 
 class UUIDModel(models.Model):
-    """base model to replace the id with UUID"""
+    """
+    base model to replace the id with UUID, the ids are time ordered
+    (UUIDv7), so the inserts append to the primary key index
+    """
 
-    id = models.UUIDField(_("id"), primary_key=True, default=uuid.uuid4, editable=False)
+    id = models.UUIDField(_("id"), primary_key=True, default=uuid7, editable=False)
 
     class Meta:
         abstract = True
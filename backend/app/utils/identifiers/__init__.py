@@ -0,0 +1,5 @@
+from utils.identifiers.time_ordered_uuid import uuid7
+
+__all__ = [
+    uuid7,
+]
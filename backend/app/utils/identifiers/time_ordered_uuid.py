@@ -0,0 +1,50 @@
+"""
+Time-ordered UUIDs, version 7 of RFC 9562.
+"""
+
+import os
+import threading
+import time
+import uuid
+
+_lock = threading.Lock()
+_last_timestamp = 0
+_counter = 0
+
+
+def uuid7() -> uuid.UUID:
+    """
+    Returns a UUID starting with the unix time in milliseconds, so the new
+    ids are appended at the end of the B-tree index instead of a random page.
+
+    The 12 bits after the version are a counter, started at a random value
+    every millisecond and incremented for the ids of the same millisecond,
+    so the ids of the process are strictly increasing, the last 62 bits are
+    random. If the counter overflows or the clock goes back, the timestamp
+    of the previous id is incremented instead.
+    """
+    global _last_timestamp, _counter
+    # the random field and the seed of the counter are separate bits
+    random_bytes = os.urandom(10)
+    random_bits = int.from_bytes(random_bytes[:8], "big")
+    # half of the counter range is left for the ids of the millisecond
+    counter_seed = int.from_bytes(random_bytes[8:], "big") >> 5
+    with _lock:
+        timestamp = time.time_ns() // 1_000_000
+        if timestamp > _last_timestamp:
+            _counter = counter_seed
+        else:
+            _counter += 1
+            timestamp = _last_timestamp
+            if _counter > 0xFFF:
+                timestamp += 1
+                _counter = counter_seed
+        _last_timestamp = timestamp
+        counter = _counter
+
+    value = (timestamp & 0xFFFF_FFFF_FFFF) << 80
+    value |= 0x7 << 76  # version
+    value |= counter << 64
+    value |= 0b10 << 62  # variant
+    value |= random_bits & 0x3FFF_FFFF_FFFF_FFFF
+    return uuid.UUID(int=value)
@@ -2,11 +2,17 @@ from typing import Tuple, TypeVar
 
 from django.conf import settings
 from django.contrib.auth.models import AbstractBaseUser
+from rest_framework.exceptions import AuthenticationFailed
 from rest_framework.request import Request
 from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
 from rest_framework_simplejwt.models import TokenUser
+from rest_framework_simplejwt.settings import api_settings
 from rest_framework_simplejwt.tokens import Token
 
+from utils.jwt_tokens.models import ClaimsUser
+from utils.jwt_tokens.revocation import get_revoked_tokens
+
 AuthUser = TypeVar("AuthUser", AbstractBaseUser, TokenUser)
 
 
@@ -24,6 +30,34 @@ class JWTCookieAuthentication(JWTAuthentication):
 
         return self.get_user(validated_token), validated_token
 
+    def get_validated_token(self, raw_token: bytes) -> Token:
+        """rejects the valid tokens that were revoked, like on the logout"""
+        validated_token = super().get_validated_token(raw_token)
+        jti = validated_token.get(api_settings.JTI_CLAIM)
+        if jti is not None and get_revoked_tokens().is_revoked(jti):
+            raise InvalidToken("Token is revoked")
+
+        return validated_token
+
+    def get_user(self, validated_token: Token) -> AuthUser:
+        """
+        In the stateless mode, enabled with the JWT_AUTH_STATELESS_USER setting,
+        the user is built from the claims of the token without reading the
+        database. Tokens issued without the claims are still authenticated
+        with the user read from the database.
+        """
+        stateless_user = getattr(settings, "SIMPLE_JWT", {}).get(
+            "JWT_AUTH_STATELESS_USER", False
+        )
+        if not stateless_user or not ClaimsUser.has_claims(validated_token):
+            return super().get_user(validated_token)
+
+        user = ClaimsUser(validated_token)
+        if not user.is_active:
+            raise AuthenticationFailed("User is inactive", code="user_inactive")
+
+        return user
+
     def _get_cookie_access_toke(self, request: Request) -> bytes:
         """
         Extracts the cookie containing the JSON access web token from the given
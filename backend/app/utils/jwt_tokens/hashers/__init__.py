@@ -0,0 +1,13 @@
+from utils.jwt_tokens.hashers.password_pool import (
+    PasswordPool,
+    PasswordPoolSaturated,
+    get_password_pool,
+)
+from utils.jwt_tokens.hashers.pooled_argon2_hasher import PooledArgon2PasswordHasher
+
+__all__ = [
+    PasswordPool,
+    PasswordPoolSaturated,
+    PooledArgon2PasswordHasher,
+    get_password_pool,
+]
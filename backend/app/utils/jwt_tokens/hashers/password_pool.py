@@ -0,0 +1,104 @@
+"""
+Bounded pool of threads hashing the passwords of the logins.
+"""
+
+import contextvars
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Any, Callable
+
+from django.conf import settings
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+# the pool used by the hasher in the current context, set during a login
+_active_pool: contextvars.ContextVar = contextvars.ContextVar(
+    "password_pool", default=None
+)
+
+
+class PasswordPoolSaturated(APIException):
+    """
+    All the workers are busy and the queue is full, the login is refused
+    with 503 and the Retry-After header, set by DRF from the wait.
+    """
+
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = "Too many logins at the moment, try again later."
+    default_code = "login_unavailable"
+
+    def __init__(self, wait: int, detail=None, code=None):
+        super().__init__(detail, code)
+        self.wait = wait
+
+
+class PasswordPool:
+    """
+    A fixed number of worker threads hashing the passwords, so a burst of
+    logins can only use that many CPU cores, argon2 releases the GIL while
+    hashing. At most queue_size hashes wait for a worker, any hash beyond
+    that is refused right away with PasswordPoolSaturated.
+    """
+
+    def __init__(self, workers: int = 2, queue_size: int = 8, retry_after: int = 1):
+        self.workers = workers
+        self.queue_size = queue_size
+        self.retry_after = retry_after
+        self._slots = threading.BoundedSemaphore(workers + queue_size)
+        self._executor: ThreadPoolExecutor | None = None
+        self._lock = threading.Lock()
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.workers, thread_name_prefix="password_pool"
+                )
+            return self._executor
+
+    def run(self, function: Callable, *args) -> Any:
+        """Runs the function on a worker and waits for its result."""
+        if not self._slots.acquire(blocking=False):
+            raise PasswordPoolSaturated(wait=self.retry_after)
+        try:
+            return self.executor.submit(function, *args).result()
+        finally:
+            self._slots.release()
+
+    @contextmanager
+    def activate(self):
+        """The passwords hashed in the block are hashed by the pool."""
+        token = _active_pool.set(self)
+        try:
+            yield self
+        finally:
+            _active_pool.reset(token)
+
+    @staticmethod
+    def get_active() -> "PasswordPool | None":
+        """Returns the pool activated in the current context."""
+        return _active_pool.get()
+
+    def shutdown(self) -> None:
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown()
+                self._executor = None
+
+
+_password_pool: PasswordPool | None = None
+
+
+def get_password_pool() -> PasswordPool:
+    """Returns the password pool of the process, configured with the SIMPLE_JWT settings."""
+    global _password_pool
+    if _password_pool is None:
+        jwt_settings = getattr(settings, "SIMPLE_JWT", {})
+        _password_pool = PasswordPool(
+            workers=jwt_settings.get("JWT_AUTH_PASSWORD_WORKERS", 2),
+            queue_size=jwt_settings.get("JWT_AUTH_PASSWORD_QUEUE_SIZE", 8),
+            retry_after=jwt_settings.get("JWT_AUTH_PASSWORD_RETRY_AFTER", 1),
+        )
+    return _password_pool
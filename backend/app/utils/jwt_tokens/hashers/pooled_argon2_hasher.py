@@ -0,0 +1,26 @@
+from django.contrib.auth.hashers import Argon2PasswordHasher
+
+from utils.jwt_tokens.hashers.password_pool import PasswordPool
+
+
+class PooledArgon2PasswordHasher(Argon2PasswordHasher):
+    """
+    Argon2PasswordHasher hashing on the PasswordPool activated in the
+    current context, like during the login of JWTCookieTokenObtainPairView,
+    and in the calling thread otherwise, like in the admin.
+
+    The algorithm stays "argon2", so it reads the existing hashes.
+    """
+
+    def encode(self, password: str, salt: str) -> str:
+        # the password of an unknown user is hashed too, against timing attacks
+        pool = PasswordPool.get_active()
+        if pool is None:
+            return super().encode(password, salt)
+        return pool.run(super().encode, password, salt)
+
+    def verify(self, password: str, encoded: str) -> bool:
+        pool = PasswordPool.get_active()
+        if pool is None:
+            return super().verify(password, encoded)
+        return pool.run(super().verify, password, encoded)
@@ -0,0 +1,5 @@
+from utils.jwt_tokens.models.claims_user import ClaimsUser
+
+__all__ = [
+    ClaimsUser,
+]
@@ -0,0 +1,116 @@
+from typing import Any
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AbstractBaseUser
+from django.utils.functional import cached_property
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.models import TokenUser
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import Token
+
+User = get_user_model()
+
+
+class ClaimsUser(TokenUser):
+    """
+    Stateless user built from the claims of the access token, used by the
+    JWTCookieAuthentication in the stateless mode, so authenticating a request
+    does not read the database.
+
+    The claims carry the id, the active and the staff flags and the display
+    name of the user, any other attribute is read from the user model, which
+    is loaded lazily, only on the first access. The members TokenUser answers
+    from the token, like the superuser flag, the groups and the permissions,
+    are read from the user model too, so the permission checks are not denied.
+    """
+
+    claims = ("is_active", "is_staff", "full_name")
+
+    @classmethod
+    def add_claims(cls, token: Token, user: AbstractBaseUser) -> None:
+        """adds the claims of the user to the token payload"""
+        token["is_active"] = user.is_active
+        token["is_staff"] = user.is_staff
+        token["full_name"] = user.get_full_name
+
+    @classmethod
+    def has_claims(cls, token: Token) -> bool:
+        """checks if the token carries all the claims of the user"""
+        return all(
+            claim in token for claim in (api_settings.USER_ID_CLAIM, *cls.claims)
+        )
+
+    def __str__(self) -> str:
+        return f"ClaimsUser {self.id}"
+
+    @cached_property
+    def id(self) -> Any:
+        # the same type as the primary key of the user model, like the uuid
+        return User._meta.pk.to_python(self.token[api_settings.USER_ID_CLAIM])
+
+    @cached_property
+    def is_active(self) -> bool:
+        return self.token["is_active"]
+
+    @property
+    def get_full_name(self) -> str | None:
+        return self.token["full_name"]
+
+    @cached_property
+    def instance(self) -> AbstractBaseUser:
+        """the user model instance, read from the database on the first access"""
+        try:
+            return User.objects.get(pk=self.pk)
+        except User.DoesNotExist:
+            raise AuthenticationFailed("User not found", code="user_not_found")
+
+    @property
+    def is_superuser(self) -> bool:
+        return self.instance.is_superuser
+
+    @property
+    def username(self) -> str:
+        return self.instance.get_username()
+
+    def get_username(self) -> str:
+        return self.instance.get_username()
+
+    @property
+    def groups(self):
+        return self.instance.groups
+
+    @property
+    def user_permissions(self):
+        return self.instance.user_permissions
+
+    def get_group_permissions(self, obj: object = None) -> set:
+        return self.instance.get_group_permissions(obj)
+
+    def get_all_permissions(self, obj: object = None) -> set:
+        return self.instance.get_all_permissions(obj)
+
+    def has_perm(self, perm: str, obj: object = None) -> bool:
+        return self.instance.has_perm(perm, obj)
+
+    def has_perms(self, perm_list, obj: object = None) -> bool:
+        return self.instance.has_perms(perm_list, obj)
+
+    def has_module_perms(self, module: str) -> bool:
+        return self.instance.has_module_perms(module)
+
+    def __eq__(self, other: object) -> bool:
+        if isinstance(other, AbstractBaseUser):
+            return self.pk == other.pk
+        return super().__eq__(other)
+
+    def __hash__(self) -> int:
+        return hash(self.id)
+
+    def __getattr__(self, attr: str) -> Any:
+        # custom claims are read from the token and
+        # the rest of the attributes from the user model
+        if attr.startswith("_"):
+            raise AttributeError(attr)
+        if attr in self.token:
+            return self.token[attr]
+        return getattr(self.instance, attr)
@@ -0,0 +1,13 @@
+from utils.jwt_tokens.revocation.bloom_filter import BloomFilter
+from utils.jwt_tokens.revocation.revoked_tokens import (
+    RevocationUnavailable,
+    RevokedTokens,
+    get_revoked_tokens,
+)
+
+__all__ = [
+    BloomFilter,
+    RevocationUnavailable,
+    RevokedTokens,
+    get_revoked_tokens,
+]
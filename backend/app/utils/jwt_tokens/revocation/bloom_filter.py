@@ -0,0 +1,39 @@
+"""
+Bloom filter of the revoked tokens, kept in the memory of the process.
+"""
+
+import hashlib
+import math
+
+
+class BloomFilter:
+    """
+    Set of strings that can only answer "not in the set" for sure, an item
+    reported in the set may be a false positive, with the given error rate
+    as long as the filter holds no more items than its capacity.
+    """
+
+    def __init__(self, capacity: int, error_rate: float = 0.01):
+        capacity = max(capacity, 1)
+        self.size = max(
+            math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2), 8
+        )
+        self.hashes = max(round(self.size / capacity * math.log(2)), 1)
+        self.bits = bytearray(math.ceil(self.size / 8))
+
+    def _positions(self, item: str):
+        # the positions of the bits are derived from two halves of one hash
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], "little")
+        second = int.from_bytes(digest[8:], "little") | 1
+        return ((first + index * second) % self.size for index in range(self.hashes))
+
+    def add(self, item: str) -> None:
+        for position in self._positions(item):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, item: str) -> bool:
+        return all(
+            self.bits[position >> 3] & (1 << (position & 7))
+            for position in self._positions(item)
+        )
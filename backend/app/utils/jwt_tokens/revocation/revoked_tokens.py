@@ -0,0 +1,174 @@
+"""
+Revoked tokens, stored in redis and checked with an in-process Bloom filter.
+"""
+
+import logging
+import time
+
+import redis
+from django.conf import settings
+from rest_framework import status
+from rest_framework.exceptions import APIException
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import Token
+
+from utils.jwt_tokens.revocation.bloom_filter import BloomFilter
+from utils.redis import get_async_redis, get_redis
+
+logger = logging.getLogger(__name__)
+
+
+class RevocationUnavailable(APIException):
+    """
+    The token could not be stored as revoked, so it would stay valid in the
+    other processes, the request is refused with 503 and can be retried.
+    """
+
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = "The tokens could not be revoked, try again later."
+    default_code = "revocation_unavailable"
+
+
+class RevokedTokens:
+    """
+    The jti of the revoked tokens, kept in a redis sorted set scored by the
+    expiration of the token, so the expired ones are removed.
+
+    Every process keeps a Bloom filter of the revoked tokens, reloaded from
+    redis when their version changes, checked at most every refresh interval.
+    A token not in the filter is not revoked, without a redis round trip,
+    only a token found in the filter is confirmed in redis. A token revoked
+    by another process is so rejected after the refresh interval at the
+    latest, a token revoked by this process immediately.
+
+    The redis errors of the checks are logged, the last loaded filter is then
+    used and a token found in it is treated as revoked. A token that can not
+    be revoked in redis raises RevocationUnavailable.
+    """
+
+    key = "jwt:revoked"
+    version_key = "jwt:revoked:version"
+
+    def __init__(
+        self,
+        refresh_interval: float = 5,
+        capacity: int = 100_000,
+        error_rate: float = 0.01,
+    ):
+        self.refresh_interval = refresh_interval
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.bloom_filter = BloomFilter(capacity, error_rate)
+        self.version = None
+        self.refreshed_at = float("-inf")
+
+    def revoke(self, jti: str, expires_at: float) -> None:
+        """
+        Revokes the token with the jti until it expires, raises
+        RevocationUnavailable if it could not be stored in redis.
+        """
+        self.bloom_filter.add(jti)
+        try:
+            pipeline = get_redis().pipeline()
+            pipeline.zadd(self.key, {jti: expires_at})
+            pipeline.zremrangebyscore(self.key, "-inf", time.time())
+            pipeline.incr(self.version_key)
+            pipeline.execute()
+        except redis.RedisError as error:
+            logger.warning("Could not revoke the token: %s", error)
+            raise RevocationUnavailable() from error
+
+    def revoke_token(self, token: Token) -> None:
+        """Revokes the validated token."""
+        self.revoke(token[api_settings.JTI_CLAIM], token["exp"])
+
+    def is_revoked(self, jti: str) -> bool:
+        """Returns True if the token with the jti is revoked."""
+        if self.should_refresh():
+            try:
+                if get_redis().get(self.version_key) != self.version:
+                    self.load()
+            except redis.RedisError as error:
+                logger.warning("Could not refresh the revoked tokens: %s", error)
+        if jti not in self.bloom_filter:
+            return False
+        # confirming the token is not a false positive of the filter
+        try:
+            return get_redis().zscore(self.key, jti) is not None
+        except redis.RedisError as error:
+            logger.warning("Could not check the revoked token: %s", error)
+            return True
+
+    async def ais_revoked(self, jti: str) -> bool:
+        """Returns True if the token with the jti is revoked."""
+        if self.should_refresh():
+            try:
+                version = await get_async_redis().get(self.version_key)
+                if version != self.version:
+                    await self.aload()
+            except redis.RedisError as error:
+                logger.warning("Could not refresh the revoked tokens: %s", error)
+        if jti not in self.bloom_filter:
+            return False
+        # confirming the token is not a false positive of the filter
+        try:
+            return await get_async_redis().zscore(self.key, jti) is not None
+        except redis.RedisError as error:
+            logger.warning("Could not check the revoked token: %s", error)
+            return True
+
+    def should_refresh(self) -> bool:
+        """
+        Returns True once every refresh interval, the concurrent checks use
+        the loaded filter in the meantime.
+        """
+        now = time.monotonic()
+        if now - self.refreshed_at < self.refresh_interval:
+            return False
+        self.refreshed_at = now
+        return True
+
+    def load(self) -> None:
+        """Reloads the filter with the revoked tokens that did not expire yet."""
+        pipeline = get_redis().pipeline()
+        pipeline.get(self.version_key)
+        pipeline.zrangebyscore(self.key, time.time(), "+inf")
+        self.set_filter(*pipeline.execute())
+
+    async def aload(self) -> None:
+        """Reloads the filter with the revoked tokens that did not expire yet."""
+        pipeline = get_async_redis().pipeline()
+        pipeline.get(self.version_key)
+        pipeline.zrangebyscore(self.key, time.time(), "+inf")
+        self.set_filter(*await pipeline.execute())
+
+    def set_filter(self, version: str | None, revoked: list[str]) -> None:
+        # the filter grows with the revoked tokens to keep its error rate
+        bloom_filter = BloomFilter(
+            max(self.capacity, 2 * len(revoked)), self.error_rate
+        )
+        for jti in revoked:
+            bloom_filter.add(jti)
+        self.bloom_filter, self.version = bloom_filter, version
+
+    def clear(self) -> None:
+        """Removes all the revoked tokens."""
+        get_redis().delete(self.key, self.version_key)
+        self.bloom_filter = BloomFilter(self.capacity, self.error_rate)
+        self.version = None
+        self.refreshed_at = float("-inf")
+
+
+_revoked_tokens: RevokedTokens | None = None
+
+
+def get_revoked_tokens() -> RevokedTokens:
+    """Returns the revoked tokens of the process, configured with the SIMPLE_JWT settings."""
+    global _revoked_tokens
+    if _revoked_tokens is None:
+        jwt_settings = getattr(settings, "SIMPLE_JWT", {})
+        _revoked_tokens = RevokedTokens(
+            refresh_interval=jwt_settings.get("JWT_REVOCATION_REFRESH_INTERVAL", 5),
+            capacity=jwt_settings.get("JWT_REVOCATION_CAPACITY", 100_000),
+        )
+    return _revoked_tokens
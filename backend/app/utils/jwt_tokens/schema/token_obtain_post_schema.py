@@ -39,5 +39,16 @@ token_obtain_post_schema = extend_schema(
                 "password": ["This field is required."],
             },
         },
+        (status.HTTP_503_SERVICE_UNAVAILABLE, "application/json"): {
+            "description": "Too many logins at the moment, "
+            + "retry after the seconds in the Retry-After header.",
+            "type": "object",
+            "properties": {
+                "detail": {
+                    "type": "string",
+                    "example": "Too many logins at the moment, try again later.",
+                },
+            },
+        },
     },
 )
@@ -5,6 +5,9 @@ from rest_framework_simplejwt.models import TokenUser
 from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
 from rest_framework_simplejwt.tokens import Token
 
+from utils.jwt_tokens.hashers import get_password_pool
+from utils.jwt_tokens.models import ClaimsUser
+
 AuthUser = TypeVar("AuthUser", AbstractBaseUser, TokenUser)
 
 
@@ -20,12 +23,17 @@ class CustomTokenObtainPairSerializer(TokenObtainPairSerializer):
         # adding specific data as payload to the token
         # just an example how to do it
         token["example"] = "example"
+        # the claims of the user, used by the stateless JWTCookieAuthentication
+        ClaimsUser.add_claims(token, user)
 
         return token
 
     def validate(self, attrs: Dict[str, Any]) -> Dict[str, str]:
         """adding custom data to the response"""
-        data = super().validate(attrs)
+        # the password is hashed on the bounded pool, so a burst of logins
+        # does not take all the CPU, when it is full 503 is returned
+        with get_password_pool().activate():
+            data = super().validate(attrs)
         # addign additional data - user_id
         data["user_id"] = self.user.id
 
@@ -1,13 +1,22 @@
 from typing import Any, Dict, TypeVar
 
 from django.conf import settings
+from django.contrib.auth import get_user_model
 from django.contrib.auth.models import AbstractBaseUser
+from rest_framework.exceptions import AuthenticationFailed
 from rest_framework_simplejwt.exceptions import InvalidToken
 from rest_framework_simplejwt.models import TokenUser
 from rest_framework_simplejwt.serializers import TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
+
+from utils.jwt_tokens.models import ClaimsUser
+from utils.jwt_tokens.revocation import get_revoked_tokens
 
 AuthUser = TypeVar("AuthUser", AbstractBaseUser, TokenUser)
 
+User = get_user_model()
+
 
 class CustomTokenRefreshSerializer(TokenRefreshSerializer):
     """based on the simple jwt TokenRefreshSerializer making sure the refresh token can
@@ -25,6 +34,28 @@ class CustomTokenRefreshSerializer(TokenRefreshSerializer):
         attrs["refresh"] = self.context["request"].COOKIES.get(refresh_token_name, None)
 
         if attrs["refresh"]:
-            return super().validate(attrs)
+            # a revoked refresh token can not issue new access tokens
+            refresh = RefreshToken(attrs["refresh"])
+            if get_revoked_tokens().is_revoked(refresh[api_settings.JTI_CLAIM]):
+                raise InvalidToken("Token is revoked")
+            data = super().validate(attrs)
+            data["access"] = self.update_claims(data["access"])
+            return data
 
         raise InvalidToken
+
+    def update_claims(self, access: str) -> str:
+        """
+        the claims of the user are read again from the database, so the new
+        access token does not carry the claims copied from the refresh token,
+        which could be outdated, like the active flag of a deactivated user
+        """
+        token = AccessToken(access)
+        user = User.objects.filter(
+            **{api_settings.USER_ID_FIELD: token[api_settings.USER_ID_CLAIM]}
+        ).first()
+        if user is None or not user.is_active:
+            raise AuthenticationFailed("User not found", code="user_not_found")
+
+        ClaimsUser.add_claims(token, user)
+        return str(token)
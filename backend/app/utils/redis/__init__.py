@@ -0,0 +1,6 @@
+from utils.redis.client import get_async_redis, get_redis
+
+__all__ = [
+    get_redis,
+    get_async_redis,
+]
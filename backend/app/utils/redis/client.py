@@ -0,0 +1,44 @@
+"""
+Redis clients used by the app for caching.
+"""
+
+import asyncio
+import weakref
+
+import redis
+import redis.asyncio
+from django.conf import settings
+
+_redis: redis.Redis | None = None
+# the connections of an asyncio client can only be used on the event loop
+# they were created on, so there is one client per event loop
+_async_redis: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+
+
+def _get_connection_kwargs() -> dict:
+    redis_settings = getattr(settings, "REDIS", {})
+    return {
+        "host": redis_settings.get("HOST", "localhost"),
+        "port": redis_settings.get("PORT", 6379),
+        "db": redis_settings.get("DB", 0),
+        "socket_timeout": redis_settings.get("SOCKET_TIMEOUT", 1.0),
+        "socket_connect_timeout": redis_settings.get("SOCKET_TIMEOUT", 1.0),
+        "decode_responses": True,
+    }
+
+
+def get_redis() -> redis.Redis:
+    """Returns the redis client of the process, configured with the REDIS settings."""
+    global _redis
+    if _redis is None:
+        _redis = redis.Redis(**_get_connection_kwargs())
+    return _redis
+
+
+def get_async_redis() -> redis.asyncio.Redis:
+    """Returns the asyncio redis client of the running event loop."""
+    loop = asyncio.get_running_loop()
+    client = _async_redis.get(loop)
+    if client is None:
+        client = _async_redis[loop] = redis.asyncio.Redis(**_get_connection_kwargs())
+    return client
@@ -3,6 +3,8 @@
 from django.contrib.auth import get_user_model
 from django.contrib.auth.hashers import make_password
 
+from server.models import Category, Channel, Server
+
 User = get_user_model()
 
 
@@ -94,3 +96,18 @@ class BaseTestUser:
         data["is_active"] = False
         inactive_regularuser, _ = User.objects.get_or_create(**data)
         return inactive_regularuser
+
+
+class BaseTestChannel:
+    """base class with test channels generated with the class"""
+
+    def get_test_channel(self, name: str = "test_channel") -> Channel:
+        """return a new test channel of the test server"""
+        owner, _ = User.objects.get_or_create(email="test_channel_owner@test.com")
+        category, _ = Category.objects.get_or_create(name="test_channel_category")
+        server, _ = Server.objects.get_or_create(
+            name="test_channel_server", owner=owner, category=category
+        )
+        return Channel.objects.create(
+            name=name, owner=owner, topic="test_topic", server=server
+        )
@@ -0,0 +1,69 @@
+import uuid
+from datetime import datetime, timezone
+
+from django.db import connection
+from django.test import SimpleTestCase
+
+from utils.identifiers import uuid7
+from utils.tests.benchmark import BaseBenchmark
+
+
+class PrimaryKeyInsertBenchmark(SimpleTestCase, BaseBenchmark):
+    """
+    Inserting messages with the random uuid4 and the time ordered uuid7
+    primary keys, the insert throughput, the size of the primary key index
+    and the WAL written.
+
+    Run with BENCH_ROWS=3000000 for a few million messages.
+    """
+
+    databases = "__all__"
+
+    def insert(self, name: str, generate_id) -> dict:
+        table = f"bench_messages_{name}"
+        rows = self.bench_size("rows", 200_000)
+        batch_size = self.bench_size("batch_size", 10_000)
+        conversation_id = uuid.uuid4()
+        created = datetime.now(timezone.utc)
+        with connection.cursor() as cursor:
+            cursor.execute(f"DROP TABLE IF EXISTS {table}")
+            cursor.execute(
+                f"CREATE TABLE {table} (id uuid PRIMARY KEY, "
+                "conversation_id uuid NOT NULL, content text NOT NULL, "
+                "created timestamptz NOT NULL)"
+            )
+            cursor.execute("SELECT pg_current_wal_lsn()")
+            wal_start = cursor.fetchone()[0]
+            try:
+                with self.timer() as insert_time:
+                    for start in range(0, rows, batch_size):
+                        with cursor.copy(f"COPY {table} FROM STDIN") as copy:
+                            for index in range(start, min(start + batch_size, rows)):
+                                copy.write_row(
+                                    (
+                                        generate_id(),
+                                        conversation_id,
+                                        f"Message {index}",
+                                        created,
+                                    )
+                                )
+                cursor.execute(
+                    "SELECT pg_wal_lsn_diff(pg_current_wal_lsn(), %s), "
+                    "pg_relation_size(%s), pg_relation_size(%s)",
+                    [wal_start, f"{table}_pkey", table],
+                )
+                wal, index_size, table_size = cursor.fetchone()
+            finally:
+                cursor.execute(f"DROP TABLE {table}")
+        return {
+            "id": name,
+            "rows": rows,
+            "rows/s": rows / insert_time["seconds"],
+            "index MB": index_size / 2**20,
+            "table MB": table_size / 2**20,
+            "WAL MB": float(wal) / 2**20,
+        }
+
+    def test_insert_throughput_and_index_size(self):
+        rows = [self.insert("uuid4", uuid.uuid4), self.insert("uuid7", uuid7)]
+        self.report("Message inserts by primary key", rows)
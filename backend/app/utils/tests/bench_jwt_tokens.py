@@ -0,0 +1,123 @@
+import json
+import threading
+import time
+import uuid
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import SimpleTestCase
+
+from utils.jwt_tokens.hashers import PasswordPool, PasswordPoolSaturated
+from utils.jwt_tokens.serializers import CustomTokenObtainPairSerializer
+from utils.tests.benchmark import BaseBenchmark, percentile
+
+User = get_user_model()
+
+
+class LoginStormBenchmark(SimpleTestCase, BaseBenchmark):
+    """
+    Latency of the chat traffic during a burst of logins, with the passwords
+    hashed by as many workers as logins, like before the PasswordPool, and
+    by the bounded pool.
+
+    The chat traffic is a message serialized to json every 10 ms, its
+    latency grows when the hashing takes the CPU cores.
+    """
+
+    databases = "__all__"
+    password = "bench_pass"
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(
+            email="bench_login@test.com", password=cls.password
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        User.objects.filter(email="bench_login@test.com").delete()
+        super().tearDownClass()
+
+    def login(self) -> None:
+        serializer = CustomTokenObtainPairSerializer(
+            data={"email": self.user.email, "password": self.password},
+            context={"request": None},
+        )
+        assert serializer.is_valid()
+
+    def chat(self, stop: threading.Event, latencies: list[float]) -> None:
+        message = {
+            "id": str(uuid.uuid4()),
+            "sender": "Test User",
+            "content": "Hello chat! " * 20,
+            "timestamp": "2024-01-01T00:00:00Z",
+        }
+        # the latency is from when the message is due, so the time waiting
+        # for a CPU core is counted too
+        due = time.perf_counter()
+        while not stop.is_set():
+            for _ in range(200):
+                json.dumps(message)
+            latencies.append((time.perf_counter() - due) * 1000)
+            due += 0.01
+            time.sleep(max(due - time.perf_counter(), 0))
+
+    def storm(self, name: str, pool: PasswordPool | None, logins: int) -> dict:
+        stop = threading.Event()
+        latencies, results = [], {"logged in": 0, "refused": 0}
+        lock = threading.Lock()
+
+        def login() -> None:
+            while not stop.is_set():
+                try:
+                    self.login()
+                    result = "logged in"
+                except PasswordPoolSaturated:
+                    result = "refused"
+                    time.sleep(0.05)
+                with lock:
+                    results[result] += 1
+            connection.close()
+
+        chat = threading.Thread(target=self.chat, args=(stop, latencies))
+        storm = [threading.Thread(target=login) for _ in range(logins if pool else 0)]
+        with patch(
+            "utils.jwt_tokens.serializers.custom_token_obtain_pair_serializer"
+            ".get_password_pool",
+            return_value=pool,
+        ):
+            for thread in [chat, *storm]:
+                thread.start()
+            time.sleep(self.bench_size("storm_seconds", 5))
+            stop.set()
+            for thread in [chat, *storm]:
+                thread.join()
+        if pool is not None:
+            pool.shutdown()
+        return {
+            "hashing": name,
+            "logins/s": results["logged in"] / self.bench_size("storm_seconds", 5),
+            "refused": results["refused"],
+            "chat p50 ms": percentile(latencies, 50),
+            "chat p99 ms": percentile(latencies, 99),
+        }
+
+    def test_chat_latency_during_login_storm(self):
+        logins = self.bench_size("logins", 8)
+        workers = self.bench_size("password_workers", 1)
+        rows = [
+            self.storm("idle", None, 0),
+            self.storm(
+                f"{logins} workers",
+                PasswordPool(workers=logins, queue_size=0),
+                logins,
+            ),
+            self.storm(
+                f"{workers} workers",
+                PasswordPool(workers=workers, queue_size=workers),
+                logins,
+            ),
+        ]
+        self.report(f"Chat latency during {logins} concurrent logins", rows)
@@ -0,0 +1,69 @@
+"""base file used for the benchmarks."""
+
+import math
+import os
+import sys
+import time
+from contextlib import contextmanager
+
+
+def percentile(samples: list[float], pct: float) -> float:
+    """returns the given percentile (0-100) of the samples - nearest rank"""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    rank = max(math.ceil(pct / 100 * len(ordered)) - 1, 0)
+    return ordered[rank]
+
+
+class BaseBenchmark:
+    """
+    base class for the benchmarks.
+
+    Benchmarks are not collected by the default test run, as the files are
+    named bench_*.py, they are run with:
+        python manage.py test --pattern="bench_*.py"
+    """
+
+    def bench_size(self, name: str, default: int) -> int:
+        """size of the benchmark, can be adjusted with the BENCH_<NAME> env variable"""
+        return int(os.environ.get(f"BENCH_{name.upper()}", default))
+
+    @contextmanager
+    def timer(self):
+        """measures the wall time of the block, result in the returned dict"""
+        result = {}
+        start = time.perf_counter()
+        try:
+            yield result
+        finally:
+            result["seconds"] = time.perf_counter() - start
+
+    def report(self, title: str, rows: list[dict]) -> None:
+        """prints the results of the benchmark as a simple table"""
+        if not rows:
+            return
+        columns = list(rows[0].keys())
+        widths = {
+            column: max(len(column), *(len(self._format(row[column])) for row in rows))
+            for column in columns
+        }
+        lines = [
+            "",
+            f"== {title} ==",
+            "  ".join(column.ljust(widths[column]) for column in columns),
+        ]
+        for row in rows:
+            lines.append(
+                "  ".join(
+                    self._format(row[column]).ljust(widths[column])
+                    for column in columns
+                )
+            )
+        sys.stdout.write("\n".join(lines) + "\n")
+
+    @staticmethod
+    def _format(value) -> str:
+        if isinstance(value, float):
+            return f"{value:.3f}"
+        return str(value)
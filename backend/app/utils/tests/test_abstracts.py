@@ -0,0 +1,153 @@
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.db.models.signals import pre_save
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from server.models import Category, Server
+from utils.tests.base import BaseTestUser
+
+
+class ModelChangedFieldsTest(TestCase, BaseTestUser):
+    """Test suit for the changed fields tracked by the abstract Model"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = cls().get_test_active_regularuser()
+        cls.category = Category.objects.create(
+            name="Test Category", description="Test Description"
+        )
+
+    def get_update(self, context: CaptureQueriesContext) -> str:
+        self.assertEqual(len(context.captured_queries), 1)
+        return context.captured_queries[0]["sql"]
+
+    def test_loaded_model_without_changes(self):
+        category = Category.objects.get(pk=self.category.pk)
+        self.assertEqual(category.get_changed_fields(), set())
+        self.assertEqual(category.get_loaded_value("name"), "Test Category")
+
+    def test_only_the_changed_fields_are_updated(self):
+        category = Category.objects.get(pk=self.category.pk)
+        category.description = "Changed Description"
+        self.assertEqual(category.get_changed_fields(), {"description"})
+
+        with CaptureQueriesContext(connection) as context:
+            category.save(update_changed=True)
+        update = self.get_update(context)
+        self.assertIn('"description"', update)
+        self.assertIn('"modified"', update)
+        self.assertNotIn('"name"', update)
+        # the saved values are the loaded ones from now on
+        self.assertEqual(category.get_changed_fields(), set())
+        self.assertEqual(
+            Category.objects.get(pk=self.category.pk).description,
+            "Changed Description",
+        )
+
+    def test_changed_foreign_key(self):
+        server = Server.objects.create(
+            name="Test Server", owner=self.owner, category=self.category
+        )
+        other_category = Category.objects.create(name="Other Category")
+        server = Server.objects.get(pk=server.pk)
+        server.category = other_category
+        self.assertEqual(server.get_changed_fields(), {"category"})
+
+    def test_created_model_is_tracked_after_save(self):
+        category = Category(name="New Category")
+        self.assertIn("name", category.get_changed_fields())
+        category.save()
+        self.assertEqual(category.get_changed_fields(), set())
+
+        category.name = "Renamed Category"
+        with CaptureQueriesContext(connection) as context:
+            category.save(update_changed=True)
+        self.assertNotIn('"description"', self.get_update(context))
+
+    def test_save_updates_every_field_by_default(self):
+        category = Category.objects.get(pk=self.category.pk)
+        category.description = "Changed Description"
+        with CaptureQueriesContext(connection) as context:
+            category.save()
+        self.assertIn('"name"', self.get_update(context))
+        self.assertEqual(category.get_changed_fields(), set())
+
+    def test_save_of_a_deleted_row_inserts_it(self):
+        category = Category.objects.get(pk=self.category.pk)
+        Category.objects.filter(pk=self.category.pk).delete()
+        category.description = "Changed Description"
+        category.save()
+        self.assertEqual(
+            Category.objects.get(pk=self.category.pk).description,
+            "Changed Description",
+        )
+
+    def test_changes_of_pre_save_handlers_are_saved(self):
+        def set_description(sender, instance, **kwargs):
+            instance.description = "Set by pre_save"
+
+        pre_save.connect(set_description, sender=Category)
+        self.addCleanup(pre_save.disconnect, set_description, sender=Category)
+        category = Category.objects.get(pk=self.category.pk)
+        category.name = "Renamed Category"
+        category.save()
+        self.assertEqual(
+            Category.objects.get(pk=self.category.pk).description, "Set by pre_save"
+        )
+
+    def test_models_without_tracking_do_not_record_values(self):
+        user = type(self.owner).objects.get(pk=self.owner.pk)
+        self.assertFalse(hasattr(user, "_loaded_values"))
+        # every field set on the model counts as changed
+        self.assertIn("email", user.get_changed_fields())
+        with CaptureQueriesContext(connection) as context:
+            user.save(update_changed=True)
+        self.assertIn('"email"', self.get_update(context))
+
+    def test_deferred_fields(self):
+        category = Category.objects.only("name").get(pk=self.category.pk)
+        self.assertEqual(category.get_changed_fields(), set())
+        self.assertIsNone(category.get_loaded_value("description"))
+        category.description = "Changed Description"
+        self.assertEqual(category.get_changed_fields(), {"description"})
+
+    def test_refresh_from_db(self):
+        category = Category.objects.get(pk=self.category.pk)
+        Category.objects.filter(pk=self.category.pk).update(name="Updated Category")
+        category.refresh_from_db()
+        self.assertEqual(category.get_changed_fields(), set())
+        self.assertEqual(category.get_loaded_value("name"), "Updated Category")
+
+    def test_explicit_update_fields(self):
+        category = Category.objects.get(pk=self.category.pk)
+        category.name = "Changed Category"
+        category.description = "Changed Description"
+        with CaptureQueriesContext(connection) as context:
+            category.save(update_fields=["description"])
+        self.assertNotIn('"name"', self.get_update(context))
+        self.assertEqual(category.get_changed_fields(), {"name"})
+
+    def test_replaced_icon_is_deleted_without_a_query(self):
+        server = Server.objects.create(
+            name="Test Server",
+            owner=self.owner,
+            category=self.category,
+            icon=SimpleUploadedFile("icon.png", b"icon", content_type="image/png"),
+        )
+        first_icon = server.icon.name
+        self.addCleanup(server.icon.storage.delete, first_icon)
+        server = Server.objects.get(pk=server.pk)
+
+        server.icon = SimpleUploadedFile("icon.png", b"new", content_type="image/png")
+        with CaptureQueriesContext(connection) as context:
+            server.save()
+        self.addCleanup(server.icon.storage.delete, server.icon.name)
+        self.assertTrue(self.get_update(context).startswith("UPDATE"))
+        self.assertFalse(server.icon.storage.exists(first_icon))
+        self.assertTrue(server.icon.storage.exists(server.icon.name))
+
+        # saving other fields keeps the icon
+        server.name = "Renamed Server"
+        server.save()
+        self.assertTrue(server.icon.storage.exists(server.icon.name))
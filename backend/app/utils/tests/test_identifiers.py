@@ -0,0 +1,49 @@
+import time
+import uuid
+from unittest.mock import patch
+
+from django.test import SimpleTestCase
+
+from server.models import Category
+from utils.identifiers import uuid7
+
+
+class UUID7Test(SimpleTestCase):
+    """Test suit for the time ordered uuid7"""
+
+    def test_layout(self):
+        before = time.time_ns() // 1_000_000
+        id = uuid7()
+        after = time.time_ns() // 1_000_000
+        self.assertEqual(id.version, 7)
+        self.assertEqual(id.variant, uuid.RFC_4122)
+        self.assertTrue(before <= id.int >> 80 <= after)
+
+    def test_ids_are_increasing(self):
+        ids = [uuid7() for _ in range(10000)]
+        self.assertEqual(ids, sorted(ids))
+        self.assertEqual(len(set(ids)), len(ids))
+
+    def test_ids_of_the_same_millisecond(self):
+        with patch("time.time_ns", return_value=1_700_000_000_000_000_000):
+            ids = [uuid7() for _ in range(5000)]
+        # the counter overflows into the next milliseconds
+        self.assertEqual(ids, sorted(ids))
+        self.assertEqual(len(set(ids)), len(ids))
+        self.assertGreater(ids[-1].int >> 80, ids[0].int >> 80)
+
+    def test_counter_is_seeded_apart_from_the_random_field(self):
+        # the first id of a new millisecond
+        time.sleep(0.002)
+        with patch("os.urandom", return_value=bytes(8) + b"\xff\xff"):
+            id = uuid7()
+        self.assertEqual((id.int >> 64) & 0xFFF, 0x7FF)
+        self.assertEqual(id.int & 0x3FFF_FFFF_FFFF_FFFF, 0)
+
+    def test_clock_going_back(self):
+        first = uuid7()
+        with patch("time.time_ns", return_value=0):
+            self.assertGreater(uuid7(), first)
+
+    def test_default_of_the_uuid_models(self):
+        self.assertEqual(Category(name="Test Category").id.version, 7)
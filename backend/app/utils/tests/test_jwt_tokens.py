@@ -0,0 +1,363 @@
+import threading
+import time
+import uuid
+from unittest.mock import patch
+
+import redis
+from django.conf import settings
+from django.contrib.auth.models import Group, Permission
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.test import APIClient, APIRequestFactory
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.tokens import AccessToken
+
+from utils.jwt_tokens.authentication import JWTCookieAuthentication
+from utils.jwt_tokens.hashers import (
+    PasswordPool,
+    PasswordPoolSaturated,
+    PooledArgon2PasswordHasher,
+)
+from utils.jwt_tokens.models import ClaimsUser
+from utils.jwt_tokens.revocation import (
+    BloomFilter,
+    RevocationUnavailable,
+    RevokedTokens,
+    get_revoked_tokens,
+)
+from utils.jwt_tokens.serializers import CustomTokenObtainPairSerializer
+from utils.tests.base import BaseTestUser
+
+
+@override_settings(SIMPLE_JWT={**settings.SIMPLE_JWT, "JWT_AUTH_STATELESS_USER": True})
+class JWTCookieAuthenticationStatelessTest(TestCase, BaseTestUser):
+    """Test suit for the stateless mode of the JWTCookieAuthentication"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = cls().get_test_staffuser()
+
+    def authenticate(self, token: AccessToken):
+        request = APIRequestFactory().get("/")
+        request.COOKIES["access_token"] = str(token)
+        return JWTCookieAuthentication().authenticate(request)
+
+    def get_access_token(self) -> AccessToken:
+        return CustomTokenObtainPairSerializer.get_token(self.user).access_token
+
+    def test_user_is_built_from_the_claims(self):
+        with self.assertNumQueries(0):
+            user, _ = self.authenticate(self.get_access_token())
+            self.assertIsInstance(user, ClaimsUser)
+            self.assertEqual(user.pk, self.user.pk)
+            self.assertEqual(user, self.user)
+            self.assertTrue(user.is_authenticated)
+            self.assertTrue(user.is_active)
+            self.assertTrue(user.is_staff)
+            self.assertEqual(user.get_full_name, self.user.get_full_name)
+
+    def test_full_user_is_loaded_lazily(self):
+        user, _ = self.authenticate(self.get_access_token())
+        with self.assertNumQueries(1):
+            self.assertEqual(user.email, self.user.email)
+            self.assertEqual(user.instance, self.user)
+            self.assertEqual(user.last_name, self.user.last_name)
+
+    def test_permissions_are_read_from_the_user(self):
+        self.user.is_superuser = True
+        self.user.save()
+        user, _ = self.authenticate(self.get_access_token())
+        with self.assertNumQueries(1):
+            self.assertTrue(user.is_superuser)
+            self.assertTrue(user.has_perm("webchat.view_message"))
+            self.assertTrue(user.has_perms(["webchat.view_message"]))
+            self.assertTrue(user.has_module_perms("webchat"))
+            self.assertEqual(user.username, self.user.email)
+
+    def test_permissions_of_the_groups(self):
+        group = Group.objects.create(name="Readers")
+        group.permissions.add(
+            Permission.objects.get(
+                codename="view_message", content_type__app_label="webchat"
+            )
+        )
+        self.user.groups.add(group)
+        user, _ = self.authenticate(self.get_access_token())
+        self.assertEqual(list(user.groups.all()), [group])
+        self.assertTrue(user.has_perm("webchat.view_message"))
+        self.assertFalse(user.has_perm("webchat.delete_message"))
+
+    def test_inactive_user(self):
+        token = self.get_access_token()
+        token["is_active"] = False
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate(token)
+
+    def test_token_without_the_claims(self):
+        # tokens issued before the claims were added read the user
+        with self.assertNumQueries(1):
+            user, _ = self.authenticate(AccessToken.for_user(self.user))
+        self.assertEqual(user, self.user)
+
+    @override_settings(SIMPLE_JWT=settings.SIMPLE_JWT)
+    def test_stateless_mode_disabled(self):
+        with self.assertNumQueries(1):
+            user, _ = self.authenticate(self.get_access_token())
+        self.assertNotIsInstance(user, ClaimsUser)
+
+
+class JWTCookieTokenViewsClaimsTest(TestCase, BaseTestUser):
+    """Test suit for the claims of the user in the tokens set as cookies"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = cls().get_test_active_regularuser()
+
+    def setUp(self):
+        self.client = APIClient()
+        response = self.client.post(
+            reverse("token_obtain_pair"),
+            {"email": self.user.email, "password": "regularuser_pass"},
+        )
+        self.assertEqual(response.status_code, 200)
+
+    def get_claims(self) -> dict:
+        token = AccessToken(self.client.cookies["access_token"].value)
+        return {claim: token[claim] for claim in ClaimsUser.claims}
+
+    def test_obtained_token_carries_the_claims(self):
+        self.assertEqual(
+            self.get_claims(),
+            {
+                "is_active": True,
+                "is_staff": False,
+                "full_name": self.user.get_full_name,
+            },
+        )
+
+    def test_refreshed_token_carries_the_current_claims(self):
+        self.user.first_name = "changed"
+        self.user.save()
+        response = self.client.post(reverse("token_refresh"))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.get_claims()["full_name"], self.user.get_full_name)
+
+    def test_refresh_for_inactive_user(self):
+        self.user.is_active = False
+        self.user.save()
+        response = self.client.post(reverse("token_refresh"))
+        self.assertEqual(response.status_code, 401)
+
+
+class BloomFilterTest(SimpleTestCase):
+    """Test suit for the BloomFilter"""
+
+    def test_added_items_are_found(self):
+        bloom_filter = BloomFilter(capacity=1000)
+        items = [str(uuid.uuid4()) for _ in range(1000)]
+        for item in items:
+            bloom_filter.add(item)
+        self.assertTrue(all(item in bloom_filter for item in items))
+
+    def test_error_rate(self):
+        bloom_filter = BloomFilter(capacity=1000, error_rate=0.01)
+        for _ in range(1000):
+            bloom_filter.add(str(uuid.uuid4()))
+        false_positives = sum(str(uuid.uuid4()) in bloom_filter for _ in range(10000))
+        self.assertLess(false_positives, 200)
+
+
+class RevokedTokensTest(SimpleTestCase):
+    """Test suit for the RevokedTokens"""
+
+    def setUp(self):
+        self.revoked_tokens = RevokedTokens(refresh_interval=60, capacity=100)
+        self.revoked_tokens.clear()
+        self.addCleanup(self.revoked_tokens.clear)
+        self.expires_at = time.time() + 60
+
+    def test_revoked_in_the_process(self):
+        self.assertFalse(self.revoked_tokens.is_revoked("jti"))
+        self.revoked_tokens.revoke("jti", self.expires_at)
+        self.assertTrue(self.revoked_tokens.is_revoked("jti"))
+        self.assertFalse(self.revoked_tokens.is_revoked("other_jti"))
+
+    def test_revoked_by_another_process(self):
+        other_process = RevokedTokens(refresh_interval=60, capacity=100)
+        self.assertFalse(other_process.is_revoked("jti"))
+        self.revoked_tokens.revoke("jti", self.expires_at)
+        # the filter is reloaded after the refresh interval
+        self.assertFalse(other_process.is_revoked("jti"))
+        other_process.refreshed_at -= 60
+        self.assertTrue(other_process.is_revoked("jti"))
+
+    def test_not_revoked_without_redis(self):
+        self.revoked_tokens.is_revoked("jti")
+        with patch("redis.Redis.zscore") as zscore:
+            self.assertFalse(self.revoked_tokens.is_revoked("other_jti"))
+        zscore.assert_not_called()
+
+    def test_expired_tokens_are_removed(self):
+        self.revoked_tokens.revoke("expired_jti", time.time() - 1)
+        self.revoked_tokens.revoke("jti", self.expires_at)
+        other_process = RevokedTokens(refresh_interval=60, capacity=100)
+        self.assertTrue(other_process.is_revoked("jti"))
+        self.assertFalse(other_process.is_revoked("expired_jti"))
+
+    def test_redis_not_available(self):
+        self.revoked_tokens.revoke("jti", self.expires_at)
+        unavailable = redis.Redis(port=1, socket_connect_timeout=0.1)
+        with patch(
+            "utils.jwt_tokens.revocation.revoked_tokens.get_redis",
+            return_value=unavailable,
+        ):
+            with self.assertLogs(
+                "utils.jwt_tokens.revocation.revoked_tokens", "WARNING"
+            ):
+                # found in the filter, so treated as revoked
+                self.assertTrue(self.revoked_tokens.is_revoked("jti"))
+            self.assertFalse(self.revoked_tokens.is_revoked("other_jti"))
+
+    def test_revoke_without_redis(self):
+        unavailable = redis.Redis(port=1, socket_connect_timeout=0.1)
+        with patch(
+            "utils.jwt_tokens.revocation.revoked_tokens.get_redis",
+            return_value=unavailable,
+        ):
+            with self.assertLogs(
+                "utils.jwt_tokens.revocation.revoked_tokens", "WARNING"
+            ):
+                with self.assertRaises(RevocationUnavailable):
+                    self.revoked_tokens.revoke("jti", self.expires_at)
+
+
+class JWTCookieAuthenticationRevokedTest(TestCase, BaseTestUser):
+    """Test suit for the revoked tokens and the JWTCookieAuthentication"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = cls().get_test_active_regularuser()
+
+    def setUp(self):
+        get_revoked_tokens().clear()
+        self.addCleanup(get_revoked_tokens().clear)
+        self.client = APIClient()
+        response = self.client.post(
+            reverse("token_obtain_pair"),
+            {"email": self.user.email, "password": "regularuser_pass"},
+        )
+        self.assertEqual(response.status_code, 200)
+
+    def test_revoked_access_token(self):
+        token = AccessToken(self.client.cookies["access_token"].value)
+        request = APIRequestFactory().get("/")
+        request.COOKIES["access_token"] = str(token)
+        self.assertIsNotNone(JWTCookieAuthentication().authenticate(request))
+
+        get_revoked_tokens().revoke_token(token)
+        with self.assertRaises(InvalidToken):
+            JWTCookieAuthentication().authenticate(request)
+
+    def test_tokens_revoked_on_logout(self):
+        cookies = {name: cookie.value for name, cookie in self.client.cookies.items()}
+        response = self.client.post(reverse("users:logout"))
+        self.assertEqual(response.status_code, 200)
+
+        # the copied tokens are not valid anymore
+        for name, value in cookies.items():
+            self.client.cookies[name] = value
+        response = self.client.get(reverse("users:user-list"))
+        self.assertEqual(response.status_code, 401)
+        response = self.client.post(reverse("token_refresh"))
+        self.assertEqual(response.status_code, 401)
+
+    def test_logout_without_redis(self):
+        unavailable = redis.Redis(port=1, socket_connect_timeout=0.1)
+        with patch(
+            "utils.jwt_tokens.revocation.revoked_tokens.get_redis",
+            return_value=unavailable,
+        ):
+            with self.assertLogs(
+                "utils.jwt_tokens.revocation.revoked_tokens", "WARNING"
+            ):
+                response = self.client.post(reverse("users:logout"))
+        # the cookies are kept, so the logout can be retried
+        self.assertEqual(response.status_code, 503)
+        self.assertNotIn("access_token", response.cookies)
+
+        response = self.client.post(reverse("users:logout"))
+        self.assertEqual(response.status_code, 200)
+
+
+class PasswordPoolTest(SimpleTestCase):
+    """Test suit for the PasswordPool"""
+
+    def setUp(self):
+        self.pool = PasswordPool(workers=1, queue_size=1, retry_after=3)
+        self.addCleanup(self.pool.shutdown)
+
+    def occupy(self) -> threading.Event:
+        """blocks the worker and the queue until the returned event is set"""
+        release = threading.Event()
+        for _ in range(2):
+            threading.Thread(target=self.pool.run, args=(release.wait,)).start()
+        self.addCleanup(release.set)
+        while self.pool._slots._value:
+            time.sleep(0.001)
+        return release
+
+    def test_run_on_a_worker(self):
+        name = self.pool.run(lambda: threading.current_thread().name)
+        self.assertTrue(name.startswith("password_pool"))
+
+    def test_saturated_pool(self):
+        release = self.occupy()
+        with self.assertRaises(PasswordPoolSaturated) as context:
+            self.pool.run(time.time)
+        self.assertEqual(context.exception.wait, 3)
+
+        release.set()
+        while not self.pool._slots._value:
+            time.sleep(0.001)
+        self.assertIsNotNone(self.pool.run(time.time))
+
+    def test_hasher_uses_the_active_pool(self):
+        hasher = PooledArgon2PasswordHasher()
+        encoded = hasher.encode("password", hasher.salt())
+        self.occupy()
+        # hashed in the calling thread without an active pool
+        self.assertTrue(hasher.verify("password", encoded))
+        with self.pool.activate():
+            with self.assertRaises(PasswordPoolSaturated):
+                hasher.verify("password", encoded)
+
+
+class JWTCookieTokenObtainPairViewPoolTest(TestCase, BaseTestUser):
+    """Test suit for the logins refused by a saturated PasswordPool"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = cls().get_test_active_regularuser()
+
+    def test_saturated_pool(self):
+        pool = PasswordPool(workers=1, queue_size=0, retry_after=2)
+        self.addCleanup(pool.shutdown)
+        release = threading.Event()
+        self.addCleanup(release.set)
+        threading.Thread(target=pool.run, args=(release.wait,)).start()
+        while pool._slots._value:
+            time.sleep(0.001)
+
+        with patch(
+            "utils.jwt_tokens.serializers.custom_token_obtain_pair_serializer"
+            ".get_password_pool",
+            return_value=pool,
+        ):
+            response = APIClient().post(
+                reverse("token_obtain_pair"),
+                {"email": self.user.email, "password": "regularuser_pass"},
+            )
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response["Retry-After"], "2")
+        self.assertNotIn("access_token", response.cookies)
@@ -1,4 +1,5 @@
 from webchat.admin.conversation import ConversationAdmin
 from webchat.admin.message import MessageAdmin
+from webchat.admin.read_marker import ReadMarkerAdmin
 
-__all__ = [ConversationAdmin, MessageAdmin]
+__all__ = [ConversationAdmin, MessageAdmin, ReadMarkerAdmin]
@@ -9,10 +9,22 @@ class ConversationAdmin(admin.ModelAdmin):
     """Define the admin pages for the Conversation model."""
 
     ordering = ["-created"]
-    list_display = ["channel_id", "created", "modified"]
-    list_filter = ["channel_id", "created", "modified"]
-    search_fields = ["channel_id"]
-    readonly_fields = ["id", "created", "modified"]
+    list_display = ["channel", "message_count", "last_message_at", "created"]
+    list_filter = ["created", "modified"]
+    list_select_related = ["channel"]
+    raw_id_fields = ["channel"]
+    search_fields = ["channel__name", "legacy_channel_id"]
+    readonly_fields = [
+        "id",
+        "legacy_channel_id",
+        "last_seq",
+        "reserved_seq",
+        "message_count",
+        "last_message_at",
+        "last_message_id",
+        "created",
+        "modified",
+    ]
 
 
 admin.site.register(Conversation, ConversationAdmin)
@@ -1,7 +1,11 @@
 """Message admin customization"""
 
+from functools import partial
+
 from django.contrib import admin
+from django.db import transaction
 
+from webchat.cache import clear_recent_messages
 from webchat.models import Message
 
 
@@ -9,10 +13,28 @@ class MessageAdmin(admin.ModelAdmin):
     """Define the admin pages for the Message model."""
 
     ordering = ["-created"]
-    list_display = ["conversation", "sender", "created", "modified"]
+    list_display = ["conversation", "seq", "sender", "created", "modified"]
     list_filter = ["conversation", "sender", "created", "modified"]
-    search_fields = ["conversation__channel_id", "sender__email"]
-    readonly_fields = ["id", "created", "modified"]
+    search_fields = ["conversation__channel__name", "sender__email"]
+    readonly_fields = ["id", "seq", "created", "modified"]
+
+    def delete_model(self, request, obj):
+        """The cached latest messages of the channel are removed with it."""
+        channel_id = obj.conversation.channel_id
+        super().delete_model(request, obj)
+        if channel_id is not None:
+            transaction.on_commit(partial(clear_recent_messages, [channel_id]))
+
+    def delete_queryset(self, request, queryset):
+        """The cached latest messages of the channels are removed with them."""
+        channel_ids = set(
+            queryset.filter(conversation__channel__isnull=False)
+            .values_list("conversation__channel_id", flat=True)
+            .distinct()
+        )
+        super().delete_queryset(request, queryset)
+        if channel_ids:
+            transaction.on_commit(partial(clear_recent_messages, channel_ids))
 
 
 admin.site.register(Message, MessageAdmin)
@@ -0,0 +1,19 @@
+"""Read marker admin customization"""
+
+from django.contrib import admin
+
+from webchat.models import ReadMarker
+
+
+class ReadMarkerAdmin(admin.ModelAdmin):
+    """Define the admin pages for the ReadMarker model."""
+
+    ordering = ["-modified"]
+    list_display = ["user", "conversation", "last_read_seq", "modified"]
+    list_select_related = ["user", "conversation__channel"]
+    raw_id_fields = ["user", "conversation"]
+    search_fields = ["user__email", "conversation__channel__name"]
+    readonly_fields = ["id", "created", "modified"]
+
+
+admin.site.register(ReadMarker, ReadMarkerAdmin)
@@ -0,0 +1,19 @@
+from webchat.buffers.lifespan import BuffersLifespan
+from webchat.buffers.message_buffer import MessageWriteBuffer, get_message_buffer
+from webchat.buffers.message_sequences import (
+    MessageSequenceAllocator,
+    get_message_sequence_allocator,
+)
+from webchat.buffers.read_marker_buffer import ReadMarkerBuffer, get_read_marker_buffer
+from webchat.buffers.write_buffer import WriteBuffer
+
+__all__ = [
+    BuffersLifespan,
+    MessageSequenceAllocator,
+    MessageWriteBuffer,
+    ReadMarkerBuffer,
+    WriteBuffer,
+    get_message_buffer,
+    get_message_sequence_allocator,
+    get_read_marker_buffer,
+]
@@ -0,0 +1,40 @@
+"""
+ASGI lifespan application storing the buffers on shutdown.
+"""
+
+import logging
+
+from webchat.buffers.message_buffer import get_message_buffer
+from webchat.buffers.read_marker_buffer import get_read_marker_buffer
+
+logger = logging.getLogger(__name__)
+
+
+class BuffersLifespan:
+    """
+    Handles the lifespan scope of the ASGI server. On a graceful shutdown
+    the sockets are closed first and then the buffered writes of the process
+    are stored, so the buffers are not flushed by every closing socket.
+    """
+
+    async def __call__(self, scope, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                try:
+                    await self.flush()
+                except Exception as error:
+                    logger.exception("Storing the buffers on shutdown failed.")
+                    await send(
+                        {"type": "lifespan.shutdown.failed", "message": str(error)}
+                    )
+                else:
+                    await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    async def flush(self) -> None:
+        """Stores the buffered writes of the process."""
+        await get_message_buffer().flush()
+        await get_read_marker_buffer().flush()
@@ -0,0 +1,74 @@
+"""
+Write-behind buffer for the chat messages.
+"""
+
+import atexit
+import logging
+
+from django.conf import settings
+from django.db import transaction
+
+from webchat.buffers.write_buffer import WriteBuffer
+from webchat.models import Conversation, Message
+
+logger = logging.getLogger(__name__)
+
+
+class MessageWriteBuffer(WriteBuffer):
+    """
+    Collects the messages that were already broadcasted and stores them
+    in batches with bulk_create, when the batch is full or when the flush
+    interval has passed since the first buffered message.
+
+    The messages get their id and created timestamp when they are
+    instantiated, so they are the same in the broadcast and in the database.
+    The failed messages are put back before the newer ones, so they are
+    stored in the order they were sent.
+    """
+
+    verbose_name = "buffered message"
+    verbose_name_plural = "buffered messages"
+    logger = logger
+
+    def __init__(
+        self,
+        batch_size: int = 100,
+        flush_interval: float = 0.5,
+        max_retries: int = 5,
+        max_retry_delay: float = 30.0,
+    ):
+        super().__init__(batch_size, flush_interval, max_retries, max_retry_delay)
+        self.batch_size = batch_size
+
+    def add(self, message: Message) -> None:
+        """Adds the message to the buffer and schedules the flush."""
+        self._add({message.id: message})
+
+    def _store(self, batch: dict) -> None:
+        messages = list(batch.values())
+        # the counters of the conversations are updated with the messages,
+        # the sequence numbers were allocated when they were buffered
+        with transaction.atomic():
+            Message.objects.bulk_create(messages, batch_size=self.batch_size)
+            Conversation.objects.add_messages(messages)
+
+
+_message_buffer: MessageWriteBuffer | None = None
+
+
+def get_message_buffer() -> MessageWriteBuffer:
+    """
+    Returns the write-behind buffer of the process, configured with the
+    WEBCHAT settings. The remaining messages are stored on the lifespan
+    shutdown of the server, or when the process exits.
+    """
+    global _message_buffer
+    if _message_buffer is None:
+        webchat_settings = getattr(settings, "WEBCHAT", {})
+        _message_buffer = MessageWriteBuffer(
+            batch_size=webchat_settings.get("WRITE_BEHIND_BATCH_SIZE", 100),
+            flush_interval=webchat_settings.get("WRITE_BEHIND_FLUSH_INTERVAL", 0.5),
+            max_retries=webchat_settings.get("WRITE_BEHIND_MAX_RETRIES", 5),
+        )
+        atexit.register(_message_buffer.flush_sync)
+    return _message_buffer
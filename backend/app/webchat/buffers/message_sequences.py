@@ -0,0 +1,159 @@
+"""
+Sequence numbers of the messages stored by the write-behind buffer.
+"""
+
+import asyncio
+import logging
+import uuid
+
+import redis
+from channels.db import database_sync_to_async
+from django.conf import settings
+
+from utils.redis import get_async_redis
+from webchat.models import Conversation
+
+logger = logging.getLogger(__name__)
+
+# hands out the next number of the block, nothing if it is used up or lost
+# KEYS: sequence - ARGV: timeout
+ALLOCATE_SCRIPT = """
+local seq = tonumber(redis.call('HGET', KEYS[1], 'seq') or '0')
+if seq >= tonumber(redis.call('HGET', KEYS[1], 'limit') or '0') then
+    return false
+end
+redis.call('EXPIRE', KEYS[1], ARGV[1])
+return redis.call('HINCRBY', KEYS[1], 'seq', 1)
+"""
+
+# continues the sequence up to the end of the block, the numbers are handed
+# out after the last one handed out and never decrease
+# KEYS: sequence - ARGV: start of the block, end of the block, timeout
+EXTEND_SCRIPT = """
+redis.call('HSET', KEYS[1], 'limit', ARGV[2])
+if tonumber(ARGV[1]) > tonumber(redis.call('HGET', KEYS[1], 'seq') or '0') then
+    redis.call('HSET', KEYS[1], 'seq', ARGV[1])
+end
+redis.call('EXPIRE', KEYS[1], ARGV[3])
+"""
+
+# releases the lock of the refill, if it was not taken over after it expired
+# KEYS: lock - ARGV: token
+RELEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+class MessageSequenceAllocator:
+    """
+    Allocates the sequence numbers of the buffered messages in redis, from
+    blocks reserved in the conversation with one UPDATE, so a message costs
+    no commit and no lock of the conversation row. The numbers are shared by
+    all the processes and increase in the order the messages are sent.
+
+    The blocks are refilled by one process at a time, under a lock in redis,
+    so every reserved number is handed out and the sequence has no gaps.
+    A lost key, after a day without messages or a restart of redis, is
+    resumed from the last stored number up to the end of the reserved block,
+    after resume_delay, which leaves the buffered messages time to be stored.
+
+    If redis fails, the number is allocated by the conversation, after the
+    reserved block. The key is deleted first, so the other processes do not
+    hand out the rest of the block after it, if it can not be deleted the
+    error is raised, the message could not be broadcasted anyway.
+    """
+
+    key_prefix = "webchat:seq"
+    # pause of the processes waiting for the refill of another one
+    lock_wait = 0.005
+
+    def __init__(
+        self,
+        block_size: int = 100,
+        timeout: int = 60 * 60 * 24,
+        resume_delay: float = 1.0,
+        lock_timeout: float = 10.0,
+    ):
+        self.block_size = block_size
+        self.timeout = timeout
+        self.resume_delay = resume_delay
+        self.lock_timeout = lock_timeout
+
+    def get_key(self, conversation_id) -> str:
+        return f"{self.key_prefix}:{conversation_id}"
+
+    async def allocate(self, conversation_id) -> int:
+        """Returns the next sequence number of the conversation."""
+        key = self.get_key(conversation_id)
+        try:
+            client = get_async_redis()
+            while True:
+                seq = await client.register_script(ALLOCATE_SCRIPT)(
+                    keys=[key], args=[self.timeout]
+                )
+                if seq is not None:
+                    return int(seq)
+                await self.refill(client, key, conversation_id)
+        except redis.RedisError:
+            logger.warning("Allocating a sequence number in redis failed.")
+            await self.invalidate(key)
+        return await database_sync_to_async(Conversation.objects.allocate_seq)(
+            conversation_id
+        )
+
+    async def refill(self, client, key: str, conversation_id) -> None:
+        """
+        Continues the used up or lost sequence with the next reserved block,
+        or waits until the process holding the lock has done it.
+        """
+        lock, token = f"{key}:lock", uuid.uuid4().hex
+        if not await client.set(lock, token, nx=True, px=int(self.lock_timeout * 1000)):
+            await asyncio.sleep(self.lock_wait)
+            return
+        try:
+            sequence = await client.hgetall(key)
+            if not sequence:
+                # the messages buffered before the key was lost are stored
+                # within the flush interval, they are not numbered again
+                await asyncio.sleep(self.resume_delay)
+                start, limit = await database_sync_to_async(
+                    Conversation.objects.filter(id=conversation_id)
+                    .values_list("last_seq", "reserved_seq")
+                    .get
+                )()
+            elif int(sequence.get("seq", 0)) < int(sequence["limit"]):
+                # refilled by another process before the lock was released
+                return
+            else:
+                start = limit = 0
+            if limit <= start:
+                limit = await database_sync_to_async(
+                    Conversation.objects.reserve_seq_block
+                )(conversation_id, self.block_size)
+                start = limit - self.block_size
+            await client.register_script(EXTEND_SCRIPT)(
+                keys=[key], args=[start, limit, self.timeout]
+            )
+        finally:
+            await client.register_script(RELEASE_SCRIPT)(keys=[lock], args=[token])
+
+    async def invalidate(self, key: str) -> None:
+        """deletes the sequence before a number is allocated after its block"""
+        try:
+            await get_async_redis().delete(key)
+        except redis.RedisError:
+            logger.error("Deleting the sequence %s in redis failed.", key)
+            raise
+
+
+def get_message_sequence_allocator() -> MessageSequenceAllocator:
+    """Returns the sequence allocator configured with the WEBCHAT settings."""
+    webchat_settings = getattr(settings, "WEBCHAT", {})
+    return MessageSequenceAllocator(
+        block_size=webchat_settings.get("WRITE_BEHIND_SEQ_BLOCK_SIZE", 100),
+        # twice the flush interval of the buffered messages
+        resume_delay=2 * webchat_settings.get("WRITE_BEHIND_FLUSH_INTERVAL", 0.5),
+    )
@@ -0,0 +1,76 @@
+"""
+Coalescing buffer for the read markers.
+"""
+
+import atexit
+import logging
+
+from django.conf import settings
+
+from webchat.buffers.write_buffer import WriteBuffer
+from webchat.models import ReadMarker
+
+logger = logging.getLogger(__name__)
+
+
+class ReadMarkerBuffer(WriteBuffer):
+    """
+    Collects the "mark read" frames of the sockets and stores them with one
+    upsert, after the flush interval has passed since the first buffered
+    marker, or when the buffer is full.
+
+    Only the highest sequence number of every (user, conversation) is kept,
+    so a client marking every message it shows, from any number of sockets,
+    costs one row per flush. The failed markers are stored with the next
+    flush, unless newer ones were buffered in the meantime.
+    """
+
+    verbose_name = "read marker"
+    verbose_name_plural = "read markers"
+    logger = logger
+
+    def __init__(
+        self,
+        max_size: int = 1000,
+        flush_interval: float = 1.0,
+        max_retries: int = 5,
+        max_retry_delay: float = 30.0,
+    ):
+        super().__init__(max_size, flush_interval, max_retries, max_retry_delay)
+
+    def add(self, user_id, conversation_id, seq: int) -> None:
+        """Adds the marker to the buffer and schedules the flush."""
+        self._add({(user_id, conversation_id): seq})
+
+    def _merge(self, markers: dict) -> None:
+        """keeps the highest sequence number of every marker, under the lock"""
+        for key, seq in markers.items():
+            if seq > self._pending.get(key, -1):
+                self._pending[key] = seq
+
+    def _put_back(self, failed: dict) -> None:
+        self._merge(failed)
+
+    def _store(self, batch: dict) -> None:
+        ReadMarker.objects.mark_read(batch)
+
+
+_read_marker_buffer: ReadMarkerBuffer | None = None
+
+
+def get_read_marker_buffer() -> ReadMarkerBuffer:
+    """
+    Returns the read marker buffer of the process, configured with the
+    WEBCHAT settings. The remaining markers are stored on the lifespan
+    shutdown of the server, or when the process exits.
+    """
+    global _read_marker_buffer
+    if _read_marker_buffer is None:
+        webchat_settings = getattr(settings, "WEBCHAT", {})
+        _read_marker_buffer = ReadMarkerBuffer(
+            max_size=webchat_settings.get("READ_MARKER_BUFFER_SIZE", 1000),
+            flush_interval=webchat_settings.get("READ_MARKER_FLUSH_INTERVAL", 1.0),
+            max_retries=webchat_settings.get("READ_MARKER_MAX_RETRIES", 5),
+        )
+        atexit.register(_read_marker_buffer.flush_sync)
+    return _read_marker_buffer
@@ -0,0 +1,178 @@
+"""
+Base of the write-behind buffers.
+"""
+
+import asyncio
+import logging
+import threading
+
+from channels.db import database_sync_to_async
+from django.db import DataError, IntegrityError
+
+logger = logging.getLogger(__name__)
+
+
+class WriteBuffer:
+    """
+    Collects the items written by the consumers and stores them in batches,
+    when the buffer is full or when the flush interval has passed since the
+    first buffered item. The items are kept by key, in the order they were
+    added, the subclasses store them with _store and can coalesce the items
+    of the same key with _merge.
+
+    A batch that fails because of one of its items is split until the item
+    is found, the item is logged and dropped and the rest of the batch is
+    stored. The other failures are retried with a growing delay, the items
+    are logged and dropped after max_retries failed flushes in a row, so the
+    buffer does not grow while the database is unavailable.
+    """
+
+    verbose_name = "buffered item"
+    verbose_name_plural = "buffered items"
+    logger = logger
+
+    def __init__(
+        self,
+        max_size: int,
+        flush_interval: float,
+        max_retries: int = 5,
+        max_retry_delay: float = 30.0,
+    ):
+        self.max_size = max_size
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries
+        self.max_retry_delay = max_retry_delay
+        self._pending: dict = {}
+        # number of the failed flushes in a row
+        self._failures = 0
+        # the buffer is shared by the consumers of the event loop and
+        # flushed from the atexit hook, so the items are guarded with a lock
+        self._lock = threading.Lock()
+        self._flush_task: asyncio.Task | None = None
+        # the event loop keeps only weak references to the tasks
+        self._tasks: set[asyncio.Task] = set()
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    async def flush(self) -> None:
+        """Stores all the buffered items."""
+        batch = self._take()
+        if not batch:
+            return
+        failed = await database_sync_to_async(self._write)(batch)
+        retry_delay = self._retry_later(failed)
+        if retry_delay is not None:
+            loop = asyncio.get_running_loop()
+            self._flush_task = self._create_task(loop, self._flush_later(retry_delay))
+
+    def flush_sync(self) -> None:
+        """Stores all the buffered items, used outside of the event loop."""
+        batch = self._take()
+        if batch:
+            self._retry_later(self._write(batch))
+
+    def _add(self, items: dict) -> None:
+        """
+        adds the items to the buffer and schedules the flush on the running
+        event loop, without a loop the items are stored with flush_sync.
+        While a failed flush waits to be retried, a full buffer is not flushed
+        before the retry.
+        """
+        with self._lock:
+            self._merge(items)
+            is_full = len(self._pending) >= self.max_size and not self._failures
+
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        if is_full:
+            self._create_task(loop, self.flush())
+        elif (
+            self._flush_task is None
+            or self._flush_task.done()
+            or self._flush_task.get_loop() is not loop
+        ):
+            self._flush_task = self._create_task(
+                loop, self._flush_later(self.flush_interval)
+            )
+
+    async def _flush_later(self, delay: float) -> None:
+        await asyncio.sleep(delay)
+        await self.flush()
+
+    def _create_task(self, loop, coro) -> asyncio.Task:
+        task = loop.create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    def _merge(self, items: dict) -> None:
+        """adds the items after the buffered ones, under the lock"""
+        self._pending.update(items)
+
+    def _put_back(self, failed: dict) -> None:
+        """puts the failed items back before the buffered ones, under the lock"""
+        self._pending = {**failed, **self._pending}
+
+    def _take(self) -> dict:
+        with self._lock:
+            batch, self._pending = self._pending, {}
+        return batch
+
+    def _store(self, batch: dict) -> None:
+        raise NotImplementedError
+
+    def _write(self, batch: dict) -> dict:
+        """
+        stores the batch, returns the items that failed and can be
+        stored later
+        """
+        try:
+            self._store(batch)
+        except (DataError, IntegrityError):
+            # one of the items can not be stored, e.g. its conversation was
+            # deleted, the halves of the batch are stored separately
+            if len(batch) == 1:
+                self.logger.exception(
+                    "Dropping the %s %s, it can not be stored.",
+                    self.verbose_name,
+                    next(iter(batch)),
+                )
+                return {}
+            keys = list(batch)
+            middle = len(keys) // 2
+            return {
+                **self._write({key: batch[key] for key in keys[:middle]}),
+                **self._write({key: batch[key] for key in keys[middle:]}),
+            }
+        except Exception:
+            self.logger.exception(
+                "Storing %s %s failed.", len(batch), self.verbose_name_plural
+            )
+            return batch
+        return {}
+
+    def _retry_later(self, failed: dict) -> float | None:
+        """
+        puts the failed items back, returns the delay of the retry,
+        or None if there is nothing to retry
+        """
+        with self._lock:
+            if not failed:
+                self._failures = 0
+                return None
+            self._failures += 1
+            if self._failures > self.max_retries:
+                self.logger.error(
+                    "Dropping %s %s after %s failed flushes.",
+                    len(failed),
+                    self.verbose_name_plural,
+                    self._failures,
+                )
+                self._failures = 0
+                return None
+            # the items are stored with the next flush
+            self._put_back(failed)
+            return min(self.flush_interval * 2**self._failures, self.max_retry_delay)
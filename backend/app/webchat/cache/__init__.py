@@ -0,0 +1,11 @@
+from webchat.cache.recent_messages import (
+    RecentMessagesCache,
+    clear_recent_messages,
+    get_recent_messages_cache,
+)
+
+__all__ = [
+    RecentMessagesCache,
+    clear_recent_messages,
+    get_recent_messages_cache,
+]
@@ -0,0 +1,167 @@
+"""
+Redis cache of the most recent messages of every channel.
+"""
+
+import json
+import logging
+
+import redis
+from django.conf import settings
+from rest_framework.utils.encoders import JSONEncoder
+
+from utils.redis import get_async_redis, get_redis
+
+logger = logging.getLogger(__name__)
+
+# adds the message to the cached ones, only if the channel is already cached,
+# so the cache is never started with only the newest messages of a channel.
+# The highest sequence number is recorded even if the channel is not cached.
+# KEYS: messages, last seq - ARGV: seq, message, size, timeout
+APPEND_SCRIPT = """
+local seq = tonumber(ARGV[1])
+if seq > tonumber(redis.call('GET', KEYS[2]) or '0') then
+    redis.call('SET', KEYS[2], seq, 'EX', ARGV[4])
+end
+if redis.call('EXISTS', KEYS[1]) == 1 then
+    redis.call('ZREMRANGEBYSCORE', KEYS[1], seq, seq)
+    redis.call('ZADD', KEYS[1], seq, ARGV[2])
+    redis.call('ZREMRANGEBYRANK', KEYS[1], 0, -tonumber(ARGV[3]) - 1)
+    redis.call('EXPIRE', KEYS[1], ARGV[4])
+end
+"""
+
+# replaces the cached messages with the ones read from the database,
+# unless a newer message was added in the meantime, which could be missing
+# KEYS: messages, last seq - ARGV: size, timeout, last seq, seq, message ...
+FILL_SCRIPT = """
+local last_seq = tonumber(ARGV[3])
+if last_seq < tonumber(redis.call('GET', KEYS[2]) or '0') then
+    return 0
+end
+redis.call('DEL', KEYS[1])
+for i = 4, #ARGV, 2 do
+    redis.call('ZADD', KEYS[1], ARGV[i], ARGV[i + 1])
+end
+redis.call('ZREMRANGEBYRANK', KEYS[1], 0, -tonumber(ARGV[1]) - 1)
+redis.call('EXPIRE', KEYS[1], ARGV[2])
+redis.call('SET', KEYS[2], last_seq, 'EX', ARGV[2])
+return 1
+"""
+
+
+class RecentMessagesCache:
+    """
+    Bounded ring buffer of the latest serialized messages of every channel,
+    kept in a redis sorted set scored by the sequence number of the message.
+
+    The cache is filled from the database when the first page of a channel
+    is read, after that the consumer adds every new message to it. The redis
+    errors are logged and treated like a cache miss, so the messages are
+    then read from the database.
+    """
+
+    key_prefix = "webchat:recent"
+
+    def __init__(self, size: int = 100, timeout: int = 60 * 60 * 24):
+        self.size = size
+        self.timeout = timeout
+
+    def get_keys(self, channel_id: str) -> list[str]:
+        """Returns the keys of the messages and of the last sequence number."""
+        return [
+            f"{self.key_prefix}:{channel_id}",
+            f"{self.key_prefix}:{channel_id}:seq",
+        ]
+
+    def get(self, channel_id: str, count: int) -> list[dict] | None:
+        """
+        Returns the latest count messages of the channel, from the oldest
+        to the newest, or None if they are not all cached.
+        """
+        if not self.size or count > self.size:
+            return None
+        try:
+            cached = get_redis().zrange(self.get_keys(channel_id)[0], -count, -1)
+        except redis.RedisError:
+            logger.warning("Reading the recent messages of %s failed.", channel_id)
+            return None
+        messages = [json.loads(message) for message in cached]
+        # fewer messages are only complete if the channel has no older ones
+        if not messages or (len(messages) < count and messages[0]["seq"] != 1):
+            return None
+        return messages
+
+    def fill(self, channel_id: str, messages: list[dict]) -> None:
+        """Caches the latest messages of the channel read from the database."""
+        if not self.size or not messages:
+            return
+        start = max(len(messages) - self.size, 0)
+        args = [
+            self.size,
+            self.timeout,
+            max(message["seq"] for message in messages),
+        ]
+        for message in messages[start:]:
+            args.extend([message["seq"], self.encode(message)])
+        try:
+            get_redis().register_script(FILL_SCRIPT)(
+                keys=self.get_keys(channel_id), args=args
+            )
+        except redis.RedisError:
+            logger.warning("Caching the recent messages of %s failed.", channel_id)
+
+    async def append(self, channel_id: str, message: dict) -> None:
+        """Adds the new message of the channel to the cached ones."""
+        if not self.size:
+            return
+        try:
+            await get_async_redis().register_script(APPEND_SCRIPT)(
+                keys=self.get_keys(channel_id),
+                args=[message["seq"], self.encode(message), self.size, self.timeout],
+            )
+        except redis.RedisError:
+            logger.warning("Caching a new message of %s failed.", channel_id)
+
+    async def aget_last_seq(self, channel_id: str) -> int | None:
+        """
+        Returns the highest sequence number added to the cache of the channel,
+        or None if it is not known.
+        """
+        if not self.size:
+            return None
+        try:
+            last_seq = await get_async_redis().get(self.get_keys(channel_id)[1])
+        except redis.RedisError:
+            logger.warning("Reading the last sequence number of %s failed.", channel_id)
+            return None
+        return int(last_seq) if last_seq is not None else None
+
+    def clear(self, channel_id: str) -> None:
+        """Removes the cached messages of the channel."""
+        get_redis().delete(*self.get_keys(channel_id))
+
+    @staticmethod
+    def encode(message: dict) -> str:
+        return json.dumps(message, cls=JSONEncoder)
+
+
+def clear_recent_messages(channel_ids) -> None:
+    """
+    Removes the cached messages of the channels whose messages were deleted,
+    the redis errors are logged, the cache then expires with its timeout.
+    """
+    cache = get_recent_messages_cache()
+    for channel_id in channel_ids:
+        try:
+            cache.clear(str(channel_id))
+        except redis.RedisError:
+            logger.warning("Clearing the recent messages of %s failed.", channel_id)
+
+
+def get_recent_messages_cache() -> RecentMessagesCache:
+    """Returns the cache of the recent messages configured with the WEBCHAT settings."""
+    webchat_settings = getattr(settings, "WEBCHAT", {})
+    return RecentMessagesCache(
+        size=webchat_settings.get("RECENT_MESSAGES_CACHE_SIZE", 100),
+        timeout=webchat_settings.get("RECENT_MESSAGES_CACHE_TIMEOUT", 60 * 60 * 24),
+    )
@@ -1,21 +1,71 @@
-from asgiref.sync import async_to_sync
-from channels.generic.websocket import JsonWebsocketConsumer
+import asyncio
+import uuid
+from urllib.parse import parse_qs
+
+from channels.db import database_sync_to_async
+from channels.generic.websocket import AsyncJsonWebsocketConsumer
+from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.db import IntegrityError
 
-from server.models import Server
+from server.cache import get_membership_cache
+from server.models import Channel
+from server.signals import get_membership_group_name
+from webchat.buffers import (
+    get_message_buffer,
+    get_message_sequence_allocator,
+    get_read_marker_buffer,
+)
+from webchat.cache import get_recent_messages_cache
 from webchat.models import Conversation, Message
+from webchat.serializers import MessageSerializer
 
 User = get_user_model()
 
 
-class WebChatConsumer(JsonWebsocketConsumer):
+class WebChatConsumer(AsyncJsonWebsocketConsumer):
+    """
+    Fully asynchronous chat consumer.
+
+    The websocket handling and the channel layer calls run on the event loop,
+    only the database access is offloaded with database_sync_to_async, so a
+    socket does not occupy a thread from the asgiref pool while it is idle.
+
+    A client that reconnects can resume the stream of messages with
+    ws/<server_id>/<channel_id>/?resume_from=<seq>, the messages after
+    the given sequence number are replayed before the live ones.
+
+    The membership of the user is read from the membership cache and kept
+    up to date with the membership.changed events, so a user that leaves
+    the server can not send messages anymore without reconnecting.
+
+    The client marks the messages it has shown as read with the frame
+    {"type": "mark_read", "seq": <seq>}, the frames are coalesced by the
+    read marker buffer and stored in batches.
+    """
+
+    # number of messages loaded at once when they are replayed
+    replay_batch_size = 200
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.channel_id = None
+        self.server_id = None
         self.user = None
+        self.is_member = False
+        # the conversation of the channel, resolved with the first message
+        self.conversation_id = None
+        # bounds the replayed messages to the partitions since it was created
+        self.conversation_created = None
+        # storing the messages in batches after they are broadcasted
+        self.write_behind = (
+            getattr(settings, "WEBCHAT", {}).get("MESSAGE_PERSISTENCE", "sync")
+            == "write_behind"
+        )
+        # the last sequence number sent when the messages were replayed
+        self.replayed_seq = 0
 
-    def connect(self):
+    async def connect(self):
         self.user = self.scope.get("user")
         # the middlewre wil be called eveytime we try making a new web scoket connection
         # adding authentication of the user before actully connecting
@@ -24,34 +74,48 @@ class WebChatConsumer(JsonWebsocketConsumer):
         # and now we can check if the user is logged in
         if not self.user or not self.user.is_authenticated:
             # closing the connection
-            self.close(code=4001)
+            await self.close(code=4001)
             return
 
-        self.accept()
-
-        # getting the channel id
-        self.channel_id = self.scope["url_route"]["kwargs"]["channel_id"]
-        # getting the server id
-        self.server_id = self.scope["url_route"]["kwargs"]["server_id"]
-
-        # setting the user that makes the connection as the current user
-        # self.user = User.objects.get(id=self.user.id)
-        # this is done alredy from the scope
+        # getting the channel and the server ids, in the same format as they
+        # are stored, so the groups and the caches are the same for every
+        # client and the membership changes sent by the signals are received
+        kwargs = self.scope["url_route"]["kwargs"]
+        try:
+            channel_id = str(uuid.UUID(kwargs["channel_id"]))
+            server_id = str(uuid.UUID(kwargs["server_id"]))
+        except ValueError:
+            await self.close(code=4004)
+            return
+        self.channel_id, self.server_id = channel_id, server_id
 
-        # now we can determine if the user with the give user id is a member ot not
-        # getting first the server
-        server = Server.objects.get(id=self.server_id)
+        # the changes of the membership are sent to this group,
+        # joined before the check, so no change is missed
+        await self.channel_layer.group_add(
+            get_membership_group_name(self.server_id, self.user.id),
+            self.channel_name,
+        )
         # checking if the user is a member
         # and now this can eb used in the receive_json method
-        self.is_member = server.member.filter(id=self.user.id).exists()
+        self.is_member = await get_membership_cache().ais_member(
+            self.server_id, self.user.id
+        )
 
-        # https://channels.readthedocs.io/en/latest/topics/channel_layers.html#synchronous-functions
-        async_to_sync(self.channel_layer.group_add)(
+        # https://channels.readthedocs.io/en/latest/topics/channel_layers.html
+        await self.channel_layer.group_add(
             self.channel_id,
             self.channel_name,
         )
 
-    def receive_json(self, content=None, bytes_data=None):
+        # accepting only after joining the group, so a connected client
+        # does not miss the messages sent right after the connection
+        await self.accept()
+
+        resume_from = self.get_resume_from()
+        if resume_from is not None:
+            await self.replay_messages(resume_from)
+
+    async def receive_json(self, content=None, **kwargs):
         # called when the consumer recives the message
         # content -> this is the recived message
 
@@ -59,43 +123,211 @@ class WebChatConsumer(JsonWebsocketConsumer):
         if not self.is_member:
             return
 
-        channel_id = self.channel_id
-        sender = self.user
-        message = content["message"]
+        if content.get("type") == "mark_read":
+            await self.mark_read(content.get("seq"))
+            return
 
-        obj, is_created = Conversation.objects.get_or_create(channel_id=channel_id)
+        try:
+            if self.write_behind:
+                message = await self.buffer_message(content["message"])
+            else:
+                message = await self.create_message(content["message"])
+        except Channel.DoesNotExist:
+            await self.close(code=4004)
+            return
+        new_message = self.get_message_payload(message)
 
-        new_message = Message.objects.create(
-            conversation=obj,
-            sender=sender,
-            content=message,
+        # the payload is encoded to JSON only once here, and not by every
+        # consumer of the group, the text is then written as it is to each socket
+        text = await self.encode_json(
+            {
+                "type": "chat.message",
+                "new_message": new_message,
+            }
         )
 
-        async_to_sync(self.channel_layer.group_send)(
+        await self.channel_layer.group_send(
             # using group send to send messages to all channelsin a particular group
             self.channel_id,
             # this is the message we are sending
             {
                 "type": "chat.message",
-                "new_message": {
-                    "id": str(new_message.id),
-                    "sender": new_message.sender.get_full_name,
-                    "content": new_message.content,
-                    "created": new_message.created.isoformat(),
-                },
+                "seq": new_message["seq"],
+                "text": text,
             },
         )
 
-    def chat_message(self, event):
+        # keeping the latest messages of the channel in the cache,
+        # the first page of the messages is served from them
+        await get_recent_messages_cache().append(
+            self.channel_id, MessageSerializer(message).data
+        )
+
+    async def chat_message(self, event):
         # sending the message
         # it is a consumer method which is invoked when a message of type chat.message
-        # is received by the consumer
-        self.send_json(event)
+        # is received by the consumer, the text is already encoded JSON
+        # skipping the messages that were already sent when they were replayed
+        if event["seq"] <= self.replayed_seq:
+            return
+        await self.send(text_data=event["text"])
+
+    async def membership_changed(self, event):
+        # the user joined or left the server while the socket is open
+        self.is_member = event["is_member"]
+        await self.send_json(
+            {
+                "type": "membership.changed",
+                "is_member": self.is_member,
+            }
+        )
 
-    def disconnect(self, close_code):
+    def get_resume_from(self) -> int | None:
+        """Returns the sequence number given with ?resume_from=<seq>."""
+        query = parse_qs(self.scope.get("query_string", b"").decode())
+        try:
+            resume_from = int(query["resume_from"][0])
+        except (KeyError, ValueError):
+            return None
+        return resume_from if resume_from >= 0 else None
+
+    async def replay_messages(self, resume_from: int) -> None:
+        """
+        Sends the messages of the channel with a sequence number greater than
+        resume_from, so a reconnect costs only the missed messages.
+        """
+        # the buffered messages of this process are stored first,
+        # so they can be replayed too
+        if self.write_behind:
+            await get_message_buffer().flush()
+
+        last_seq = await self.send_messages_after(resume_from)
+        if self.write_behind:
+            # the messages buffered by the other processes are stored within
+            # their flush interval, the replay is continued after it, if the
+            # last broadcasted message was not stored yet
+            broadcasted_seq = await get_recent_messages_cache().aget_last_seq(
+                self.channel_id
+            )
+            if broadcasted_seq is not None and broadcasted_seq > last_seq:
+                await asyncio.sleep(get_message_buffer().flush_interval)
+                last_seq = await self.send_messages_after(last_seq)
+        self.replayed_seq = last_seq
+
+    async def send_messages_after(self, seq: int) -> int:
+        """
+        Sends the stored messages after the sequence number in batches,
+        returns the sequence number of the last sent message.
+        """
+        while True:
+            messages = await self.get_messages_after(seq)
+            for message in messages:
+                await self.send_json({"type": "chat.message", "new_message": message})
+            if messages:
+                seq = messages[-1]["seq"]
+            if len(messages) < self.replay_batch_size:
+                return seq
+
+    async def disconnect(self, close_code):
         # Called when the socket closes
-        # try to remove the user that disconnects
-        async_to_sync(self.channel_layer.group_discard)(
-            self.channel_id, self.channel_name
+        # try to remove the user that disconnects, the channel_id is not set
+        # if the connection was rejected before it was accepted
+        if self.channel_id is not None:
+            await self.channel_layer.group_discard(self.channel_id, self.channel_name)
+            await self.channel_layer.group_discard(
+                get_membership_group_name(self.server_id, self.user.id),
+                self.channel_name,
+            )
+        await super().disconnect(close_code)
+
+    @database_sync_to_async
+    def get_messages_after(self, seq: int) -> list[dict]:
+        """Returns the next batch of messages after the given sequence number."""
+        if self.conversation_id is None:
+            conversation = Conversation.objects.get_for_channel(self.channel_id)
+            if conversation is None:
+                return []
+            self.conversation_id, self.conversation_created = conversation
+        messages = (
+            Message.objects.of_conversation(
+                self.conversation_id, self.conversation_created
+            )
+            .filter(seq__gt=seq)
+            .select_related("sender")
+            .order_by("seq")[: self.replay_batch_size]
         )
-        super().disconnect(close_code)
+        return [self.get_message_payload(message) for message in messages]
+
+    async def mark_read(self, seq) -> None:
+        """
+        Buffers the read marker of the user in the channel, the frames with
+        an invalid sequence number are ignored.
+        """
+        if not isinstance(seq, int) or isinstance(seq, bool) or seq < 0:
+            return
+        if self.conversation_id is None:
+            conversation = await database_sync_to_async(
+                Conversation.objects.get_for_channel
+            )(self.channel_id)
+            # nothing to read in a channel without messages
+            if conversation is None:
+                return
+            self.conversation_id, self.conversation_created = conversation
+        get_read_marker_buffer().add(self.user.id, self.conversation_id, seq)
+
+    @database_sync_to_async
+    def create_message(self, content: str) -> Message:
+        """Stores the message in the conversation of the channel."""
+        return Message.objects.create(
+            conversation_id=self.get_conversation_id(),
+            sender=self.user,
+            content=content,
+        )
+
+    async def buffer_message(self, content: str) -> Message:
+        """
+        Adds the message to the write-behind buffer, it is stored with
+        the next batch.
+        """
+        if self.conversation_id is None:
+            await database_sync_to_async(self.get_conversation_id)()
+        new_message = Message(
+            conversation_id=self.conversation_id,
+            sender=self.user,
+            content=content,
+        )
+        # the sequence number is needed for the broadcast, so it is allocated
+        # now from a block reserved in the conversation, without a commit
+        new_message.seq = await get_message_sequence_allocator().allocate(
+            new_message.conversation_id
+        )
+        get_message_buffer().add(new_message)
+        return new_message
+
+    def get_message_payload(self, message: Message) -> dict:
+        """Returns the message as it is broadcasted to the group."""
+        return {
+            "id": str(message.id),
+            "sender": message.sender.get_full_name,
+            "content": message.content,
+            "created": message.created.isoformat(),
+            "seq": message.seq,
+        }
+
+    def get_conversation_id(self):
+        """
+        Returns the id of the conversation of the channel. The conversation
+        does not change while the socket is open, so it is resolved only once
+        per connection and every following message is a single INSERT.
+        """
+        if self.conversation_id is None:
+            try:
+                self.conversation_id = (
+                    Conversation.objects.get_or_create_id_for_channel(self.channel_id)
+                )
+            except IntegrityError:
+                # the conversation could not reference the channel
+                raise Channel.DoesNotExist(
+                    f"Channel with id: {self.channel_id} does not exists."
+                )
+        return self.conversation_id
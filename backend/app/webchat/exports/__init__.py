@@ -0,0 +1,5 @@
+from webchat.exports.message_export import MessageExport
+
+__all__ = [
+    MessageExport,
+]
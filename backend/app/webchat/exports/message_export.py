@@ -0,0 +1,110 @@
+"""
+Streaming export of the messages of a conversation as gzip compressed
+JSON Lines, one message per line.
+"""
+
+import zlib
+from itertools import islice
+from typing import AsyncIterator, BinaryIO, Iterator
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import transaction
+from django.db.models import QuerySet, TextField
+from django.db.models.functions import Cast, JSONObject
+
+# wbits for the zlib stream with the gzip header and trailer
+GZIP_WBITS = 16 + zlib.MAX_WBITS
+
+
+class MessageExport:
+    """
+    Export of the messages as gzip compressed JSON Lines.
+
+    The messages are read with a server-side cursor in chunks of chunk_size
+    rows and every chunk is compressed before the next one is read, so the
+    memory used does not grow with the number of the exported messages.
+    The cursor is read in a transaction, in autocommit it would be declared
+    WITH HOLD and postgres would materialize the whole result at once.
+    """
+
+    fields = ("id", "seq", "created", "modified", "sender_id", "content")
+
+    def __init__(
+        self,
+        messages: QuerySet,
+        chunk_size: int | None = None,
+        compress_level: int | None = None,
+    ) -> None:
+        webchat_settings = getattr(settings, "WEBCHAT", {})
+        self.messages = messages
+        self.chunk_size = chunk_size or webchat_settings.get(
+            "MESSAGE_EXPORT_CHUNK_SIZE", 2000
+        )
+        self.compress_level = compress_level or webchat_settings.get(
+            "MESSAGE_EXPORT_COMPRESS_LEVEL", 6
+        )
+        # statistics of the export, known after the iteration
+        self.rows = 0
+        self.raw_bytes = 0
+        self.compressed_bytes = 0
+
+    def get_lines(self) -> Iterator[list[str]]:
+        """Yields the JSON lines of the messages, a list per chunk."""
+        # the lines are built by the database, so the ids and the dates
+        # are not parsed to python objects only to be formatted again
+        lines = (
+            self.messages.order_by("seq")
+            .annotate(
+                line=Cast(
+                    JSONObject(**{field: field for field in self.fields}),
+                    TextField(),
+                )
+            )
+            .values_list("line", flat=True)
+        )
+        # the transaction stays open between the chunks and is rolled back
+        # if the export is closed before its end
+        with transaction.atomic(using=lines.db):
+            rows = lines.iterator(chunk_size=self.chunk_size)
+            while chunk := list(islice(rows, self.chunk_size)):
+                yield chunk
+
+    def __iter__(self) -> Iterator[bytes]:
+        """Yields the gzip compressed chunks of the export."""
+        compressor = zlib.compressobj(self.compress_level, zlib.DEFLATED, GZIP_WBITS)
+        self.rows = self.raw_bytes = self.compressed_bytes = 0
+        for lines in self.get_lines():
+            raw = ("\n".join(lines) + "\n").encode()
+            self.rows += len(lines)
+            self.raw_bytes += len(raw)
+            # the compressor keeps a part of the data until it fills a block,
+            # so the empty chunks are not sent
+            chunk = compressor.compress(raw)
+            if chunk:
+                self.compressed_bytes += len(chunk)
+                yield chunk
+        chunk = compressor.flush()
+        self.compressed_bytes += len(chunk)
+        yield chunk
+
+    async def aiter_chunks(self) -> AsyncIterator[bytes]:
+        """
+        Yields the gzip compressed chunks of the export to the ASGI server.
+        The chunks are read in the thread of the database connection, so the
+        transaction and the server-side cursor stay open between them, and
+        they are closed in the same thread when the export is interrupted.
+        """
+        chunks = iter(self)
+        get_next = sync_to_async(next)
+        try:
+            while (chunk := await get_next(chunks, None)) is not None:
+                yield chunk
+        finally:
+            await sync_to_async(chunks.close)()
+
+    def write(self, file: BinaryIO) -> int:
+        """Writes the export to the binary file, returns the number of messages."""
+        for chunk in self:
+            file.write(chunk)
+        return self.rows
@@ -0,0 +1,13 @@
+from webchat.imports.message_import import (
+    MessageImport,
+    get_message_id,
+    read_csv,
+    read_jsonl,
+)
+
+__all__ = [
+    MessageImport,
+    get_message_id,
+    read_csv,
+    read_jsonl,
+]
@@ -0,0 +1,407 @@
+"""
+Bulk import of the messages of the old chat system with COPY.
+"""
+
+import csv
+import hashlib
+import io
+import json
+import logging
+import uuid
+from collections import Counter
+from dataclasses import dataclass
+from datetime import datetime
+from datetime import timezone as dt_timezone
+from typing import BinaryIO, Iterator
+
+import redis
+from django.contrib.auth import get_user_model
+from django.db import connection, transaction
+from django.db.models.functions import Greatest
+
+from server.models import Channel
+from webchat.cache import get_recent_messages_cache
+from webchat.managers.conversation import MESSAGE_COUNTERS_SQL
+from webchat.models import Conversation, Message
+from webchat.partitions import MessagePartitions, get_month
+
+logger = logging.getLogger(__name__)
+
+User = get_user_model()
+
+# the characters escaped in the text format of COPY
+COPY_ESCAPES = str.maketrans({"\\": "\\\\", "\t": "\\t", "\n": "\\n", "\r": "\\r"})
+
+# numbers the messages of the conversation after the base sequence number in
+# the order they were created, only the rows that move are updated
+RENUMBER_SQL = """
+UPDATE "webchat_message" SET "seq" = "numbered"."seq"
+FROM (
+    SELECT
+        "id",
+        "created",
+        %(base_seq)s + row_number() OVER (ORDER BY "created", "id") AS "seq"
+    FROM "webchat_message"
+    WHERE "conversation_id" = %(conversation_id)s AND "seq" > %(base_seq)s
+) AS "numbered"
+WHERE "webchat_message"."conversation_id" = %(conversation_id)s
+    AND "webchat_message"."id" = "numbered"."id"
+    AND "webchat_message"."created" = "numbered"."created"
+    AND "webchat_message"."seq" <> "numbered"."seq"
+"""
+
+# moves the markers of the users who had read the conversation to its end
+# before the import past the imported messages, they are not unread
+MOVE_READ_MARKERS_SQL = """
+UPDATE "webchat_readmarker" SET
+    "last_read_seq" = "conversation"."last_seq",
+    "modified" = now()
+FROM "webchat_conversation" AS "conversation"
+WHERE "conversation"."id" = %(conversation_id)s
+    AND "webchat_readmarker"."conversation_id" = %(conversation_id)s
+    AND "webchat_readmarker"."last_read_seq" >= %(base_seq)s
+    AND "webchat_readmarker"."last_read_seq" < "conversation"."last_seq"
+"""
+
+
+@dataclass
+class ImportedMessage:
+    """A message of the input, with its sender and conversation resolved."""
+
+    id: uuid.UUID
+    channel_id: str
+    conversation_id: uuid.UUID
+    sender_id: uuid.UUID
+    content: str
+    created: datetime
+
+
+def get_message_id(created: datetime, key: str) -> uuid.UUID:
+    """
+    Returns a time-ordered uuid7 of the time of the message, with the random
+    bits taken from the hash of the key, so the message imported again gets
+    the same id.
+    """
+    digest = int.from_bytes(hashlib.blake2b(key.encode(), digest_size=10).digest())
+    value = (int(created.timestamp() * 1000) & 0xFFFF_FFFF_FFFF) << 80
+    value |= 0x7 << 76  # version
+    value |= (digest >> 62) << 64
+    value |= 0b10 << 62  # variant
+    value |= digest & 0x3FFF_FFFF_FFFF_FFFF
+    return uuid.UUID(int=value)
+
+
+def read_jsonl(file: BinaryIO, offset: int = 0) -> Iterator[tuple[int, dict | None]]:
+    """
+    Yields the messages of the JSON Lines file after the byte offset with
+    the offset of the line after them, None for a line that is not valid.
+    """
+    file.seek(offset)
+    for line in file:
+        offset += len(line)
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError:
+            row = None
+        yield offset, row if isinstance(row, dict) else None
+
+
+def read_csv(file: BinaryIO, offset: int = 0) -> Iterator[tuple[int, dict | None]]:
+    """
+    Yields the messages of the CSV file with a header after the byte offset
+    with the offset of the line after them.
+    """
+    position = 0
+
+    def lines(start: int) -> Iterator[str]:
+        nonlocal position
+        position = start
+        for line in file:
+            position += len(line)
+            yield line.decode()
+
+    file.seek(0)
+    header = next(csv.reader(lines(0)), None)
+    if header is None:
+        return
+    file.seek(max(offset, position))
+    for values in csv.reader(lines(max(offset, position))):
+        # the reader has read the lines of the row and not further
+        if values:
+            yield position, dict(zip(header, values))
+
+
+class MessageImport:
+    """
+    Imports the messages in batches, every batch is written with a single COPY
+    to the messages table, in its own transaction.
+
+    The senders are resolved by their email or id and the conversations by the
+    id of their channel with maps kept in memory, so the rows are not looked
+    up one by one. The sequence numbers of a batch are reserved with one UPDATE
+    per conversation, which also moves the creation of the conversation back
+    to its oldest message, so the messages are found by the queries bounded by
+    it. The partitions of the months of the messages are created before they
+    are written, so the old messages are not stored in the default partition.
+
+    The batches are numbered in the order of the file, when the import is
+    done renumber() numbers the imported messages of every conversation in
+    the order they were created. The conversations that already have messages
+    are skipped, unless force is set, then the imported messages are numbered
+    after the existing ones.
+    """
+
+    def __init__(
+        self, channel_id: str | None = None, source: str = "", force: bool = False
+    ) -> None:
+        # the channel of the messages without their own channel_id
+        self.channel_id = channel_id
+        # the ids of the messages without their own id are derived from it
+        self.source = source
+        self.force = force
+        self.senders: dict[str, uuid.UUID] | None = None
+        self.sender_ids: set[uuid.UUID] = set()
+        self.conversations: dict[str, uuid.UUID | None] = {}
+        # the last sequence number of the imported conversations before the
+        # import, the imported messages are numbered after it
+        self.base_seqs: dict[uuid.UUID, int] = {}
+        # the channels skipped because their conversation has messages
+        self.refused: set[str] = set()
+        self.partitions = MessagePartitions()
+        self.months: set[datetime] | None = None
+        self.columns = self.partitions.get_columns()
+        self.rows = 0
+        self.skipped: Counter = Counter()
+
+    def load_senders(self) -> None:
+        """Loads the ids of all the users by their email."""
+        self.senders = {}
+        for email, user_id in User.objects.values_list("email", "id").iterator():
+            self.senders[email.lower()] = user_id
+            self.sender_ids.add(user_id)
+
+    def get_sender_id(self, row: dict) -> uuid.UUID | None:
+        if self.senders is None:
+            self.load_senders()
+        if row.get("sender_id"):
+            try:
+                sender_id = uuid.UUID(str(row["sender_id"]))
+            except ValueError:
+                return None
+            return sender_id if sender_id in self.sender_ids else None
+        return self.senders.get(str(row.get("sender_email", "")).strip().lower())
+
+    def get_conversation_id(self, channel_id: str) -> uuid.UUID | None:
+        """Returns the conversation of the channel, None if it does not exist."""
+        if channel_id not in self.conversations:
+            conversation_id = None
+            # the foreign key of the channel is checked only when the
+            # transaction commits, so the channel is looked up first
+            if Channel.objects.filter(id=channel_id).exists():
+                conversation_id = Conversation.objects.get_or_create_id_for_channel(
+                    channel_id
+                )
+            if conversation_id is not None and conversation_id not in self.base_seqs:
+                base_seq = (
+                    Conversation.objects.filter(id=conversation_id)
+                    .values_list(Greatest("last_seq", "reserved_seq"), flat=True)
+                    .get()
+                )
+                if base_seq and not self.force:
+                    self.refused.add(channel_id)
+                    conversation_id = None
+                else:
+                    self.base_seqs[conversation_id] = base_seq
+            self.conversations[channel_id] = conversation_id
+        return self.conversations[channel_id]
+
+    def parse(self, row: dict | None, offset: int) -> ImportedMessage | None:
+        """
+        Returns the message of the row read at the offset of the input, or None
+        if it can not be imported, the reason is counted in skipped.
+        """
+        if row is None:
+            self.skipped["invalid"] += 1
+            return None
+        try:
+            channel_id = str(uuid.UUID(str(row.get("channel_id") or self.channel_id)))
+        except ValueError:
+            channel_id = None
+        conversation_id = channel_id and self.get_conversation_id(channel_id)
+        if conversation_id is None:
+            self.skipped["existing" if channel_id in self.refused else "channel"] += 1
+            return None
+        sender_id = self.get_sender_id(row)
+        if sender_id is None:
+            self.skipped["sender"] += 1
+            return None
+        content = row.get("content")
+        if not isinstance(content, str) or not content:
+            self.skipped["content"] += 1
+            return None
+        try:
+            created = datetime.fromisoformat(str(row.get("created")))
+        except ValueError:
+            self.skipped["created"] += 1
+            return None
+        if created.tzinfo is None:
+            created = created.replace(tzinfo=dt_timezone.utc)
+        try:
+            message_id = uuid.UUID(str(row["id"])) if row.get("id") else None
+        except ValueError:
+            message_id = None
+        return ImportedMessage(
+            id=message_id or get_message_id(created, f"{self.source}:{offset}"),
+            channel_id=channel_id,
+            conversation_id=conversation_id,
+            sender_id=sender_id,
+            content=content.replace("\x00", ""),
+            created=created,
+        )
+
+    def ensure_partitions(self, messages: list[ImportedMessage]) -> None:
+        """Creates the missing partitions of the months of the messages."""
+        if self.months is None:
+            self.months = {
+                get_month(start) for _, start, _ in self.partitions.get_partitions()
+            }
+        months = {get_month(message.created) for message in messages} - self.months
+        for month in sorted(months):
+            self.partitions.create(month)
+            self.months.add(month)
+
+    def get_existing_ids(self, messages: list[ImportedMessage]) -> set[uuid.UUID]:
+        """Returns the ids of the messages that are already stored."""
+        return set(
+            Message.objects.filter(
+                id__in=[message.id for message in messages],
+                created__gte=min(message.created for message in messages),
+                created__lte=max(message.created for message in messages),
+            ).values_list("id", flat=True)
+        )
+
+    def reserve_seqs(self, messages: list[ImportedMessage]) -> dict:
+        """
+        Reserves the sequence numbers of the messages and adds them to the
+        counters of their conversations, returns the first sequence number of
+        every conversation. The conversations are updated in the order of
+        their ids, so concurrent imports do not deadlock.
+        """
+        counts = Counter(message.conversation_id for message in messages)
+        oldest, latest = {}, {}
+        for message in messages:
+            created = oldest.get(message.conversation_id)
+            if created is None or message.created < created:
+                oldest[message.conversation_id] = message.created
+            last = latest.get(message.conversation_id)
+            if last is None or (message.created, message.id) > (last.created, last.id):
+                latest[message.conversation_id] = message
+
+        first_seqs = {}
+        with connection.cursor() as cursor:
+            for conversation_id, count in sorted(counts.items()):
+                cursor.execute(
+                    'UPDATE "webchat_conversation" '
+                    'SET "last_seq" = '
+                    'greatest("last_seq", "reserved_seq") + %(count)s, '
+                    '"created" = least("created", %(oldest)s), '
+                    f"{MESSAGE_COUNTERS_SQL} "
+                    'WHERE "id" = %(conversation_id)s RETURNING "last_seq"',
+                    {
+                        "count": count,
+                        "oldest": oldest[conversation_id],
+                        "last_message_at": latest[conversation_id].created,
+                        "last_message_id": latest[conversation_id].id,
+                        "conversation_id": conversation_id,
+                    },
+                )
+                first_seqs[conversation_id] = cursor.fetchone()[0] - count + 1
+        return first_seqs
+
+    def copy(self, messages: list[ImportedMessage], first_seqs: dict) -> None:
+        """Writes the messages with COPY, numbered from the first sequence numbers."""
+        next_seqs = dict(first_seqs)
+        buffer = io.StringIO()
+        for message in messages:
+            seq = next_seqs[message.conversation_id]
+            next_seqs[message.conversation_id] = seq + 1
+            created = message.created.isoformat()
+            values = {
+                "created": created,
+                "modified": created,
+                "id": str(message.id),
+                "content": message.content.translate(COPY_ESCAPES),
+                "conversation_id": str(message.conversation_id),
+                "sender_id": str(message.sender_id),
+                "seq": str(seq),
+            }
+            buffer.write("\t".join(values[column] for column in self.columns))
+            buffer.write("\n")
+
+        # the generated columns are computed by the database
+        columns = ", ".join(f'"{column}"' for column in self.columns)
+        with connection.cursor() as cursor:
+            with cursor.copy(f'COPY "webchat_message" ({columns}) FROM STDIN') as copy:
+                copy.write(buffer.getvalue())
+
+    def write(
+        self, messages: list[ImportedMessage], skip_existing: bool = False
+    ) -> int:
+        """
+        Writes the messages in one transaction, returns the number of the
+        written ones. With skip_existing the messages already stored are left
+        out, they are the ones of the batch written before an interrupted
+        import stored its checkpoint.
+        """
+        if not messages:
+            return 0
+        self.ensure_partitions(messages)
+        with transaction.atomic():
+            if skip_existing:
+                # they were imported by the interrupted import
+                existing = self.get_existing_ids(messages)
+                self.rows += len(existing)
+                messages = [
+                    message for message in messages if message.id not in existing
+                ]
+                if not messages:
+                    return 0
+            self.copy(messages, self.reserve_seqs(messages))
+
+        self.rows += len(messages)
+        # the cached latest messages of the channels are read again
+        for channel_id in {message.channel_id for message in messages}:
+            try:
+                get_recent_messages_cache().clear(channel_id)
+            except redis.RedisError:
+                logger.warning("Clearing the recent messages of %s failed.", channel_id)
+        return len(messages)
+
+    def renumber(self) -> None:
+        """
+        Numbers the imported messages of every conversation after its base
+        sequence number in the order of their creation and id, so they are
+        replayed and exported in the order they were sent. The read markers
+        at the end of the conversation before the import are moved past the
+        imported messages.
+        """
+        # the conversations of a resumed import are not all in the map
+        channel_ids = dict(
+            Conversation.objects.filter(id__in=self.base_seqs).values_list(
+                "id", "channel_id"
+            )
+        )
+        for conversation_id, base_seq in sorted(self.base_seqs.items()):
+            params = {"conversation_id": conversation_id, "base_seq": base_seq}
+            with transaction.atomic(), connection.cursor() as cursor:
+                cursor.execute(RENUMBER_SQL, params)
+                cursor.execute(MOVE_READ_MARKERS_SQL, params)
+            channel_id = channel_ids.get(conversation_id)
+            if channel_id is None:
+                continue
+            try:
+                get_recent_messages_cache().clear(str(channel_id))
+            except redis.RedisError:
+                logger.warning("Clearing the recent messages of %s failed.", channel_id)
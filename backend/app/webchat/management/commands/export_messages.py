@@ -0,0 +1,72 @@
+"""
+Django command to export the messages of a channel as gzip compressed
+JSON Lines, for the compliance exports.
+"""
+
+import sys
+import time
+import uuid
+from typing import Any
+
+from django.core.management.base import BaseCommand, CommandError, CommandParser
+
+from webchat.exports import MessageExport
+from webchat.models import Conversation, Message
+
+
+class Command(BaseCommand):
+    """Django command to export the messages of a channel."""
+
+    help = (
+        "Exports all the messages of the channel as gzip compressed JSON Lines, "
+        "the oldest first. The messages are read with a server-side cursor in "
+        "chunks, so the memory used does not depend on the size of the channel."
+    )
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument("channel_id", help="ID of the exported channel.")
+        parser.add_argument(
+            "-o",
+            "--output",
+            default="-",
+            help="Path of the written .jsonl.gz file, - writes to the stdout.",
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=None,
+            help="Number of the messages read and compressed at once.",
+        )
+
+    def handle(self, *args: Any, **options: Any) -> str | None:
+        """Entry point for command."""
+        try:
+            channel_id = uuid.UUID(options["channel_id"])
+        except ValueError:
+            raise CommandError(f"Channel ID: {options['channel_id']} is not valid.")
+
+        conversation = Conversation.objects.get_for_channel(channel_id)
+        if conversation is None:
+            raise CommandError(f"Channel {channel_id} has no messages.")
+        export = MessageExport(
+            Message.objects.of_conversation(*conversation),
+            chunk_size=options["chunk_size"],
+        )
+
+        start = time.perf_counter()
+        if options["output"] == "-":
+            export.write(sys.stdout.buffer)
+        else:
+            with open(options["output"], "wb") as file:
+                export.write(file)
+        seconds = time.perf_counter() - start
+
+        # the summary goes to the stderr, the stdout can be the export
+        self.stderr.write(
+            self.style.SUCCESS(
+                f"Exported {export.rows} messages, "
+                f"{export.raw_bytes / 2**20:.1f} MB "
+                f"({export.compressed_bytes / 2**20:.1f} MB compressed) "
+                f"at {export.raw_bytes / 2**20 / max(seconds, 1e-9):.1f} MB/s"
+            )
+        )
@@ -0,0 +1,70 @@
+"""
+Django command to maintain the monthly partitions of the messages.
+Creating the partitions of the next months and detaching the old ones.
+"""
+
+from typing import Any
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandParser
+
+from webchat.partitions import MessagePartitions
+
+
+class Command(BaseCommand):
+    """Django command to maintain the monthly partitions of the messages."""
+
+    help = (
+        "Creates the monthly partitions of the messages ahead of time and moves "
+        "the messages stored in the default partition to their month. The "
+        "partitions older than the retained months are detached from the "
+        "messages table, and dropped with --drop. Meant to run daily."
+    )
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        webchat_settings = getattr(settings, "WEBCHAT", {})
+        parser.add_argument(
+            "--months-ahead",
+            type=int,
+            default=webchat_settings.get("MESSAGE_PARTITIONS_AHEAD", 3),
+            help="Number of the months after the current one with a partition.",
+        )
+        parser.add_argument(
+            "--retain-months",
+            type=int,
+            default=webchat_settings.get("MESSAGE_PARTITIONS_RETAIN_MONTHS", 0),
+            help=(
+                "Number of the full months before the current one kept in the "
+                "messages table, 0 keeps all of them."
+            ),
+        )
+        parser.add_argument(
+            "--drop",
+            action="store_true",
+            help="Drops the detached partitions, instead of keeping them as tables.",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Only prints the partitions with their bounds.",
+        )
+
+    def handle(self, *args: Any, **options: Any) -> str | None:
+        """Entry point for command."""
+        partitions = MessagePartitions()
+        expired = []
+        if options["retain_months"] > 0:
+            expired = partitions.get_expired(options["retain_months"])
+
+        if options["dry_run"]:
+            for name, start, end in partitions.get_partitions():
+                detach = " (detach)" if name in expired else ""
+                self.stdout.write(f"{name}: {start.date()} - {end.date()}{detach}")
+            return
+
+        for name in partitions.ensure(options["months_ahead"]):
+            self.stdout.write(self.style.SUCCESS(f"Created {name}"))
+        for name in expired:
+            partitions.detach(name, drop=options["drop"])
+            action = "Dropped" if options["drop"] else "Detached"
+            self.stdout.write(self.style.SUCCESS(f"{action} {name}"))
@@ -0,0 +1,137 @@
+"""
+Django command to delete the messages older than the retention period
+of their server.
+"""
+
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Any
+
+from django.core.management.base import BaseCommand, CommandError, CommandParser
+from django.utils import timezone
+
+from webchat.retention import MessageRetention
+
+
+class Command(BaseCommand):
+    """Django command to delete the expired messages."""
+
+    help = (
+        "Deletes the messages older than the message retention days of their "
+        "server, in batches of the oldest messages of every channel with a "
+        "pause between them, so it can run while the chat is used. The "
+        "servers without a retention period are skipped. Meant to run daily."
+    )
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument(
+            "--server",
+            default=None,
+            help="ID of the only server purged, by default all of them.",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=None,
+            help="Number of the messages deleted in one transaction.",
+        )
+        parser.add_argument(
+            "--sleep",
+            type=float,
+            default=None,
+            help="Pause between the batches, in seconds.",
+        )
+        parser.add_argument(
+            "--orphaned-days",
+            type=int,
+            default=None,
+            help="Retention of the messages of the deleted channels, 0 keeps them.",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Only prints the number of the expired messages.",
+        )
+
+    def handle(self, *args: Any, **options: Any) -> str | None:
+        """Entry point for command."""
+        if options["batch_size"] is not None and options["batch_size"] <= 0:
+            raise CommandError("The batch size has to be positive.")
+        server_id = None
+        if options["server"]:
+            try:
+                server_id = uuid.UUID(options["server"])
+            except ValueError:
+                raise CommandError(f"Server ID: {options['server']} is not valid.")
+
+        retention = MessageRetention(
+            batch_size=options["batch_size"],
+            sleep=options["sleep"],
+            orphaned_days=options["orphaned_days"],
+        )
+        now = timezone.now()
+        targets = [
+            (name, cutoff, retention.get_conversations(policy_server_id))
+            for policy_server_id, name, cutoff in retention.get_policies(now)
+            if server_id is None or policy_server_id == server_id
+        ]
+        purge_orphaned = retention.orphaned_days > 0 and server_id is None
+        if purge_orphaned:
+            targets.append(
+                (
+                    "deleted channels",
+                    now - timedelta(days=retention.orphaned_days),
+                    retention.get_orphaned_conversations(),
+                )
+            )
+
+        start, total = time.perf_counter(), 0
+        for name, cutoff, conversations in targets:
+            if options["dry_run"]:
+                expired = sum(
+                    retention.count(conversation_id, cutoff)
+                    for conversation_id, _ in conversations
+                )
+                self.stdout.write(
+                    f"{name}: {expired} messages before {self.format(cutoff)}"
+                )
+                continue
+
+            deleted = 0
+            for conversation_id, channel_id in conversations:
+                conversation_deleted = 0
+                for batch in retention.purge_conversation(conversation_id, cutoff):
+                    conversation_deleted += batch
+                    if options["verbosity"] >= 2:
+                        self.write_progress(name, deleted + conversation_deleted, start)
+                if conversation_deleted and channel_id is not None:
+                    retention.clear_cache(channel_id)
+                deleted += conversation_deleted
+            total += deleted
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f"{name}: deleted {deleted} messages before {self.format(cutoff)}"
+                )
+            )
+
+        if options["dry_run"]:
+            return
+        if purge_orphaned:
+            conversations = retention.delete_empty_orphaned_conversations()
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f"Deleted {conversations} conversations of the deleted channels"
+                )
+            )
+        self.write_progress("Total", total, start)
+
+    def write_progress(self, name: str, deleted: int, start: float) -> None:
+        seconds = max(time.perf_counter() - start, 1e-9)
+        self.stdout.write(
+            f"{name}: {deleted} messages deleted, {deleted / seconds:.0f} rows/s"
+        )
+
+    @staticmethod
+    def format(cutoff: datetime) -> str:
+        return cutoff.strftime("%Y-%m-%d %H:%M")
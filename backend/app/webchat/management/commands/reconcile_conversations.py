@@ -0,0 +1,73 @@
+"""
+Django command to repair the message counters of the conversations.
+Counting the messages of the conversations again, in batches.
+"""
+
+import time
+from typing import Any
+
+from django.core.management.base import BaseCommand, CommandError, CommandParser
+from django.db import transaction
+
+from webchat.models import Conversation
+
+
+class Command(BaseCommand):
+    """Django command to repair the message counters of the conversations."""
+
+    help = (
+        "Counts the messages of every conversation and repairs its message "
+        "count and last message when they drifted, after messages were "
+        "deleted outside of the purge or buffered messages were lost. The "
+        "conversations are locked only while their batch is counted, so it "
+        "can run while the chat is used."
+    )
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=500,
+            help="Number of the conversations counted in one transaction.",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Only prints the number of the conversations with drifted counters.",
+        )
+
+    def handle(self, *args: Any, **options: Any) -> str | None:
+        """Entry point for command."""
+        if options["batch_size"] <= 0:
+            raise CommandError("The batch size has to be positive.")
+
+        action = "Drifted" if options["dry_run"] else "Repaired"
+        start, checked, repaired = time.perf_counter(), 0, 0
+        last_id = None
+        while True:
+            conversations = Conversation.objects.order_by("id")
+            if last_id is not None:
+                conversations = conversations.filter(id__gt=last_id)
+            batch = list(
+                conversations.values_list("id", flat=True)[: options["batch_size"]]
+            )
+            if not batch:
+                break
+            with transaction.atomic():
+                repaired_ids = Conversation.objects.reconcile(batch)
+                # the dry run does not store the repaired counters
+                transaction.set_rollback(options["dry_run"])
+            if options["verbosity"] >= 2:
+                for conversation_id in repaired_ids:
+                    self.stdout.write(f"{action} {conversation_id}")
+            checked += len(batch)
+            repaired += len(repaired_ids)
+            last_id = batch[-1]
+
+        seconds = max(time.perf_counter() - start, 1e-9)
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{action} {repaired} of {checked} conversations "
+                f"({checked / seconds:.0f} conversations/s)"
+            )
+        )
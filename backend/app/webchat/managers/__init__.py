@@ -0,0 +1,10 @@
+from webchat.managers.conversation import ConversationManager
+from webchat.managers.message import MessageManager, MessageQuerySet
+from webchat.managers.read_marker import ReadMarkerManager
+
+__all__ = [
+    ConversationManager,
+    MessageManager,
+    MessageQuerySet,
+    ReadMarkerManager,
+]
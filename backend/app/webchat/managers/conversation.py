@@ -0,0 +1,195 @@
+"""
+Custom conversation manager.
+"""
+
+from collections import Counter
+from typing import Iterable
+
+from django.db import connection, models, transaction
+
+# adds the stored messages to the counters of the conversation, the latest
+# message is replaced only by a newer one, as the messages stored in a batch
+# can be older than the ones stored before
+MESSAGE_COUNTERS_SQL = (
+    '"message_count" = "message_count" + %(count)s, '
+    '"last_message_id" = CASE WHEN "last_message_at" IS NULL '
+    'OR "last_message_at" <= %(last_message_at)s '
+    'THEN %(last_message_id)s ELSE "last_message_id" END, '
+    '"last_message_at" = greatest("last_message_at", %(last_message_at)s)'
+)
+
+# recounts the messages of the conversations, only the conversations with
+# different counters are updated and returned
+RECONCILE_SQL = """
+UPDATE "webchat_conversation" SET
+    "message_count" = "counted"."message_count",
+    "last_message_at" = "counted"."last_message_at",
+    "last_message_id" = "counted"."last_message_id"
+FROM (
+    SELECT
+        "conversation"."id",
+        (
+            SELECT count(*) FROM "webchat_message"
+            WHERE "conversation_id" = "conversation"."id"
+        ) AS "message_count",
+        "last"."created" AS "last_message_at",
+        "last"."id" AS "last_message_id"
+    FROM "webchat_conversation" AS "conversation"
+    LEFT JOIN LATERAL (
+        SELECT "created", "id" FROM "webchat_message"
+        WHERE "conversation_id" = "conversation"."id"
+        ORDER BY "created" DESC, "id" DESC
+        LIMIT 1
+    ) AS "last" ON true
+    WHERE "conversation"."id" = ANY(%s)
+) AS "counted"
+WHERE "webchat_conversation"."id" = "counted"."id" AND (
+    "webchat_conversation"."message_count",
+    "webchat_conversation"."last_message_at",
+    "webchat_conversation"."last_message_id"
+) IS DISTINCT FROM (
+    "counted"."message_count", "counted"."last_message_at", "counted"."last_message_id"
+)
+RETURNING "webchat_conversation"."id"
+"""
+
+
+class ConversationManager(models.Manager):
+    """Custom conversation manager."""
+
+    def get_for_channel(self, channel_id) -> tuple | None:
+        """
+        Returns the (id, created) of the conversation of the channel, or None
+        if the channel has no conversation yet. They are read from the unique
+        index of the channel, without visiting the table.
+        """
+        try:
+            return self.values_list("id", "created").get(channel_id=channel_id)
+        except self.model.DoesNotExist:
+            return None
+
+    def get_id_for_channel(self, channel_id):
+        """
+        Returns the id of the conversation of the channel, or None if
+        the channel has no conversation yet.
+        """
+        conversation = self.get_for_channel(channel_id)
+        return conversation[0] if conversation is not None else None
+
+    def get_or_create_id_for_channel(self, channel_id):
+        """
+        Returns the id of the conversation of the channel and creates it with
+        the first message. Concurrent first writers of the same channel are
+        resolved by the unique constraint, the ones losing the race read the
+        conversation created by the winner.
+        """
+        conversation_id = self.get_id_for_channel(channel_id)
+        if conversation_id is None:
+            conversation, _ = self.get_or_create(channel_id=channel_id)
+            conversation_id = conversation.id
+        return conversation_id
+
+    def allocate_seq(self, conversation_id, count: int = 1, last_message=None) -> int:
+        """
+        Reserves the next `count` sequence numbers of the conversation and
+        returns the last one of them. It is a single atomic UPDATE, so
+        concurrent writers always get distinct, increasing numbers. The
+        numbers follow the blocks reserved for the write-behind buffer.
+
+        With last_message the messages are also added to the counters of the
+        conversation, for the messages stored in the same transaction.
+        """
+        params = {"count": count, "conversation_id": conversation_id}
+        assignments = '"last_seq" = greatest("last_seq", "reserved_seq") + %(count)s'
+        if last_message is not None:
+            assignments = f"{assignments}, {MESSAGE_COUNTERS_SQL}"
+            params["last_message_at"] = last_message.created
+            params["last_message_id"] = last_message.id
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'UPDATE "{self.model._meta.db_table}" SET {assignments} '
+                'WHERE "id" = %(conversation_id)s RETURNING "last_seq"',
+                params,
+            )
+            row = cursor.fetchone()
+        if row is None:
+            raise self.model.DoesNotExist(
+                f"Conversation with id: {conversation_id} does not exists."
+            )
+        return row[0]
+
+    def reserve_seq_block(self, conversation_id, count: int) -> int:
+        """
+        Reserves a block of `count` sequence numbers after every number
+        allocated or reserved so far and returns the last one of them. The
+        numbers are handed out by the write-behind buffer, so the last_seq of
+        the conversation is only moved when the messages are stored.
+        """
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'UPDATE "{self.model._meta.db_table}" SET "reserved_seq" = '
+                'greatest("last_seq", "reserved_seq") + %(count)s '
+                'WHERE "id" = %(conversation_id)s RETURNING "reserved_seq"',
+                {"count": count, "conversation_id": conversation_id},
+            )
+            row = cursor.fetchone()
+        if row is None:
+            raise self.model.DoesNotExist(
+                f"Conversation with id: {conversation_id} does not exists."
+            )
+        return row[0]
+
+    def add_messages(self, messages: Iterable) -> None:
+        """
+        Adds the messages stored with bulk_create to the counters of their
+        conversations, with one UPDATE per conversation, and moves their
+        last_seq to the highest stored number. The conversations are
+        updated in the order of their ids, so concurrent writers do not
+        deadlock.
+        """
+        counts = Counter()
+        latest = {}
+        last_seqs = {}
+        for message in messages:
+            counts[message.conversation_id] += 1
+            last = latest.get(message.conversation_id)
+            if last is None or (message.created, message.id) > (last.created, last.id):
+                latest[message.conversation_id] = message
+            last_seqs[message.conversation_id] = max(
+                message.seq, last_seqs.get(message.conversation_id, 0)
+            )
+        with connection.cursor() as cursor:
+            for conversation_id, count in sorted(counts.items()):
+                cursor.execute(
+                    f'UPDATE "{self.model._meta.db_table}" '
+                    f"SET {MESSAGE_COUNTERS_SQL}, "
+                    '"last_seq" = greatest("last_seq", %(last_seq)s) '
+                    'WHERE "id" = %(conversation_id)s',
+                    {
+                        "count": count,
+                        "last_message_at": latest[conversation_id].created,
+                        "last_message_id": latest[conversation_id].id,
+                        "last_seq": last_seqs[conversation_id],
+                        "conversation_id": conversation_id,
+                    },
+                )
+
+    def reconcile(self, conversation_ids: list) -> list:
+        """
+        Counts the messages of the conversations again and repairs their
+        counters, returns the ids of the repaired conversations. The
+        conversations are locked first, so the messages stored while they
+        are counted are added to the repaired counters and are not lost.
+        """
+        with transaction.atomic():
+            conversation_ids = list(
+                self.select_for_update()
+                .filter(id__in=conversation_ids)
+                .order_by("id")
+                .values_list("id", flat=True)
+            )
+            if not conversation_ids:
+                return []
+            with connection.cursor() as cursor:
+                cursor.execute(RECONCILE_SQL, [conversation_ids])
+                return [row[0] for row in cursor.fetchall()]
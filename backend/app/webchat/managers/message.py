@@ -0,0 +1,32 @@
+"""
+Custom message manager.
+"""
+
+from datetime import datetime, timedelta
+
+from django.db import models
+
+# the messages are created by several servers, with a bit skewed clocks,
+# so a message can be a bit older than its conversation
+CLOCK_SKEW = timedelta(days=1)
+
+
+class MessageQuerySet(models.QuerySet):
+    """Custom message queryset."""
+
+    def of_conversation(
+        self, conversation_id, conversation_created: datetime | None = None
+    ) -> "MessageQuerySet":
+        """
+        Returns the messages of the conversation. With the time the conversation
+        was created, the messages are bounded by it, so the partitions of the
+        months before the conversation are pruned from the query.
+        """
+        queryset = self.filter(conversation_id=conversation_id)
+        if conversation_created is not None:
+            queryset = queryset.filter(created__gte=conversation_created - CLOCK_SKEW)
+        return queryset
+
+
+class MessageManager(models.Manager.from_queryset(MessageQuerySet)):
+    """Custom message manager."""
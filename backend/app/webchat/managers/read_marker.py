@@ -0,0 +1,57 @@
+"""
+Custom read marker manager.
+"""
+
+from django.db import connection, models
+
+from utils.identifiers import uuid7
+
+# stores the markers of the (user, conversation) pairs, a marker only moves
+# forward and not past the last allocated sequence number of the conversation,
+# the buffered messages can be read before they are stored. The markers of
+# missing conversations are left out
+MARK_READ_SQL = """
+INSERT INTO "webchat_readmarker"
+    ("id", "created", "modified", "user_id", "conversation_id", "last_read_seq")
+SELECT
+    "marker"."id", now(), now(), "marker"."user_id", "conversation"."id",
+    least(
+        "marker"."seq",
+        greatest("conversation"."last_seq", "conversation"."reserved_seq")
+    )
+FROM unnest(%s::uuid[], %s::uuid[], %s::uuid[], %s::bigint[])
+    AS "marker" ("id", "user_id", "conversation_id", "seq")
+JOIN "webchat_conversation" AS "conversation"
+    ON "conversation"."id" = "marker"."conversation_id"
+ORDER BY "marker"."user_id", "marker"."conversation_id"
+ON CONFLICT ("user_id", "conversation_id") DO UPDATE SET
+    "last_read_seq" = "excluded"."last_read_seq",
+    "modified" = "excluded"."modified"
+WHERE "webchat_readmarker"."last_read_seq" < "excluded"."last_read_seq"
+"""
+
+
+class ReadMarkerManager(models.Manager):
+    """Custom read marker manager."""
+
+    def mark_read(self, markers: dict) -> int:
+        """
+        Stores the last read sequence numbers of the markers, given as
+        {(user_id, conversation_id): seq}, with a single upsert. The rows are
+        locked in the order of the user and conversation, so concurrent
+        writers do not deadlock. Returns the number of the moved markers.
+        """
+        if not markers:
+            return 0
+        keys = sorted(markers)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                MARK_READ_SQL,
+                [
+                    [uuid7() for _ in keys],
+                    [user_id for user_id, _ in keys],
+                    [conversation_id for _, conversation_id in keys],
+                    [markers[key] for key in keys],
+                ],
+            )
+            return cursor.rowcount
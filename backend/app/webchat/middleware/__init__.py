@@ -1,5 +1,10 @@
+from webchat.middleware.cookie_parser import get_cookie
 from webchat.middleware.jwt_auth_middleware import JWTAuthMiddleWare
+from webchat.middleware.token_user_cache import TokenUserCache, get_token_user_cache
 
 __all__ = [
     JWTAuthMiddleWare,
+    TokenUserCache,
+    get_token_user_cache,
+    get_cookie,
 ]
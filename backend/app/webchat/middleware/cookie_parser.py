@@ -0,0 +1,40 @@
+COOKIE_HEADER = b"cookie"
+SEMICOLON = ord(";")
+# the whitespace allowed around the cookie pairs
+WHITESPACE = b" \t"
+
+
+def get_cookie(headers: list[tuple[bytes, bytes]], name: str) -> str | None:
+    """
+    Returns the value of the cookie with the given name from the raw ASGI
+    headers, or None if it is missing or empty.
+
+    The cookie headers are scanned in a single pass for the name of the
+    cookie, without splitting them into all the cookie pairs, only the
+    value of the cookie is copied. The value ends at the next ";", so it can
+    contain "=", and a name found inside the value of another cookie is
+    skipped. If the cookie is sent more than once the first one is returned.
+    """
+    key = name.encode("latin-1") + b"="
+    for header_name, header in headers:
+        # the names of the ASGI headers are lowercased
+        if header_name != COOKIE_HEADER:
+            continue
+        start = header.find(key)
+        while start != -1:
+            # the name has to start a cookie pair,
+            # so only whitespace is allowed between it and the previous ";"
+            position = start
+            while position and header[position - 1] in WHITESPACE:
+                position -= 1
+            if position == 0 or header[position - 1] == SEMICOLON:
+                value_start = start + len(key)
+                value_end = header.find(b";", value_start)
+                if value_end == -1:
+                    value_end = len(header)
+                value = header[value_start:value_end].strip(WHITESPACE)
+                if len(value) > 1 and value[0] == value[-1] == ord('"'):
+                    value = value[1:-1]
+                return value.decode("latin-1") or None
+            start = header.find(key, start + 1)
+    return None
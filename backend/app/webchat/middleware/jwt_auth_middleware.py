@@ -4,28 +4,59 @@ from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.contrib.auth.models import AnonymousUser
 
+from utils.jwt_tokens.revocation import get_revoked_tokens
+from webchat.middleware.cookie_parser import get_cookie
+from webchat.middleware.token_user_cache import get_token_user_cache
+
 User = get_user_model()
 
 
 @database_sync_to_async
-def get_user(scope):
+def get_user_by_id(user_id):
+    try:
+        return User.objects.get(id=user_id)
+    except User.DoesNotExist:
+        return None
+
+
+async def is_revoked(token_payload: dict) -> bool:
+    jti = token_payload.get("jti", None)
+    return jti is not None and await get_revoked_tokens().ais_revoked(jti)
+
+
+async def get_user(scope):
     token = scope["token"]
     if token is None:
         return AnonymousUser()
+    # a reconnecting socket sends the same token again,
+    # its user is then taken from the cache without a query
+    token_user_cache = get_token_user_cache()
+    user = token_user_cache.get(token)
+    if user is not None:
+        # the token was verified before it was cached,
+        # only its jti is read to check if it was revoked since
+        token_payload = jwt.decode(token, options={"verify_signature": False})
+        if await is_revoked(token_payload):
+            return AnonymousUser()
+        return user
     secret_key_jwt = getattr(settings, "SIMPLE_JWT", {}).get(
         "SIGNING_KEY", settings.SECRET_KEY
     )
     try:
         token_payload = jwt.decode(token, secret_key_jwt, algorithms=["HS256"])
-    except jwt.exceptions.DecodeError:
+    except jwt.exceptions.InvalidTokenError:
+        # invalid, expired or malformed token
         return AnonymousUser()
     user_id = token_payload.get("user_id", None)
     if user_id is None:
         return AnonymousUser()
-    try:
-        return User.objects.get(id=user_id)
-    except User.DoesNotExist:
+    if await is_revoked(token_payload):
+        return AnonymousUser()
+    user = await get_user_by_id(user_id)
+    if user is None:
         return AnonymousUser()
+    token_user_cache.set(token, user, token_payload.get("exp", 0))
+    return user
 
 
 # the middlewre wil be called eveytime we try making a new web scoket connection
@@ -35,21 +66,11 @@ class JWTAuthMiddleWare:
         self.app = app
 
     async def __call__(self, scope, receive, send):
-        # grabing scope from header
-        # exctracting cookies from the scope headers
-        headers_dict = dict(scope["headers"])
-        cookies = headers_dict.get(b"cookie", b"").decode("utf-8")
-        cookies_dict = {
-            item.split("=")[0]: item.split("=")[1] for item in cookies.split("; ")
-        }
         access_toke_name = getattr(settings, "SIMPLE_JWT", {}).get(
             "JWT_AUTH_COOKIE_NAME", "access_token"
         )
-        # refresh_token_name = getattr(settings, "SIMPLE_JWT", {}).get("JWT_AUTH_REFRESH_COOKIE_NAME", "refresh_token")
-        access_toke = cookies_dict.get(access_toke_name, None)
-        # refresh_token = cookies_dict.get(refresh_token_name)
-
-        scope["token"] = access_toke
+        # exctracting the access token cookie from the raw scope headers
+        scope["token"] = get_cookie(scope["headers"], access_toke_name)
         scope["user"] = await get_user(scope)
 
         return await self.app(scope, receive, send)
@@ -0,0 +1,85 @@
+"""
+In-process cache of the users authenticated with a token.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth.base_user import AbstractBaseUser
+
+
+class TokenUserCache:
+    """
+    Bounded LRU cache of the users of the access tokens, used by the
+    JWTAuthMiddleWare so a reconnecting socket does not decode its token
+    and read its user again.
+
+    An entry expires after the timeout or when the token expires, whichever
+    comes first, so an expired token is never accepted from the cache.
+    When the cache is full the least recently used entry is evicted.
+    """
+
+    def __init__(self, max_size: int = 1024, timeout: float = 60):
+        self.max_size = max_size
+        self.timeout = timeout
+        self.hits = 0
+        self.misses = 0
+        # token -> (expires at, user), ordered from the least recently used
+        self._entries: OrderedDict[str, tuple[float, AbstractBaseUser]] = OrderedDict()
+        # the cache is shared by the event loop and the threads
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, token: str) -> AbstractBaseUser | None:
+        """Returns the user of the token, or None if it is not cached."""
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is None or entry[0] <= time.time():
+                if entry is not None:
+                    del self._entries[token]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(token)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, token: str, user: AbstractBaseUser, expires_at: float) -> None:
+        """Caches the user of the token, expires_at is the exp claim of the token."""
+        if self.max_size <= 0:
+            return
+        expires_at = min(time.time() + self.timeout, expires_at)
+        with self._lock:
+            self._entries[token] = (expires_at, user)
+            self._entries.move_to_end(token)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        """Removes all the cached users and resets the counters."""
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> dict:
+        """Returns the counters of the cache."""
+        return {"size": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+_token_user_cache: TokenUserCache | None = None
+
+
+def get_token_user_cache() -> TokenUserCache:
+    """Returns the token cache of the process configured with the WEBCHAT settings."""
+    global _token_user_cache
+    if _token_user_cache is None:
+        webchat_settings = getattr(settings, "WEBCHAT", {})
+        _token_user_cache = TokenUserCache(
+            max_size=webchat_settings.get("TOKEN_USER_CACHE_SIZE", 1024),
+            timeout=webchat_settings.get("TOKEN_USER_CACHE_TIMEOUT", 60),
+        )
+    return _token_user_cache
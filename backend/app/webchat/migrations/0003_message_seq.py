@@ -0,0 +1,66 @@
+# Generated by Django 5.0.3 on 2026-10-18 09:02
+
+from django.db import migrations, models
+
+# numbering the existing messages of every conversation in the order
+# they were created and storing the last number on the conversation
+NUMBER_MESSAGES_SQL = """
+UPDATE "webchat_message" AS "message"
+SET "seq" = "numbered"."seq"
+FROM (
+    SELECT
+        "id",
+        ROW_NUMBER() OVER (
+            PARTITION BY "conversation_id" ORDER BY "created", "id"
+        ) AS "seq"
+    FROM "webchat_message"
+) AS "numbered"
+WHERE "message"."id" = "numbered"."id";
+
+UPDATE "webchat_conversation" AS "conversation"
+SET "last_seq" = "last"."seq"
+FROM (
+    SELECT "conversation_id", MAX("seq") AS "seq"
+    FROM "webchat_message"
+    GROUP BY "conversation_id"
+) AS "last"
+WHERE "conversation"."id" = "last"."conversation_id";
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("webchat", "0002_message_created_default"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="conversation",
+            name="last_seq",
+            field=models.PositiveBigIntegerField(
+                default=0, editable=False, verbose_name="last sequence number"
+            ),
+        ),
+        migrations.AddField(
+            model_name="message",
+            name="seq",
+            field=models.PositiveBigIntegerField(
+                editable=False, null=True, verbose_name="sequence number"
+            ),
+        ),
+        migrations.RunSQL(NUMBER_MESSAGES_SQL, reverse_sql=migrations.RunSQL.noop),
+        migrations.AlterField(
+            model_name="message",
+            name="seq",
+            field=models.PositiveBigIntegerField(
+                editable=False, verbose_name="sequence number"
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="message",
+            constraint=models.UniqueConstraint(
+                fields=("conversation", "seq"), name="unique_message_conversation_seq"
+            ),
+        ),
+    ]
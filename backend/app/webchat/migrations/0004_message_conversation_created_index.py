@@ -0,0 +1,25 @@
+# Generated by Django 5.0.3 on 2026-10-18 08:49
+
+from django.conf import settings
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # the index is built without locking the writes to the messages table
+    atomic = False
+
+    dependencies = [
+        ("webchat", "0003_message_seq"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name="message",
+            index=models.Index(
+                fields=["conversation", "created", "id"],
+                name="message_conversation_created",
+            ),
+        ),
+    ]
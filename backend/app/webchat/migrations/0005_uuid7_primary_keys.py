@@ -0,0 +1,36 @@
+# Generated by Django 5.0.3 on 2026-10-18 09:18
+
+import utils.identifiers.time_ordered_uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("webchat", "0004_message_conversation_created_index"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="conversation",
+            name="id",
+            field=models.UUIDField(
+                default=utils.identifiers.time_ordered_uuid.uuid7,
+                editable=False,
+                primary_key=True,
+                serialize=False,
+                verbose_name="id",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="message",
+            name="id",
+            field=models.UUIDField(
+                default=utils.identifiers.time_ordered_uuid.uuid7,
+                editable=False,
+                primary_key=True,
+                serialize=False,
+                verbose_name="id",
+            ),
+        ),
+    ]
@@ -0,0 +1,203 @@
+# Generated by Django 5.0.3 on 2026-10-18 10:02
+
+import django.db.models.deletion
+from django.db import IntegrityError, migrations, models, transaction
+
+# an index build that failed leaves an INVALID index behind,
+# which IF NOT EXISTS would take for the built one
+INDEX_IS_VALID_SQL = """
+SELECT "pg_index"."indisvalid" FROM "pg_index"
+JOIN "pg_class" ON "pg_class"."oid" = "pg_index"."indexrelid"
+WHERE "pg_class"."relname" = %s
+"""
+
+
+def merge_conversations(apps, schema_editor):
+    """
+    Keys every conversation to the channel of its legacy channel id and merges
+    the conversations of the same channel into the oldest one. Each channel is
+    merged in its own short transaction, so the writes to the other channels
+    are not blocked while the migration runs.
+
+    The legacy channel id is cleared only for the conversations keyed to
+    a channel, the ones that match no channel keep it, with the channel
+    set to NULL, until they are reviewed.
+    """
+    connection = schema_editor.connection
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'UPDATE "webchat_conversation" SET "channel_id" = "server_channel"."id", '
+            '"legacy_channel_id" = NULL '
+            'FROM "server_channel" '
+            'WHERE "server_channel"."id"::text = '
+            'lower(trim("webchat_conversation"."legacy_channel_id"))'
+        )
+        cursor.execute(
+            'SELECT "channel_id" FROM "webchat_conversation" '
+            'WHERE "channel_id" IS NOT NULL '
+            'GROUP BY "channel_id" HAVING count(*) > 1'
+        )
+        channel_ids = [row[0] for row in cursor.fetchall()]
+
+    for channel_id in channel_ids:
+        with transaction.atomic(using=connection.alias):
+            with connection.cursor() as cursor:
+                merge_channel_conversations(cursor, channel_id)
+
+
+def merge_channel_conversations(cursor, channel_id) -> None:
+    """
+    Moves the messages of the channel to its oldest conversation and numbers
+    them again by (created, id), then deletes the emptied conversations.
+    """
+    # the new messages of the conversations wait for the merge
+    cursor.execute(
+        'SELECT "id" FROM "webchat_conversation" WHERE "channel_id" = %s '
+        'ORDER BY "created", "id" FOR UPDATE',
+        [channel_id],
+    )
+    keeper_id, *duplicate_ids = [row[0] for row in cursor.fetchall()]
+    conversation_ids = [keeper_id, *duplicate_ids]
+    cursor.execute(
+        'SELECT coalesce(max("seq"), 0) FROM "webchat_message" '
+        'WHERE "conversation_id" = ANY(%s)',
+        [conversation_ids],
+    )
+    (offset,) = cursor.fetchone()
+    # the messages are numbered above every current sequence number first,
+    # so the unique (conversation, seq) is never violated while they move
+    cursor.execute(
+        'WITH "ordered" AS ('
+        ' SELECT "id", row_number() OVER (ORDER BY "created", "id") AS "seq"'
+        ' FROM "webchat_message" WHERE "conversation_id" = ANY(%s)'
+        ") "
+        'UPDATE "webchat_message" SET "conversation_id" = %s, '
+        '"seq" = "ordered"."seq" + %s '
+        'FROM "ordered" WHERE "webchat_message"."id" = "ordered"."id"',
+        [conversation_ids, keeper_id, offset],
+    )
+    cursor.execute(
+        'UPDATE "webchat_message" SET "seq" = "seq" - %s '
+        'WHERE "conversation_id" = %s',
+        [offset, keeper_id],
+    )
+    cursor.execute(
+        'UPDATE "webchat_conversation" SET "last_seq" = ('
+        ' SELECT count(*) FROM "webchat_message" WHERE "conversation_id" = %s'
+        ') WHERE "id" = %s',
+        [keeper_id, keeper_id],
+    )
+    cursor.execute(
+        'DELETE FROM "webchat_conversation" WHERE "id" = ANY(%s)', [duplicate_ids]
+    )
+
+
+def restore_legacy_channel_ids(apps, schema_editor):
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            'UPDATE "webchat_conversation" SET "legacy_channel_id" = "channel_id"::text '
+            'WHERE "legacy_channel_id" IS NULL AND "channel_id" IS NOT NULL'
+        )
+
+
+def create_channel_index(apps, schema_editor):
+    """
+    Builds the unique index of the channel without locking the writes. An
+    invalid index left by a failed build is dropped first, the conversations
+    created for a channel while the index was built are merged and the build
+    is repeated once. The migration fails if the index is still not valid.
+    """
+    connection = schema_editor.connection
+    for attempt in range(2):
+        with connection.cursor() as cursor:
+            cursor.execute(INDEX_IS_VALID_SQL, ["conversation_channel_unique"])
+            row = cursor.fetchone()
+            if row is not None and row[0]:
+                return
+            if row is not None:
+                cursor.execute(
+                    'DROP INDEX CONCURRENTLY IF EXISTS "conversation_channel_unique"'
+                )
+            try:
+                cursor.execute(
+                    'CREATE UNIQUE INDEX CONCURRENTLY "conversation_channel_unique" '
+                    'ON "webchat_conversation" ("channel_id") INCLUDE ("id")'
+                )
+            except IntegrityError:
+                if attempt:
+                    raise
+                merge_conversations(apps, schema_editor)
+    with connection.cursor() as cursor:
+        cursor.execute(INDEX_IS_VALID_SQL, ["conversation_channel_unique"])
+        row = cursor.fetchone()
+    if row is None or not row[0]:
+        raise RuntimeError(
+            'The index "conversation_channel_unique" is not valid, '
+            "run the migration again."
+        )
+
+
+def drop_channel_index(apps, schema_editor):
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            'DROP INDEX CONCURRENTLY IF EXISTS "conversation_channel_unique"'
+        )
+
+
+class Migration(migrations.Migration):
+    # the conversations are merged in a transaction per channel
+    # and the unique index is built without locking the writes
+    atomic = False
+
+    dependencies = [
+        ("server", "0002_uuid7_primary_keys"),
+        ("webchat", "0005_uuid7_primary_keys"),
+    ]
+
+    operations = [
+        migrations.RenameField(
+            model_name="conversation",
+            old_name="channel_id",
+            new_name="legacy_channel_id",
+        ),
+        migrations.AddField(
+            model_name="conversation",
+            name="channel",
+            field=models.ForeignKey(
+                db_index=False,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="conversations",
+                to="server.channel",
+                verbose_name="channel",
+            ),
+        ),
+        # cleared for the conversations keyed to a channel
+        migrations.AlterField(
+            model_name="conversation",
+            name="legacy_channel_id",
+            field=models.CharField(
+                blank=True,
+                editable=False,
+                max_length=255,
+                null=True,
+                verbose_name="legacy channel id",
+            ),
+        ),
+        migrations.RunPython(merge_conversations, restore_legacy_channel_ids),
+        migrations.SeparateDatabaseAndState(
+            database_operations=[
+                migrations.RunPython(create_channel_index, drop_channel_index),
+            ],
+            state_operations=[
+                migrations.AddConstraint(
+                    model_name="conversation",
+                    constraint=models.UniqueConstraint(
+                        fields=("channel",),
+                        include=("id",),
+                        name="conversation_channel_unique",
+                    ),
+                ),
+            ],
+        ),
+    ]
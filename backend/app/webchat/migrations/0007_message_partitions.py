@@ -0,0 +1,161 @@
+# Generated by Django 5.0.3 on 2026-10-18 10:41
+
+from datetime import datetime, timezone
+
+from django.db import migrations, models
+
+# the messages are partitioned by the month they were created in, the primary
+# key and the unique indexes of a partitioned table have to include "created",
+# so the sequence numbers are only indexed, they are unique as they are
+# allocated by the conversation
+CREATE_PARTITIONED_SQL = """
+ALTER TABLE "webchat_message" RENAME TO "webchat_message_unpartitioned";
+ALTER INDEX "webchat_message_pkey" RENAME TO "webchat_message_unpartitioned_pkey";
+ALTER TABLE "webchat_message_unpartitioned"
+    DROP CONSTRAINT "unique_message_conversation_seq";
+DROP INDEX
+    "message_conversation_created",
+    "webchat_message_conversation_id_bca79d99",
+    "webchat_message_sender_id_4ec6d6d2";
+
+CREATE TABLE "webchat_message" (
+    "created" timestamp with time zone NOT NULL,
+    "modified" timestamp with time zone NOT NULL,
+    "id" uuid NOT NULL,
+    "content" text NOT NULL,
+    "conversation_id" uuid NOT NULL,
+    "sender_id" uuid NOT NULL,
+    "seq" bigint NOT NULL CONSTRAINT "webchat_message_seq_check" CHECK ("seq" >= 0),
+    CONSTRAINT "webchat_message_pkey" PRIMARY KEY ("id", "created"),
+    CONSTRAINT "webchat_message_conversation_id_bca79d99_fk_webchat_c"
+        FOREIGN KEY ("conversation_id") REFERENCES "webchat_conversation" ("id")
+        DEFERRABLE INITIALLY DEFERRED,
+    CONSTRAINT "webchat_message_sender_id_4ec6d6d2_fk_users_user_id"
+        FOREIGN KEY ("sender_id") REFERENCES "users_user" ("id")
+        DEFERRABLE INITIALLY DEFERRED
+) PARTITION BY RANGE ("created");
+CREATE INDEX "webchat_message_conversation_id_bca79d99"
+    ON "webchat_message" ("conversation_id");
+CREATE INDEX "webchat_message_sender_id_4ec6d6d2" ON "webchat_message" ("sender_id");
+CREATE INDEX "message_conversation_created"
+    ON "webchat_message" ("conversation_id", "created", "id");
+CREATE INDEX "message_conversation_seq" ON "webchat_message" ("conversation_id", "seq");
+
+-- the messages outside of the created monthly partitions
+CREATE TABLE "webchat_message_default" PARTITION OF "webchat_message" DEFAULT;
+"""
+
+COPY_MESSAGES_SQL = """
+INSERT INTO "webchat_message"
+    ("created", "modified", "id", "content", "conversation_id", "sender_id", "seq")
+SELECT "created", "modified", "id", "content", "conversation_id", "sender_id", "seq"
+FROM "webchat_message_unpartitioned";
+DROP TABLE "webchat_message_unpartitioned";
+"""
+
+CREATE_UNPARTITIONED_SQL = """
+ALTER TABLE "webchat_message" RENAME TO "webchat_message_partitioned";
+ALTER INDEX "webchat_message_pkey" RENAME TO "webchat_message_partitioned_pkey";
+DROP INDEX
+    "message_conversation_created",
+    "message_conversation_seq",
+    "webchat_message_conversation_id_bca79d99",
+    "webchat_message_sender_id_4ec6d6d2";
+
+CREATE TABLE "webchat_message" (
+    "created" timestamp with time zone NOT NULL,
+    "modified" timestamp with time zone NOT NULL,
+    "id" uuid NOT NULL PRIMARY KEY,
+    "content" text NOT NULL,
+    "conversation_id" uuid NOT NULL,
+    "sender_id" uuid NOT NULL,
+    "seq" bigint NOT NULL CONSTRAINT "webchat_message_seq_check" CHECK ("seq" >= 0),
+    CONSTRAINT "webchat_message_conversation_id_bca79d99_fk_webchat_c"
+        FOREIGN KEY ("conversation_id") REFERENCES "webchat_conversation" ("id")
+        DEFERRABLE INITIALLY DEFERRED,
+    CONSTRAINT "webchat_message_sender_id_4ec6d6d2_fk_users_user_id"
+        FOREIGN KEY ("sender_id") REFERENCES "users_user" ("id")
+        DEFERRABLE INITIALLY DEFERRED
+);
+INSERT INTO "webchat_message"
+    ("created", "modified", "id", "content", "conversation_id", "sender_id", "seq")
+SELECT "created", "modified", "id", "content", "conversation_id", "sender_id", "seq"
+FROM "webchat_message_partitioned";
+-- the copied rows are checked now, the indexes can not be created
+-- while the deferred checks of the foreign keys are pending
+SET CONSTRAINTS ALL IMMEDIATE;
+DROP TABLE "webchat_message_partitioned";
+
+CREATE INDEX "webchat_message_conversation_id_bca79d99"
+    ON "webchat_message" ("conversation_id");
+CREATE INDEX "webchat_message_sender_id_4ec6d6d2" ON "webchat_message" ("sender_id");
+CREATE INDEX "message_conversation_created"
+    ON "webchat_message" ("conversation_id", "created", "id");
+ALTER TABLE "webchat_message" ADD CONSTRAINT "unique_message_conversation_seq"
+    UNIQUE ("conversation_id", "seq");
+"""
+
+# number of the months after the current one created with the table
+MONTHS_AHEAD = 3
+
+
+def add_months(month: datetime, months: int) -> datetime:
+    index = month.year * 12 + month.month - 1 + months
+    return month.replace(year=index // 12, month=index % 12 + 1)
+
+
+def create_monthly_partitions(apps, schema_editor):
+    """
+    Creates a partition for every month with messages and the months ahead,
+    before the messages are copied, so only the messages with a future
+    created end up in the default partition.
+    """
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute('SELECT min("created") FROM "webchat_message_unpartitioned"')
+        (first,) = cursor.fetchone()
+        now = datetime.now(timezone.utc)
+        month = min(first or now, now).astimezone(timezone.utc)
+        month = month.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+        last = add_months(
+            now.replace(day=1, hour=0, minute=0, second=0, microsecond=0), MONTHS_AHEAD
+        )
+        while month <= last:
+            next_month = add_months(month, 1)
+            cursor.execute(
+                f'CREATE TABLE "webchat_message_p{month:%Y_%m}" '
+                'PARTITION OF "webchat_message" FOR VALUES '
+                f"FROM ('{month.isoformat()}') TO ('{next_month.isoformat()}')"
+            )
+            month = next_month
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("webchat", "0006_conversation_channel"),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            database_operations=[
+                migrations.RunSQL(CREATE_PARTITIONED_SQL, CREATE_UNPARTITIONED_SQL),
+                migrations.RunPython(
+                    create_monthly_partitions, migrations.RunPython.noop
+                ),
+                migrations.RunSQL(COPY_MESSAGES_SQL, migrations.RunSQL.noop),
+            ],
+            state_operations=[
+                migrations.RemoveConstraint(
+                    model_name="message",
+                    name="unique_message_conversation_seq",
+                ),
+                migrations.AddIndex(
+                    model_name="message",
+                    index=models.Index(
+                        fields=["conversation", "seq"],
+                        name="message_conversation_seq",
+                    ),
+                ),
+            ],
+        ),
+    ]
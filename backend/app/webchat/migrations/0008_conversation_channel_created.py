@@ -0,0 +1,79 @@
+# Generated by Django 5.0.3 on 2026-10-18 10:58
+
+from django.db import migrations, models
+
+# an index build that failed leaves an INVALID index behind,
+# which IF NOT EXISTS would take for the built one
+INDEX_IS_VALID_SQL = """
+SELECT "pg_index"."indisvalid" FROM "pg_index"
+JOIN "pg_class" ON "pg_class"."oid" = "pg_index"."indexrelid"
+WHERE "pg_class"."relname" = %s
+"""
+
+
+def swap_index(include: str):
+    """
+    The new index is built next to the old one and then takes its name,
+    so the channel stays unique the whole time and the writes are not locked.
+    An invalid index left by a failed build is dropped and built again.
+    """
+
+    def swap(apps, schema_editor):
+        with schema_editor.connection.cursor() as cursor:
+            cursor.execute(INDEX_IS_VALID_SQL, ["conversation_channel_unique_new"])
+            row = cursor.fetchone()
+            if row is not None and not row[0]:
+                cursor.execute(
+                    'DROP INDEX CONCURRENTLY "conversation_channel_unique_new"'
+                )
+            cursor.execute(
+                "CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS "
+                '"conversation_channel_unique_new" '
+                f'ON "webchat_conversation" ("channel_id") INCLUDE ({include})'
+            )
+            cursor.execute(INDEX_IS_VALID_SQL, ["conversation_channel_unique_new"])
+            if not cursor.fetchone()[0]:
+                raise RuntimeError(
+                    'The index "conversation_channel_unique_new" is not valid, '
+                    "run the migration again."
+                )
+            cursor.execute(
+                'DROP INDEX CONCURRENTLY IF EXISTS "conversation_channel_unique"'
+            )
+            cursor.execute(
+                'ALTER INDEX "conversation_channel_unique_new" '
+                'RENAME TO "conversation_channel_unique"'
+            )
+
+    return swap
+
+
+class Migration(migrations.Migration):
+    # the indexes are built and dropped without locking the writes
+    atomic = False
+
+    dependencies = [
+        ("webchat", "0007_message_partitions"),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            database_operations=[
+                migrations.RunPython(swap_index('"id", "created"'), swap_index('"id"')),
+            ],
+            state_operations=[
+                migrations.RemoveConstraint(
+                    model_name="conversation",
+                    name="conversation_channel_unique",
+                ),
+                migrations.AddConstraint(
+                    model_name="conversation",
+                    constraint=models.UniqueConstraint(
+                        fields=("channel",),
+                        include=("id", "created"),
+                        name="conversation_channel_unique",
+                    ),
+                ),
+            ],
+        ),
+    ]
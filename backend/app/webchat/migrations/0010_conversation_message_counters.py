@@ -0,0 +1,91 @@
+# Generated by Django 5.0.3 on 2026-10-18 10:00
+
+from django.db import migrations, models, transaction
+
+# the conversations counted in one transaction
+BATCH_SIZE = 500
+
+COUNT_MESSAGES_SQL = """
+UPDATE "webchat_conversation" SET
+    "message_count" = "counted"."message_count",
+    "last_message_at" = "counted"."last_message_at",
+    "last_message_id" = "counted"."last_message_id"
+FROM (
+    SELECT
+        "conversation"."id",
+        (
+            SELECT count(*) FROM "webchat_message"
+            WHERE "conversation_id" = "conversation"."id"
+        ) AS "message_count",
+        "last"."created" AS "last_message_at",
+        "last"."id" AS "last_message_id"
+    FROM "webchat_conversation" AS "conversation"
+    LEFT JOIN LATERAL (
+        SELECT "created", "id" FROM "webchat_message"
+        WHERE "conversation_id" = "conversation"."id"
+        ORDER BY "created" DESC, "id" DESC
+        LIMIT 1
+    ) AS "last" ON true
+    WHERE "conversation"."id" = ANY(%s)
+) AS "counted"
+WHERE "webchat_conversation"."id" = "counted"."id"
+"""
+
+
+def count_messages(apps, schema_editor):
+    """
+    Sets the counters of the existing conversations, each batch of them in its
+    own short transaction, so the writes of the other channels are not blocked
+    while the migration runs. The conversations are locked while they are
+    counted, the messages stored after it are counted by the application.
+    """
+    connection = schema_editor.connection
+    last_id = None
+    while True:
+        with transaction.atomic(using=connection.alias):
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    'SELECT "id" FROM "webchat_conversation" '
+                    'WHERE %s::uuid IS NULL OR "id" > %s::uuid '
+                    'ORDER BY "id" LIMIT %s FOR UPDATE',
+                    [last_id, last_id, BATCH_SIZE],
+                )
+                conversation_ids = [row[0] for row in cursor.fetchall()]
+                if not conversation_ids:
+                    return
+                cursor.execute(COUNT_MESSAGES_SQL, [conversation_ids])
+        last_id = conversation_ids[-1]
+
+
+class Migration(migrations.Migration):
+    # the conversations are counted in a transaction per batch
+    atomic = False
+
+    dependencies = [
+        ("webchat", "0009_message_search_vector"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="conversation",
+            name="last_message_at",
+            field=models.DateTimeField(
+                blank=True, editable=False, null=True, verbose_name="last message at"
+            ),
+        ),
+        migrations.AddField(
+            model_name="conversation",
+            name="last_message_id",
+            field=models.UUIDField(
+                blank=True, editable=False, null=True, verbose_name="last message id"
+            ),
+        ),
+        migrations.AddField(
+            model_name="conversation",
+            name="message_count",
+            field=models.PositiveBigIntegerField(
+                default=0, editable=False, verbose_name="message count"
+            ),
+        ),
+        migrations.RunPython(count_messages, migrations.RunPython.noop),
+    ]
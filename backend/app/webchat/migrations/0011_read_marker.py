@@ -0,0 +1,73 @@
+# Generated by Django 5.0.3 on 2026-10-18 10:04
+
+import django.db.models.deletion
+import utils.identifiers.time_ordered_uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("webchat", "0010_conversation_message_counters"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ReadMarker",
+            fields=[
+                (
+                    "created",
+                    models.DateTimeField(auto_now_add=True, verbose_name="created"),
+                ),
+                (
+                    "modified",
+                    models.DateTimeField(auto_now=True, verbose_name="modified"),
+                ),
+                (
+                    "id",
+                    models.UUIDField(
+                        default=utils.identifiers.time_ordered_uuid.uuid7,
+                        editable=False,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="id",
+                    ),
+                ),
+                (
+                    "last_read_seq",
+                    models.PositiveBigIntegerField(
+                        default=0, verbose_name="last read sequence number"
+                    ),
+                ),
+                (
+                    "conversation",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="read_markers",
+                        to="webchat.conversation",
+                        verbose_name="conversation",
+                    ),
+                ),
+                (
+                    "user",
+                    models.ForeignKey(
+                        db_index=False,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="read_markers",
+                        to=settings.AUTH_USER_MODEL,
+                        verbose_name="user",
+                    ),
+                ),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name="readmarker",
+            constraint=models.UniqueConstraint(
+                fields=("user", "conversation"),
+                include=("last_read_seq",),
+                name="read_marker_user_conversation_unique",
+            ),
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 5.0.3 on 2026-10-18 12:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("webchat", "0011_read_marker"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="conversation",
+            name="reserved_seq",
+            field=models.PositiveBigIntegerField(
+                default=0, editable=False, verbose_name="reserved sequence number"
+            ),
+        ),
+    ]
@@ -1,4 +1,5 @@
 from webchat.models.conversation import Conversation
 from webchat.models.message import Message
+from webchat.models.read_marker import ReadMarker
 
-__all__ = [Conversation, Message]
+__all__ = [Conversation, Message, ReadMarker]
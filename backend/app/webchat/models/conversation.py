@@ -2,15 +2,70 @@ from django.db import models
 from django.utils.translation import gettext_lazy as _
 
 from utils.abstracts import Model
+from webchat.managers import ConversationManager
 
 
 class Conversation(Model):
     """Coversation table representation"""
 
-    channel_id = models.CharField(
-        _("channel_id"),
+    # the conversation is kept with its messages when the channel is deleted
+    channel = models.ForeignKey(
+        "server.Channel",
+        verbose_name=_("channel"),
+        on_delete=models.SET_NULL,
+        null=True,
+        # the unique constraint below is the index of the channel
+        db_index=False,
+        related_name="conversations",
+    )
+    # the channel id of the conversations that matched no channel when they
+    # were keyed to the channels, kept until they are reviewed, see
+    # migrations/0006_conversation_channel.py
+    legacy_channel_id = models.CharField(
+        _("legacy channel id"),
         max_length=255,
+        null=True,
+        blank=True,
+        editable=False,
+    )
+    # the sequence number of the last message in the conversation
+    last_seq = models.PositiveBigIntegerField(
+        _("last sequence number"), default=0, editable=False
+    )
+    # the end of the last block of sequence numbers reserved for the
+    # write-behind buffer, the following numbers are allocated after it
+    reserved_seq = models.PositiveBigIntegerField(
+        _("reserved sequence number"), default=0, editable=False
+    )
+    # counters of the stored messages, updated in the transaction that stores
+    # them, so the channels are listed with their activity without counting
+    # their messages, see webchat.managers.conversation. They are not indexed,
+    # so the update of every message stays a HOT update of the conversation
+    message_count = models.PositiveBigIntegerField(
+        _("message count"), default=0, editable=False
     )
+    last_message_at = models.DateTimeField(
+        _("last message at"), null=True, blank=True, editable=False
+    )
+    # not a foreign key, the primary key of the partitioned messages
+    # is (id, created)
+    last_message_id = models.UUIDField(
+        _("last message id"), null=True, blank=True, editable=False
+    )
+
+    objects = ConversationManager()
+
+    class Meta:
+        constraints = [
+            # one conversation per channel, the id and created are included
+            # in the index, so the conversation of a channel is found with
+            # an index-only scan
+            models.UniqueConstraint(
+                fields=["channel"],
+                include=["id", "created"],
+                name="conversation_channel_unique",
+            ),
+        ]
 
     def __str__(self) -> str:
-        return self.channel_id
+        return str(self.channel_id)
@@ -1,8 +1,13 @@
 from django.conf import settings
-from django.db import models
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVector, SearchVectorField
+from django.db import models, transaction
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 
 from utils.abstracts import Model
+from webchat.managers import MessageManager
+from webchat.models.conversation import Conversation
 
 
 class Message(Model):
@@ -21,3 +26,52 @@ class Message(Model):
         related_name="message_sender",
     )
     content = models.TextField(_("content"), blank=False, null=False)
+    # set when the message is instantiated and not when it is saved, so a
+    # message stored later in a batch keeps the time it was broadcasted with
+    created = models.DateTimeField(_("created"), default=timezone.now, editable=False)
+    # increasing number of the message in its conversation, used to resume
+    # the stream of messages from the last one a client has seen
+    seq = models.PositiveBigIntegerField(_("sequence number"), editable=False)
+    # kept up to date by the database whenever the content changes,
+    # the messages are searched with its GIN index
+    search_vector = models.GeneratedField(
+        expression=SearchVector("content", config="english"),
+        output_field=SearchVectorField(),
+        db_persist=True,
+    )
+
+    objects = MessageManager()
+
+    class Meta:
+        # the table is partitioned by the month of created, see
+        # webchat.partitions, its primary key in the database is (id, created)
+        indexes = [
+            # keyset pagination of the messages of a conversation
+            models.Index(
+                fields=["conversation", "created", "id"],
+                name="message_conversation_created",
+            ),
+            # replaying the messages after a sequence number, it can not be
+            # unique across the partitions, the numbers are unique as they
+            # are allocated by the conversation
+            models.Index(
+                fields=["conversation", "seq"],
+                name="message_conversation_seq",
+            ),
+            # full-text search of the messages
+            GinIndex(fields=["search_vector"], name="message_search_vector"),
+        ]
+
+    def save(self, *args, **kwargs) -> None:
+        # the sequence number is taken from the conversation when the message
+        # is stored for the first time, with the same UPDATE that counts it,
+        # messages stored with bulk_create need to have it allocated before
+        # and are counted with Conversation.objects.add_messages
+        if self.seq is None and self.conversation_id is not None:
+            with transaction.atomic():
+                self.seq = Conversation.objects.allocate_seq(
+                    self.conversation_id, last_message=self
+                )
+                super().save(*args, **kwargs)
+            return
+        super().save(*args, **kwargs)
@@ -0,0 +1,48 @@
+from django.conf import settings
+from django.db import models
+from django.utils.translation import gettext_lazy as _
+
+from utils.abstracts import Model
+from webchat.managers import ReadMarkerManager
+
+
+class ReadMarker(Model):
+    """Read marker table representation"""
+
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        verbose_name=_("user"),
+        on_delete=models.CASCADE,
+        # the unique constraint below is the index of the user
+        db_index=False,
+        related_name="read_markers",
+    )
+    conversation = models.ForeignKey(
+        "Conversation",
+        verbose_name=_("conversation"),
+        on_delete=models.CASCADE,
+        related_name="read_markers",
+    )
+    # the sequence number of the last message read by the user, the messages
+    # after it are unread, so they are counted from the last_seq of the
+    # conversation without reading the messages
+    last_read_seq = models.PositiveBigIntegerField(
+        _("last read sequence number"), default=0
+    )
+
+    objects = ReadMarkerManager()
+
+    class Meta:
+        constraints = [
+            # one marker per user and conversation, the last read sequence
+            # number is included in the index, so the unread counts are
+            # read with an index-only scan
+            models.UniqueConstraint(
+                fields=["user", "conversation"],
+                include=["last_read_seq"],
+                name="read_marker_user_conversation_unique",
+            ),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.user_id} {self.conversation_id}: {self.last_read_seq}"
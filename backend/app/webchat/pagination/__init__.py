@@ -0,0 +1,9 @@
+from webchat.pagination.keyset import KeysetPagination
+from webchat.pagination.message_cursor import MessageCursorPagination
+from webchat.pagination.message_search import MessageSearchPagination
+
+__all__ = [
+    KeysetPagination,
+    MessageCursorPagination,
+    MessageSearchPagination,
+]
@@ -0,0 +1,24 @@
+from rest_framework.pagination import BasePagination
+from rest_framework.request import Request
+
+
+class KeysetPagination(BasePagination):
+    """
+    Base of the keyset paginations, a page is read after the position of its
+    cursor with a range scan of an index. The page size can be given in the
+    request, up to max_page_size.
+    """
+
+    page_size = 50
+    max_page_size = 100
+    page_size_query_param = "page_size"
+
+    def get_page_size(self, request: Request) -> int:
+        """Returns the page size given in the request, capped by max_page_size."""
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if page_size <= 0:
+            return self.page_size
+        return min(page_size, self.max_page_size)
@@ -0,0 +1,152 @@
+import base64
+import uuid
+from datetime import datetime
+
+from django.db.models import Q, QuerySet
+from rest_framework.exceptions import ValidationError
+from rest_framework.request import Request
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from webchat.pagination.keyset import KeysetPagination
+
+
+class MessageCursorPagination(KeysetPagination):
+    """
+    Keyset pagination of the messages on (created, id).
+
+    A page is read with a range scan of the index on
+    (conversation, created, id), so the time of a request stays the same
+    no matter how many messages the conversation has.
+
+    Without a cursor the latest messages are returned, ?before=<cursor>
+    returns the older ones and ?after=<cursor> the newer ones. The messages
+    of a page are always ordered from the oldest to the newest and the links
+    to the previous and the next page are sent in the Link header.
+    """
+
+    before_query_param = "before"
+    after_query_param = "after"
+
+    def is_first_page(self, request: Request) -> bool:
+        """Returns True if the latest messages are requested, without a cursor."""
+        return not (
+            request.query_params.get(self.before_query_param)
+            or request.query_params.get(self.after_query_param)
+        )
+
+    def paginate_queryset(
+        self, queryset: QuerySet, request: Request, view=None
+    ) -> list:
+        self.base_url = request.build_absolute_uri()
+        page_size = self.get_page_size(request)
+        before = self.decode_cursor(request.query_params.get(self.before_query_param))
+        after = self.decode_cursor(request.query_params.get(self.after_query_param))
+
+        if before is not None and after is not None:
+            raise ValidationError(
+                detail="The before and after parameters can not be used together."
+            )
+
+        if after is not None:
+            rows = list(
+                queryset.filter(self.get_after_filter(*after)).order_by(
+                    "created", "id"
+                )[: page_size + 1]
+            )
+            self.page = rows[:page_size]
+            self.has_previous = True
+            self.has_next = len(rows) > page_size
+        else:
+            if before is not None:
+                queryset = queryset.filter(self.get_before_filter(*before))
+            # the latest messages are read from the end of the index
+            # and reversed, so the page is from the oldest to the newest
+            rows = list(queryset.order_by("-created", "-id")[: page_size + 1])
+            self.page = rows[:page_size][::-1]
+            self.has_previous = len(rows) > page_size
+            self.has_next = before is not None
+        if self.page:
+            self.first = (self.page[0].created, self.page[0].id)
+            self.last = (self.page[-1].created, self.page[-1].id)
+        return self.page
+
+    def paginate_cached(self, messages: list[dict], request: Request) -> list[dict]:
+        """
+        Paginates the latest serialized messages of the first page, served
+        from the cache, messages before the first one exist if it is not
+        the first message of the conversation.
+        """
+        self.base_url = request.build_absolute_uri()
+        self.page = messages
+        self.has_previous = messages[0]["seq"] > 1
+        self.has_next = False
+        self.first = (
+            datetime.fromisoformat(messages[0]["created"]),
+            uuid.UUID(messages[0]["id"]),
+        )
+        return self.page
+
+    def get_paginated_response(self, data) -> Response:
+        links = []
+        previous_link = self.get_previous_link()
+        if previous_link:
+            links.append(f'<{previous_link}>; rel="prev"')
+        next_link = self.get_next_link()
+        if next_link:
+            links.append(f'<{next_link}>; rel="next"')
+        headers = {"Link": ", ".join(links)} if links else None
+        return Response(data, headers=headers)
+
+    def get_previous_link(self) -> str | None:
+        """Returns the url of the page with the older messages."""
+        if not self.page or not self.has_previous:
+            return None
+        url = remove_query_param(self.base_url, self.after_query_param)
+        return replace_query_param(
+            url, self.before_query_param, self.encode_cursor(*self.first)
+        )
+
+    def get_next_link(self) -> str | None:
+        """Returns the url of the page with the newer messages."""
+        if not self.page or not self.has_next:
+            return None
+        url = remove_query_param(self.base_url, self.before_query_param)
+        return replace_query_param(
+            url, self.after_query_param, self.encode_cursor(*self.last)
+        )
+
+    @staticmethod
+    def get_before_filter(created: datetime, id: uuid.UUID) -> Q:
+        # created__lte bounds the range scan of the index,
+        # the id is only compared for the messages with the same created
+        return Q(created__lte=created) & (
+            Q(created__lt=created) | Q(created=created, id__lt=id)
+        )
+
+    @staticmethod
+    def get_after_filter(created: datetime, id: uuid.UUID) -> Q:
+        return Q(created__gte=created) & (
+            Q(created__gt=created) | Q(created=created, id__gt=id)
+        )
+
+    @staticmethod
+    def encode_cursor(created: datetime, id: uuid.UUID) -> str:
+        """Returns the opaque cursor pointing to the given message."""
+        position = f"{created.isoformat()} {id}"
+        return base64.urlsafe_b64encode(position.encode()).decode().rstrip("=")
+
+    @staticmethod
+    def decode_cursor(cursor: str | None) -> tuple[datetime, uuid.UUID] | None:
+        """Returns the (created, id) position of the cursor."""
+        if not cursor:
+            return None
+        try:
+            position = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+            created, id = position.decode().split(" ")
+            created, id = datetime.fromisoformat(created), uuid.UUID(id)
+        except ValueError:
+            raise ValidationError(detail="Invalid cursor.")
+        if created.tzinfo is None:
+            raise ValidationError(detail="Invalid cursor.")
+        return created, id
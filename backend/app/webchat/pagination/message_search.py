@@ -0,0 +1,86 @@
+import base64
+import math
+import uuid
+from datetime import datetime
+
+from django.db.models import Q, QuerySet
+from rest_framework.exceptions import ValidationError
+from rest_framework.request import Request
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+from webchat.pagination.keyset import KeysetPagination
+
+
+class MessageSearchPagination(KeysetPagination):
+    """
+    Keyset pagination of the search results on (rank, created, id).
+
+    The best matches are returned first, and the newest ones of the equally
+    ranked messages. ?cursor=<cursor> returns the results after the given one
+    and the link to the next page is sent in the Link header, so a page does
+    not cost more the further it is, like it would with an OFFSET.
+    """
+
+    page_size = 20
+    cursor_query_param = "cursor"
+
+    def paginate_queryset(
+        self, queryset: QuerySet, request: Request, view=None
+    ) -> list:
+        self.base_url = request.build_absolute_uri()
+        page_size = self.get_page_size(request)
+        cursor = self.decode_cursor(request.query_params.get(self.cursor_query_param))
+        if cursor is not None:
+            queryset = queryset.filter(self.get_after_filter(*cursor))
+        rows = list(queryset.order_by("-rank", "-created", "-id")[: page_size + 1])
+        self.page = rows[:page_size]
+        self.has_next = len(rows) > page_size
+        return self.page
+
+    def get_paginated_response(self, data) -> Response:
+        next_link = self.get_next_link()
+        headers = {"Link": f'<{next_link}>; rel="next"'} if next_link else None
+        return Response(data, headers=headers)
+
+    def get_next_link(self) -> str | None:
+        """Returns the url of the page with the next results."""
+        if not self.page or not self.has_next:
+            return None
+        last = self.page[-1]
+        return replace_query_param(
+            self.base_url,
+            self.cursor_query_param,
+            self.encode_cursor(last.rank, last.created, last.id),
+        )
+
+    @staticmethod
+    def get_after_filter(rank: float, created: datetime, id: uuid.UUID) -> Q:
+        return (
+            Q(rank__lt=rank)
+            | Q(rank=rank, created__lt=created)
+            | Q(rank=rank, created=created, id__lt=id)
+        )
+
+    @staticmethod
+    def encode_cursor(rank: float, created: datetime, id: uuid.UUID) -> str:
+        """Returns the opaque cursor pointing to the given result."""
+        # repr keeps every digit of the rank, so it is compared exactly
+        position = f"{rank!r} {created.isoformat()} {id}"
+        return base64.urlsafe_b64encode(position.encode()).decode().rstrip("=")
+
+    @staticmethod
+    def decode_cursor(cursor: str | None) -> tuple[float, datetime, uuid.UUID] | None:
+        """Returns the (rank, created, id) position of the cursor."""
+        if not cursor:
+            return None
+        try:
+            position = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+            rank, created, id = position.decode().split(" ")
+            rank = float(rank)
+            created, id = datetime.fromisoformat(created), uuid.UUID(id)
+        except ValueError:
+            raise ValidationError(detail="Invalid cursor.")
+        if not math.isfinite(rank) or created.tzinfo is None:
+            raise ValidationError(detail="Invalid cursor.")
+        return rank, created, id
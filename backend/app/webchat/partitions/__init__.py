@@ -0,0 +1,11 @@
+from webchat.partitions.message_partitions import (
+    MessagePartitions,
+    add_months,
+    get_month,
+)
+
+__all__ = [
+    MessagePartitions,
+    add_months,
+    get_month,
+]
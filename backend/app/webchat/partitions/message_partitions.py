@@ -0,0 +1,165 @@
+"""
+Monthly range partitions of the messages table.
+"""
+
+import re
+from datetime import datetime
+from datetime import timezone as dt_timezone
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+# the bounds of a partition, as they are returned by pg_get_expr
+BOUNDS_PATTERN = re.compile(r"FROM \('(?P<start>[^']+)'\) TO \('(?P<end>[^']+)'\)")
+
+
+def get_month(value: datetime) -> datetime:
+    """Returns the start of the month of the given time, in UTC."""
+    return value.astimezone(dt_timezone.utc).replace(
+        day=1, hour=0, minute=0, second=0, microsecond=0
+    )
+
+
+def add_months(month: datetime, months: int) -> datetime:
+    """Returns the start of the month the given number of months after."""
+    index = month.year * 12 + month.month - 1 + months
+    return month.replace(year=index // 12, month=index % 12 + 1)
+
+
+class MessagePartitions:
+    """
+    The messages table is partitioned by the month of created, with a default
+    partition for the messages of the months without their own partition.
+
+    The partitions are created ahead of time, so the default partition stays
+    empty, and the old ones are detached from the table, so they are not
+    vacuumed, indexed and scanned with the current messages anymore. A
+    detached partition is a regular table, it can be archived and dropped.
+    """
+
+    def __init__(self, table: str = "webchat_message"):
+        self.table = table
+        self.default = f"{table}_default"
+
+    def get_name(self, month: datetime) -> str:
+        """Returns the name of the partition of the month."""
+        return f"{self.table}_p{get_month(month):%Y_%m}"
+
+    def get_partitions(self) -> list[tuple[str, datetime, datetime]]:
+        """Returns the monthly partitions with their bounds, the oldest first."""
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT c.relname, pg_get_expr(c.relpartbound, c.oid) "
+                "FROM pg_inherits AS i JOIN pg_class AS c ON c.oid = i.inhrelid "
+                "WHERE i.inhparent = %s::regclass",
+                [connection.ops.quote_name(self.table)],
+            )
+            rows = cursor.fetchall()
+        partitions = []
+        for name, bounds in rows:
+            match = BOUNDS_PATTERN.search(bounds)
+            if match is None:
+                continue
+            partitions.append(
+                (
+                    name,
+                    datetime.fromisoformat(match["start"]),
+                    datetime.fromisoformat(match["end"]),
+                )
+            )
+        return sorted(partitions, key=lambda partition: partition[1])
+
+    def get_columns(self) -> list[str]:
+        """Returns the columns of the messages table, without the generated ones."""
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT column_name FROM information_schema.columns "
+                "WHERE table_schema = current_schema() AND table_name = %s "
+                "AND is_generated = 'NEVER' ORDER BY ordinal_position",
+                [self.table],
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+    def get_default_months(self) -> list[datetime]:
+        """Returns the months of the messages stored in the default partition."""
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT DISTINCT date_trunc('month', \"created\", 'UTC') "
+                f"FROM {connection.ops.quote_name(self.default)}"
+            )
+            return sorted(get_month(row[0]) for row in cursor.fetchall())
+
+    def create(self, month: datetime) -> bool:
+        """
+        Creates the partition of the month, returns False if it already exists.
+
+        The partition is created as a standalone table with a CHECK constraint
+        of its bounds and then attached, attaching only takes a SHARE UPDATE
+        EXCLUSIVE lock of the messages table, so the messages can still be
+        read and written. The messages of the month that were stored in the
+        default partition are moved to it.
+        """
+        name = self.get_name(month)
+        if name in {partition[0] for partition in self.get_partitions()}:
+            return False
+
+        start, end = get_month(month), add_months(get_month(month), 1)
+        bounds = f"FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+        range_sql = f"\"created\" >= '{start.isoformat()}' AND \"created\" < '{end.isoformat()}'"
+        quote_name = connection.ops.quote_name
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(
+                f"CREATE TABLE {quote_name(name)} (LIKE {quote_name(self.table)} "
+                "INCLUDING DEFAULTS INCLUDING CONSTRAINTS INCLUDING GENERATED)"
+            )
+            cursor.execute(
+                f"ALTER TABLE {quote_name(name)} ADD CONSTRAINT "
+                f"{quote_name(name + '_bounds')} CHECK ({range_sql})"
+            )
+            # the generated columns are computed again when the rows are inserted
+            columns = ", ".join(quote_name(column) for column in self.get_columns())
+            cursor.execute(
+                f"WITH moved AS (DELETE FROM {quote_name(self.default)} "
+                f"WHERE {range_sql} RETURNING {columns}) "
+                f"INSERT INTO {quote_name(name)} ({columns}) SELECT {columns} FROM moved"
+            )
+            cursor.execute(
+                f"ALTER TABLE {quote_name(self.table)} "
+                f"ATTACH PARTITION {quote_name(name)} FOR VALUES {bounds}"
+            )
+            # the partition bounds are the constraint from now on
+            cursor.execute(
+                f"ALTER TABLE {quote_name(name)} "
+                f"DROP CONSTRAINT {quote_name(name + '_bounds')}"
+            )
+        return True
+
+    def ensure(self, months_ahead: int, now: datetime | None = None) -> list[str]:
+        """
+        Creates the missing partitions of the current month, the given number
+        of months ahead and the months with messages in the default partition.
+        Returns the names of the created partitions.
+        """
+        current = get_month(now or timezone.now())
+        months = {add_months(current, offset) for offset in range(months_ahead + 1)}
+        months.update(self.get_default_months())
+        return [self.get_name(month) for month in sorted(months) if self.create(month)]
+
+    def get_expired(self, retain_months: int, now: datetime | None = None) -> list[str]:
+        """
+        Returns the names of the partitions older than the given number of
+        full months before the current one.
+        """
+        cutoff = add_months(get_month(now or timezone.now()), -retain_months)
+        return [name for name, _, end in self.get_partitions() if end <= cutoff]
+
+    def detach(self, name: str, drop: bool = False) -> None:
+        """Detaches the partition from the messages table, and drops it."""
+        quote_name = connection.ops.quote_name
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(
+                f"ALTER TABLE {quote_name(self.table)} "
+                f"DETACH PARTITION {quote_name(name)}"
+            )
+            if drop:
+                cursor.execute(f"DROP TABLE {quote_name(name)}")
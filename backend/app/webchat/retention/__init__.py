@@ -0,0 +1,5 @@
+from webchat.retention.message_retention import MessageRetention
+
+__all__ = [
+    MessageRetention,
+]
@@ -0,0 +1,173 @@
+"""
+Retention of the messages, deleting the messages older than the retention
+period of their server.
+"""
+
+import logging
+import time
+from datetime import datetime, timedelta
+from typing import Iterator
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+from server.models import Server
+from webchat.cache import clear_recent_messages
+from webchat.models import Conversation, Message
+
+logger = logging.getLogger(__name__)
+
+# one batch of the oldest messages of the conversation, found with the index
+# of (conversation, created, id), the created bound prunes the partitions
+# of the newer months from both of the scans. The deleted messages are
+# subtracted from the counters of the conversation in the same statement,
+# if the latest message is deleted the latest retained one takes its place,
+# the statement does not see its own deletes, so they are left out of it
+DELETE_BATCH_SQL = """
+WITH "deleted" AS (
+    DELETE FROM "webchat_message"
+    WHERE "created" < %(cutoff)s AND ("id", "created") IN (
+        SELECT "id", "created" FROM "webchat_message"
+        WHERE "conversation_id" = %(conversation_id)s AND "created" < %(cutoff)s
+        ORDER BY "created"
+        LIMIT %(batch_size)s
+    )
+    RETURNING "id"
+)
+UPDATE "webchat_conversation" SET
+    "message_count" = greatest(
+        "message_count" - (SELECT count(*) FROM "deleted"), 0
+    ),
+    "last_message_at" = CASE WHEN "last_message_id" IN (SELECT "id" FROM "deleted")
+        THEN "latest"."created" ELSE "last_message_at" END,
+    "last_message_id" = CASE WHEN "last_message_id" IN (SELECT "id" FROM "deleted")
+        THEN "latest"."id" ELSE "last_message_id" END
+FROM (SELECT 1) AS "one"
+LEFT JOIN LATERAL (
+    SELECT "created", "id" FROM "webchat_message"
+    WHERE "conversation_id" = %(conversation_id)s
+        AND "id" NOT IN (SELECT "id" FROM "deleted")
+    ORDER BY "created" DESC, "id" DESC
+    LIMIT 1
+) AS "latest" ON true
+WHERE "webchat_conversation"."id" = %(conversation_id)s
+RETURNING (SELECT count(*) FROM "deleted")
+"""
+
+
+class MessageRetention:
+    """
+    Deletes the messages older than the retention period of their server.
+
+    The messages are deleted in batches of batch_size rows with a short
+    transaction each, with a pause of sleep seconds between them. Only the
+    deleted rows and their conversation are locked and nothing is loaded
+    to python, so the purge can run while the messages are written and read,
+    the pause leaves room for the chat traffic, the vacuum and the replicas.
+    """
+
+    def __init__(
+        self,
+        batch_size: int | None = None,
+        sleep: float | None = None,
+        orphaned_days: int | None = None,
+    ) -> None:
+        webchat_settings = getattr(settings, "WEBCHAT", {})
+        self.batch_size = batch_size or webchat_settings.get(
+            "MESSAGE_PURGE_BATCH_SIZE", 1000
+        )
+        self.sleep = (
+            sleep
+            if sleep is not None
+            else webchat_settings.get("MESSAGE_PURGE_SLEEP", 0.1)
+        )
+        # the conversations of the deleted channels have no server, they are
+        # kept when it is not set
+        self.orphaned_days = (
+            orphaned_days
+            if orphaned_days is not None
+            else webchat_settings.get("ORPHANED_MESSAGE_RETENTION_DAYS", 0)
+        )
+
+    def get_policies(self, now: datetime | None = None) -> list[tuple]:
+        """
+        Returns the (server id, server name, cutoff) of the servers with
+        a retention period, the messages created before the cutoff expired.
+        """
+        now = now or timezone.now()
+        return [
+            (server_id, name, now - timedelta(days=days))
+            for server_id, name, days in Server.objects.filter(
+                message_retention_days__isnull=False
+            )
+            .order_by("name")
+            .values_list("id", "name", "message_retention_days")
+        ]
+
+    def get_conversations(self, server_id) -> list[tuple]:
+        """Returns the (id, channel id) of the conversations of the server."""
+        return list(
+            Conversation.objects.filter(channel__server=server_id)
+            .order_by("id")
+            .values_list("id", "channel_id")
+        )
+
+    def get_orphaned_conversations(self) -> list[tuple]:
+        """
+        Returns the (id, None) of the conversations of the deleted channels,
+        the ones with a legacy channel id are kept until they are reviewed.
+        """
+        return list(
+            Conversation.objects.filter(
+                channel__isnull=True, legacy_channel_id__isnull=True
+            )
+            .order_by("id")
+            .values_list("id", "channel_id")
+        )
+
+    def count(self, conversation_id, cutoff: datetime) -> int:
+        """Returns the number of the expired messages of the conversation."""
+        return Message.objects.filter(
+            conversation_id=conversation_id, created__lt=cutoff
+        ).count()
+
+    def purge_conversation(self, conversation_id, cutoff: datetime) -> Iterator[int]:
+        """
+        Deletes the messages of the conversation created before the cutoff,
+        yields the number of the deleted messages of every batch.
+        """
+        while True:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    DELETE_BATCH_SQL,
+                    {
+                        "conversation_id": conversation_id,
+                        "cutoff": cutoff,
+                        "batch_size": self.batch_size,
+                    },
+                )
+                row = cursor.fetchone()
+            deleted = row[0] if row is not None else 0
+            yield deleted
+            if deleted < self.batch_size:
+                return
+            if self.sleep:
+                time.sleep(self.sleep)
+
+    def delete_empty_orphaned_conversations(self) -> int:
+        """Deletes the conversations of the deleted channels without messages."""
+        _, deleted = (
+            Conversation.objects.filter(
+                channel__isnull=True, legacy_channel_id__isnull=True
+            )
+            .filter(~Exists(Message.objects.filter(conversation=OuterRef("pk"))))
+            .delete()
+        )
+        return deleted.get(Conversation._meta.label, 0)
+
+    @staticmethod
+    def clear_cache(channel_id) -> None:
+        """The cached latest messages of the channel can be expired."""
+        clear_recent_messages([channel_id])
@@ -1,5 +1,13 @@
-from webchat.schema.message_schema import message_list_docs
+from webchat.schema.message_schema import (
+    message_export_docs,
+    message_list_docs,
+    message_search_docs,
+    message_unread_docs,
+)
 
 __all__ = [
+    message_export_docs,
     message_list_docs,
+    message_search_docs,
+    message_unread_docs,
 ]
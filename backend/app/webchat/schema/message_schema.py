@@ -1,6 +1,10 @@
 from drf_spectacular.utils import OpenApiParameter, OpenApiTypes, extend_schema
 
-from webchat.serializers import MessageSerializer
+from webchat.serializers import (
+    MessageSearchSerializer,
+    MessageSerializer,
+    UnreadCountSerializer,
+)
 
 message_list_docs = extend_schema(
     responses=MessageSerializer(many=True),
@@ -12,5 +16,96 @@ message_list_docs = extend_schema(
             description="ID of the channel, used to filter the messages.",
             required=True,
         ),
+        OpenApiParameter(
+            name="before",
+            location=OpenApiParameter.QUERY,
+            type=OpenApiTypes.STR,
+            description="Cursor from the Link header, returns the older messages.",
+            required=False,
+        ),
+        OpenApiParameter(
+            name="after",
+            location=OpenApiParameter.QUERY,
+            type=OpenApiTypes.STR,
+            description="Cursor from the Link header, returns the newer messages.",
+            required=False,
+        ),
+        OpenApiParameter(
+            name="page_size",
+            location=OpenApiParameter.QUERY,
+            type=OpenApiTypes.INT,
+            description="Number of messages in the page, 50 by default and at most 100.",
+            required=False,
+        ),
+    ],
+)
+
+message_search_docs = extend_schema(
+    responses=MessageSearchSerializer(many=True),
+    parameters=[
+        OpenApiParameter(
+            name="q",
+            location=OpenApiParameter.QUERY,
+            type=OpenApiTypes.STR,
+            description=(
+                "Searched text, with the web search syntax: "
+                '"quoted phrase", or, -excluded.'
+            ),
+            required=True,
+        ),
+        OpenApiParameter(
+            name="by_serverId",
+            location=OpenApiParameter.QUERY,
+            type=OpenApiTypes.UUID,
+            description="ID of the server, searches only its channels.",
+            required=False,
+        ),
+        OpenApiParameter(
+            name="by_channelId",
+            location=OpenApiParameter.QUERY,
+            type=OpenApiTypes.UUID,
+            description="ID of the channel, searches only its messages.",
+            required=False,
+        ),
+        OpenApiParameter(
+            name="cursor",
+            location=OpenApiParameter.QUERY,
+            type=OpenApiTypes.STR,
+            description="Cursor from the Link header, returns the next results.",
+            required=False,
+        ),
+        OpenApiParameter(
+            name="page_size",
+            location=OpenApiParameter.QUERY,
+            type=OpenApiTypes.INT,
+            description="Number of results in the page, 20 by default and at most 100.",
+            required=False,
+        ),
+    ],
+)
+
+message_export_docs = extend_schema(
+    responses={(200, "application/gzip"): OpenApiTypes.BINARY},
+    parameters=[
+        OpenApiParameter(
+            name="by_channelId",
+            location=OpenApiParameter.QUERY,
+            type=OpenApiTypes.UUID,
+            description="ID of the exported channel.",
+            required=True,
+        ),
+    ],
+)
+
+message_unread_docs = extend_schema(
+    responses=UnreadCountSerializer(many=True),
+    parameters=[
+        OpenApiParameter(
+            name="by_serverId",
+            location=OpenApiParameter.QUERY,
+            type=OpenApiTypes.UUID,
+            description="Returns only the channels of the server.",
+            required=False,
+        ),
     ],
 )
@@ -1,5 +1,11 @@
-from webchat.serializers.message_serializer import MessageSerializer
+from webchat.serializers.message_serializer import (
+    MessageSearchSerializer,
+    MessageSerializer,
+    UnreadCountSerializer,
+)
 
 __all__ = [
+    MessageSearchSerializer,
     MessageSerializer,
+    UnreadCountSerializer,
 ]
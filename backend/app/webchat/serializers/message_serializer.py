@@ -11,8 +11,25 @@ class MessageSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Message
-        fields = "__all__"
+        exclude = ["search_vector"]
 
     def get_sender(self, obj: Message) -> str:
         """Custom method to return the sender's full name"""
         return obj.sender.get_full_name
+
+
+class MessageSearchSerializer(MessageSerializer):
+    """Message found by the search, with its channel and rank"""
+
+    channel = serializers.UUIDField(source="channel_id", read_only=True)
+    rank = serializers.FloatField(read_only=True)
+
+
+class UnreadCountSerializer(serializers.Serializer):
+    """Number of the unread messages of a channel"""
+
+    server = serializers.UUIDField(source="server_id")
+    channel = serializers.UUIDField(source="id")
+    last_seq = serializers.IntegerField()
+    last_read_seq = serializers.IntegerField()
+    unread = serializers.IntegerField()
@@ -0,0 +1,11 @@
+from webchat.signals.message_signals import (
+    clear_channel_recent_messages,
+    clear_conversation_recent_messages,
+    clear_sender_recent_messages,
+)
+
+__all__ = [
+    clear_channel_recent_messages,
+    clear_conversation_recent_messages,
+    clear_sender_recent_messages,
+]
@@ -0,0 +1,42 @@
+from functools import partial
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_delete, pre_delete
+from django.dispatch import receiver
+
+from server.models import Channel
+from webchat.cache import clear_recent_messages
+from webchat.models import Conversation, Message
+
+# the messages are deleted by the cascades of their sender, conversation and
+# channel without signals of their own, so the cached recent messages of the
+# channels are cleared by the signals of the deleted parent
+
+
+@receiver(pre_delete, sender=settings.AUTH_USER_MODEL)
+def clear_sender_recent_messages(sender, instance, **kwargs):
+    """
+    When a user gets deleted, the cached messages of the channels the user
+    wrote in are removed, after the transaction is committed.
+    """
+    channel_ids = set(
+        Message.objects.filter(sender=instance.pk, conversation__channel__isnull=False)
+        .values_list("conversation__channel_id", flat=True)
+        .distinct()
+    )
+    if channel_ids:
+        transaction.on_commit(partial(clear_recent_messages, channel_ids))
+
+
+@receiver(post_delete, sender=Conversation)
+def clear_conversation_recent_messages(sender, instance, **kwargs):
+    """When a conversation gets deleted, the cache of its channel is removed."""
+    if instance.channel_id is not None:
+        transaction.on_commit(partial(clear_recent_messages, [instance.channel_id]))
+
+
+@receiver(post_delete, sender=Channel)
+def clear_channel_recent_messages(sender, instance, **kwargs):
+    """When a channel gets deleted, its cached messages are removed too."""
+    transaction.on_commit(partial(clear_recent_messages, [instance.pk]))
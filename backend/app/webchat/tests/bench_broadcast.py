@@ -0,0 +1,70 @@
+import json
+import time
+from unittest.mock import AsyncMock
+
+from asgiref.sync import async_to_sync
+from django.test import SimpleTestCase
+
+from utils.tests.benchmark import BaseBenchmark
+from webchat.consumers import WebChatConsumer
+
+
+class BroadcastBenchmark(SimpleTestCase, BaseBenchmark):
+    """
+    CPU time spent by the recipients of a single chat.message broadcast,
+    when every consumer encodes the event itself compared to sending
+    the text that was encoded once by the sender.
+    """
+
+    group_sizes = (10, 100, 1000, 2000)
+
+    def get_event(self) -> dict:
+        return {
+            "type": "chat.message",
+            "new_message": {
+                "id": "0190b6a4-9e0e-7a3c-8b1e-5d7f9a2c4e61",
+                "sender": "Regularuser_Active_Fn Regularuser_Active_Ln",
+                "content": "Hello everyone! " * 20,
+                "created": "2024-04-22T16:39:00.000000+00:00",
+            },
+        }
+
+    def get_consumers(self, size: int) -> list[WebChatConsumer]:
+        consumers = [WebChatConsumer() for _ in range(size)]
+        for consumer in consumers:
+            # the socket itself is not part of the measurement
+            consumer.base_send = AsyncMock()
+        return consumers
+
+    async def encode_per_recipient(self, consumers: list[WebChatConsumer]) -> None:
+        event = self.get_event()
+        for consumer in consumers:
+            await consumer.send_json(event)
+
+    async def encode_once(self, consumers: list[WebChatConsumer]) -> None:
+        event = {"type": "chat.message", "text": json.dumps(self.get_event())}
+        for consumer in consumers:
+            await consumer.chat_message(event)
+
+    def cpu_ms(self, broadcast, consumers: list[WebChatConsumer], rounds: int) -> float:
+        start = time.process_time()
+        for _ in range(rounds):
+            async_to_sync(broadcast)(consumers)
+        return (time.process_time() - start) / rounds * 1000
+
+    def test_cpu_per_broadcast(self):
+        rounds = self.bench_size("rounds", 20)
+        rows = []
+        for size in self.group_sizes:
+            consumers = self.get_consumers(size)
+            per_recipient = self.cpu_ms(self.encode_per_recipient, consumers, rounds)
+            once = self.cpu_ms(self.encode_once, consumers, rounds)
+            rows.append(
+                {
+                    "recipients": size,
+                    "per recipient ms": per_recipient,
+                    "encoded once ms": once,
+                    "speedup": per_recipient / once,
+                }
+            )
+        self.report("CPU per chat.message broadcast", rows)
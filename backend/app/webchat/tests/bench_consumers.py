@@ -0,0 +1,167 @@
+import asyncio
+import sys
+import threading
+import time
+from unittest.mock import MagicMock
+
+from asgiref.sync import async_to_sync
+from channels.generic.websocket import JsonWebsocketConsumer
+from channels.routing import URLRouter
+from django.test import SimpleTestCase
+from django.urls import path
+
+from server.models import Category, Channel, Server
+from utils.tests.base import BaseTestUser
+from utils.tests.benchmark import BaseBenchmark, percentile
+from webchat.consumers import WebChatConsumer
+from webchat.models import Conversation, Message
+
+# https://github.com/django/channels/issues/1942
+sys.modules["channels.testing.live"] = MagicMock()
+
+from channels.testing import WebsocketCommunicator  # noqa E402
+
+
+class SyncWebChatConsumer(JsonWebsocketConsumer):
+    """the previous synchronous consumer, kept here as the baseline"""
+
+    def connect(self):
+        self.user = self.scope["user"]
+        self.accept()
+        self.channel_id = self.scope["url_route"]["kwargs"]["channel_id"]
+        server = Server.objects.get(id=self.scope["url_route"]["kwargs"]["server_id"])
+        self.is_member = server.member.filter(id=self.user.id).exists()
+        async_to_sync(self.channel_layer.group_add)(self.channel_id, self.channel_name)
+
+    def receive_json(self, content=None, bytes_data=None):
+        if not self.is_member:
+            return
+        obj, _ = Conversation.objects.get_or_create(channel_id=self.channel_id)
+        new_message = Message.objects.create(
+            conversation=obj, sender=self.user, content=content["message"]
+        )
+        async_to_sync(self.channel_layer.group_send)(
+            self.channel_id,
+            {
+                "type": "chat.message",
+                "new_message": {
+                    "id": str(new_message.id),
+                    "sender": new_message.sender.get_full_name,
+                    "content": new_message.content,
+                    "created": new_message.created.isoformat(),
+                },
+            },
+        )
+
+    def chat_message(self, event):
+        self.send_json(event)
+
+    def disconnect(self, close_code):
+        async_to_sync(self.channel_layer.group_discard)(
+            self.channel_id, self.channel_name
+        )
+
+
+class ScopeUserMiddleware:
+    """sets the user in the scope, so the benchmark does not measure the JWT auth"""
+
+    def __init__(self, app, user):
+        self.app = app
+        self.user = user
+
+    async def __call__(self, scope, receive, send):
+        scope["user"] = self.user
+        return await self.app(scope, receive, send)
+
+
+class WebChatConsumerBenchmark(SimpleTestCase, BaseTestUser, BaseBenchmark):
+    """
+    Compares the sync and the async consumer: how fast the sockets of
+    a single worker can be connected and the fan-out latency of a message
+    sent to all of them.
+    """
+
+    databases = "__all__"
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = cls().get_test_active_regularuser()
+        cls.category = Category.objects.create(name="Bench Category")
+        cls.server = Server.objects.create(
+            name="Bench server", owner=cls.user, category=cls.category
+        )
+        cls.server.member.add(cls.user)
+
+    @classmethod
+    def tearDownClass(cls):
+        Conversation.objects.filter(channel__server=cls.server).delete()
+        cls.server.delete()
+        cls.category.delete()
+        super().tearDownClass()
+
+    async def run_consumer(self, consumer_class, sockets: int, rounds: int) -> dict:
+        channel = await Channel.objects.acreate(
+            name=f"bench_{consumer_class.__name__}",
+            owner=self.user,
+            topic="bench_topic",
+            server=self.server,
+        )
+        channel_id = str(channel.id)
+        application = ScopeUserMiddleware(
+            URLRouter(
+                [path("ws/<str:server_id>/<str:channel_id>/", consumer_class.as_asgi())]
+            ),
+            self.user,
+        )
+        communicators = [
+            WebsocketCommunicator(application, f"/ws/{self.server.id}/{channel_id}/")
+            for _ in range(sockets)
+        ]
+
+        # the redis connection pool of the channel layer is bounded,
+        # so the sockets are connected and disconnected in limited batches
+        limit = asyncio.Semaphore(50)
+
+        async def bounded(coroutine):
+            async with limit:
+                return await coroutine
+
+        with self.timer() as connect_time:
+            await asyncio.gather(
+                *(bounded(c.connect(timeout=60)) for c in communicators)
+            )
+        threads = threading.active_count()
+
+        async def receive_at(communicator) -> float:
+            await communicator.receive_json_from(timeout=60)
+            return time.perf_counter()
+
+        latencies = []
+        # the first round warms up the connections and is not measured
+        for index in range(rounds + 1):
+            sent = time.perf_counter()
+            await communicators[0].send_json_to({"message": f"bench {index}"})
+            arrivals = await asyncio.gather(*(receive_at(c) for c in communicators))
+            if index:
+                latencies.extend(arrival - sent for arrival in arrivals)
+
+        await asyncio.gather(*(bounded(c.disconnect()) for c in communicators))
+
+        return {
+            "consumer": consumer_class.__name__,
+            "sockets": sockets,
+            "sockets/s": sockets / connect_time["seconds"],
+            "threads": threads,
+            "p50 ms": percentile(latencies, 50) * 1000,
+            "p99 ms": percentile(latencies, 99) * 1000,
+        }
+
+    def test_sockets_and_fan_out_latency(self):
+        sockets = self.bench_size("sockets", 200)
+        rounds = self.bench_size("rounds", 10)
+        rows = [
+            async_to_sync(self.run_consumer)(consumer_class, sockets, rounds)
+            for consumer_class in (SyncWebChatConsumer, WebChatConsumer)
+        ]
+        self.report("WebChatConsumer sync vs async", rows)
@@ -0,0 +1,151 @@
+import random
+import string
+import tracemalloc
+from datetime import datetime, timedelta, timezone
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import SimpleTestCase
+
+from utils.identifiers import uuid7
+from utils.tests.benchmark import BaseBenchmark
+from webchat.exports import MessageExport
+from webchat.models import Conversation, Message
+from webchat.partitions import MessagePartitions
+from webchat.serializers import MessageSerializer
+
+User = get_user_model()
+
+
+class NullFile:
+    """counts the written bytes, so only the export is measured"""
+
+    def __init__(self) -> None:
+        self.size = 0
+
+    def write(self, data: bytes) -> None:
+        self.size += len(data)
+
+
+class MessageExportBenchmark(SimpleTestCase, BaseBenchmark):
+    """
+    Throughput and peak memory of the streaming gzip JSON Lines export of
+    channels of growing size, compared with serializing the whole channel
+    like the messages list did for the exports before.
+
+    Run with BENCH_EXPORT_MESSAGES=2000000 for a bigger channel.
+    """
+
+    databases = "__all__"
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        benchmark = cls()
+        generator = random.Random(13)
+        cls.user = User.objects.create_user(
+            email="bench_export@test.com", password="bench_pass"
+        )
+        cls.rows = benchmark.bench_size("export_messages", 200_000)
+        cls.conversations = {}
+        MessagePartitions().ensure(1)
+        fields = MessagePartitions().get_columns()
+        columns = ", ".join(f'"{column}"' for column in fields)
+        start = datetime.now(timezone.utc) - timedelta(days=20)
+        words = [
+            "".join(generator.choices(string.ascii_lowercase, k=6)) for _ in range(2000)
+        ]
+        # every channel has a tenth of the messages of the next one
+        for size in (cls.rows // 100, cls.rows // 10, cls.rows):
+            conversation = Conversation.objects.create()
+            cls.conversations[size] = conversation
+            with connection.cursor() as cursor:
+                copy_sql = f'COPY "webchat_message" ({columns}) FROM STDIN'
+                with cursor.copy(copy_sql) as copy:
+                    for index in range(size):
+                        created = start + timedelta(milliseconds=index)
+                        values = {
+                            "created": created,
+                            "modified": created,
+                            "id": uuid7(),
+                            "content": " ".join(
+                                generator.choices(words, k=generator.randint(3, 30))
+                            ),
+                            "conversation_id": conversation.pk,
+                            "sender_id": cls.user.pk,
+                            "seq": index + 1,
+                        }
+                        copy.write_row([values[column] for column in fields])
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE "webchat_message"')
+
+    @classmethod
+    def tearDownClass(cls):
+        Message.objects.filter(sender=cls.user).delete()
+        Conversation.objects.filter(
+            pk__in=[conversation.pk for conversation in cls.conversations.values()]
+        ).delete()
+        cls.user.delete()
+        super().tearDownClass()
+
+    def measure(self, run) -> tuple[float, float]:
+        """
+        returns the seconds of the run and the peak MB of its allocations,
+        measured with a second run, as tracing slows the allocations down
+        """
+        with self.timer() as run_time:
+            run()
+        tracemalloc.start()
+        try:
+            run()
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        return run_time["seconds"], peak / 2**20
+
+    def test_export_throughput(self):
+        rows = []
+        for size, conversation in self.conversations.items():
+            messages = Message.objects.of_conversation(conversation.pk)
+            export = MessageExport(messages)
+            output = NullFile()
+
+            def stream():
+                output.size = 0
+                export.write(output)
+
+            seconds, peak = self.measure(stream)
+            rows.append(
+                {
+                    "export": "stream",
+                    "messages": export.rows,
+                    "MB": export.raw_bytes / 2**20,
+                    "gzip MB": output.size / 2**20,
+                    "MB/s": export.raw_bytes / 2**20 / seconds,
+                    "messages/s": export.rows / seconds,
+                    "peak MB": peak,
+                }
+            )
+            # the whole channel serialized at once, only for the smaller ones
+            if size > self.bench_size("export_serialized_max", 20_000):
+                continue
+            serialized = {}
+
+            def serialize():
+                serialized["data"] = MessageSerializer(
+                    messages.select_related("sender").order_by("seq"), many=True
+                ).data
+
+            seconds, peak = self.measure(serialize)
+            rows.append(
+                {
+                    "export": "serializer",
+                    "messages": len(serialized["data"]),
+                    "MB": 0.0,
+                    "gzip MB": 0.0,
+                    "MB/s": 0.0,
+                    "messages/s": len(serialized["data"]) / seconds,
+                    "peak MB": peak,
+                }
+            )
+        self.report("Streaming message export", rows)
@@ -0,0 +1,156 @@
+import asyncio
+import sys
+from unittest.mock import MagicMock, patch
+
+from asgiref.sync import async_to_sync
+from channels.generic.websocket import AsyncWebsocketConsumer
+from django.contrib.auth import get_user_model
+from django.test import SimpleTestCase
+from rest_framework_simplejwt.tokens import AccessToken
+
+from utils.tests.benchmark import BaseBenchmark
+from webchat.middleware import JWTAuthMiddleWare, get_cookie, get_token_user_cache
+
+# https://github.com/django/channels/issues/1942
+sys.modules["channels.testing.live"] = MagicMock()
+
+from channels.testing import WebsocketCommunicator  # noqa E402
+
+User = get_user_model()
+
+
+class AcceptConsumer(AsyncWebsocketConsumer):
+    """accepts every socket, so only the handshake is measured"""
+
+    async def connect(self):
+        await self.accept()
+
+
+class JWTAuthMiddleWareBenchmark(SimpleTestCase, BaseBenchmark):
+    """
+    Handshake throughput of the JWTAuthMiddleWare with a cold cache,
+    like after a deploy, and with a warm one, like a reconnect.
+    """
+
+    databases = "__all__"
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.users = [
+            User.objects.create_user(
+                email=f"bench_middleware_{index}@test.com", password="bench_pass"
+            )
+            for index in range(cls().bench_size("users", 50))
+        ]
+
+    @classmethod
+    def tearDownClass(cls):
+        User.objects.filter(email__startswith="bench_middleware_").delete()
+        get_token_user_cache().clear()
+        super().tearDownClass()
+
+    async def handshakes(self, tokens: list[str]) -> None:
+        application = JWTAuthMiddleWare(AcceptConsumer.as_asgi())
+        # the sockets are opened in limited batches, like a reconnect storm
+        limit = asyncio.Semaphore(50)
+
+        async def handshake(token: str) -> None:
+            async with limit:
+                communicator = WebsocketCommunicator(
+                    application,
+                    "/ws/",
+                    headers=[(b"cookie", f"access_token={token}".encode())],
+                )
+                connected, _ = await communicator.connect(timeout=60)
+                assert connected
+                await communicator.disconnect()
+
+        await asyncio.gather(*(handshake(token) for token in tokens))
+
+    def run_handshakes(self, name: str, tokens: list[str]) -> dict:
+        cache = get_token_user_cache()
+        hits, misses = cache.hits, cache.misses
+        with self.timer() as handshake_time:
+            async_to_sync(self.handshakes)(tokens)
+        return {
+            "cache": name,
+            "handshakes": len(tokens),
+            "handshakes/s": len(tokens) / handshake_time["seconds"],
+            "hits": cache.hits - hits,
+            "misses": cache.misses - misses,
+        }
+
+    def test_handshake_throughput(self):
+        sockets = self.bench_size("sockets", 1000)
+        # every user has a few sockets open with the same token
+        tokens = [
+            str(AccessToken.for_user(self.users[index % len(self.users)]))
+            for index in range(len(self.users))
+        ]
+        tokens = [tokens[index % len(tokens)] for index in range(sockets)]
+
+        cache = get_token_user_cache()
+        cache.clear()
+        # without the cache every handshake reads the user
+        with patch.object(cache, "max_size", 0):
+            rows = [self.run_handshakes("disabled", tokens)]
+        cache.clear()
+        rows.append(self.run_handshakes("cold", tokens))
+        rows.append(self.run_handshakes("warm", tokens))
+        self.report("JWTAuthMiddleWare handshakes", rows)
+
+
+def split_cookies(headers: list[tuple[bytes, bytes]], name: str) -> str | None:
+    """the cookie parsing used before by the JWTAuthMiddleWare, for comparison"""
+    headers_dict = dict(headers)
+    cookies = headers_dict.get(b"cookie", b"").decode("utf-8")
+    cookies_dict = {
+        item.split("=")[0]: item.split("=")[1] for item in cookies.split("; ")
+    }
+    return cookies_dict.get(name, None)
+
+
+class GetCookieBenchmark(SimpleTestCase, BaseBenchmark):
+    """
+    Extracting the access token cookie from the headers of a handshake,
+    with a growing number of other cookies sent by the browser.
+    """
+
+    def get_headers(self, cookies: int) -> list[tuple[bytes, bytes]]:
+        token = str(AccessToken.for_user(User(email="bench_cookie@test.com")))
+        pairs = [f"cookie_{index}={'x' * 64}" for index in range(cookies)]
+        # the access token is the last cookie, so the whole header is read
+        pairs.append(f"access_token={token}")
+        return [
+            (b"host", b"localhost"),
+            (b"user-agent", b"Mozilla/5.0"),
+            (b"cookie", "; ".join(pairs).encode()),
+        ]
+
+    def run_parser(self, parser, headers: list, rounds: int) -> float:
+        with self.timer() as parse_time:
+            for _ in range(rounds):
+                parser(headers, "access_token")
+        return rounds / parse_time["seconds"]
+
+    def test_get_cookie_throughput(self):
+        rounds = self.bench_size("cookie_rounds", 20000)
+        rows = []
+        for cookies in (0, 10, 50, 200):
+            headers = self.get_headers(cookies)
+            assert get_cookie(headers, "access_token") == split_cookies(
+                headers, "access_token"
+            )
+            split_rate = self.run_parser(split_cookies, headers, rounds)
+            get_cookie_rate = self.run_parser(get_cookie, headers, rounds)
+            rows.append(
+                {
+                    "cookies": cookies,
+                    "header bytes": len(headers[-1][1]),
+                    "split/s": split_rate,
+                    "get_cookie/s": get_cookie_rate,
+                    "speedup": get_cookie_rate / split_rate,
+                }
+            )
+        self.report("Access token cookie extraction", rows)
@@ -0,0 +1,160 @@
+import itertools
+import random
+import string
+from datetime import datetime, timedelta, timezone
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import SimpleTestCase
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from server.models import Category, Channel, Server
+from utils.identifiers import uuid7
+from utils.tests.benchmark import BaseBenchmark, percentile
+from webchat.models import Conversation, Message
+from webchat.partitions import MessagePartitions
+
+User = get_user_model()
+
+
+class MessageSearchBenchmark(SimpleTestCase, BaseBenchmark):
+    """
+    Latency of the full-text message search over a synthetic corpus with a
+    Zipf distributed vocabulary, for a common word, a rare word and a few
+    words, on the first page and on the pages after it, compared with
+    a case insensitive LIKE over the content.
+
+    Run with BENCH_SEARCH_MESSAGES=1000000 for a million messages.
+    """
+
+    databases = "__all__"
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        benchmark = cls()
+        generator = random.Random(13)
+        cls.user = User.objects.create_user(
+            email="bench_search@test.com", password="bench_pass"
+        )
+        category = Category.objects.create(name="bench_search_category")
+        cls.server = Server.objects.create(
+            name="bench_search_server", owner=cls.user, category=category
+        )
+        cls.server.member.add(cls.user)
+        conversations = [
+            Conversation.objects.create(
+                channel=Channel.objects.create(
+                    name=f"bench_search_{index}", owner=cls.user, server=cls.server
+                )
+            )
+            for index in range(benchmark.bench_size("search_channels", 20))
+        ]
+        # the words are ranked by their frequency, the first ones are the most
+        # common, like in a natural language
+        cls.vocabulary = sorted(
+            {
+                "".join(generator.choices(string.ascii_lowercase, k=8))
+                for _ in range(benchmark.bench_size("search_vocabulary", 20000))
+            }
+        )
+        generator.shuffle(cls.vocabulary)
+        weights = list(
+            itertools.accumulate(1 / rank for rank in range(1, len(cls.vocabulary) + 1))
+        )
+
+        rows = benchmark.bench_size("search_messages", 1_000_000)
+        # the messages of the last weeks, inside the monthly partitions
+        MessagePartitions().ensure(1)
+        start = datetime.now(timezone.utc) - timedelta(days=20)
+        # the search vector is generated by the database
+        fields = MessagePartitions().get_columns()
+        columns = ", ".join(f'"{column}"' for column in fields)
+        with connection.cursor() as cursor:
+            with cursor.copy(f'COPY "webchat_message" ({columns}) FROM STDIN') as copy:
+                for index in range(rows):
+                    created = start + timedelta(seconds=index)
+                    conversation = conversations[index % len(conversations)]
+                    words = generator.choices(
+                        cls.vocabulary, cum_weights=weights, k=generator.randint(3, 20)
+                    )
+                    values = {
+                        "created": created,
+                        "modified": created,
+                        "id": uuid7(),
+                        "content": " ".join(words),
+                        "conversation_id": conversation.pk,
+                        "sender_id": cls.user.pk,
+                        "seq": index // len(conversations) + 1,
+                    }
+                    copy.write_row([values[column] for column in fields])
+            cursor.execute('ANALYZE "webchat_message"')
+
+    @classmethod
+    def tearDownClass(cls):
+        Message.objects.filter(sender=cls.user).delete()
+        Conversation.objects.filter(channel__server=cls.server).delete()
+        cls.server.delete()
+        cls.user.delete()
+        super().tearDownClass()
+
+    def search(self, client: APIClient, params: dict, pages: int) -> list[list]:
+        """returns the latency in ms of every page of the search"""
+        url = reverse("webchat:webchat-messages-search")
+        latencies = [[] for _ in range(pages)]
+        for page in range(pages):
+            with self.timer() as search_time:
+                response = client.get(url, params)
+            assert response.status_code == 200, response.data
+            latencies[page].append(search_time["seconds"] * 1000)
+            if "Link" not in response:
+                break
+            url, params = response["Link"].split(">")[0].lstrip("<"), None
+        return latencies
+
+    def like(self, text: str) -> float:
+        """returns the latency in ms of the LIKE search of the first page"""
+        with self.timer() as like_time:
+            list(
+                Message.objects.filter(
+                    conversation__channel__server__member=self.user.pk,
+                    content__icontains=text,
+                )
+                .select_related("sender")
+                .order_by("-created", "-id")[:20]
+            )
+        return like_time["seconds"] * 1000
+
+    def test_search_latency(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        repeats = self.bench_size("search_repeats", 20)
+        queries = {
+            "common": self.vocabulary[0],
+            "rare": self.vocabulary[len(self.vocabulary) // 2],
+            "words": " ".join(self.vocabulary[5:8]),
+        }
+        rows = []
+        for name, text in queries.items():
+            latencies = [[], [], []]
+            for _ in range(repeats):
+                for page, samples in enumerate(self.search(client, {"q": text}, 3)):
+                    latencies[page].extend(samples)
+            like = [self.like(text) for _ in range(repeats)]
+            rows.append(
+                {
+                    "query": name,
+                    "page 1 p50 ms": percentile(latencies[0], 50),
+                    "page 1 p99 ms": percentile(latencies[0], 99),
+                    "page 3 p50 ms": percentile(latencies[2], 50),
+                    "page 3 p99 ms": percentile(latencies[2], 99),
+                    "like p50 ms": percentile(like, 50),
+                    "like p99 ms": percentile(like, 99),
+                }
+            )
+        self.report(
+            f"Message search of {self.bench_size('search_messages', 1_000_000)} "
+            "messages",
+            rows,
+        )
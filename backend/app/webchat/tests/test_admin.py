@@ -1,67 +1,74 @@
+from unittest.mock import patch
+
 from django.test import Client, TestCase
 from django.urls import reverse
 
-from utils.tests.base import BaseTestUser
-from webchat.models import Conversation, Message
+from utils.tests.base import BaseTestChannel, BaseTestUser
+from webchat.models import Conversation, Message, ReadMarker
 
 
-class ConversationAdminTestCase(TestCase, BaseTestUser):
+class ConversationAdminTestCase(TestCase, BaseTestUser, BaseTestChannel):
     """Test Suit for the Conversation admin"""
 
     def setUp(self):
         self.client = Client()
         self.admin_user = self.get_test_superuser()
         self.client.force_login(self.admin_user)
-        self.conversation = Conversation.objects.create(channel_id="test_channel")
+        self.channel = self.get_test_channel()
+        self.conversation = Conversation.objects.create(channel=self.channel)
 
     def test_admin_accessible_conversation(self):
         url = reverse("admin:webchat_conversation_changelist")
         res = self.client.get(url)
         self.assertEqual(res.status_code, 200)
-        self.assertContains(res, self.conversation.channel_id)
+        self.assertContains(res, self.channel.name)
 
     def test_edit_conversation_page(self):
         url = reverse("admin:webchat_conversation_change", args=(self.conversation.id,))
         res = self.client.get(url)
         self.assertEqual(res.status_code, 200)
+        channel = self.get_test_channel("updated_channel")
         data = {
-            "channel_id": "updated_channel_id",
+            "channel": channel.id,
         }
         response = self.client.post(url, data)
         self.assertEqual(response.status_code, 302)
         updated_conversation = Conversation.objects.get(id=self.conversation.id)
-        self.assertEqual(updated_conversation.channel_id, data["channel_id"])
+        self.assertEqual(updated_conversation.channel_id, channel.id)
 
     def test_create_conversation_page(self):
         url = reverse("admin:webchat_conversation_add")
         res = self.client.get(url)
         self.assertEqual(res.status_code, 200)
+        channel = self.get_test_channel("new_channel")
         data = {
-            "channel_id": "new_channel_id",
+            "channel": channel.id,
         }
         res = self.client.post(url, data)
         self.assertEqual(res.status_code, 302)
-        self.assertTrue(
-            Conversation.objects.filter(channel_id=data["channel_id"]).exists()
-        )
+        self.assertTrue(Conversation.objects.filter(channel=channel).exists())
+
+    def test_create_second_conversation_of_channel(self):
+        url = reverse("admin:webchat_conversation_add")
+        res = self.client.post(url, {"channel": self.channel.id})
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(Conversation.objects.filter(channel=self.channel).count(), 1)
 
     def test_conversation_search(self):
         url = (
-            reverse("admin:webchat_conversation_changelist")
-            + "?q="
-            + self.conversation.channel_id
+            reverse("admin:webchat_conversation_changelist") + "?q=" + self.channel.name
         )
         response = self.client.get(url)
-        self.assertContains(response, self.conversation.channel_id)
+        self.assertContains(response, self.channel.name)
 
 
-class MessageAdminTestCase(TestCase, BaseTestUser):
+class MessageAdminTestCase(TestCase, BaseTestUser, BaseTestChannel):
     """Test Suit for the Message admin"""
 
     @classmethod
     def setUpTestData(cls):
         cls.user = cls().get_test_active_regularuser()
-        cls.conversation = Conversation.objects.create(channel_id="test_channel")
+        cls.conversation = Conversation.objects.create(channel=cls().get_test_channel())
 
     def setUp(self):
         self.client = Client()
@@ -112,3 +119,49 @@ class MessageAdminTestCase(TestCase, BaseTestUser):
         url = reverse("admin:webchat_message_changelist") + "?q=" + self.message.content
         response = self.client.get(url)
         self.assertContains(response, self.message.content)
+
+    def test_delete_message_clears_the_recent_messages(self):
+        channel_id = self.conversation.channel_id
+        url = reverse("admin:webchat_message_delete", args=(self.message.id,))
+        with patch("webchat.admin.message.clear_recent_messages") as patched_clear:
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.post(url, {"post": "yes"})
+        self.assertEqual(response.status_code, 302)
+        self.assertFalse(Message.objects.filter(id=self.message.id).exists())
+        patched_clear.assert_called_once_with([channel_id])
+
+    def test_delete_selected_messages_clears_the_recent_messages(self):
+        url = reverse("admin:webchat_message_changelist")
+        data = {"action": "delete_selected", "_selected_action": [self.message.id]}
+        with patch("webchat.admin.message.clear_recent_messages") as patched_clear:
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.post(url, {**data, "post": "yes"})
+        self.assertEqual(response.status_code, 302)
+        self.assertFalse(Message.objects.filter(id=self.message.id).exists())
+        patched_clear.assert_called_once_with({self.conversation.channel_id})
+
+
+class ReadMarkerAdminTestCase(TestCase, BaseTestUser, BaseTestChannel):
+    """Test Suit for the ReadMarker admin"""
+
+    def setUp(self):
+        self.client = Client()
+        self.admin_user = self.get_test_superuser()
+        self.client.force_login(self.admin_user)
+        self.user = self.get_test_active_regularuser()
+        self.marker = ReadMarker.objects.create(
+            user=self.user,
+            conversation=Conversation.objects.create(channel=self.get_test_channel()),
+            last_read_seq=7,
+        )
+
+    def test_admin_accessible_read_marker(self):
+        url = reverse("admin:webchat_readmarker_changelist")
+        res = self.client.get(url)
+        self.assertEqual(res.status_code, 200)
+        self.assertContains(res, self.user.email)
+
+    def test_read_marker_search(self):
+        url = reverse("admin:webchat_readmarker_changelist") + "?q=" + self.user.email
+        res = self.client.get(url)
+        self.assertContains(res, str(self.marker.last_read_seq))
@@ -0,0 +1,494 @@
+import asyncio
+import uuid
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import redis
+from asgiref.sync import async_to_sync
+from channels.db import database_sync_to_async
+from django.contrib.auth import get_user_model
+from django.test import TransactionTestCase, override_settings
+
+from utils.redis import get_async_redis, get_redis
+from utils.tests.base import BaseTestChannel
+from webchat.buffers import (
+    BuffersLifespan,
+    MessageSequenceAllocator,
+    MessageWriteBuffer,
+    ReadMarkerBuffer,
+    get_message_buffer,
+)
+from webchat.consumers import WebChatConsumer
+from webchat.models import Conversation, Message, ReadMarker
+
+User = get_user_model()
+
+
+# TransactionTestCase as database_sync_to_async closes the connection that
+# would be used inside of the TestCase transaction
+class MessageWriteBufferTest(TransactionTestCase, BaseTestChannel):
+    """Test suit for the write-behind MessageWriteBuffer"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email="test_buffer@test.com", password="buffer_pass"
+        )
+        self.conversation = Conversation.objects.create(channel=self.get_test_channel())
+
+    def get_message(self, content: str = "Hello") -> Message:
+        # messages stored with bulk_create have their sequence number allocated
+        return Message(
+            conversation=self.conversation,
+            sender=self.user,
+            content=content,
+            seq=Conversation.objects.allocate_seq(self.conversation.id),
+        )
+
+    async def wait_for_flush(self) -> None:
+        """waits for the flush tasks scheduled by the buffer"""
+        tasks = asyncio.all_tasks() - {asyncio.current_task()}
+        await asyncio.gather(*tasks)
+
+    def test_flush_when_batch_is_full(self):
+        buffer = MessageWriteBuffer(batch_size=3, flush_interval=60)
+        messages = [self.get_message(f"Message {index}") for index in range(3)]
+
+        async def add_messages():
+            for message in messages:
+                buffer.add(message)
+            # the flush task of the full batch is not waiting for the interval
+            tasks = [
+                task
+                for task in asyncio.all_tasks()
+                if task is not asyncio.current_task()
+                and task.get_coro().__name__ == "flush"
+            ]
+            await asyncio.gather(*tasks)
+            for task in asyncio.all_tasks() - {asyncio.current_task()}:
+                task.cancel()
+
+        async_to_sync(add_messages)()
+
+        self.assertEqual(len(buffer), 0)
+        self.assertEqual(self.conversation.message.count(), 3)
+
+    def test_flush_after_interval(self):
+        buffer = MessageWriteBuffer(batch_size=100, flush_interval=0.05)
+        message = self.get_message()
+
+        async def add_message():
+            buffer.add(message)
+            stored_before = await database_sync_to_async(
+                self.conversation.message.count
+            )()
+            await self.wait_for_flush()
+            return stored_before
+
+        stored_before = async_to_sync(add_message)()
+
+        self.assertEqual(stored_before, 0)
+        self.assertEqual(len(buffer), 0)
+        self.assertEqual(self.conversation.message.count(), 1)
+
+    def test_flush_sync_stores_remaining_messages(self):
+        buffer = MessageWriteBuffer(batch_size=100, flush_interval=60)
+        messages = [self.get_message(f"Message {index}") for index in range(5)]
+        for message in messages:
+            buffer.add(message)
+        self.assertEqual(self.conversation.message.count(), 0)
+
+        buffer.flush_sync()
+
+        self.assertEqual(len(buffer), 0)
+        stored = {message.id: message for message in self.conversation.message.all()}
+        # the id and the created timestamp are the ones given on instantiation
+        for message in messages:
+            self.assertEqual(stored[message.id].created, message.created)
+
+    def test_flush_counts_the_stored_messages(self):
+        buffer = MessageWriteBuffer(batch_size=100, flush_interval=60)
+        messages = [self.get_message(f"Message {index}") for index in range(3)]
+        for message in messages:
+            buffer.add(message)
+        # the messages are counted when they are stored
+        self.conversation.refresh_from_db()
+        self.assertEqual(self.conversation.message_count, 0)
+
+        buffer.flush_sync()
+
+        self.conversation.refresh_from_db()
+        self.assertEqual(self.conversation.message_count, 3)
+        self.assertEqual(self.conversation.last_message_at, messages[-1].created)
+        self.assertEqual(self.conversation.last_message_id, messages[-1].id)
+
+    def test_failed_flush_keeps_messages(self):
+        buffer = MessageWriteBuffer(batch_size=100, flush_interval=60)
+        buffer.add(self.get_message())
+
+        with patch.object(
+            Message.objects, "bulk_create", side_effect=Exception("db is down")
+        ):
+            with self.assertLogs("webchat.buffers.message_buffer", level="ERROR"):
+                buffer.flush_sync()
+
+        self.assertEqual(len(buffer), 1)
+        buffer.flush_sync()
+        self.assertEqual(len(buffer), 0)
+        self.assertEqual(self.conversation.message.count(), 1)
+        self.conversation.refresh_from_db()
+        self.assertEqual(self.conversation.message_count, 1)
+
+    def test_failing_row_is_dropped_and_the_batch_stored(self):
+        buffer = MessageWriteBuffer(batch_size=100, flush_interval=60)
+        messages = [self.get_message(f"Message {index}") for index in range(4)]
+        # the conversation of the message does not exist
+        messages[2].conversation_id = uuid.uuid4()
+        for message in messages:
+            buffer.add(message)
+
+        with self.assertLogs("webchat.buffers.message_buffer", level="ERROR"):
+            buffer.flush_sync()
+
+        self.assertEqual(len(buffer), 0)
+        self.assertEqual(
+            set(self.conversation.message.values_list("id", flat=True)),
+            {messages[0].id, messages[1].id, messages[3].id},
+        )
+
+    def test_failed_flushes_are_dropped_after_max_retries(self):
+        buffer = MessageWriteBuffer(batch_size=100, flush_interval=60, max_retries=2)
+        buffer.add(self.get_message())
+
+        with patch.object(
+            Message.objects, "bulk_create", side_effect=Exception("db is down")
+        ):
+            with self.assertLogs("webchat.buffers.message_buffer", level="ERROR"):
+                for _ in range(2):
+                    buffer.flush_sync()
+                    self.assertEqual(len(buffer), 1)
+                buffer.flush_sync()
+
+        self.assertEqual(len(buffer), 0)
+        self.assertEqual(self.conversation.message.count(), 0)
+
+    def test_failed_flush_is_retried_with_backoff(self):
+        buffer = MessageWriteBuffer(batch_size=100, flush_interval=0.01)
+        buffer.add(self.get_message())
+
+        async def flush_failing():
+            with patch.object(
+                Message.objects, "bulk_create", side_effect=Exception("db is down")
+            ):
+                await buffer.flush()
+            retry_task = buffer._flush_task
+            # the retry is kept by the buffer and waits longer than the interval
+            self.assertIn(retry_task, buffer._tasks)
+            await retry_task
+
+        with self.assertLogs("webchat.buffers.message_buffer", level="ERROR"):
+            async_to_sync(flush_failing)()
+
+        self.assertEqual(len(buffer), 0)
+        self.assertEqual(self.conversation.message.count(), 1)
+
+    def test_lifespan_shutdown_flushes_the_buffer(self):
+        buffer = MessageWriteBuffer(batch_size=100, flush_interval=60)
+        buffer.add(self.get_message())
+        events = iter([{"type": "lifespan.startup"}, {"type": "lifespan.shutdown"}])
+        sent = []
+
+        async def receive():
+            return next(events)
+
+        async def send(message):
+            sent.append(message["type"])
+
+        with patch("webchat.buffers.lifespan.get_message_buffer", return_value=buffer):
+            async_to_sync(BuffersLifespan())({"type": "lifespan"}, receive, send)
+
+        self.assertEqual(
+            sent, ["lifespan.startup.complete", "lifespan.shutdown.complete"]
+        )
+        self.assertEqual(len(buffer), 0)
+        self.assertEqual(self.conversation.message.count(), 1)
+
+    @override_settings(WEBCHAT={"MESSAGE_PERSISTENCE": "write_behind"})
+    def test_consumer_write_behind(self):
+        consumer = WebChatConsumer()
+        consumer.user = self.user
+        consumer.channel_id = str(self.conversation.channel_id)
+        self.assertTrue(consumer.write_behind)
+
+        async def send_message():
+            message = await consumer.buffer_message("Hello")
+            payload = consumer.get_message_payload(message)
+            # the timer of the buffer is not waited for in the test
+            for task in asyncio.all_tasks() - {asyncio.current_task()}:
+                task.cancel()
+            return payload
+
+        payload = async_to_sync(send_message)()
+
+        # broadcasted before it is stored
+        self.assertFalse(Message.objects.filter(id=payload["id"]).exists())
+
+        get_message_buffer().flush_sync()
+
+        message = Message.objects.get(id=payload["id"])
+        self.assertEqual(message.conversation, self.conversation)
+        self.assertEqual(message.created.isoformat(), payload["created"])
+
+    @override_settings(WEBCHAT={"MESSAGE_PERSISTENCE": "write_behind"})
+    def test_replay_waits_for_the_buffers_of_other_processes(self):
+        stored = self.get_message("Stored")
+        Message.objects.bulk_create([stored])
+        Conversation.objects.add_messages([stored])
+        # broadcasted and buffered by another process
+        other_buffer = MessageWriteBuffer(batch_size=100, flush_interval=60)
+        other_buffer.add(self.get_message("Buffered"))
+
+        consumer = WebChatConsumer()
+        consumer.user = self.user
+        consumer.channel_id = str(self.conversation.channel_id)
+        sent = []
+
+        async def send_json(content):
+            sent.append(content["new_message"]["content"])
+
+        async def get_last_seq(channel_id):
+            # the other process stores its buffer in the meantime
+            await database_sync_to_async(other_buffer.flush_sync)()
+            return 2
+
+        local_buffer = MagicMock(flush=AsyncMock(), flush_interval=0)
+        recent_messages_cache = MagicMock(aget_last_seq=get_last_seq)
+        with (
+            patch.object(consumer, "send_json", new=send_json),
+            patch(
+                "webchat.consumers.webchat_consumer.get_message_buffer",
+                return_value=local_buffer,
+            ),
+            patch(
+                "webchat.consumers.webchat_consumer.get_recent_messages_cache",
+                return_value=recent_messages_cache,
+            ),
+        ):
+            async_to_sync(consumer.replay_messages)(0)
+
+        self.assertEqual(sent, ["Stored", "Buffered"])
+        self.assertEqual(consumer.replayed_seq, 2)
+
+
+class MessageSequenceAllocatorTest(TransactionTestCase, BaseTestChannel):
+    """Test suit for the MessageSequenceAllocator"""
+
+    def setUp(self):
+        self.conversation = Conversation.objects.create(channel=self.get_test_channel())
+        self.allocator = self.get_allocator()
+        self.clear_key()
+        self.addCleanup(self.clear_key)
+
+    def get_allocator(self) -> MessageSequenceAllocator:
+        return MessageSequenceAllocator(block_size=3, timeout=60, resume_delay=0)
+
+    def clear_key(self) -> None:
+        key = self.allocator.get_key(self.conversation.id)
+        get_redis().delete(key, f"{key}:lock")
+
+    def allocate(self, count: int) -> list[int]:
+        async def allocate():
+            return [
+                await self.allocator.allocate(self.conversation.id)
+                for _ in range(count)
+            ]
+
+        return async_to_sync(allocate)()
+
+    def get_failing_client(self, delete_fails: bool = False) -> MagicMock:
+        """an async redis client whose scripts fail"""
+        client = MagicMock(wraps=get_async_redis())
+        client.register_script.side_effect = redis.RedisError("redis timed out")
+        if delete_fails:
+            client.delete.side_effect = redis.RedisError("redis timed out")
+        return client
+
+    def test_numbers_are_reserved_in_blocks(self):
+        with patch.object(
+            Conversation.objects,
+            "reserve_seq_block",
+            wraps=Conversation.objects.reserve_seq_block,
+        ) as patched_reserve:
+            self.assertEqual(self.allocate(7), [1, 2, 3, 4, 5, 6, 7])
+
+        self.assertEqual(patched_reserve.call_count, 3)
+        self.conversation.refresh_from_db()
+        # the last_seq is moved when the messages are stored
+        self.assertEqual(self.conversation.last_seq, 0)
+        self.assertEqual(self.conversation.reserved_seq, 9)
+
+    def test_concurrent_refills_leave_no_gaps(self):
+        allocators = [self.get_allocator() for _ in range(4)]
+
+        async def allocate():
+            return await asyncio.gather(
+                *(
+                    allocator.allocate(self.conversation.id)
+                    for allocator in allocators
+                    for _ in range(5)
+                )
+            )
+
+        self.assertEqual(sorted(async_to_sync(allocate)()), list(range(1, 21)))
+        self.conversation.refresh_from_db()
+        self.assertEqual(self.conversation.reserved_seq, 21)
+
+    def test_lost_key_continues_the_reserved_block(self):
+        self.assertEqual(self.allocate(2), [1, 2])
+        # the allocated messages are stored before the key is lost
+        Conversation.objects.filter(id=self.conversation.id).update(last_seq=2)
+        self.clear_key()
+        self.assertEqual(self.allocate(2), [3, 4])
+        self.conversation.refresh_from_db()
+        self.assertEqual(self.conversation.reserved_seq, 6)
+
+    def test_redis_error_falls_back_to_the_conversation(self):
+        async def allocate():
+            working = [await self.allocator.allocate(self.conversation.id)]
+            with patch(
+                "webchat.buffers.message_sequences.get_async_redis",
+                return_value=self.get_failing_client(),
+            ):
+                fallback = await self.get_allocator().allocate(self.conversation.id)
+            working.append(await self.allocator.allocate(self.conversation.id))
+            return working, fallback
+
+        with self.assertLogs("webchat.buffers.message_sequences", level="WARNING"):
+            (first, later), fallback = async_to_sync(allocate)()
+
+        # the rest of the block is not handed out after the fallback
+        self.assertEqual(first, 1)
+        self.assertEqual(fallback, 4)
+        self.assertEqual(later, 5)
+        self.conversation.refresh_from_db()
+        self.assertEqual(self.conversation.last_seq, 4)
+
+    def test_redis_error_without_invalidation_is_raised(self):
+        self.assertEqual(self.allocate(1), [1])
+
+        async def allocate():
+            with patch(
+                "webchat.buffers.message_sequences.get_async_redis",
+                return_value=self.get_failing_client(delete_fails=True),
+            ):
+                await self.allocator.allocate(self.conversation.id)
+
+        with self.assertLogs("webchat.buffers.message_sequences", level="ERROR"):
+            with self.assertRaises(redis.RedisError):
+                async_to_sync(allocate)()
+        self.conversation.refresh_from_db()
+        self.assertEqual(self.conversation.last_seq, 0)
+        self.assertEqual(self.allocate(1), [2])
+
+
+class ReadMarkerBufferTest(TransactionTestCase, BaseTestChannel):
+    """Test suit for the coalescing ReadMarkerBuffer"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email="test_read_marker@test.com", password="read_marker_pass"
+        )
+        self.conversation = Conversation.objects.create(channel=self.get_test_channel())
+        for _ in range(10):
+            Message.objects.create(
+                conversation=self.conversation, sender=self.user, content="Hello"
+            )
+
+    def get_markers(self) -> list[tuple]:
+        return list(
+            ReadMarker.objects.values_list(
+                "user_id", "conversation_id", "last_read_seq"
+            )
+        )
+
+    def test_markers_are_coalesced(self):
+        buffer = ReadMarkerBuffer(max_size=100, flush_interval=60)
+        for seq in [1, 5, 3, 4]:
+            buffer.add(self.user.id, self.conversation.id, seq)
+        self.assertEqual(len(buffer), 1)
+
+        with patch.object(
+            ReadMarker.objects, "mark_read", wraps=ReadMarker.objects.mark_read
+        ) as patched_mark_read:
+            buffer.flush_sync()
+
+        patched_mark_read.assert_called_once_with(
+            {(self.user.id, self.conversation.id): 5}
+        )
+        self.assertEqual(len(buffer), 0)
+        self.assertEqual(self.get_markers(), [(self.user.id, self.conversation.id, 5)])
+
+    def test_flush_after_interval(self):
+        buffer = ReadMarkerBuffer(max_size=100, flush_interval=0.05)
+
+        async def add_marker():
+            buffer.add(self.user.id, self.conversation.id, 2)
+            tasks = asyncio.all_tasks() - {asyncio.current_task()}
+            await asyncio.gather(*tasks)
+
+        async_to_sync(add_marker)()
+
+        self.assertEqual(len(buffer), 0)
+        self.assertEqual(self.get_markers(), [(self.user.id, self.conversation.id, 2)])
+
+    def test_failed_flush_keeps_the_newest_markers(self):
+        buffer = ReadMarkerBuffer(max_size=100, flush_interval=60)
+        buffer.add(self.user.id, self.conversation.id, 3)
+
+        with patch.object(
+            ReadMarker.objects, "mark_read", side_effect=Exception("db is down")
+        ):
+            with self.assertLogs("webchat.buffers.read_marker_buffer", level="ERROR"):
+                buffer.flush_sync()
+
+        buffer.add(self.user.id, self.conversation.id, 2)
+        buffer.flush_sync()
+        self.assertEqual(self.get_markers(), [(self.user.id, self.conversation.id, 3)])
+
+    def test_failing_marker_is_dropped_and_the_rest_stored(self):
+        buffer = ReadMarkerBuffer(max_size=100, flush_interval=60)
+        buffer.add(self.user.id, self.conversation.id, 3)
+        # the user of the marker does not exist
+        buffer.add(uuid.uuid4(), self.conversation.id, 4)
+
+        with self.assertLogs("webchat.buffers.read_marker_buffer", level="ERROR"):
+            buffer.flush_sync()
+
+        self.assertEqual(len(buffer), 0)
+        self.assertEqual(self.get_markers(), [(self.user.id, self.conversation.id, 3)])
+
+    def test_failed_flushes_are_dropped_after_max_retries(self):
+        buffer = ReadMarkerBuffer(max_size=100, flush_interval=60, max_retries=2)
+        buffer.add(self.user.id, self.conversation.id, 3)
+
+        with patch.object(
+            ReadMarker.objects, "mark_read", side_effect=Exception("db is down")
+        ):
+            with self.assertLogs("webchat.buffers.read_marker_buffer", level="ERROR"):
+                for _ in range(2):
+                    buffer.flush_sync()
+                    self.assertEqual(len(buffer), 1)
+                buffer.flush_sync()
+
+        self.assertEqual(len(buffer), 0)
+        self.assertEqual(self.get_markers(), [])
+
+    def test_lifespan_shutdown_flushes_the_markers(self):
+        buffer = ReadMarkerBuffer(max_size=100, flush_interval=60)
+        buffer.add(self.user.id, self.conversation.id, 3)
+
+        with patch(
+            "webchat.buffers.lifespan.get_read_marker_buffer", return_value=buffer
+        ):
+            async_to_sync(BuffersLifespan().flush)()
+
+        self.assertEqual(len(buffer), 0)
+        self.assertEqual(self.get_markers(), [(self.user.id, self.conversation.id, 3)])
@@ -0,0 +1,177 @@
+from unittest.mock import patch
+
+import redis
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.contrib.auth import get_user_model
+from django.test import SimpleTestCase, TransactionTestCase
+
+from utils.tests.base import BaseTestChannel
+from webchat.cache import RecentMessagesCache
+from webchat.consumers import WebChatConsumer
+from webchat.models import Conversation, Message
+
+User = get_user_model()
+
+
+class RecentMessagesCacheTest(SimpleTestCase):
+    """Test suit for the RecentMessagesCache"""
+
+    def setUp(self):
+        self.cache = RecentMessagesCache(size=5, timeout=60)
+        self.channel_id = "test_recent_messages"
+        self.cache.clear(self.channel_id)
+        self.addCleanup(self.cache.clear, self.channel_id)
+
+    def get_messages(self, first: int, last: int) -> list[dict]:
+        return [
+            {"id": str(seq), "seq": seq, "content": f"Message {seq}"}
+            for seq in range(first, last + 1)
+        ]
+
+    def append(self, message: dict) -> None:
+        async_to_sync(self.cache.append)(self.channel_id, message)
+
+    def test_cold_cache(self):
+        self.assertIsNone(self.cache.get(self.channel_id, 5))
+
+    def test_fill_and_get(self):
+        self.cache.fill(self.channel_id, self.get_messages(1, 3))
+        self.assertEqual(self.cache.get(self.channel_id, 3), self.get_messages(1, 3))
+        self.assertEqual(self.cache.get(self.channel_id, 2), self.get_messages(2, 3))
+        # the whole conversation is cached, so fewer messages are complete
+        self.assertEqual(self.cache.get(self.channel_id, 5), self.get_messages(1, 3))
+
+    def test_fill_keeps_the_latest_messages(self):
+        self.cache.fill(self.channel_id, self.get_messages(1, 8))
+        self.assertEqual(self.cache.get(self.channel_id, 5), self.get_messages(4, 8))
+        # more messages than the size of the cache are read from the database
+        self.assertIsNone(self.cache.get(self.channel_id, 6))
+
+    def test_get_with_missing_older_messages(self):
+        self.cache.fill(self.channel_id, self.get_messages(10, 12))
+        self.assertEqual(self.cache.get(self.channel_id, 3), self.get_messages(10, 12))
+        self.assertIsNone(self.cache.get(self.channel_id, 4))
+
+    def test_append_to_cached_channel(self):
+        self.cache.fill(self.channel_id, self.get_messages(1, 4))
+        for message in self.get_messages(5, 7):
+            self.append(message)
+        # the oldest messages are evicted
+        self.assertEqual(self.cache.get(self.channel_id, 5), self.get_messages(3, 7))
+
+    def test_append_out_of_order(self):
+        self.cache.fill(self.channel_id, self.get_messages(1, 2))
+        messages = self.get_messages(3, 4)
+        self.append(messages[1])
+        self.append(messages[0])
+        # appending the same message again does not duplicate it
+        self.append(messages[0])
+        self.assertEqual(self.cache.get(self.channel_id, 4), self.get_messages(1, 4))
+
+    def test_append_to_cold_cache(self):
+        # the cache is not started with only the new message
+        self.append(self.get_messages(1, 1)[0])
+        self.assertIsNone(self.cache.get(self.channel_id, 1))
+
+    def test_fill_missing_a_newer_message(self):
+        # the message was added after the page was read from the database
+        self.append(self.get_messages(4, 4)[0])
+        self.cache.fill(self.channel_id, self.get_messages(1, 3))
+        self.assertIsNone(self.cache.get(self.channel_id, 3))
+
+        self.cache.fill(self.channel_id, self.get_messages(1, 4))
+        self.assertEqual(self.cache.get(self.channel_id, 4), self.get_messages(1, 4))
+
+    def test_disabled_cache(self):
+        cache = RecentMessagesCache(size=0)
+        cache.fill(self.channel_id, self.get_messages(1, 3))
+        self.assertIsNone(cache.get(self.channel_id, 3))
+
+    def test_redis_not_available(self):
+        unavailable = redis.Redis(port=1, socket_connect_timeout=0.1)
+        with patch("webchat.cache.recent_messages.get_redis", return_value=unavailable):
+            with self.assertLogs("webchat.cache.recent_messages", "WARNING"):
+                self.cache.fill(self.channel_id, self.get_messages(1, 3))
+            with self.assertLogs("webchat.cache.recent_messages", "WARNING"):
+                self.assertIsNone(self.cache.get(self.channel_id, 3))
+
+
+class WebChatConsumerRecentMessagesTest(TransactionTestCase, BaseTestChannel):
+    """Test suit for the recent messages cached by the WebChatConsumer"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email="test_recent@test.com", password="recent_pass"
+        )
+        self.channel_id = str(self.get_test_channel().id)
+        self.cache = RecentMessagesCache(size=5, timeout=60)
+        self.cache.clear(self.channel_id)
+        self.addCleanup(self.cache.clear, self.channel_id)
+
+    def send_message(self, content: str) -> None:
+        consumer = WebChatConsumer()
+        consumer.user = self.user
+        consumer.channel_id = self.channel_id
+        consumer.channel_layer = get_channel_layer()
+        consumer.is_member = True
+        with patch(
+            "webchat.consumers.webchat_consumer.get_recent_messages_cache",
+            return_value=self.cache,
+        ):
+            async_to_sync(consumer.receive_json)({"message": content})
+
+    def test_consumer_appends_to_cached_channel(self):
+        self.send_message("First message")
+        # the channel is not cached yet
+        self.assertIsNone(self.cache.get(self.channel_id, 1))
+
+        conversation = Conversation.objects.get(channel_id=self.channel_id)
+        message = conversation.message.get()
+        self.cache.fill(self.channel_id, [{"id": str(message.id), "seq": message.seq}])
+        self.send_message("Second message")
+
+        cached = self.cache.get(self.channel_id, 2)
+        self.assertEqual(
+            [message["content"] for message in cached[1:]], ["Second message"]
+        )
+        self.assertEqual(cached[1]["sender"], self.user.get_full_name)
+        self.assertEqual(cached[1]["conversation"], str(conversation.id))
+        self.assertEqual(cached[1]["seq"], 2)
+
+
+class RecentMessagesInvalidationTest(TransactionTestCase, BaseTestChannel):
+    """Test suit for the recent messages cleared when messages are deleted"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email="test_recent_delete@test.com", password="recent_delete_pass"
+        )
+        self.channel = self.get_test_channel()
+        self.channel_id = str(self.channel.id)
+        self.conversation = Conversation.objects.create(channel=self.channel)
+        message = Message.objects.create(
+            conversation=self.conversation, sender=self.user, content="Hello"
+        )
+        self.cache = RecentMessagesCache(size=5, timeout=60)
+        self.cache.fill(self.channel_id, [{"id": str(message.id), "seq": message.seq}])
+        self.addCleanup(self.cache.clear, self.channel_id)
+
+    def test_cache_is_cleared_with_the_sender(self):
+        self.assertIsNotNone(self.cache.get(self.channel_id, 1))
+        self.user.delete()
+        self.assertIsNone(self.cache.get(self.channel_id, 1))
+
+    def test_cache_is_cleared_with_the_conversation(self):
+        self.conversation.delete()
+        self.assertIsNone(self.cache.get(self.channel_id, 1))
+
+    def test_cache_is_cleared_with_the_channel(self):
+        self.channel.delete()
+        self.assertIsNone(self.cache.get(self.channel_id, 1))
+
+    def test_other_channels_are_kept(self):
+        User.objects.create_user(
+            email="test_recent_other@test.com", password="recent_other_pass"
+        ).delete()
+        self.assertIsNotNone(self.cache.get(self.channel_id, 1))
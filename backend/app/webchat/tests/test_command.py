@@ -0,0 +1,213 @@
+"""
+Test custom Django management commands.
+"""
+
+import gzip
+import json
+import os
+import tempfile
+import uuid
+from datetime import datetime, timedelta, timezone
+from io import StringIO
+from unittest.mock import patch
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase
+from django.utils import timezone as django_timezone
+
+from utils.tests.base import BaseTestChannel, BaseTestUser
+from webchat.models import Conversation, Message
+from webchat.partitions import MessagePartitions, add_months, get_month
+from webchat.retention import MessageRetention
+
+
+class PartitionMessagesCommandTests(TestCase):
+    """Test the partition_messages command."""
+
+    def setUp(self):
+        self.partitions = MessagePartitions()
+        self.current = get_month(datetime.now(timezone.utc))
+
+    def call_command(self, *args) -> str:
+        out = StringIO()
+        call_command("partition_messages", *args, stdout=out)
+        return out.getvalue()
+
+    def test_creates_the_partitions_ahead(self):
+        out = self.call_command("--months-ahead", "6")
+        # the first months ahead are created with the table
+        for offset in (5, 6):
+            name = self.partitions.get_name(add_months(self.current, offset))
+            self.assertIn(f"Created {name}", out)
+        self.assertEqual(self.call_command("--months-ahead", "6"), "")
+
+    def test_detaches_the_expired_partitions(self):
+        self.partitions.create(datetime(2001, 1, 1, tzinfo=timezone.utc))
+
+        out = self.call_command("--retain-months", "12")
+        self.assertIn("Detached webchat_message_p2001_01", out)
+        names = [name for name, _, _ in self.partitions.get_partitions()]
+        self.assertNotIn("webchat_message_p2001_01", names)
+        self.assertIn(self.partitions.get_name(self.current), names)
+
+    def test_drops_the_expired_partitions(self):
+        self.partitions.create(datetime(2001, 1, 1, tzinfo=timezone.utc))
+        out = self.call_command("--retain-months", "12", "--drop")
+        self.assertIn("Dropped webchat_message_p2001_01", out)
+
+    def test_dry_run(self):
+        self.partitions.create(datetime(2001, 1, 1, tzinfo=timezone.utc))
+        out = self.call_command("--retain-months", "12", "--dry-run")
+        self.assertIn("webchat_message_p2001_01: 2001-01-01 - 2001-02-01 (detach)", out)
+        names = [name for name, _, _ in self.partitions.get_partitions()]
+        self.assertIn("webchat_message_p2001_01", names)
+
+
+class ExportMessagesCommandTests(TestCase, BaseTestUser, BaseTestChannel):
+    """Test the export_messages command."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = cls().get_test_active_regularuser()
+        cls.channel = cls().get_test_channel()
+        conversation = Conversation.objects.create(channel=cls.channel)
+        for index in range(5):
+            Message.objects.create(
+                conversation=conversation, sender=cls.user, content=f"Message {index}"
+            )
+
+    def test_export_to_file(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "export.jsonl.gz")
+            err = StringIO()
+            call_command(
+                "export_messages", str(self.channel.id), "-o", path, stderr=err
+            )
+            with gzip.open(path, "rt") as file:
+                lines = [json.loads(line) for line in file]
+        self.assertEqual(
+            [line["content"] for line in lines],
+            [f"Message {index}" for index in range(5)],
+        )
+        self.assertIn("Exported 5 messages", err.getvalue())
+
+    def test_invalid_channel(self):
+        with self.assertRaises(CommandError):
+            call_command("export_messages", "not_a_channel_id")
+        with self.assertRaises(CommandError):
+            call_command("export_messages", str(self.get_test_channel("empty").id))
+
+
+@patch("time.sleep")
+class PurgeMessagesCommandTests(TestCase, BaseTestUser, BaseTestChannel):
+    """Test the purge_messages command."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = cls().get_test_active_regularuser()
+        cls.channel = cls().get_test_channel()
+        cls.channel.server.message_retention_days = 30
+        cls.channel.server.save()
+        cls.conversation = Conversation.objects.create(channel=cls.channel)
+        now = django_timezone.now()
+        for days in (60, 40, 31, 20):
+            Message.objects.create(
+                conversation=cls.conversation,
+                sender=cls.user,
+                content=f"{days} days old",
+                created=now - timedelta(days=days),
+            )
+
+    def call_command(self, *args) -> str:
+        out = StringIO()
+        call_command("purge_messages", *args, stdout=out)
+        return out.getvalue()
+
+    def test_purge(self, patched_sleep):
+        with patch.object(MessageRetention, "clear_cache") as patched_clear_cache:
+            out = self.call_command("--batch-size", "2")
+        self.assertIn("test_channel_server: deleted 3 messages", out)
+        self.assertIn("Total: 3 messages deleted", out)
+        self.assertEqual(
+            list(
+                Message.objects.filter(conversation=self.conversation).values_list(
+                    "content", flat=True
+                )
+            ),
+            ["20 days old"],
+        )
+        patched_clear_cache.assert_called_once_with(self.channel.id)
+        self.assertEqual(patched_sleep.call_count, 1)
+
+    def test_dry_run(self, patched_sleep):
+        out = self.call_command("--dry-run")
+        self.assertIn("test_channel_server: 3 messages before", out)
+        self.assertEqual(
+            Message.objects.filter(conversation=self.conversation).count(), 4
+        )
+
+    def test_other_server(self, patched_sleep):
+        out = self.call_command("--server", str(uuid.uuid4()))
+        self.assertIn("Total: 0 messages deleted", out)
+        with self.assertRaises(CommandError):
+            self.call_command("--server", "not_a_server_id")
+
+    def test_deleted_channels(self, patched_sleep):
+        self.channel.delete()
+        out = self.call_command("--orphaned-days", "35")
+        self.assertIn("deleted channels: deleted 2 messages", out)
+        self.assertIn("Deleted 0 conversations", out)
+        out = self.call_command("--orphaned-days", "1")
+        self.assertIn("deleted channels: deleted 2 messages", out)
+        self.assertIn("Deleted 1 conversations", out)
+
+
+class ReconcileConversationsCommandTests(TestCase, BaseTestUser, BaseTestChannel):
+    """Test the reconcile_conversations command."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = cls().get_test_active_regularuser()
+        cls.conversation = Conversation.objects.create(channel=cls().get_test_channel())
+        cls.empty_conversation = Conversation.objects.create()
+        cls.messages = [
+            Message.objects.create(
+                conversation=cls.conversation, sender=cls.user, content="Hello"
+            )
+            for _ in range(3)
+        ]
+
+    def call_command(self, *args) -> str:
+        out = StringIO()
+        call_command("reconcile_conversations", *args, stdout=out)
+        return out.getvalue()
+
+    def test_repairs_the_drifted_counters(self):
+        # messages deleted outside of the purge are not counted down
+        self.messages[-1].delete()
+        Conversation.objects.filter(id=self.empty_conversation.id).update(
+            message_count=5
+        )
+
+        out = self.call_command("--batch-size", "1", "-v", "2")
+
+        self.assertIn("Repaired 2 of 2 conversations", out)
+        self.assertIn(f"Repaired {self.conversation.id}", out)
+        self.conversation.refresh_from_db()
+        self.assertEqual(self.conversation.message_count, 2)
+        self.assertEqual(self.conversation.last_message_id, self.messages[1].id)
+        self.empty_conversation.refresh_from_db()
+        self.assertEqual(self.empty_conversation.message_count, 0)
+        self.assertIn("Repaired 0 of 2 conversations", self.call_command())
+
+    def test_dry_run(self):
+        self.messages[-1].delete()
+        out = self.call_command("--dry-run")
+        self.assertIn("Drifted 1 of 2 conversations", out)
+        self.conversation.refresh_from_db()
+        self.assertEqual(self.conversation.message_count, 3)
+
+    def test_invalid_batch_size(self):
+        with self.assertRaises(CommandError):
+            self.call_command("--batch-size", "0")
@@ -1,18 +1,25 @@
 import sys
 import time
-from unittest.mock import MagicMock
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import AsyncMock, MagicMock, patch
 
-from asgiref.sync import sync_to_async
+from asgiref.sync import async_to_sync, sync_to_async
 from channels.layers import get_channel_layer
 from channels.routing import URLRouter
-from django.test import AsyncClient, SimpleTestCase
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import AsyncClient, SimpleTestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
 from app import urls
-from server.models import Category, Server
-from utils.tests.base import BaseTestUser
+from server.models import Category, Channel, Server
+from utils.tests.base import BaseTestChannel, BaseTestUser
+from webchat.buffers import get_read_marker_buffer
+from webchat.consumers import WebChatConsumer
 from webchat.middleware import JWTAuthMiddleWare
-from webchat.models import Conversation, Message
+from webchat.models import Conversation, Message, ReadMarker
 
 # https://github.com/django/channels/issues/1942
 # workaround for needing daphne - uvicorn is used here so should not depend on it
@@ -21,6 +28,8 @@ sys.modules["channels.testing.live"] = MagicMock()
 
 from channels.testing import WebsocketCommunicator  # noqa E402
 
+User = get_user_model()
+
 
 # or using TransactionTestCase, without -> databases = '__all__'
 class WebChatConsumerTestCase(SimpleTestCase, BaseTestUser):
@@ -38,10 +47,16 @@ class WebChatConsumerTestCase(SimpleTestCase, BaseTestUser):
         )
         cls.server.member.add(cls.user)
         cls.server_id = cls.server.id
-        cls.channel_id = "test_channel_id"
         cls.application = JWTAuthMiddleWare(URLRouter(urls.websocket_urlpatterns))
         cls.channel_layer = get_channel_layer()
 
+    async def get_channel_id(self, name: str) -> str:
+        """returns the id of a new channel of the test server"""
+        channel = await Channel.objects.acreate(
+            name=name, owner=self.user, topic="test_topic", server=self.server
+        )
+        return str(channel.id)
+
     # addint this code to setupclass would save testing time but would require
     # adjustment of BaseTestUser to return the test data for users
     # TODO: investinget this further
@@ -55,7 +70,7 @@ class WebChatConsumerTestCase(SimpleTestCase, BaseTestUser):
         token = response.cookies.get("access_token").value
         return token
 
-    async def get_headers(self, user=None) -> dict:
+    async def get_headers(self, user=None) -> list:
         """adding headers with tokens as cookie"""
         if not user:  # for regualr user defined in the base class
             user = self.user
@@ -65,13 +80,15 @@ class WebChatConsumerTestCase(SimpleTestCase, BaseTestUser):
             self._get_staffuser_data()
             password = self.staffuser_data.password
         token = await self.get_token(user, password)
-        headers = {b"cookie": f"access_token={token}".encode()}
+        headers = [(b"cookie", f"access_token={token}".encode())]
         return headers
 
     async def test_unauthenticated_user_connect(self):
         # Simulate an unauthenticated user by not providing any headers
-        headers = {b"cookie": f"access_token={'not.valid.token'}".encode()}
-        unique_channel_id = self.channel_id + "test_unauthenticated_user_connect"
+        headers = [(b"cookie", f"access_token={'not.valid.token'}".encode())]
+        unique_channel_id = await self.get_channel_id(
+            "test_unauthenticated_user_connect"
+        )
         communicator = WebsocketCommunicator(
             self.application,
             f"/ws/{self.server_id}/{unique_channel_id}/",
@@ -87,7 +104,7 @@ class WebChatConsumerTestCase(SimpleTestCase, BaseTestUser):
     async def test_non_member_cannot_send_message(self):
         # Create a user who is not a member of the server
         headers = await self.get_headers(self.non_member_user)
-        unique_channel_id = self.channel_id + "non_member_send_message"
+        unique_channel_id = await self.get_channel_id("non_member_send_message")
         # Connect the WebSocket communicator for the non-member user
         communicator = WebsocketCommunicator(
             self.application,
@@ -107,10 +124,38 @@ class WebChatConsumerTestCase(SimpleTestCase, BaseTestUser):
         # Disconnect the communicator
         await communicator.disconnect()
 
+    async def test_membership_change_while_connected(self):
+        headers = await self.get_headers(self.non_member_user)
+        unique_channel_id = await self.get_channel_id("membership_change")
+        communicator = WebsocketCommunicator(
+            self.application,
+            f"/ws/{self.server_id}/{unique_channel_id}/",
+            headers=headers,
+        )
+        connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+
+        # the user joins the server while the socket is open
+        await sync_to_async(self.server.member.add)(self.non_member_user)
+        response = await communicator.receive_json_from()
+        self.assertEqual(response, {"type": "membership.changed", "is_member": True})
+        await communicator.send_json_to({"message": "Hello as a member"})
+        response = await communicator.receive_json_from()
+        self.assertEqual(response["new_message"]["content"], "Hello as a member")
+
+        # and leaves it, the socket stops accepting the messages
+        await sync_to_async(self.server.member.remove)(self.non_member_user)
+        response = await communicator.receive_json_from()
+        self.assertEqual(response, {"type": "membership.changed", "is_member": False})
+        await communicator.send_json_to({"message": "Hello as a non member"})
+        self.assertTrue(await communicator.receive_nothing())
+
+        await communicator.disconnect()
+
     async def test_connect_websocket(self):
         # this way the asynchronous test wont mess with other running tests
         headers = await self.get_headers()
-        unique_channel_id = self.channel_id + "connect_simple"
+        unique_channel_id = await self.get_channel_id("connect_simple")
         communicator = WebsocketCommunicator(
             self.application,
             f"/ws/{self.server_id}/{unique_channel_id}/",
@@ -123,7 +168,7 @@ class WebChatConsumerTestCase(SimpleTestCase, BaseTestUser):
     async def test_disconnect(self):
         # this way the asynchronous test wont mess with other running tests
         headers = await self.get_headers()
-        unique_channel_id = self.channel_id + "disconect_simple"
+        unique_channel_id = await self.get_channel_id("disconect_simple")
         communicator = WebsocketCommunicator(
             self.application,
             f"/ws/{self.server_id}/{unique_channel_id}/",
@@ -144,10 +189,68 @@ class WebChatConsumerTestCase(SimpleTestCase, BaseTestUser):
         with self.assertRaises(ValueError):
             connected, subprotocol = await communicator.connect()
 
+    async def test_connect_with_invalid_channel_id(self):
+        headers = await self.get_headers()
+        communicator = WebsocketCommunicator(
+            self.application,
+            f"/ws/{self.server_id}/not_a_channel_id/",
+            headers=headers,
+        )
+        connected, close_code = await communicator.connect()
+        self.assertFalse(connected)
+        self.assertEqual(close_code, 4004)
+
+    async def test_connect_with_invalid_server_id(self):
+        headers = await self.get_headers()
+        unique_channel_id = await self.get_channel_id("invalid_server")
+        communicator = WebsocketCommunicator(
+            self.application,
+            f"/ws/not_a_server_id/{unique_channel_id}/",
+            headers=headers,
+        )
+        connected, close_code = await communicator.connect()
+        self.assertFalse(connected)
+        self.assertEqual(close_code, 4004)
+
+    async def test_membership_change_with_differently_formatted_server_id(self):
+        headers = await self.get_headers(self.non_member_user)
+        unique_channel_id = await self.get_channel_id("membership_format")
+        communicator = WebsocketCommunicator(
+            self.application,
+            f"/ws/{self.server_id.hex.upper()}/{unique_channel_id}/",
+            headers=headers,
+        )
+        connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+
+        # the group of the membership is the one the signals send to
+        await sync_to_async(self.server.member.add)(self.non_member_user)
+        response = await communicator.receive_json_from()
+        self.assertEqual(response, {"type": "membership.changed", "is_member": True})
+        await sync_to_async(self.server.member.remove)(self.non_member_user)
+        response = await communicator.receive_json_from()
+        self.assertEqual(response, {"type": "membership.changed", "is_member": False})
+        await communicator.disconnect()
+
+    async def test_message_to_not_existing_channel(self):
+        headers = await self.get_headers()
+        communicator = WebsocketCommunicator(
+            self.application,
+            f"/ws/{self.server_id}/{uuid.uuid4()}/",
+            headers=headers,
+        )
+        connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+
+        await communicator.send_json_to({"message": "Hello, world!"})
+        output = await communicator.receive_output()
+        self.assertEqual(output, {"type": "websocket.close", "code": 4004})
+        await communicator.wait()
+
     async def test_message_handling_with_message_conversation_creation(self):
         # this way the asynchronous test wont mess with other running tests
         headers = await self.get_headers()
-        unique_channel_id = self.channel_id + "conversation"
+        unique_channel_id = await self.get_channel_id("conversation")
         communicator = WebsocketCommunicator(
             self.application,
             f"/ws/{self.server_id}/{unique_channel_id}/",
@@ -182,10 +285,104 @@ class WebChatConsumerTestCase(SimpleTestCase, BaseTestUser):
 
         await communicator.disconnect()
 
+    async def test_resume_replays_missed_messages(self):
+        # this way the asynchronous test wont mess with other running tests
+        headers = await self.get_headers()
+        unique_channel_id = await self.get_channel_id("resume")
+
+        # messages sent while the client was disconnected
+        def create_messages():
+            conversation = Conversation.objects.create(channel_id=unique_channel_id)
+            for index in range(1, 4):
+                Message.objects.create(
+                    conversation=conversation,
+                    sender=self.user,
+                    content=f"Message {index}",
+                )
+
+        await sync_to_async(create_messages)()
+
+        communicator = WebsocketCommunicator(
+            self.application,
+            f"/ws/{self.server_id}/{unique_channel_id}/?resume_from=1",
+            headers=headers,
+        )
+        connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+
+        # only the messages after the given sequence number are replayed
+        for seq in [2, 3]:
+            response = await communicator.receive_json_from()
+            self.assertEqual(response["new_message"]["seq"], seq)
+            self.assertEqual(response["new_message"]["content"], f"Message {seq}")
+
+        # and then the live messages follow
+        await communicator.send_json_to({"message": "Message 4"})
+        response = await communicator.receive_json_from()
+        self.assertEqual(response["new_message"]["seq"], 4)
+        self.assertEqual(response["new_message"]["content"], "Message 4")
+        self.assertTrue(await communicator.receive_nothing())
+
+        await communicator.disconnect()
+
+    async def test_mark_read_frames_are_coalesced(self):
+        headers = await self.get_headers()
+        unique_channel_id = await self.get_channel_id("mark_read")
+
+        def create_messages():
+            conversation = Conversation.objects.create(channel_id=unique_channel_id)
+            for index in range(1, 4):
+                Message.objects.create(
+                    conversation=conversation,
+                    sender=self.user,
+                    content=f"Message {index}",
+                )
+            return conversation
+
+        conversation = await sync_to_async(create_messages)()
+
+        communicator = WebsocketCommunicator(
+            self.application,
+            f"/ws/{self.server_id}/{unique_channel_id}/",
+            headers=headers,
+        )
+        connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+        for seq in [1, 3, 2, "3", -1, None]:
+            await communicator.send_json_to({"type": "mark_read", "seq": seq})
+        # the frames are not answered
+        self.assertTrue(await communicator.receive_nothing())
+        await communicator.disconnect()
+        # the buffered markers are stored after the flush interval
+        # or on shutdown, not when the socket closes
+        await get_read_marker_buffer().flush()
+
+        markers = await sync_to_async(list)(
+            ReadMarker.objects.filter(conversation=conversation).values_list(
+                "user_id", "last_read_seq"
+            )
+        )
+        self.assertEqual(markers, [(self.user.id, 3)])
+
+    async def test_resume_with_invalid_seq_replays_nothing(self):
+        # this way the asynchronous test wont mess with other running tests
+        headers = await self.get_headers()
+        unique_channel_id = await self.get_channel_id("resume_invalid")
+        communicator = WebsocketCommunicator(
+            self.application,
+            f"/ws/{self.server_id}/{unique_channel_id}/?resume_from=not_a_number",
+            headers=headers,
+        )
+        connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+        self.assertTrue(await communicator.receive_nothing())
+
+        await communicator.disconnect()
+
     async def test_group_operations(self):
         # this way the asynchronous test wont mess with other running tests
         headers = await self.get_headers()
-        unique_channel_id = self.channel_id + "operations"
+        unique_channel_id = await self.get_channel_id("operations")
         communicator1 = WebsocketCommunicator(
             self.application,
             f"/ws/{self.server_id}/{unique_channel_id}/",
@@ -225,7 +422,7 @@ class WebChatConsumerTestCase(SimpleTestCase, BaseTestUser):
         # and that the channel name is discarded
 
         # this way the asynchronous test wont mess with other running tests
-        unique_channel_id = self.channel_id + "discard"
+        unique_channel_id = await self.get_channel_id("discard")
         headers = await self.get_headers()
         communicator1 = WebsocketCommunicator(
             self.application,
@@ -263,9 +460,10 @@ class WebChatConsumerTestCase(SimpleTestCase, BaseTestUser):
 
         await communicator1.disconnect()
 
+        # the async consumer discards the channel name before the disconnect returns
         c_names_before_disconnect2 = await clean_up_and_get_channel_names()
         self.assertEqual(
-            len(c_names_before_disconnect1), len(c_names_before_disconnect2)
+            len(c_names_before_disconnect1) - 1, len(c_names_before_disconnect2)
         )
 
         # # Disconnect the other client
@@ -273,5 +471,102 @@ class WebChatConsumerTestCase(SimpleTestCase, BaseTestUser):
 
         c_names_after_disconnect2 = await clean_up_and_get_channel_names()
         self.assertEqual(
-            len(c_names_before_disconnect1) - 1, len(c_names_after_disconnect2)
+            len(c_names_before_disconnect1) - 2, len(c_names_after_disconnect2)
+        )
+
+
+class WebChatConsumerBroadcastTestCase(SimpleTestCase):
+    """Test suit for the broadcasting of the pre encoded messages"""
+
+    async def test_chat_message_sends_encoded_text(self):
+        # the text is encoded once by the sender, the recipients write it as it is
+        consumer = WebChatConsumer()
+        consumer.send = AsyncMock()
+        text = '{"type": "chat.message", "new_message": {"content": "Hello"}}'
+
+        with patch.object(WebChatConsumer, "encode_json") as patched_encode_json:
+            await consumer.chat_message(
+                {"type": "chat.message", "seq": 1, "text": text}
+            )
+
+        patched_encode_json.assert_not_called()
+        consumer.send.assert_awaited_once_with(text_data=text)
+
+
+# TransactionTestCase as database_sync_to_async closes the connection that
+# would be used inside of the TestCase transaction
+class WebChatConsumerConversationTestCase(TransactionTestCase, BaseTestChannel):
+    """Test suit for the conversation resolved once per connection"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email="test_conversation@test.com", password="conversation_pass"
+        )
+        self.channel_id = str(self.get_test_channel().id)
+
+    def get_consumer(self) -> WebChatConsumer:
+        consumer = WebChatConsumer()
+        consumer.user = self.user
+        consumer.channel_id = self.channel_id
+        return consumer
+
+    def test_conversation_created_with_first_message(self):
+        consumer = self.get_consumer()
+        self.assertFalse(Conversation.objects.filter(channel_id=self.channel_id))
+
+        async_to_sync(consumer.create_message)("Hello")
+
+        conversation = Conversation.objects.get(channel_id=self.channel_id)
+        self.assertEqual(consumer.conversation_id, conversation.id)
+        self.assertEqual(conversation.message.get().content, "Hello")
+
+    def test_existing_conversation_is_used(self):
+        conversation = Conversation.objects.create(channel_id=self.channel_id)
+        consumer = self.get_consumer()
+
+        async_to_sync(consumer.create_message)("Hello")
+
+        self.assertEqual(consumer.conversation_id, conversation.id)
+        self.assertEqual(
+            Conversation.objects.filter(channel_id=self.channel_id).count(), 1
+        )
+
+    def test_one_insert_query_per_message(self):
+        consumer = self.get_consumer()
+        async_to_sync(consumer.create_message)("First message")
+
+        for content in ["Second message", "Third message"]:
+            with CaptureQueriesContext(connection) as context:
+                async_to_sync(consumer.create_message)(content)
+            queries = [
+                query["sql"]
+                for query in context.captured_queries
+                if query["sql"] not in ("BEGIN", "COMMIT")
+            ]
+            # no lookup of the conversation on the hot path, only the allocation
+            # of the sequence number and the INSERT
+            self.assertEqual(len(queries), 2)
+            self.assertTrue(queries[0].startswith('UPDATE "webchat_conversation"'))
+            self.assertTrue(queries[1].startswith('INSERT INTO "webchat_message"'))
+
+        self.assertEqual(
+            Message.objects.filter(conversation_id=consumer.conversation_id).count(),
+            3,
+        )
+
+    def test_concurrent_first_writers_create_one_conversation(self):
+        consumers = [self.get_consumer() for _ in range(5)]
+
+        def resolve(consumer: WebChatConsumer):
+            try:
+                return consumer.get_conversation_id()
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(max_workers=len(consumers)) as executor:
+            conversation_ids = set(executor.map(resolve, consumers))
+
+        self.assertEqual(len(conversation_ids), 1)
+        self.assertEqual(
+            Conversation.objects.filter(channel_id=self.channel_id).count(), 1
         )
@@ -0,0 +1,100 @@
+import gzip
+import io
+import json
+import random
+import string
+
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from utils.tests.base import BaseTestChannel, BaseTestUser
+from webchat.exports import MessageExport
+from webchat.models import Conversation, Message
+
+
+class MessageExportTest(TestCase, BaseTestUser, BaseTestChannel):
+    """Test suit for the MessageExport"""
+
+    @classmethod
+    def setUpTestData(cls) -> None:
+        cls.user = cls().get_test_active_regularuser()
+        cls.conversation = Conversation.objects.create(channel=cls().get_test_channel())
+        generator = random.Random(13)
+        # random content, so the compressed export has several chunks
+        cls.messages = [
+            Message.objects.create(
+                conversation=cls.conversation,
+                sender=cls.user,
+                content="".join(generator.choices(string.printable, k=500)),
+            )
+            for _ in range(300)
+        ]
+        Message.objects.create(
+            conversation=Conversation.objects.create(), sender=cls.user, content="x"
+        )
+
+    def get_export(self, **kwargs) -> MessageExport:
+        return MessageExport(
+            Message.objects.of_conversation(self.conversation.pk), **kwargs
+        )
+
+    def read(self, export: MessageExport) -> list[dict]:
+        file = io.BytesIO()
+        export.write(file)
+        return [
+            json.loads(line)
+            for line in gzip.decompress(file.getvalue()).split(b"\n")
+            if line
+        ]
+
+    def test_messages_in_order(self):
+        export = self.get_export(chunk_size=7)
+        lines = self.read(export)
+        self.assertEqual(
+            [line["id"] for line in lines],
+            [str(message.id) for message in self.messages],
+        )
+        self.assertEqual([line["seq"] for line in lines], list(range(1, 301)))
+        self.assertEqual(lines[0]["content"], self.messages[0].content)
+        self.assertEqual(lines[0]["sender_id"], str(self.user.id))
+        self.assertEqual(
+            set(lines[0]), {"id", "seq", "created", "modified", "sender_id", "content"}
+        )
+        self.assertEqual(export.rows, 300)
+        self.assertGreater(export.raw_bytes, export.compressed_bytes)
+
+    def test_messages_are_read_in_chunks(self):
+        export = self.get_export(chunk_size=50)
+        chunks = iter(export)
+        next(chunks)
+        # the first chunk is sent before the rest of the messages are read
+        self.assertLess(export.rows, 300)
+        for _ in chunks:
+            pass
+        self.assertEqual(export.rows, 300)
+
+    def test_server_side_cursor(self):
+        with CaptureQueriesContext(connection) as context:
+            self.read(self.get_export(chunk_size=100))
+        selects = [
+            query
+            for query in context.captured_queries
+            if query["sql"].startswith("SELECT")
+        ]
+        # the rows are fetched from the cursor, not with a query per chunk
+        self.assertEqual(len(selects), 1)
+
+    def test_cursor_is_read_in_a_transaction(self):
+        savepoints = len(connection.savepoint_ids)
+        chunks = iter(self.get_export(chunk_size=50))
+        next(chunks)
+        # in autocommit the cursor would be declared WITH HOLD
+        self.assertEqual(len(connection.savepoint_ids), savepoints + 1)
+        chunks.close()
+        self.assertEqual(len(connection.savepoint_ids), savepoints)
+
+    def test_empty_export(self):
+        export = MessageExport(Message.objects.none())
+        self.assertEqual(self.read(export), [])
+        self.assertEqual(export.rows, 0)
@@ -0,0 +1,171 @@
+import random
+import string
+import time
+from datetime import timedelta
+from unittest.mock import patch
+
+from asgiref.sync import async_to_sync
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.http.cookie import parse_cookie
+from django.test import SimpleTestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework_simplejwt.tokens import AccessToken
+
+from utils.jwt_tokens.revocation import get_revoked_tokens
+from webchat.middleware import TokenUserCache, get_cookie, get_token_user_cache
+from webchat.middleware.jwt_auth_middleware import get_user
+
+User = get_user_model()
+
+
+class TokenUserCacheTest(SimpleTestCase):
+    """Test suit for the TokenUserCache"""
+
+    def setUp(self):
+        self.cache = TokenUserCache(max_size=2, timeout=60)
+        self.user = User(email="test_cache@test.com")
+
+    def test_hits_and_misses(self):
+        self.assertIsNone(self.cache.get("token"))
+        self.cache.set("token", self.user, time.time() + 300)
+        self.assertIs(self.cache.get("token"), self.user)
+        self.assertEqual(self.cache.stats(), {"size": 1, "hits": 1, "misses": 1})
+
+    def test_least_recently_used_is_evicted(self):
+        expires_at = time.time() + 300
+        self.cache.set("first", self.user, expires_at)
+        self.cache.set("second", self.user, expires_at)
+        self.cache.get("first")
+        self.cache.set("third", self.user, expires_at)
+
+        self.assertEqual(len(self.cache), 2)
+        self.assertIsNone(self.cache.get("second"))
+        self.assertIsNotNone(self.cache.get("first"))
+        self.assertIsNotNone(self.cache.get("third"))
+
+    def test_entry_expires_with_the_token(self):
+        self.cache.set("token", self.user, time.time() - 1)
+        self.assertIsNone(self.cache.get("token"))
+        self.assertEqual(len(self.cache), 0)
+
+    def test_entry_expires_after_the_timeout(self):
+        self.cache.set("token", self.user, time.time() + 300)
+        with patch("time.time", return_value=time.time() + 61):
+            self.assertIsNone(self.cache.get("token"))
+
+    def test_disabled_cache(self):
+        cache = TokenUserCache(max_size=0)
+        cache.set("token", self.user, time.time() + 300)
+        self.assertIsNone(cache.get("token"))
+
+
+class GetCookieTest(SimpleTestCase):
+    """Test suit for the cookie extracted from the raw headers"""
+
+    def get_cookie(self, *cookies: bytes) -> str | None:
+        headers = [(b"host", b"localhost")]
+        headers.extend((b"cookie", cookie) for cookie in cookies)
+        return get_cookie(headers, "access_token")
+
+    def test_cookie(self):
+        self.assertEqual(self.get_cookie(b"access_token=token"), "token")
+        self.assertEqual(self.get_cookie(b"a=1; access_token=token; b=2"), "token")
+        self.assertEqual(self.get_cookie(b"a=1;access_token=token"), "token")
+        self.assertEqual(self.get_cookie(b' a=1 ;  access_token="token" '), "token")
+
+    def test_missing_cookie(self):
+        self.assertIsNone(get_cookie([], "access_token"))
+        self.assertIsNone(self.get_cookie(b""))
+        self.assertIsNone(self.get_cookie(b";"))
+        self.assertIsNone(self.get_cookie(b"access_token"))
+        self.assertIsNone(self.get_cookie(b"access_token="))
+        self.assertIsNone(self.get_cookie(b"refresh_token=token"))
+
+    def test_value_with_equal_signs(self):
+        self.assertEqual(self.get_cookie(b"access_token=a=b=="), "a=b==")
+
+    def test_name_inside_another_cookie(self):
+        self.assertIsNone(self.get_cookie(b"old_access_token=token"))
+        self.assertIsNone(self.get_cookie(b"a=access_token=token"))
+        self.assertEqual(
+            self.get_cookie(b"a=access_token=other; access_token=token"), "token"
+        )
+
+    def test_cookie_in_any_of_the_headers(self):
+        self.assertEqual(self.get_cookie(b"a=1", b"access_token=token"), "token")
+
+    def test_random_cookies_as_parse_cookie(self):
+        generator = random.Random(13)
+        names = ["access_token", "_access_token", "access_token_", "a", "b", "c"]
+        alphabet = string.ascii_letters + string.digits + "=-_. "
+        for _ in range(2000):
+            pairs = [
+                (
+                    name,
+                    "".join(generator.choices(alphabet, k=generator.randint(0, 20))),
+                )
+                for name in generator.sample(names, generator.randint(0, len(names)))
+            ]
+            separator = generator.choice(["; ", ";", " ; "])
+            cookies = separator.join(f"{name}={value}" for name, value in pairs)
+            expected = parse_cookie(cookies).get("access_token") or None
+            self.assertEqual(self.get_cookie(cookies.encode()), expected, cookies)
+
+    def test_random_bytes(self):
+        generator = random.Random(13)
+        alphabet = b'access_token=;" \t\xff'
+        for _ in range(2000):
+            cookies = bytes(generator.choices(alphabet, k=generator.randint(0, 40)))
+            value = self.get_cookie(cookies)
+            self.assertTrue(value is None or isinstance(value, str))
+
+
+class JWTAuthMiddleWareGetUserTest(TransactionTestCase):
+    """Test suit for the users of the tokens used by the JWTAuthMiddleWare"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email="test_middleware@test.com", password="middleware_pass"
+        )
+        get_token_user_cache().clear()
+        self.addCleanup(get_token_user_cache().clear)
+        get_revoked_tokens().clear()
+        self.addCleanup(get_revoked_tokens().clear)
+
+    def get_user(self, token: str | None):
+        return async_to_sync(get_user)({"token": token})
+
+    def test_user_is_read_once_per_token(self):
+        token = str(AccessToken.for_user(self.user))
+        self.assertEqual(self.get_user(token), self.user)
+        # the reconnect does not query the users table
+        with CaptureQueriesContext(connection) as context:
+            self.assertEqual(self.get_user(token), self.user)
+        self.assertEqual(len(context.captured_queries), 0)
+        self.assertEqual(get_token_user_cache().stats()["hits"], 1)
+
+    def test_expired_token(self):
+        token = AccessToken.for_user(self.user)
+        token.set_exp(lifetime=-timedelta(seconds=1))
+        self.assertFalse(self.get_user(str(token)).is_authenticated)
+
+    def test_invalid_token(self):
+        self.assertFalse(self.get_user("not.valid.token").is_authenticated)
+        self.assertFalse(self.get_user(None).is_authenticated)
+        self.assertEqual(len(get_token_user_cache()), 0)
+
+    def test_deleted_user(self):
+        token = str(AccessToken.for_user(self.user))
+        self.user.delete()
+        self.assertFalse(self.get_user(token).is_authenticated)
+
+    def test_revoked_token(self):
+        token = AccessToken.for_user(self.user)
+        # the user of the token is cached before it is revoked
+        self.assertEqual(self.get_user(str(token)), self.user)
+        get_revoked_tokens().revoke_token(token)
+        self.assertFalse(self.get_user(str(token)).is_authenticated)
+
+        get_token_user_cache().clear()
+        self.assertFalse(self.get_user(str(token)).is_authenticated)
@@ -0,0 +1,135 @@
+from datetime import datetime, timezone
+
+from django.db import connection
+from django.test import TestCase
+
+from utils.tests.base import BaseTestChannel, BaseTestUser
+from webchat.models import Conversation, Message
+from webchat.partitions import MessagePartitions, add_months, get_month
+
+
+class MonthTest(TestCase):
+    """Test suit for the months of the partitions"""
+
+    def test_get_month(self):
+        self.assertEqual(
+            get_month(datetime(2024, 3, 31, 23, 59, tzinfo=timezone.utc)),
+            datetime(2024, 3, 1, tzinfo=timezone.utc),
+        )
+
+    def test_add_months(self):
+        month = datetime(2024, 11, 1, tzinfo=timezone.utc)
+        self.assertEqual(
+            add_months(month, 2), datetime(2025, 1, 1, tzinfo=timezone.utc)
+        )
+        self.assertEqual(
+            add_months(month, -11), datetime(2023, 12, 1, tzinfo=timezone.utc)
+        )
+
+
+class MessagePartitionsTest(TestCase, BaseTestUser, BaseTestChannel):
+    """Test suit for the MessagePartitions"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = cls().get_test_active_regularuser()
+        cls.conversation = Conversation.objects.create(channel=cls().get_test_channel())
+
+    def setUp(self):
+        self.partitions = MessagePartitions()
+
+    def get_names(self) -> list[str]:
+        return [name for name, _, _ in self.partitions.get_partitions()]
+
+    def create_message(self, created: datetime) -> Message:
+        return Message.objects.create(
+            conversation=self.conversation,
+            sender=self.user,
+            content="Hello",
+            created=created,
+        )
+
+    def count_rows(self, table: str) -> int:
+        with connection.cursor() as cursor:
+            cursor.execute(f"SELECT count(*) FROM {connection.ops.quote_name(table)}")
+            return cursor.fetchone()[0]
+
+    def test_current_month_is_partitioned(self):
+        # the partitions of the next months are created with the table
+        now = datetime.now(timezone.utc)
+        self.assertIn(self.partitions.get_name(now), self.get_names())
+        self.assertIn(self.partitions.get_name(add_months(now, 1)), self.get_names())
+
+        message = self.create_message(now)
+        self.assertEqual(self.count_rows(self.partitions.get_name(now)), 1)
+        self.assertEqual(Message.objects.get(id=message.id), message)
+
+    def test_create_partition(self):
+        month = datetime(2020, 1, 1, tzinfo=timezone.utc)
+        self.assertTrue(self.partitions.create(month))
+        self.assertFalse(self.partitions.create(month))
+        self.assertIn(
+            ("webchat_message_p2020_01", month, add_months(month, 1)),
+            self.partitions.get_partitions(),
+        )
+
+    def test_messages_moved_from_the_default_partition(self):
+        message = self.create_message(datetime(2019, 5, 20, tzinfo=timezone.utc))
+        self.assertEqual(self.count_rows(self.partitions.default), 1)
+        self.assertEqual(
+            self.partitions.get_default_months(),
+            [datetime(2019, 5, 1, tzinfo=timezone.utc)],
+        )
+
+        self.partitions.create(message.created)
+
+        self.assertEqual(self.count_rows(self.partitions.default), 0)
+        self.assertEqual(self.count_rows("webchat_message_p2019_05"), 1)
+        self.assertEqual(Message.objects.get(id=message.id).content, "Hello")
+
+    def test_ensure(self):
+        self.create_message(datetime(2019, 5, 20, tzinfo=timezone.utc))
+        now = datetime(2040, 1, 15, tzinfo=timezone.utc)
+        created = self.partitions.ensure(1, now=now)
+        self.assertEqual(
+            created,
+            [
+                "webchat_message_p2019_05",
+                "webchat_message_p2040_01",
+                "webchat_message_p2040_02",
+            ],
+        )
+        self.assertEqual(self.partitions.ensure(1, now=now), [])
+
+    def test_expired_partition_is_detached(self):
+        for month in (1, 2, 3):
+            self.partitions.create(datetime(2020, month, 1, tzinfo=timezone.utc))
+        message = self.create_message(datetime(2020, 1, 10, tzinfo=timezone.utc))
+
+        expired = self.partitions.get_expired(
+            1, now=datetime(2020, 3, 10, tzinfo=timezone.utc)
+        )
+        self.assertIn("webchat_message_p2020_01", expired)
+        self.assertNotIn("webchat_message_p2020_02", expired)
+        self.assertNotIn("webchat_message_p2020_03", expired)
+
+        self.partitions.detach("webchat_message_p2020_01")
+        self.assertNotIn("webchat_message_p2020_01", self.get_names())
+        # the messages are kept in the detached table
+        self.assertFalse(Message.objects.filter(id=message.id).exists())
+        self.assertEqual(self.count_rows("webchat_message_p2020_01"), 1)
+
+        self.partitions.detach("webchat_message_p2020_02", drop=True)
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT to_regclass('webchat_message_p2020_02')")
+            self.assertIsNone(cursor.fetchone()[0])
+
+    def test_messages_of_conversation_are_pruned(self):
+        self.partitions.create(datetime(2020, 1, 1, tzinfo=timezone.utc))
+        plan = Message.objects.of_conversation(
+            self.conversation.id, self.conversation.created
+        ).explain()
+        # only the months since the conversation was created are scanned,
+        # and the default partition, which is kept empty
+        self.assertIn(self.partitions.get_name(self.conversation.created), plan)
+        self.assertNotIn("webchat_message_p2020_01", plan)
@@ -0,0 +1,150 @@
+from datetime import timedelta
+from unittest.mock import patch
+
+from django.test import TestCase
+from django.utils import timezone
+
+from server.models import Category, Channel, Server
+from utils.tests.base import BaseTestChannel, BaseTestUser
+from webchat.models import Conversation, Message
+from webchat.retention import MessageRetention
+
+
+class MessageRetentionTest(TestCase, BaseTestUser, BaseTestChannel):
+    """Test suit for the MessageRetention"""
+
+    @classmethod
+    def setUpTestData(cls) -> None:
+        cls.user = cls().get_test_active_regularuser()
+        cls.channel = cls().get_test_channel()
+        cls.server = cls.channel.server
+        cls.server.message_retention_days = 90
+        cls.server.save()
+        cls.conversation = Conversation.objects.create(channel=cls.channel)
+        # a server keeping its messages
+        category = Category.objects.create(name="test_retention_category")
+        cls.kept_server = Server.objects.create(
+            name="test_kept_server", owner=cls.user, category=category
+        )
+        cls.kept_conversation = Conversation.objects.create(
+            channel=Channel.objects.create(
+                name="test_kept_channel", owner=cls.user, server=cls.kept_server
+            )
+        )
+        now = timezone.now()
+        for conversation in (cls.conversation, cls.kept_conversation):
+            for days in (400, 200, 100, 95, 91, 80, 1):
+                Message.objects.create(
+                    conversation=conversation,
+                    sender=cls.user,
+                    content=f"{days} days old",
+                    created=now - timedelta(days=days),
+                )
+
+    def get_contents(self, conversation: Conversation) -> list[str]:
+        return list(
+            Message.objects.filter(conversation=conversation)
+            .order_by("created")
+            .values_list("content", flat=True)
+        )
+
+    def purge(self, retention: MessageRetention) -> list[int]:
+        batches = []
+        for _, _, cutoff in retention.get_policies():
+            for conversation_id, _ in retention.get_conversations(self.server.pk):
+                batches.extend(retention.purge_conversation(conversation_id, cutoff))
+        return batches
+
+    def test_policies(self):
+        policies = MessageRetention().get_policies()
+        self.assertEqual([policy[0] for policy in policies], [self.server.pk])
+        self.assertAlmostEqual(
+            policies[0][2],
+            timezone.now() - timedelta(days=90),
+            delta=timedelta(seconds=10),
+        )
+
+    @patch("time.sleep")
+    def test_expired_messages_are_deleted_in_batches(self, patched_sleep):
+        batches = self.purge(MessageRetention(batch_size=2, sleep=0.5))
+
+        self.assertEqual(batches, [2, 2, 1])
+        # the pause is only between the batches
+        self.assertEqual(patched_sleep.call_count, 2)
+        patched_sleep.assert_called_with(0.5)
+        self.assertEqual(
+            self.get_contents(self.conversation), ["80 days old", "1 days old"]
+        )
+        self.assertEqual(len(self.get_contents(self.kept_conversation)), 7)
+        # the deleted messages are subtracted from the counters
+        self.conversation.refresh_from_db()
+        self.assertEqual(self.conversation.message_count, 2)
+        self.assertIsNotNone(self.conversation.last_message_id)
+        self.kept_conversation.refresh_from_db()
+        self.assertEqual(self.kept_conversation.message_count, 7)
+
+    def test_last_message_is_cleared_with_all_messages(self):
+        retention = MessageRetention(batch_size=3, sleep=0)
+        cutoff = timezone.now() + timedelta(days=1)
+        self.assertEqual(
+            list(retention.purge_conversation(self.conversation.pk, cutoff)),
+            [3, 3, 1],
+        )
+        self.conversation.refresh_from_db()
+        self.assertEqual(self.conversation.message_count, 0)
+        self.assertIsNone(self.conversation.last_message_at)
+        self.assertIsNone(self.conversation.last_message_id)
+
+    def test_last_message_is_refreshed_in_the_batch(self):
+        # a last message older than the retained ones, stored out of order
+        expired = Message.objects.get(
+            conversation=self.conversation, content="400 days old"
+        )
+        Conversation.objects.filter(pk=self.conversation.pk).update(
+            last_message_id=expired.id, last_message_at=expired.created
+        )
+        self.assertEqual(self.purge(MessageRetention(batch_size=10, sleep=0)), [5])
+
+        latest = Message.objects.get(
+            conversation=self.conversation, content="1 days old"
+        )
+        self.conversation.refresh_from_db()
+        self.assertEqual(self.conversation.last_message_id, latest.id)
+        self.assertEqual(self.conversation.last_message_at, latest.created)
+        self.assertEqual(self.conversation.message_count, 2)
+
+    @patch("time.sleep")
+    def test_without_expired_messages(self, patched_sleep):
+        retention = MessageRetention(batch_size=10, sleep=0.5)
+        self.assertEqual(self.purge(retention), [5])
+        self.assertEqual(self.purge(retention), [0])
+        patched_sleep.assert_not_called()
+
+    def test_count(self):
+        retention = MessageRetention()
+        _, _, cutoff = retention.get_policies()[0]
+        self.assertEqual(retention.count(self.conversation.pk, cutoff), 5)
+
+    def test_orphaned_conversations(self):
+        self.kept_conversation.channel.delete()
+        retention = MessageRetention(batch_size=100, sleep=0, orphaned_days=30)
+        self.assertEqual(
+            retention.get_orphaned_conversations(), [(self.kept_conversation.pk, None)]
+        )
+        # a conversation is deleted only with its last message
+        self.assertEqual(retention.delete_empty_orphaned_conversations(), 0)
+        for conversation_id, _ in retention.get_orphaned_conversations():
+            list(retention.purge_conversation(conversation_id, timezone.now()))
+        self.assertEqual(retention.delete_empty_orphaned_conversations(), 1)
+        self.assertFalse(
+            Conversation.objects.filter(pk=self.kept_conversation.pk).exists()
+        )
+        self.assertTrue(Conversation.objects.filter(pk=self.conversation.pk).exists())
+
+    def test_conversations_with_legacy_channel_id_are_kept(self):
+        # matched no channel when the conversations were keyed to the channels
+        unreviewed = Conversation.objects.create(legacy_channel_id="old-channel")
+        retention = MessageRetention(batch_size=100, sleep=0, orphaned_days=30)
+        self.assertEqual(retention.get_orphaned_conversations(), [])
+        self.assertEqual(retention.delete_empty_orphaned_conversations(), 0)
+        self.assertTrue(Conversation.objects.filter(pk=unreviewed.pk).exists())
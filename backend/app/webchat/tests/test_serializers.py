@@ -1,16 +1,16 @@
 from django.test import TestCase
 
-from utils.tests.base import BaseTestUser
+from utils.tests.base import BaseTestChannel, BaseTestUser
 from webchat.models import Conversation, Message
 from webchat.serializers import MessageSerializer
 
 
-class MessageSerializerTest(TestCase, BaseTestUser):
+class MessageSerializerTest(TestCase, BaseTestUser, BaseTestChannel):
     @classmethod
     def setUpTestData(cls):
         # Create sample data for testing
         cls.user = cls().get_test_active_regularuser()
-        cls.conversation = Conversation.objects.create(channel_id="test_channel")
+        cls.conversation = Conversation.objects.create(channel=cls().get_test_channel())
         cls.message_data = {
             "conversation": cls.conversation.id,
             "sender": cls.user.id,
@@ -1,22 +1,34 @@
-from django.test import TestCase
+import gzip
+import json
+from datetime import timedelta
+
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils import timezone
 from rest_framework import status
 from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
 
-from utils.tests.base import BaseTestUser
-from webchat.models import Conversation, Message
+from server.models import Category, Channel, Server
+from utils.tests.base import BaseTestChannel, BaseTestUser
+from webchat.cache import get_recent_messages_cache
+from webchat.models import Conversation, Message, ReadMarker
+from webchat.retention import MessageRetention
 from webchat.serializers import MessageSerializer
 
 
-class MessageViewSetTest(TestCase, BaseTestUser):
+class MessageViewSetTest(TestCase, BaseTestUser, BaseTestChannel):
     """Test suit for MessageViewSet"""
 
     @classmethod
     def setUpTestData(cls) -> None:
         # creating sample data for testing
         cls.user = cls().get_test_active_regularuser()
-        cls.channel_id = "550e8400-e29b-41d4-a716-446655440000"
-        cls.conversation = Conversation.objects.create(channel_id=cls.channel_id)
+        cls.channel = cls().get_test_channel()
+        cls.channel_id = str(cls.channel.id)
+        cls.conversation = Conversation.objects.create(channel=cls.channel)
         cls.msg_one = Message.objects.create(
             conversation=cls.conversation, sender=cls.user, content="Message One"
         )
@@ -27,6 +39,9 @@ class MessageViewSetTest(TestCase, BaseTestUser):
     def setUp(self) -> None:
         # initialize the test client
         self.client = APIClient()
+        # the cached messages are not rolled back with the test database
+        get_recent_messages_cache().clear(self.channel_id)
+        self.addCleanup(get_recent_messages_cache().clear, self.channel_id)
 
     def test_list_messages_all(self):
         url = reverse("webchat:webchat-messages-list")
@@ -37,6 +52,25 @@ class MessageViewSetTest(TestCase, BaseTestUser):
         serializer_data = MessageSerializer(messages, many=True).data
         self.assertEqual(response.data, serializer_data)
 
+    def test_list_messages_served_from_cache(self):
+        url = reverse("webchat:webchat-messages-list")
+        response = self.client.get(url, {"by_channelId": self.channel_id})
+        # the second time the channel is opened the database is not used
+        with self.assertNumQueries(0):
+            cached_response = self.client.get(url, {"by_channelId": self.channel_id})
+        self.assertEqual(cached_response.status_code, status.HTTP_200_OK)
+        self.assertJSONEqual(cached_response.content, response.content.decode())
+
+    def test_list_messages_cache_is_filled_on_miss(self):
+        url = reverse("webchat:webchat-messages-list")
+        self.assertIsNone(get_recent_messages_cache().get(self.channel_id, 2))
+        self.client.get(url, {"by_channelId": self.channel_id})
+        cached = get_recent_messages_cache().get(self.channel_id, 2)
+        self.assertEqual(
+            [message["id"] for message in cached],
+            [str(self.msg_one.id), str(self.msg_two.id)],
+        )
+
     def test_list_messages_without_channel_id(self):
         url = reverse("webchat:webchat-messages-list")
         response = self.client.get(url)
@@ -48,3 +82,493 @@ class MessageViewSetTest(TestCase, BaseTestUser):
         response = self.client.get(url, {"by_channelId": not_existing_channel_id})
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(response.data, [])
+
+    def test_list_messages_with_wrong_channel_id_format(self):
+        url = reverse("webchat:webchat-messages-list")
+        response = self.client.get(url, {"by_channelId": "not_a_channel_id"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_list_messages_with_uppercase_channel_id(self):
+        url = reverse("webchat:webchat-messages-list")
+        response = self.client.get(url, {"by_channelId": self.channel_id.upper()})
+        self.assertEqual(len(response.data), 2)
+        # the cache of the channel is the same for any format of its id
+        self.assertIsNotNone(get_recent_messages_cache().get(self.channel_id, 2))
+
+
+class MessageViewSetPaginationTest(TestCase, BaseTestUser, BaseTestChannel):
+    """Test suit for the cursor pagination of the MessageViewSet"""
+
+    @classmethod
+    def setUpTestData(cls) -> None:
+        cls.user = cls().get_test_active_regularuser()
+        cls.channel = cls().get_test_channel()
+        cls.channel_id = str(cls.channel.id)
+        cls.conversation = Conversation.objects.create(channel=cls.channel)
+        for index in range(120):
+            Message.objects.create(
+                conversation=cls.conversation,
+                sender=cls.user,
+                content=f"Message {index}",
+            )
+        cls.messages = list(
+            Message.objects.filter(conversation=cls.conversation).order_by(
+                "created", "id"
+            )
+        )
+
+    def setUp(self) -> None:
+        self.client = APIClient()
+        self.url = reverse("webchat:webchat-messages-list")
+        get_recent_messages_cache().clear(self.channel_id)
+        self.addCleanup(get_recent_messages_cache().clear, self.channel_id)
+
+    def get_ids(self, response) -> list[str]:
+        return [message["id"] for message in response.data]
+
+    def get_expected_ids(self, messages) -> list[str]:
+        return [str(message.id) for message in messages]
+
+    def get_link(self, response, rel: str) -> str | None:
+        for link in response.get("Link", "").split(", "):
+            if link.endswith(f'rel="{rel}"'):
+                return link.split(">")[0].lstrip("<")
+        return None
+
+    def test_first_page_has_the_latest_messages(self):
+        response = self.client.get(self.url, {"by_channelId": self.channel_id})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            self.get_ids(response), self.get_expected_ids(self.messages[-50:])
+        )
+        self.assertIsNotNone(self.get_link(response, "prev"))
+        self.assertIsNone(self.get_link(response, "next"))
+
+    def test_cached_first_page_has_the_same_links(self):
+        response = self.client.get(self.url, {"by_channelId": self.channel_id})
+        with self.assertNumQueries(0):
+            cached_response = self.client.get(
+                self.url, {"by_channelId": self.channel_id}
+            )
+        self.assertEqual(self.get_ids(cached_response), self.get_ids(response))
+        self.assertEqual(cached_response["Link"], response["Link"])
+
+    def test_walk_back_and_forth_with_the_links(self):
+        response = self.client.get(self.url, {"by_channelId": self.channel_id})
+        response = self.client.get(self.get_link(response, "prev"))
+        self.assertEqual(
+            self.get_ids(response), self.get_expected_ids(self.messages[-100:-50])
+        )
+        response = self.client.get(self.get_link(response, "prev"))
+        self.assertEqual(
+            self.get_ids(response), self.get_expected_ids(self.messages[:-100])
+        )
+        self.assertIsNone(self.get_link(response, "prev"))
+
+        response = self.client.get(self.get_link(response, "next"))
+        self.assertEqual(
+            self.get_ids(response), self.get_expected_ids(self.messages[20:70])
+        )
+        response = self.client.get(self.get_link(response, "next"))
+        self.assertEqual(
+            self.get_ids(response), self.get_expected_ids(self.messages[70:120])
+        )
+        self.assertIsNone(self.get_link(response, "next"))
+
+    def test_page_size_is_capped(self):
+        response = self.client.get(
+            self.url, {"by_channelId": self.channel_id, "page_size": 10}
+        )
+        self.assertEqual(
+            self.get_ids(response), self.get_expected_ids(self.messages[-10:])
+        )
+        response = self.client.get(
+            self.url, {"by_channelId": self.channel_id, "page_size": 1000}
+        )
+        self.assertEqual(len(response.data), 100)
+
+    def test_invalid_cursor(self):
+        response = self.client.get(
+            self.url, {"by_channelId": self.channel_id, "before": "not-a-cursor"}
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_before_and_after_together(self):
+        response = self.client.get(self.url, {"by_channelId": self.channel_id})
+        cursor = self.get_link(response, "prev").split("before=")[1]
+        response = self.client.get(
+            self.url,
+            {"by_channelId": self.channel_id, "before": cursor, "after": cursor},
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+# the messages are read from the database and not from the cache
+@override_settings(WEBCHAT={"RECENT_MESSAGES_CACHE_SIZE": 0})
+class MessageViewSetQueriesTest(TestCase, BaseTestUser, BaseTestChannel):
+    """Test suit for the number of queries of the MessageViewSet"""
+
+    @classmethod
+    def setUpTestData(cls) -> None:
+        cls.channel = cls().get_test_channel()
+        cls.channel_id = str(cls.channel.id)
+        cls.conversation = Conversation.objects.create(channel=cls.channel)
+        # every message has a different sender
+        cls.senders = [
+            cls().get_test_active_regularuser(),
+            cls().get_test_staffuser(),
+            cls().get_test_superuser(),
+        ]
+        for index in range(30):
+            Message.objects.create(
+                conversation=cls.conversation,
+                sender=cls.senders[index % len(cls.senders)],
+                content=f"Message {index}",
+            )
+
+    def setUp(self) -> None:
+        self.client = APIClient()
+        self.url = reverse("webchat:webchat-messages-list")
+
+    def test_page_costs_the_same_number_of_queries(self):
+        # one query for the conversation and one for the messages
+        # with their senders, no matter how many messages are in the page
+        for page_size in (1, 10, 30):
+            with self.subTest(page_size=page_size):
+                with self.assertNumQueries(2):
+                    response = self.client.get(
+                        self.url,
+                        {"by_channelId": self.channel_id, "page_size": page_size},
+                    )
+                self.assertEqual(len(response.data), page_size)
+                self.assertTrue(all(message["sender"] for message in response.data))
+
+    def test_page_with_cursor_costs_the_same_number_of_queries(self):
+        response = self.client.get(
+            self.url, {"by_channelId": self.channel_id, "page_size": 10}
+        )
+        previous_link = response["Link"].split(">")[0].lstrip("<")
+        with self.assertNumQueries(2):
+            response = self.client.get(previous_link)
+        self.assertEqual(len(response.data), 10)
+
+    def test_conversation_is_read_from_the_index(self):
+        with CaptureQueriesContext(connection) as context:
+            self.client.get(self.url, {"by_channelId": self.channel_id})
+        # only the id and created of the conversation are selected,
+        # they are in the index
+        self.assertTrue(
+            context.captured_queries[0]["sql"].startswith(
+                'SELECT "webchat_conversation"."id", "webchat_conversation"."created" '
+                'FROM "webchat_conversation"'
+            )
+        )
+        # the messages are bounded by the creation of the conversation
+        self.assertIn(
+            '"webchat_message"."created" >=', context.captured_queries[1]["sql"]
+        )
+
+
+class MessageViewSetSearchTest(TestCase, BaseTestUser, BaseTestChannel):
+    """Test suit for the full-text search of the MessageViewSet"""
+
+    @classmethod
+    def setUpTestData(cls) -> None:
+        cls.user = cls().get_test_active_regularuser()
+        cls.channel = cls().get_test_channel()
+        cls.other_channel = cls().get_test_channel("test_other_channel")
+        cls.channel.server.member.add(cls.user)
+        cls.conversation = Conversation.objects.create(channel=cls.channel)
+        cls.other_conversation = Conversation.objects.create(channel=cls.other_channel)
+        # the channel of a server the user did not join
+        owner = cls().get_test_staffuser()
+        category = Category.objects.create(name="test_search_category")
+        server = Server.objects.create(
+            name="test_search_server", owner=owner, category=category
+        )
+        cls.hidden_channel = Channel.objects.create(
+            name="test_hidden_channel", owner=owner, server=server
+        )
+        cls.hidden_conversation = Conversation.objects.create(
+            channel=cls.hidden_channel
+        )
+
+        cls.release = cls.create_message(
+            cls.conversation, "The release is planned for friday"
+        )
+        cls.releases = cls.create_message(
+            cls.conversation, "Releases, releases and more releases"
+        )
+        cls.other_release = cls.create_message(
+            cls.other_conversation, "Who is running the release?"
+        )
+        cls.hidden_release = cls.create_message(
+            cls.hidden_conversation, "The release of the hidden server"
+        )
+        cls.create_message(cls.conversation, "Nothing to see here")
+
+    @classmethod
+    def create_message(cls, conversation: Conversation, content: str) -> Message:
+        return Message.objects.create(
+            conversation=conversation, sender=cls.user, content=content
+        )
+
+    def setUp(self) -> None:
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.url = reverse("webchat:webchat-messages-search")
+
+    def get_ids(self, response) -> list[str]:
+        return [message["id"] for message in response.data]
+
+    def test_search_only_the_servers_of_the_user(self):
+        response = self.client.get(self.url, {"q": "release"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertCountEqual(
+            self.get_ids(response),
+            [str(self.release.id), str(self.releases.id), str(self.other_release.id)],
+        )
+
+    def test_best_matches_first(self):
+        response = self.client.get(self.url, {"q": "release"})
+        self.assertEqual(response.data[0]["id"], str(self.releases.id))
+        ranks = [message["rank"] for message in response.data]
+        self.assertEqual(ranks, sorted(ranks, reverse=True))
+
+    def test_words_are_matched_by_their_stems(self):
+        response = self.client.get(self.url, {"q": "run"})
+        self.assertEqual(self.get_ids(response), [str(self.other_release.id)])
+
+    def test_web_search_syntax(self):
+        response = self.client.get(self.url, {"q": '"planned for friday"'})
+        self.assertEqual(self.get_ids(response), [str(self.release.id)])
+        response = self.client.get(self.url, {"q": "release -friday"})
+        self.assertNotIn(str(self.release.id), self.get_ids(response))
+
+    def test_result_has_the_channel(self):
+        response = self.client.get(self.url, {"q": "running"})
+        self.assertEqual(response.data[0]["channel"], str(self.other_channel.id))
+        self.assertEqual(response.data[0]["content"], self.other_release.content)
+        self.assertNotIn("search_vector", response.data[0])
+
+    def test_search_the_server_and_the_channel(self):
+        response = self.client.get(
+            self.url, {"q": "release", "by_channelId": str(self.other_channel.id)}
+        )
+        self.assertEqual(self.get_ids(response), [str(self.other_release.id)])
+        response = self.client.get(
+            self.url, {"q": "release", "by_serverId": str(self.channel.server_id)}
+        )
+        self.assertEqual(len(response.data), 3)
+        # the channel of a server the user did not join is not searched
+        response = self.client.get(
+            self.url, {"q": "release", "by_channelId": str(self.hidden_channel.id)}
+        )
+        self.assertEqual(response.data, [])
+
+    def test_walk_the_pages_with_the_links(self):
+        for index in range(7):
+            self.create_message(self.conversation, "release " * (index % 3 + 1))
+        response = self.client.get(self.url, {"q": "release", "page_size": 4})
+        ids = self.get_ids(response)
+        while "Link" in response:
+            response = self.client.get(response["Link"].split(">")[0].lstrip("<"))
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            ids.extend(self.get_ids(response))
+        expected = self.get_ids(self.client.get(self.url, {"q": "release"}))
+        self.assertEqual(ids, expected)
+        self.assertEqual(len(ids), 10)
+
+    def test_page_costs_one_query(self):
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url, {"q": "release"})
+        self.assertTrue(all(message["sender"] for message in response.data))
+
+    def test_invalid_parameters(self):
+        for params in (
+            {},
+            {"q": "  "},
+            {"q": "a" * 257},
+            {"q": "release", "by_serverId": "not_a_server_id"},
+            {"q": "release", "by_channelId": "not_a_channel_id"},
+            {"q": "release", "cursor": "not-a-cursor"},
+        ):
+            with self.subTest(params=params):
+                response = self.client.get(self.url, params)
+                self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_unauthenticated(self):
+        self.client.force_authenticate(None)
+        response = self.client.get(self.url, {"q": "release"})
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class MessageViewSetExportTest(TestCase, BaseTestUser, BaseTestChannel):
+    """Test suit for the streaming export of the MessageViewSet"""
+
+    @classmethod
+    def setUpTestData(cls) -> None:
+        cls.user = cls().get_test_active_regularuser()
+        cls.channel = cls().get_test_channel()
+        cls.channel.server.member.add(cls.user)
+        cls.conversation = Conversation.objects.create(channel=cls.channel)
+        cls.messages = [
+            Message.objects.create(
+                conversation=cls.conversation,
+                sender=cls.user,
+                content=f"Message {index}",
+            )
+            for index in range(25)
+        ]
+
+    def setUp(self) -> None:
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.url = reverse("webchat:webchat-messages-export")
+
+    def get_lines(self, content: bytes) -> list[dict]:
+        return [json.loads(line) for line in gzip.decompress(content).splitlines()]
+
+    def test_export(self):
+        response = self.client.get(self.url, {"by_channelId": str(self.channel.id)})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        self.assertEqual(response["Content-Type"], "application/gzip")
+        self.assertEqual(
+            response["Content-Disposition"],
+            f'attachment; filename="channel-{self.channel.id}.jsonl.gz"',
+        )
+        lines = self.get_lines(b"".join(response.streaming_content))
+        self.assertEqual(
+            [line["id"] for line in lines],
+            [str(message.id) for message in self.messages],
+        )
+
+    async def test_export_is_streamed_asynchronously_to_asgi(self):
+        token = AccessToken.for_user(self.user)
+        self.async_client.cookies["access_token"] = str(token)
+        response = await self.async_client.get(
+            self.url, {"by_channelId": str(self.channel.id)}
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.is_async)
+        content = b"".join([chunk async for chunk in response.streaming_content])
+        self.assertEqual(len(self.get_lines(content)), 25)
+
+    def test_channel_without_messages(self):
+        channel = self.get_test_channel("test_empty_channel")
+        response = self.client.get(self.url, {"by_channelId": str(channel.id)})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.get_lines(b"".join(response.streaming_content)), [])
+
+    def test_only_the_members_export(self):
+        self.channel.server.member.remove(self.user)
+        response = self.client.get(self.url, {"by_channelId": str(self.channel.id)})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+        self.client.force_authenticate(None)
+        response = self.client.get(self.url, {"by_channelId": str(self.channel.id)})
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_invalid_channel_id(self):
+        for params in ({}, {"by_channelId": "not_a_channel_id"}):
+            with self.subTest(params=params):
+                response = self.client.get(self.url, params)
+                self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class MessageViewSetUnreadTest(TestCase, BaseTestUser, BaseTestChannel):
+    """Test suit for the unread counts of the MessageViewSet"""
+
+    @classmethod
+    def setUpTestData(cls) -> None:
+        cls.user = cls().get_test_active_regularuser()
+        cls.other_user = cls().get_test_staffuser()
+        cls.channel = cls().get_test_channel("test_a_channel")
+        cls.read_channel = cls().get_test_channel("test_b_channel")
+        cls.empty_channel = cls().get_test_channel("test_c_channel")
+        cls.server = cls.channel.server
+        cls.server.member.add(cls.user, cls.other_user)
+        # the channel of a server the user did not join
+        category = Category.objects.create(name="test_unread_category")
+        hidden_server = Server.objects.create(
+            name="test_unread_server", owner=cls.other_user, category=category
+        )
+        cls.hidden_channel = Channel.objects.create(
+            name="test_hidden_channel", owner=cls.other_user, server=hidden_server
+        )
+        cls.conversations = {}
+        for channel, count in ((cls.channel, 5), (cls.read_channel, 3)):
+            conversation = Conversation.objects.create(channel=channel)
+            for _ in range(count):
+                Message.objects.create(
+                    conversation=conversation, sender=cls.other_user, content="Hi"
+                )
+            cls.conversations[channel.id] = conversation
+        ReadMarker.objects.mark_read(
+            {
+                (cls.user.id, cls.conversations[cls.channel.id].id): 2,
+                (cls.user.id, cls.conversations[cls.read_channel.id].id): 3,
+                # the markers of the other users are not used
+                (cls.other_user.id, cls.conversations[cls.channel.id].id): 5,
+            }
+        )
+
+    def setUp(self) -> None:
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.url = reverse("webchat:webchat-messages-unread")
+
+    def test_unread_counts(self):
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [
+                (item["channel"], item["last_seq"], item["last_read_seq"])
+                for item in response.data
+            ],
+            [
+                (str(self.channel.id), 5, 2),
+                (str(self.read_channel.id), 3, 3),
+                (str(self.empty_channel.id), 0, 0),
+            ],
+        )
+        self.assertEqual([item["unread"] for item in response.data], [3, 0, 0])
+        self.assertEqual(response.data[0]["server"], str(self.server.id))
+
+    def test_unread_counts_follow_new_messages(self):
+        Message.objects.create(
+            conversation=self.conversations[self.read_channel.id],
+            sender=self.other_user,
+            content="Hi",
+        )
+        response = self.client.get(self.url)
+        self.assertEqual([item["unread"] for item in response.data], [3, 1, 0])
+
+    def test_unread_counts_exclude_purged_messages(self):
+        # the sequence numbers of the purged messages are kept
+        list(
+            MessageRetention(sleep=0).purge_conversation(
+                self.conversations[self.channel.id].id,
+                timezone.now() + timedelta(days=1),
+            )
+        )
+        response = self.client.get(self.url)
+        self.assertEqual(response.data[0]["last_seq"], 5)
+        self.assertEqual([item["unread"] for item in response.data], [0, 0, 0])
+
+    def test_unread_counts_of_server(self):
+        response = self.client.get(self.url, {"by_serverId": str(self.server.id)})
+        self.assertEqual(len(response.data), 3)
+        response = self.client.get(
+            self.url, {"by_serverId": str(self.hidden_channel.server_id)}
+        )
+        self.assertEqual(response.data, [])
+        response = self.client.get(self.url, {"by_serverId": "not_a_server_id"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_unread_counts_require_authentication(self):
+        response = APIClient().get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
@@ -1,34 +1,72 @@
+from datetime import timedelta
+
 from django.core.exceptions import ValidationError
-from django.db.utils import DataError, IntegrityError
+from django.db import connection
+from django.db.utils import IntegrityError
 from django.test import TestCase
 
-from utils.tests.base import BaseTestUser
-from webchat.models import Conversation, Message
+from utils.identifiers import uuid7
+from utils.tests.base import BaseTestChannel, BaseTestUser
+from webchat.models import Conversation, Message, ReadMarker
 
 
-class ConversationModelTest(TestCase):
+class ConversationModelTest(TestCase, BaseTestChannel):
     """Test suit for Conversation Model."""
 
-    def test_max_length_name(self):
-        # Attempt to create a Category with a name longer than 100 characters
-        max_length = Conversation._meta.get_field("channel_id").max_length
-        long_channel_id = "a" * (max_length + 1)
-        with self.assertRaises(DataError):
-            Conversation.objects.create(channel_id=long_channel_id)
+    def setUp(self):
+        self.channel = self.get_test_channel()
 
     def test_conversation_str_representation(self):
-        conversation = Conversation.objects.create(channel_id="test_channel")
-        self.assertEqual(str(conversation), "test_channel")
+        conversation = Conversation.objects.create(channel=self.channel)
+        self.assertEqual(str(conversation), str(self.channel.id))
+
+    def test_one_conversation_per_channel(self):
+        Conversation.objects.create(channel=self.channel)
+        with self.assertRaises(IntegrityError):
+            Conversation.objects.create(channel=self.channel)
+
+    def test_conversations_without_channel(self):
+        Conversation.objects.create()
+        Conversation.objects.create()
+        self.assertEqual(Conversation.objects.filter(channel=None).count(), 2)
 
+    def test_conversation_is_kept_when_the_channel_is_deleted(self):
+        conversation = Conversation.objects.create(channel=self.channel)
+        self.channel.delete()
+        conversation.refresh_from_db()
+        self.assertIsNone(conversation.channel_id)
+
+    def test_get_or_create_id_for_channel(self):
+        self.assertIsNone(Conversation.objects.get_id_for_channel(self.channel.id))
+        conversation_id = Conversation.objects.get_or_create_id_for_channel(
+            self.channel.id
+        )
+        with self.assertNumQueries(1):
+            self.assertEqual(
+                Conversation.objects.get_or_create_id_for_channel(self.channel.id),
+                conversation_id,
+            )
 
-class MessageModelTest(TestCase, BaseTestUser):
+    def test_conversation_of_channel_is_read_from_the_index(self):
+        Conversation.objects.create(channel=self.channel)
+        queryset = Conversation.objects.values_list("id", flat=True).filter(
+            channel_id=self.channel.id
+        )
+        with connection.cursor() as cursor:
+            # the table is too small for the planner to prefer the index
+            cursor.execute("SET LOCAL enable_seqscan = off")
+            plan = queryset.explain()
+        self.assertIn("Index Only Scan using conversation_channel_unique", plan)
+
+
+class MessageModelTest(TestCase, BaseTestUser, BaseTestChannel):
     """Test suit for Message Model."""
 
     @classmethod
     def setUpTestData(cls):
         # Set up non-modified objects used by all test methods
         cls.user = cls().get_test_active_regularuser()
-        cls.conversation = Conversation.objects.create(channel_id="test_channel")
+        cls.conversation = Conversation.objects.create(channel=cls().get_test_channel())
 
     def test_create_message(self):
         message = Message.objects.create(
@@ -83,3 +121,195 @@ class MessageModelTest(TestCase, BaseTestUser):
         self.assertFalse(
             Message.objects.filter(conversation_id=conversation_id).exists()
         )
+
+    def test_message_seq_increases_per_conversation(self):
+        other_conversation = Conversation.objects.create(
+            channel=self.get_test_channel("other_channel")
+        )
+        first = Message.objects.create(
+            conversation=self.conversation, sender=self.user, content="Hello"
+        )
+        second = Message.objects.create(
+            conversation=self.conversation, sender=self.user, content="Hello"
+        )
+        other = Message.objects.create(
+            conversation=other_conversation, sender=self.user, content="Hello"
+        )
+        self.assertEqual(first.seq, 1)
+        self.assertEqual(second.seq, 2)
+        self.assertEqual(other.seq, 1)
+        self.conversation.refresh_from_db()
+        self.assertEqual(self.conversation.last_seq, 2)
+
+    def test_message_counters_of_conversation(self):
+        first = Message.objects.create(
+            conversation=self.conversation, sender=self.user, content="Hello"
+        )
+        second = Message.objects.create(
+            conversation=self.conversation, sender=self.user, content="Hello"
+        )
+        self.conversation.refresh_from_db()
+        self.assertEqual(self.conversation.message_count, 2)
+        self.assertEqual(self.conversation.last_message_at, second.created)
+        self.assertEqual(self.conversation.last_message_id, second.id)
+
+        # updating a message does not count it again
+        first.content = "Hello again"
+        first.save()
+        self.conversation.refresh_from_db()
+        self.assertEqual(self.conversation.message_count, 2)
+        self.assertEqual(self.conversation.last_message_id, second.id)
+
+    def test_add_messages_keeps_the_latest_message(self):
+        latest = Message.objects.create(
+            conversation=self.conversation, sender=self.user, content="Hello"
+        )
+        older = Message(
+            conversation=self.conversation,
+            sender=self.user,
+            content="Hello",
+            created=latest.created - timedelta(minutes=1),
+            seq=Conversation.objects.allocate_seq(self.conversation.id),
+        )
+        Message.objects.bulk_create([older])
+        Conversation.objects.add_messages([older])
+
+        self.conversation.refresh_from_db()
+        self.assertEqual(self.conversation.message_count, 2)
+        self.assertEqual(self.conversation.last_message_at, latest.created)
+        self.assertEqual(self.conversation.last_message_id, latest.id)
+
+    def test_allocate_seq_follows_the_reserved_blocks(self):
+        self.assertEqual(
+            Conversation.objects.reserve_seq_block(self.conversation.id, 10), 10
+        )
+        message = Message.objects.create(
+            conversation=self.conversation, sender=self.user, content="Hello"
+        )
+        self.assertEqual(message.seq, 11)
+        self.assertEqual(
+            Conversation.objects.reserve_seq_block(self.conversation.id, 10), 21
+        )
+
+    def test_add_messages_moves_the_last_seq(self):
+        messages = [
+            Message(
+                conversation=self.conversation,
+                sender=self.user,
+                content="Hello",
+                seq=seq,
+            )
+            for seq in [3, 5, 4]
+        ]
+        Message.objects.bulk_create(messages)
+        Conversation.objects.add_messages(messages)
+        self.conversation.refresh_from_db()
+        self.assertEqual(self.conversation.last_seq, 5)
+
+        # the messages stored later with lower numbers do not move it back
+        older = Message(
+            conversation=self.conversation, sender=self.user, content="Hi", seq=2
+        )
+        Message.objects.bulk_create([older])
+        Conversation.objects.add_messages([older])
+        self.conversation.refresh_from_db()
+        self.assertEqual(self.conversation.last_seq, 5)
+
+    def test_reconcile_repairs_the_counters(self):
+        other_conversation = Conversation.objects.create(
+            channel=self.get_test_channel("other_channel")
+        )
+        message = Message.objects.create(
+            conversation=self.conversation, sender=self.user, content="Hello"
+        )
+        Message.objects.create(
+            conversation=other_conversation, sender=self.user, content="Hello"
+        )
+        Conversation.objects.filter(id=self.conversation.id).update(
+            message_count=10, last_message_at=None, last_message_id=None
+        )
+
+        repaired = Conversation.objects.reconcile(
+            [self.conversation.id, other_conversation.id]
+        )
+
+        self.assertEqual(repaired, [self.conversation.id])
+        self.conversation.refresh_from_db()
+        self.assertEqual(self.conversation.message_count, 1)
+        self.assertEqual(self.conversation.last_message_at, message.created)
+        self.assertEqual(self.conversation.last_message_id, message.id)
+
+    def test_message_seq_kept_on_update(self):
+        message = Message.objects.create(
+            conversation=self.conversation, sender=self.user, content="Hello"
+        )
+        message.content = "Hello again"
+        message.save()
+        message.refresh_from_db()
+        self.assertEqual(message.seq, 1)
+
+    def test_messages_of_conversation(self):
+        message = Message.objects.create(
+            conversation=self.conversation, sender=self.user, content="Hello"
+        )
+        self.assertEqual(
+            list(
+                Message.objects.of_conversation(
+                    self.conversation.id, self.conversation.created
+                )
+            ),
+            [message],
+        )
+
+
+class ReadMarkerModelTest(TestCase, BaseTestChannel, BaseTestUser):
+    """Test suit for ReadMarker Model."""
+
+    def setUp(self):
+        self.user = self.get_test_active_regularuser()
+        self.conversation = Conversation.objects.create(channel=self.get_test_channel())
+        for _ in range(5):
+            Message.objects.create(
+                conversation=self.conversation, sender=self.user, content="Hello"
+            )
+
+    def get_last_read_seq(self) -> int:
+        return ReadMarker.objects.get(
+            user=self.user, conversation=self.conversation
+        ).last_read_seq
+
+    def test_read_marker_str_representation(self):
+        marker = ReadMarker.objects.create(
+            user=self.user, conversation=self.conversation, last_read_seq=2
+        )
+        self.assertEqual(str(marker), f"{self.user.id} {self.conversation.id}: 2")
+
+    def test_one_read_marker_per_user_and_conversation(self):
+        ReadMarker.objects.create(user=self.user, conversation=self.conversation)
+        with self.assertRaises(IntegrityError):
+            ReadMarker.objects.create(user=self.user, conversation=self.conversation)
+
+    def test_mark_read_only_moves_forward(self):
+        key = (self.user.id, self.conversation.id)
+        self.assertEqual(ReadMarker.objects.mark_read({key: 3}), 1)
+        self.assertEqual(self.get_last_read_seq(), 3)
+        self.assertEqual(ReadMarker.objects.mark_read({key: 2}), 0)
+        self.assertEqual(self.get_last_read_seq(), 3)
+        self.assertEqual(ReadMarker.objects.mark_read({key: 4}), 1)
+        self.assertEqual(self.get_last_read_seq(), 4)
+
+    def test_mark_read_stops_at_the_last_message(self):
+        ReadMarker.objects.mark_read({(self.user.id, self.conversation.id): 100})
+        self.assertEqual(self.get_last_read_seq(), 5)
+
+    def test_mark_read_skips_missing_conversations(self):
+        other = self.get_test_staffuser()
+        stored = ReadMarker.objects.mark_read(
+            {
+                (self.user.id, self.conversation.id): 1,
+                (other.id, self.conversation.id): 2,
+                (self.user.id, uuid7()): 1,
+            }
+        )
+        self.assertEqual(stored, 2)
+        self.assertEqual(ReadMarker.objects.count(), 2)
@@ -1,21 +1,64 @@
+import uuid
+
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.core.handlers.asgi import ASGIRequest
+from django.db.models import BigIntegerField, F, FilteredRelation, FloatField, Q, Value
+from django.db.models.functions import Cast, Coalesce, Greatest, Least
+from django.http import StreamingHttpResponse
 from drf_spectacular.utils import extend_schema_view
 from rest_framework import viewsets
-from rest_framework.exceptions import ValidationError
+from rest_framework.decorators import action
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.permissions import IsAuthenticated
 from rest_framework.request import Request
 from rest_framework.response import Response
 
+from server.models import Channel
+from webchat.cache import get_recent_messages_cache
+from webchat.exports import MessageExport
 from webchat.models import Conversation, Message
-from webchat.schema import message_list_docs
-from webchat.serializers import MessageSerializer
+from webchat.pagination import MessageCursorPagination, MessageSearchPagination
+from webchat.schema import (
+    message_export_docs,
+    message_list_docs,
+    message_search_docs,
+    message_unread_docs,
+)
+from webchat.serializers import (
+    MessageSearchSerializer,
+    MessageSerializer,
+    UnreadCountSerializer,
+)
+
+# the longest searched text, longer ones are refused
+SEARCH_QUERY_MAX_LENGTH = 256
+
+
+def get_uuid_param(request: Request, name: str) -> uuid.UUID | None:
+    """Returns the optional query parameter as a UUID."""
+    value = request.query_params.get(name)
+    if not value:
+        return None
+    try:
+        return uuid.UUID(value)
+    except ValueError:
+        raise ValidationError(detail=f"{name}: {value} is not in the right format.")
 
 
 @extend_schema_view(  # adding the custom filtering atributes to our openAPI doc
-    list=message_list_docs
+    list=message_list_docs,
+    search=message_search_docs,
+    export=message_export_docs,
+    unread=message_unread_docs,
 )
 class MessageViewSet(viewsets.ViewSet):
 
+    pagination_class = MessageCursorPagination
+
     def get_queryset(self):
-        return Message.objects.all()
+        # the sender is serialized with every message, so it is loaded
+        # with the same query as the messages
+        return Message.objects.select_related("sender")
 
     def get_view_name(self):
         """
@@ -25,17 +68,25 @@ class MessageViewSet(viewsets.ViewSet):
 
     def list(self, request: Request) -> Response:
         """
-        Returns a list of messages based on query parameters.
+        Returns a page of messages based on query parameters.
+
+        The messages are paginated with a cursor, the first page has the latest
+        messages of the channel. The links to the older and the newer messages
+        are sent in the Link header.
 
         Args:
         request (Request): The HTTP request object.
 
         Returns:
-        A queryset of messages filtered by the given parameters.
+        A page of messages filtered by the given parameters.
 
         Query Parameters:
         - `by_channelId` (str): It is required. Channel ID used to fillter all \
             the messages related to this specific channel.
+        - `before` (str): Cursor, returns the messages older than the cursor.
+        - `after` (str): Cursor, returns the messages newer than the cursor.
+        - `page_size` (int): Number of messages in the page, 50 by default \
+            and at most 100.
 
         Example:
         To retrieve messages related to the channel with the id '550e8400-e29b-41d4-a716-446655440000':
@@ -47,17 +98,210 @@ class MessageViewSet(viewsets.ViewSet):
 
         if not by_channelId:
             raise ValidationError(detail="by_channelId parameter is required.")
-
         try:
-            conversation = Conversation.objects.get(channel_id=by_channelId)
+            # the same format as the channel ids of the consumer,
+            # so both share the cached messages of the channel
+            by_channelId = str(uuid.UUID(by_channelId))
         except ValueError:
             raise ValidationError(
                 detail=f"Channel ID: {by_channelId} is not in the right format."
             )
-        except Conversation.DoesNotExist:
+
+        paginator = self.pagination_class()
+        recent_messages = get_recent_messages_cache()
+        # opening a channel is the most frequent read, the latest messages
+        # are served from the cache without touching the database
+        is_first_page = paginator.is_first_page(request)
+        if is_first_page:
+            cached = recent_messages.get(by_channelId, paginator.get_page_size(request))
+            if cached is not None:
+                page = paginator.paginate_cached(cached, request)
+                return paginator.get_paginated_response(page)
+
+        # the conversation is read from the index of the channel, the messages
+        # are bounded by its creation, so only the partitions of the months
+        # since then are scanned
+        conversation = Conversation.objects.get_for_channel(by_channelId)
+        if conversation is None:
             messages = Message.objects.none()
         else:
-            messages = conversation.message.all()
+            messages = self.get_queryset().of_conversation(*conversation)
+
+        page = paginator.paginate_queryset(messages, request, view=self)
+        serializer = MessageSerializer(page, many=True)
+        if is_first_page:
+            recent_messages.fill(by_channelId, serializer.data)
+        return paginator.get_paginated_response(serializer.data)
+
+    @action(
+        detail=False,
+        methods=["GET"],
+        permission_classes=[IsAuthenticated],
+        pagination_class=MessageSearchPagination,
+    )
+    def search(self, request: Request) -> Response:
+        """
+        Returns a page of the messages matching the searched text, the best
+        matches first.
+
+        Only the messages of the channels of the servers the user is a member
+        of are searched. The words are matched by their english stems, so
+        "running" finds "run" and "runs". The link to the next results is
+        sent in the Link header.
+
+        Query Parameters:
+        - `q` (str): It is required. The searched text, with the web search \
+            syntax: "quoted phrase", or, -excluded.
+        - `by_serverId` (str): Searches only the channels of the server.
+        - `by_channelId` (str): Searches only the messages of the channel.
+        - `cursor` (str): Cursor, returns the results after the cursor.
+        - `page_size` (int): Number of results in the page, 20 by default \
+            and at most 100.
+
+        Example:
+            GET /api/messages/search?q=release+date
+        """
+        text = request.query_params.get("q", "").strip()
+        if not text:
+            raise ValidationError(detail="q parameter is required.")
+        if len(text) > SEARCH_QUERY_MAX_LENGTH:
+            raise ValidationError(
+                detail=f"q parameter is longer than {SEARCH_QUERY_MAX_LENGTH}."
+            )
+        by_serverId = get_uuid_param(request, "by_serverId")
+        by_channelId = get_uuid_param(request, "by_channelId")
+
+        # the conversations of the servers joined by the user, the pk is used,
+        # so the stateless user of the token is not loaded
+        conversations = Conversation.objects.filter(
+            channel__server__member=request.user.pk
+        )
+        if by_serverId is not None:
+            conversations = conversations.filter(channel__server=by_serverId)
+        if by_channelId is not None:
+            conversations = conversations.filter(channel=by_channelId)
+
+        query = SearchQuery(text, search_type="websearch", config="english")
+        # the matching messages are found with the GIN index of the stored
+        # search vector, only the matches are ranked, the rank is a real and
+        # it is read as a double, so the rank of the cursor compares equal
+        messages = (
+            Message.objects.filter(
+                conversation__in=conversations.values("id"), search_vector=query
+            )
+            .annotate(
+                rank=Cast(SearchRank(F("search_vector"), query), FloatField()),
+                channel_id=F("conversation__channel_id"),
+            )
+            .select_related("sender")
+            .defer("search_vector")
+        )
 
-        serializer = MessageSerializer(messages, many=True)
-        return Response(serializer.data)
+        paginator = MessageSearchPagination()
+        page = paginator.paginate_queryset(messages, request, view=self)
+        serializer = MessageSearchSerializer(page, many=True)
+        return paginator.get_paginated_response(serializer.data)
+
+    @action(detail=False, methods=["GET"], permission_classes=[IsAuthenticated])
+    def export(self, request: Request) -> StreamingHttpResponse:
+        """
+        Streams all the messages of the channel as gzip compressed JSON Lines,
+        the oldest first, one message per line.
+
+        The messages are read with a server-side cursor in chunks, so the
+        memory used does not depend on the number of the messages. Only the
+        members of the server of the channel can export its messages.
+
+        Query Parameters:
+        - `by_channelId` (str): It is required. ID of the exported channel.
+
+        Example:
+            GET /api/messages/export?by_channelId=550e8400-e29b-41d4-a716-446655440000
+        """
+        by_channelId = get_uuid_param(request, "by_channelId")
+        if by_channelId is None:
+            raise ValidationError(detail="by_channelId parameter is required.")
+        if not Channel.objects.filter(
+            id=by_channelId, server__member=request.user.pk
+        ).exists():
+            raise NotFound(detail="Channel not found.")
+
+        conversation = Conversation.objects.get_for_channel(by_channelId)
+        if conversation is None:
+            messages = Message.objects.none()
+        else:
+            messages = Message.objects.of_conversation(*conversation)
+
+        export = MessageExport(messages)
+        # the ASGI server reads the chunks asynchronously, a synchronous
+        # iterator would be read whole into the memory before it is sent
+        if isinstance(request._request, ASGIRequest):
+            streaming_content = export.aiter_chunks()
+        else:
+            streaming_content = export
+        response = StreamingHttpResponse(
+            streaming_content, content_type="application/gzip"
+        )
+        response["Content-Disposition"] = (
+            f'attachment; filename="channel-{by_channelId}.jsonl.gz"'
+        )
+        return response
+
+    @action(detail=False, methods=["GET"], permission_classes=[IsAuthenticated])
+    def unread(self, request: Request) -> Response:
+        """
+        Returns the number of the unread messages of every channel of the
+        servers joined by the user.
+
+        The counts are the difference of the last sequence number of the
+        conversation of the channel and the last one read by the user, so
+        they are read with a single query of the indexes, without counting
+        the messages. They are at most the number of the retained messages,
+        the purged ones are not unread. The messages are marked as read with
+        the "mark_read" frames of the websocket.
+
+        Query Parameters:
+        - `by_serverId` (str): Returns only the channels of the server.
+
+        Example:
+            GET /api/messages/unread
+        """
+        by_serverId = get_uuid_param(request, "by_serverId")
+
+        # the pk is used, so the stateless user of the token is not loaded
+        channels = Channel.objects.filter(server__member=request.user.pk)
+        if by_serverId is not None:
+            channels = channels.filter(server=by_serverId)
+        channels = (
+            channels.annotate(
+                read_marker=FilteredRelation(
+                    "conversations__read_markers",
+                    condition=Q(conversations__read_markers__user=request.user.pk),
+                ),
+                # the channels without messages have no conversation yet
+                last_seq=Coalesce(
+                    F("conversations__last_seq"),
+                    Value(0),
+                    output_field=BigIntegerField(),
+                ),
+                last_read_seq=Coalesce(
+                    F("read_marker__last_read_seq"),
+                    Value(0),
+                    output_field=BigIntegerField(),
+                ),
+                message_count=Coalesce(
+                    F("conversations__message_count"),
+                    Value(0),
+                    output_field=BigIntegerField(),
+                ),
+            )
+            .annotate(
+                unread=Greatest(
+                    Least(F("last_seq") - F("last_read_seq"), F("message_count")),
+                    Value(0),
+                )
+            )
+            .order_by("server_id", "name")
+            .values("id", "server_id", "last_seq", "last_read_seq", "unread")
+        )
+        return Response(UnreadCountSerializer(channels, many=True).data)